@@ -0,0 +1,253 @@
+"""Detección en streaming de anomalías y fallos de sensores de corriente.
+
+Se registra como etapa del pipeline de lecturas (ver sensor_pipeline.py). Cada canal
+(radio, dispositivo, atributo) guarda un estado de tamaño fijo en arrays compactos,
+por lo que cada muestra cuesta O(1) y nunca se recorre el histórico:
+
+- Centinela: lecturas marcadas como no válidas (`SensorReading.valid`). La ruta de ingesta
+  las compara en crudo, antes de escalar, con los centinelas del esquema: el "sin valor"
+  del tipo ZCL y el -999.9 que envía el firmware del ESP32-H2 cuando falla el ADC.
+- Sonda desconectada: un HSTS016L sin señal queda fijo en el punto cero (1650 mV), es
+  decir, ~0 A sin ninguna variación durante muchas muestras seguidas. En una instalación
+  solar eso es también lo normal de noche, así que solo se considera desconexión si otra
+  sonda del mismo dispositivo mide corriente en ese momento; si no, es que no hay
+  producción y no se alerta.
+- Sensor atascado: el mismo valor (distinto de cero) repetido muchas muestras seguidas.
+- Fuera de rango y cambio demasiado brusco entre muestras consecutivas.
+- Deriva: la media rápida se separa de la línea base lenta (EWMA de media y varianza).
+
+Las alertas se emiten solo al activarse y al desaparecer, no en cada muestra.
+"""
+import array
+import dataclasses
+import logging
+import math
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+
+MAX_ABS_CURRENT = 100.0  # A. Cualquier valor mayor se considera fuera de rango
+MAX_RATE_OF_CHANGE = 50.0  # A/s entre dos muestras consecutivas
+FLATLINE_EPSILON = 0.001  # A. Diferencia por debajo de la cual dos muestras son "iguales"
+FLATLINE_SAMPLES = 60  # Muestras iguales seguidas para considerar el sensor atascado
+ZERO_POINT_CURRENT = 0.05  # A. Margen alrededor de 0 A (1650 mV) para "sonda desconectada"
+BASELINE_ALPHA = 0.01  # EWMA lenta (línea base)
+FAST_ALPHA = 0.2  # EWMA rápida
+DRIFT_SIGMAS = 4.0  # Separación entre medias, en desviaciones típicas de la línea base
+DRIFT_MIN_DELTA = 0.5  # A. Separación mínima absoluta para considerar deriva
+WARMUP_SAMPLES = 100  # Muestras antes de evaluar la deriva
+
+# Bits de la máscara de alertas activas de cada canal
+ALERT_SENTINEL = 0x01
+ALERT_DISCONNECTED = 0x02
+ALERT_STUCK = 0x04
+ALERT_OUT_OF_RANGE = 0x08
+ALERT_RATE = 0x10
+ALERT_DRIFT = 0x20
+
+ALERT_NAMES = {
+    ALERT_SENTINEL: "sentinel",
+    ALERT_DISCONNECTED: "disconnected",
+    ALERT_STUCK: "stuck",
+    ALERT_OUT_OF_RANGE: "out_of_range",
+    ALERT_RATE: "rate_of_change",
+    ALERT_DRIFT: "drift",
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class AnomalyEvent:
+    kind: str  # Uno de los valores de ALERT_NAMES
+    active: bool  # True al activarse la alerta, False al desaparecer
+    reading: SensorReading  # Lectura que provocó el cambio de estado
+    detail: str = ""
+
+
+AlertHandler = Callable[[AnomalyEvent], None]
+
+
+class AnomalyDetector:
+    """Estado por canal en arrays paralelos, indexados por el número de canal."""
+
+    def __init__(self, metrics: Optional[GatewayMetrics] = None):
+        self.metrics = metrics
+        self._handlers: List[AlertHandler] = []
+        self._channels: Dict[Tuple[str, str, int], int] = {}
+        self._devices: Dict[Tuple[str, str], int] = {}
+
+        self._last_value = array.array("d")
+        self._last_ts = array.array("d")
+        self._baseline_mean = array.array("d")
+        self._baseline_var = array.array("d")
+        self._fast_mean = array.array("d")
+        self._count = array.array("L")
+        self._flat_run = array.array("L")
+        self._active = array.array("B")
+        self._device = array.array("L")  # Dispositivo de cada canal
+        self._live = array.array("L")  # Por dispositivo: canales cuya última muestra supera ZERO_POINT_CURRENT
+
+        self.samples = 0
+        self.total_ns = 0
+
+    def add_alert_handler(self, handler: AlertHandler) -> None:
+        self._handlers.append(handler)
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def _channel(self, reading: SensorReading) -> int:
+        key = (reading.shard, reading.ieee, reading.attribute_id)
+        index = self._channels.get(key)
+        if index is None:
+            index = self._channels[key] = len(self._channels)
+            for column in (self._last_value, self._last_ts, self._baseline_mean,
+                           self._baseline_var, self._fast_mean):
+                column.append(0.0)
+            self._count.append(0)
+            self._flat_run.append(0)
+            self._active.append(0)
+            device = self._devices.get(key[:2])
+            if device is None:
+                device = self._devices[key[:2]] = len(self._devices)
+                self._live.append(0)
+            self._device.append(device)
+        return index
+
+    def process(self, reading: SensorReading) -> None:
+        """Etapa del pipeline: evalúa una muestra y emite los cambios de alerta."""
+        start = time.perf_counter_ns()
+        i = self._channel(reading)
+        value = reading.value
+        alerts = 0
+        details = {}
+
+        if not reading.valid:
+            # Lectura inválida: no actualiza el estado estadístico del canal
+            alerts = ALERT_SENTINEL | (self._active[i] & (ALERT_DISCONNECTED | ALERT_STUCK | ALERT_DRIFT))
+        elif math.isfinite(value):
+            count = self._count[i]
+            device = self._device[i]
+            live = abs(value) > ZERO_POINT_CURRENT
+            if count:
+                last = self._last_value[i]
+                self._live[device] += live - (abs(last) > ZERO_POINT_CURRENT)
+                delta = value - last
+                if abs(delta) < FLATLINE_EPSILON:
+                    flat_run = self._flat_run[i] + 1
+                else:
+                    flat_run = 0
+                self._flat_run[i] = flat_run
+                if flat_run >= FLATLINE_SAMPLES:
+                    if live:
+                        alerts |= ALERT_STUCK
+                    elif self._live[device]:  # Otra sonda del dispositivo mide corriente
+                        alerts |= ALERT_DISCONNECTED
+
+                dt = reading.timestamp - self._last_ts[i]
+                if dt > 0 and abs(delta) / dt > MAX_RATE_OF_CHANGE:
+                    alerts |= ALERT_RATE
+                    details[ALERT_RATE] = f"{delta:+.2f} A en {dt:.2f} s"
+
+                mean = self._baseline_mean[i]
+                var = self._baseline_var[i]
+                diff = value - mean
+                incr = BASELINE_ALPHA * diff
+                self._baseline_mean[i] = mean + incr
+                # Las muestras ya desviadas no inflan la varianza, o la deriva se ocultaría a sí misma
+                if count < WARMUP_SAMPLES or diff * diff <= DRIFT_SIGMAS * DRIFT_SIGMAS * var:
+                    self._baseline_var[i] = (1 - BASELINE_ALPHA) * (var + diff * incr)
+                fast = self._fast_mean[i] + FAST_ALPHA * (value - self._fast_mean[i])
+                self._fast_mean[i] = fast
+
+                if count >= WARMUP_SAMPLES:
+                    separation = abs(fast - self._baseline_mean[i])
+                    if separation > DRIFT_MIN_DELTA and separation > DRIFT_SIGMAS * math.sqrt(self._baseline_var[i]):
+                        alerts |= ALERT_DRIFT
+                        details[ALERT_DRIFT] = f"media {fast:.2f} A frente a línea base {self._baseline_mean[i]:.2f} A"
+            else:
+                self._live[device] += live
+                self._baseline_mean[i] = value
+                self._fast_mean[i] = value
+
+            if abs(value) > MAX_ABS_CURRENT:
+                alerts |= ALERT_OUT_OF_RANGE
+
+            self._last_value[i] = value
+            self._last_ts[i] = reading.timestamp
+            self._count[i] = count + 1
+        else:
+            alerts = ALERT_OUT_OF_RANGE
+
+        changed = alerts ^ self._active[i]
+        if changed:
+            self._active[i] = alerts
+            self._emit(changed, alerts, reading, details)
+
+        self.samples += 1
+        self.total_ns += time.perf_counter_ns() - start
+
+    def _emit(self, changed: int, alerts: int, reading: SensorReading, details: Dict[int, str]) -> None:
+        for bit, kind in ALERT_NAMES.items():
+            if not changed & bit:
+                continue
+            event = AnomalyEvent(kind=kind, active=bool(alerts & bit), reading=reading, detail=details.get(bit, ""))
+            if self.metrics is not None and event.active:
+                self.metrics.increment(f"anomaly.{kind}")
+            for handler in self._handlers:
+                try:
+                    handler(event)
+                except Exception as e:
+                    logging.error(f"Error en el manejador de alertas: {type(e).__name__} - {e}", exc_info=True)
+
+    def active_alerts(self) -> Dict[Tuple[str, str, int], List[str]]:
+        """Alertas activas por canal (radio, IEEE, atributo)."""
+        result = {}
+        for key, i in self._channels.items():
+            mask = self._active[i]
+            if mask:
+                result[key] = [kind for bit, kind in ALERT_NAMES.items() if mask & bit]
+        return result
+
+    def average_cost_us(self) -> float:
+        """Coste medio medido por muestra, en microsegundos."""
+        return self.total_ns / self.samples / 1000 if self.samples else 0.0
+
+    def update_metrics(self) -> None:
+        if self.metrics is None:
+            return
+        self.metrics.set("anomaly.channels", len(self._channels))
+        self.metrics.set("anomaly.active_channels", sum(1 for mask in self._active if mask))
+        self.metrics.set("anomaly.sample_cost_us", round(self.average_cost_us(), 3))
+
+
+def log_alert(event: AnomalyEvent) -> None:
+    """Manejador por defecto: deja constancia de la alerta en el log."""
+    reading = event.reading
+    channel = f"[{reading.shard}] {reading.ieee} {reading.sensor_name} (AttrID: {reading.attribute_id:#06x})"
+    if event.active:
+        logging.warning(f"ALERTA {event.kind}: {channel} = {reading.value} {event.detail}".rstrip())
+    else:
+        logging.info(f"Alerta {event.kind} resuelta: {channel} = {reading.value}")
+
+
+if __name__ == "__main__":
+    # Medida del coste por muestra: python sensor_anomaly.py [canales] [muestras_por_canal]
+    import random
+    import sys
+
+    n_channels = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    n_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    detector = AnomalyDetector()
+    readings = [
+        SensorReading("radio0", f"{c:016x}", c & 0xFFFF, 1 + c % 3, "bench", random.uniform(0, 20), float(s))
+        for s in range(n_samples)
+        for c in range(n_channels)
+    ]
+    start = time.perf_counter()
+    for reading in readings:
+        detector.process(reading)
+    elapsed = time.perf_counter() - start
+    print(f"{len(detector)} canales, {detector.samples} muestras en {elapsed:.3f} s: "
+          f"{elapsed / detector.samples * 1e6:.2f} us/muestra "
+          f"(medido dentro de process: {detector.average_cost_us():.2f} us/muestra)")
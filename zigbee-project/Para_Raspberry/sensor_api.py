@@ -0,0 +1,393 @@
+"""Servicio HTTP/JSON local para consultar las lecturas del gateway.
+
+Rutas:
+
+    GET /latest                     últimos valores de todos los canales
+    GET /latest/{ieee}              últimos valores de un dispositivo
+    GET /range?ieee=&attribute=&start=&end=&limit=   lecturas en NDJSON (por trozos)
+    GET /rollup?ieee=&attribute=&start=&end=&bucket= mín/media/máx por intervalo
+    GET /metrics                    métricas del gateway
+    POST /permit?duration=&radio=&node=              abre la red para uniones (duration=0 la cierra)
+
+`POST /permit` solo existe si el gateway pasa `permit` (ver sensor_join.py) y un
+`permit_token`, que la petición debe enviar como `Authorization: Bearer <token>` (si no,
+401): abrir la red deja entrar dispositivos, así que no basta con llegar al puerto. Sin
+`radio` se abren todas las radios; con `node` (IEEE de un router) solo ese router, p. ej.
+`curl -X POST -H "Authorization: Bearer $TOKEN" "http://127.0.0.1:8080/permit?duration=300"`.
+
+Las lecturas no válidas (valor crudo centinela, ver sensor_schema.py) salen con
+`"valid": false` y `"value": null` en /latest, como `null` en /range y no cuentan en /rollup.
+
+Los últimos valores salen de memoria (una etapa del pipeline los mantiene). El
+histórico se consulta en `ReadingsStore` con una conexión propia de solo lectura
+(`mode=ro`), que vive en su propio hilo, y la serialización JSON de respuestas grandes
+se hace en un pool de hilos: ninguna consulta pesada se ejecuta en el bucle de eventos
+de la radio.
+
+`/range` devuelve como mucho `limit` lecturas (API_RANGE_MAX_ROWS por defecto y como
+máximo), que se leen y envían página a página. Si el rango tiene más, la cabecera
+`X-Range-Next-Start` indica el `start` con el que pedir la continuación; `X-Range-Rows`
+dice cuántas filas trae la respuesta. La ETag se calcula antes de leer las filas.
+
+Las respuestas se guardan en caché un tiempo (TTL) con su ETag, y varias peticiones
+idénticas simultáneas comparten una única consulta. Sin `end`, el rango termina en el
+siguiente múltiplo de API_DEFAULT_END_STEP segundos y no en el instante exacto de la
+petición: así las consultas por defecto tienen la misma clave de caché (y ETag) durante ese
+paso en lugar de ser todas distintas.
+"""
+import asyncio
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+from sensor_store import ReadingsStore
+
+API_LATEST_TTL = 1.0  # Segundos de caché para los últimos valores
+API_HISTORY_TTL = 30.0  # Segundos de caché para rangos y agregados
+API_DEFAULT_END_STEP = 30.0  # Sin `end`, se redondea el instante actual hacia arriba a este paso
+API_CACHE_MAX_ENTRIES = 256
+API_CACHE_MAX_BODY = 1024 * 1024  # Las respuestas mayores no se guardan en caché
+API_CATALOG_REFRESH = 60.0  # Cada cuánto se releen dispositivos y particiones del histórico
+API_NDJSON_CHUNK = 2000  # Filas por trozo al enviar rangos
+API_RANGE_MAX_ROWS = 100000  # Filas máximas por respuesta de /range
+API_WORKERS = 2
+API_PERMIT_MAX_SECONDS = 24 * 3600  # Duración máxima que se puede pedir en POST /permit
+
+
+class LatestValues:
+    """Etapa del pipeline que guarda la última lectura de cada canal."""
+
+    def __init__(self):
+        self._readings: Dict[Tuple[str, int], SensorReading] = {}
+
+    def __call__(self, reading: SensorReading) -> None:
+        self._readings[(reading.ieee, reading.attribute_id)] = reading
+
+    def snapshot(self, ieee: Optional[str] = None) -> list:
+        return [
+            {
+                "ieee": r.ieee, "nwk": r.nwk, "radio": r.shard, "attribute_id": r.attribute_id,
+                "sensor": r.sensor_name, "value": r.value if r.valid else None, "valid": r.valid,
+                "timestamp": r.timestamp,
+            }
+            for (device, _), r in sorted(self._readings.items())
+            if ieee is None or device == ieee
+        ]
+
+
+def _encode_json(data: Any) -> Tuple[str, bytes]:
+    body = json.dumps(data, separators=(",", ":")).encode()
+    return '"' + hashlib.sha1(body).hexdigest() + '"', body
+
+
+def _encode_ndjson(rows: list) -> bytes:
+    return "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode()
+
+
+def _encode_points(rows: List[Tuple[float, float]]) -> bytes:
+    return _encode_ndjson([{"t": t, "v": v} for t, v in rows])
+
+
+class QueryService:
+    def __init__(self, latest: LatestValues, store_path: Optional[str] = None,
+                 metrics: Optional[GatewayMetrics] = None, host: str = "127.0.0.1", port: int = 8080,
+                 permit: Optional[Callable[[int, Optional[str], Optional[str]], Awaitable[List[str]]]] = None,
+                 permit_token: Optional[str] = None):
+        self.latest = latest
+        self.store_path = store_path
+        self.metrics = metrics or GatewayMetrics()
+        self.host = host
+        self.port = port
+        self.permit = permit
+        self.permit_token = permit_token
+        self._store: Optional[ReadingsStore] = None
+        self._catalog_loaded = 0.0
+        self._executor = concurrent.futures.ThreadPoolExecutor(API_WORKERS, thread_name_prefix="sensor-api")
+        self._cache: Dict[str, Tuple[float, str, bytes]] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_get("/latest", self._handle_latest)
+        self.app.router.add_get("/latest/{ieee}", self._handle_latest)
+        self.app.router.add_get("/range", self._handle_range)
+        self.app.router.add_get("/rollup", self._handle_rollup)
+        self.app.router.add_get("/metrics", self._handle_metrics)
+        if permit is not None and permit_token:
+            self.app.router.add_post("/permit", self._handle_permit)
+
+    async def start(self) -> None:
+        if self.store_path:
+            self._store = ReadingsStore(self.store_path, retention_days=0)
+            await self._store.open(read_only=True)
+            self._catalog_loaded = time.monotonic()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logging.info(f"Servicio de consultas escuchando en http://{self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._store is not None:
+            await self._store.close()
+            self._store = None
+        self._executor.shutdown(wait=False)
+
+    async def _coalesce(self, key: str, producer: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta `producer` una sola vez para todas las peticiones idénticas en curso.
+
+        Si se cancela la petición que lo ejecuta (el cliente se ha ido), las que la
+        esperaban no se quedan colgadas: la primera de ellas lo vuelve a ejecutar.
+        """
+        while True:
+            future = self._in_flight.get(key)
+            if future is None:
+                break
+            self.metrics.increment("api.coalesced")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # Cancelada esta petición, no la que ejecutaba la consulta
+
+        future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await producer()
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Marcada como recuperada aunque nadie más la espere
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if not future.done():  # CancelledError u otra BaseException
+                future.cancel()
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    async def _cached_json(self, request: web.Request, key: str, ttl: float,
+                           producer: Callable[[], Awaitable[Any]]) -> web.Response:
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.metrics.increment("api.cache_hits")
+            _, etag, body = entry
+        else:
+            self.metrics.increment("api.cache_misses")
+
+            async def produce():
+                data = await producer()
+                return await asyncio.get_running_loop().run_in_executor(self._executor, _encode_json, data)
+
+            etag, body = await self._coalesce(key, produce)
+            if len(body) <= API_CACHE_MAX_BODY:
+                if len(self._cache) >= API_CACHE_MAX_ENTRIES:
+                    self._evict_cache()
+                self._cache[key] = (time.monotonic() + ttl, etag, body)
+
+        headers = {"ETag": etag, "Cache-Control": f"max-age={int(ttl)}"}
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    def _evict_cache(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, (expires, _, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+        while len(self._cache) >= API_CACHE_MAX_ENTRIES:
+            self._cache.pop(next(iter(self._cache)))
+
+    async def _history(self) -> ReadingsStore:
+        if self._store is None:
+            raise web.HTTPServiceUnavailable(text="No hay histórico configurado")
+        if time.monotonic() - self._catalog_loaded > API_CATALOG_REFRESH:
+            # La conexión de lectura no ve las particiones ni dispositivos nuevos por sí sola
+            await self._store.reload_catalog()
+            self._catalog_loaded = time.monotonic()
+        return self._store
+
+    @staticmethod
+    def _channel_params(request: web.Request) -> Tuple[str, int, float, float]:
+        try:
+            ieee = request.query["ieee"]
+            attribute = int(request.query["attribute"], 0)
+            if "end" in request.query:
+                end = float(request.query["end"])
+            else:
+                end = math.ceil(time.time() / API_DEFAULT_END_STEP) * API_DEFAULT_END_STEP
+            start = float(request.query.get("start", end - 3600))
+        except (KeyError, ValueError) as e:
+            raise web.HTTPBadRequest(text=f"Parámetros no válidos: {e}")
+        return ieee, attribute, start, end
+
+    async def _handle_latest(self, request: web.Request) -> web.Response:
+        ieee = request.match_info.get("ieee")
+        key = f"latest:{ieee}"
+
+        async def producer():
+            return self.latest.snapshot(ieee)
+
+        return await self._cached_json(request, key, API_LATEST_TTL, producer)
+
+    async def _handle_rollup(self, request: web.Request) -> web.Response:
+        ieee, attribute, start, end = self._channel_params(request)
+        try:
+            bucket = float(request.query.get("bucket", 300))
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Parámetros no válidos: {e}")
+        store = await self._history()
+        key = f"rollup:{ieee}:{attribute}:{start}:{end}:{bucket}"
+
+        async def producer():
+            rows = await store.downsample(ieee, attribute, start, end, bucket)
+            return [{"t": t, "min": vmin, "avg": avg, "max": vmax, "n": n} for t, vmin, avg, vmax, n in rows]
+
+        return await self._cached_json(request, key, API_HISTORY_TTL, producer)
+
+    async def _handle_range(self, request: web.Request) -> web.StreamResponse:
+        ieee, attribute, start, end = self._channel_params(request)
+        try:
+            limit = int(request.query.get("limit", API_RANGE_MAX_ROWS))
+            if not 1 <= limit <= API_RANGE_MAX_ROWS:
+                raise ValueError(f"limit debe estar entre 1 y {API_RANGE_MAX_ROWS}")
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Parámetros no válidos: {e}")
+        store = await self._history()
+        key = f"range:{ieee}:{attribute}:{start}:{end}:{limit}"
+        # Solo el resumen (recuento y último timestamp) se comparte; las filas se envían según se leen
+        total, last, next_start = await self._coalesce(
+            key, lambda: store.range_summary(ieee, attribute, start, end, limit)
+        )
+        rows = min(total, limit)
+
+        etag = '"' + hashlib.sha1(f"{key}:{total}:{last}".encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "X-Range-Rows": str(rows)}
+        if next_start is not None:
+            headers["X-Range-Next-Start"] = repr(next_start)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", **headers})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        loop = asyncio.get_running_loop()
+        pages = store.range_pages(ieee, attribute, start, end, limit, API_NDJSON_CHUNK)
+        try:
+            async for page in pages:
+                self.metrics.increment("api.range_rows", len(page))
+                await response.write(await loop.run_in_executor(self._executor, _encode_points, page))
+        finally:
+            await pages.aclose()  # Libera el cursor aunque el cliente se haya ido a mitad
+        await response.write_eof()
+        return response
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response(self.metrics.snapshot())
+
+    async def _handle_permit(self, request: web.Request) -> web.Response:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), self.permit_token.encode()):
+            self.metrics.increment("api.permit_unauthorized")
+            raise web.HTTPUnauthorized(text="Falta el token de POST /permit o no es válido",
+                                       headers={"WWW-Authenticate": "Bearer"})
+        try:
+            duration = int(request.query.get("duration", 180))
+            if not 0 <= duration <= API_PERMIT_MAX_SECONDS:
+                raise ValueError(f"duration debe estar entre 0 y {API_PERMIT_MAX_SECONDS}")
+            shard = request.query.get("radio")
+            node = request.query.get("node")
+            radios = await self.permit(duration, shard, node)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=f"Parámetros no válidos: {e}")
+        except RuntimeError as e:  # Rechazada en el proceso de radio
+            raise web.HTTPBadRequest(text=str(e))
+        self.metrics.increment("api.permit_requests")
+        return web.json_response({"radios": radios, "duration": duration, "node": node})
+
+
+if __name__ == "__main__":
+    # Prueba de carga con clientes concurrentes: python sensor_api.py [clientes] [segundos]
+    import os
+    import random
+    import statistics
+    import sys
+    import tempfile
+
+    import aiohttp
+
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    async def load_test():
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "readings.db")
+        devices = [f"{d:016x}" for d in range(100)]
+        now = time.time()
+
+        store = ReadingsStore(path, retention_days=0)
+        await store.open()
+        latest = LatestValues()
+        for step in range(360):  # 1 h de lecturas cada 10 s
+            batch = [
+                SensorReading("radio0", ieee, d, attr, "Sensor Corriente", random.uniform(0, 20), now - 3600 + step * 10)
+                for d, ieee in enumerate(devices) for attr in (1, 2, 3)
+            ]
+            await store.insert(batch)
+            for reading in batch:
+                latest(reading)
+        await store.close()
+
+        metrics = GatewayMetrics()
+        service = QueryService(latest, path, metrics, port=0)
+        await service.start()
+        port = service._runner.addresses[0][1]
+        base = f"http://127.0.0.1:{port}"
+        latencies = []
+
+        async def client(session: aiohttp.ClientSession):
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                ieee = random.choice(devices[:10])  # Paneles mirando los mismos dispositivos
+                url = random.choice([
+                    "/latest",
+                    f"/latest/{ieee}",
+                    f"/rollup?ieee={ieee}&attribute=1&start={int(now) - 3600}&end={int(now)}&bucket=60",
+                    f"/range?ieee={ieee}&attribute=2&start={int(now) - 3600}&end={int(now)}",
+                ])
+                t = time.perf_counter()
+                async with session.get(base + url) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - t)
+
+        async def writer():
+            # Lecturas nuevas mientras tanto, como haría la radio
+            while True:
+                latest(SensorReading("radio0", random.choice(devices), 0, 1, "Sensor Corriente", 1.0, time.time()))
+                await asyncio.sleep(0.01)
+
+        writer_task = asyncio.create_task(writer())
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=clients)) as session:
+            await asyncio.gather(*(client(session) for _ in range(clients)))
+        writer_task.cancel()
+        await service.stop()
+
+        latencies.sort()
+        stats = metrics.snapshot()
+        hits, misses = stats.get("api.cache_hits", 0), stats.get("api.cache_misses", 0)
+        print(f"{clients} clientes, {len(latencies)} peticiones en {duration:.0f} s = {len(latencies) / duration:.0f} pet/s; "
+              f"latencia p50 {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms; "
+              f"caché {hits / max(hits + misses, 1):.0%}, consultas compartidas {stats.get('api.coalesced', 0)}")
+
+    asyncio.run(load_test())
@@ -1,30 +1,115 @@
 # --- START OF FILE ---
 import asyncio
 import logging
+import multiprocessing
 import random
 import signal
-from typing import Dict, Any
+import dataclasses
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from sensor_pipeline import GatewayMetrics, ReadingPipeline, SensorReading, zigpy_counters
+from sensor_anomaly import AnomalyDetector, log_alert
+from sensor_wal import WriteAheadQueue
+from sensor_uploader import HttpUploader
+from sensor_store import ReadingsStore
+from sensor_api import LatestValues, QueryService
+from sensor_ring import ControlChannel, ReadingRing, RingReader, RingWriter, check_record_fields
+from sensor_link import FATAL_ERRORS, RadioLink
+from sensor_join import JoinScheduler, parse_expected, parse_periods
+from sensor_schema import SENSOR_SCHEMA_PATH as SENSOR_SCHEMA_DEFAULT_PATH, Channel, SensorRegistry, SensorSchema
 
 # --- Configuración ---
 DEVICE_PATH = '/dev/ttyUSB0'
 BAUDRATE = 115200
 FLOW_CONTROL = None
-
-# Configuración para la tarea de permiso de unión periódico
-# PERMIT_JOIN_DURATION_ON_STARTUP ahora será la duración de cada ventana de unión
-PERMIT_JOIN_DURATION_ON_STARTUP = 180 # Duración de cada ventana de unión (ej. 3 minutos)
-REOPEN_JOIN_INTERVAL_SECONDS = 150    # Reabrir cada 150 segundos (2.5 minutos)
-                                      # Asegúrate REOPEN_JOIN_INTERVAL_SECONDS < PERMIT_JOIN_DURATION_ON_STARTUP
-
-ESP32_H2_ENDPOINT_ID = 1
-CUSTOM_CLUSTER_ID = 0xFC01
-ATTR_ID_CURRENT_SENSOR_1 = 0x0001
-ATTR_ID_CURRENT_SENSOR_2 = 0x0002
-ATTR_ID_CURRENT_SENSOR_3 = 0x0003
-
-REPORTING_MIN_INTERVAL = 10
-REPORTING_MAX_INTERVAL = 60
-REPORTABLE_CURRENT_CHANGE = 0.05
+DESIRED_CHANNEL = 15
+DATABASE_PATH = "zigbee.db"
+
+# Modo multi-dongle: una entrada por radio, cada una con su canal, PAN y base de datos.
+# Si la lista está vacía se usa una sola radio con DEVICE_PATH / DESIRED_CHANNEL / DATABASE_PATH.
+# Las redes de radios distintas deben usar canales (o al menos PAN IDs) diferentes.
+SHARDS: List[Dict[str, Any]] = [
+    # {"name": "radio0", "device_path": "/dev/ttyUSB0", "channel": 15, "database": "zigbee_radio0.db"},
+    # {"name": "radio1", "device_path": "/dev/ttyUSB1", "channel": 20, "pan_id": 0x1A2B, "database": "zigbee_radio1.db"},
+]
+
+WAL_DIRECTORY = "wal" # Cola en disco de las etapas duraderas (envío HTTP, base de datos...)
+READINGS_DB_PATH = "readings.db" # Histórico de lecturas (None = no guardar). Fichero distinto de zigbee.db
+READINGS_RETENTION_DAYS = 90
+API_HOST = "127.0.0.1" # "0.0.0.0" para consultar desde otros equipos de la red local
+API_PORT = 8080 # Servicio HTTP/JSON de consultas (None = desactivado)
+UPLOAD_URL = None # p. ej. "https://xxxx.execute-api.us-east-1.amazonaws.com/prod/readings" (None = no enviar)
+UPLOAD_HEADERS: Dict[str, str] = {} # Cabeceras extra, p. ej. {"x-api-key": "..."}
+UPLOAD_BATCH_SIZE = 2000 # Lecturas máximas por lote enviado (se reparte en peticiones simultáneas)
+UPLOAD_LINGER_SECONDS = 5.0 # Espera máxima para completar un lote
+METRICS_LOG_INTERVAL_SECONDS = 300 # Cada cuánto se vuelcan las métricas al log (0 = nunca)
+
+# Permiso de unión bajo demanda (ver sensor_join.py): la red ya no se reabre periódicamente.
+# Se abre al arrancar, con `POST /permit?duration=&radio=&node=` en la API (duration=0 la cierra),
+# mientras falten dispositivos esperados y durante los periodos de puesta en marcha.
+# La ruta de la API solo existe con API_PERMIT_TOKEN y pide `Authorization: Bearer <token>`.
+API_PERMIT_TOKEN: Optional[str] = None # Token de `POST /permit` (None = ruta desactivada)
+PERMIT_JOIN_DURATION_ON_STARTUP = 180 # Ventana de toda la red al arrancar el gateway (0 = cerrada)
+JOIN_EXPECTED_DEVICES: List[Dict[str, Any]] = [
+    # {"ieee": "00:12:4b:00:1c:a1:b2:c3"},                                  # Se abre toda la red
+    # {"ieee": "00:12:4b:00:1c:a1:b2:c4", "router": "00:12:4b:00:2d:00:00:01"}, # Solo ese router
+]
+JOIN_EXPECTED_TIMEOUT_MINUTES = 60 # Tiempo máximo abierta esperando a los dispositivos que faltan
+JOIN_COMMISSIONING_PERIODS: List[Dict[str, Any]] = [
+    # {"start": "08:00", "end": "09:00"},                       # Cada día, toda la red (hora local)
+    # {"start": "08:00", "end": "09:00", "router": "...", "radio": "radio1"},
+]
+
+# Clusters, atributos, canales y reporte de los sensores: ver sensor_schema.json
+SENSOR_SCHEMA_PATH = SENSOR_SCHEMA_DEFAULT_PATH
+SENSOR_REGISTRY = SensorRegistry.load(SENSOR_SCHEMA_PATH)
+
+# Los sensores reportan continuamente: en la base de datos de zigpy solo hace falta
+# el último valor para restaurar el estado, así que se guardan cada 5 minutos (y al cerrar).
+ATTRIBUTE_PERSISTENCE = [
+    {"cluster_id": schema.cluster_id, "policy": "sampled", "interval": 300}
+    for schema in SENSOR_REGISTRY
+]
+
+# Bucle de eventos: "auto" usa uvloop si está instalado y si no el de asyncio,
+# "uvloop" lo exige (con aviso si falta) y "asyncio" fuerza el bucle estándar.
+# Se usa tanto en el hilo principal como en el hilo serie de bellows.
+EVENT_LOOP = "auto"
+# Tareas "eager" (Python 3.12+): las tareas arrancan sin esperar a la siguiente
+# iteración del bucle. Desactivado por defecto hasta validarlo con bellows/zigpy.
+EAGER_TASKS = False
+# Traza binaria de las últimas tramas serie (0 = desactivada). Se vuelca a
+# FRAME_TRACE_PATH (uno por radio) si el NCP falla o se pierde el puerto.
+FRAME_TRACE_RECORDS = 0
+FRAME_TRACE_PATH = "ash_trace_{shard}.bin"
+# Captura de todos los bytes del puerto serie para reproducirla sin radio con
+# `bellows -d - replay <fichero>` (None = desactivada). Crece ~1 MB/h con poco tráfico.
+SERIAL_CAPTURE_PATH = None # p. ej. "captura_{shard}.bcap"
+# Concurrencia de peticiones adaptativa (AIMD): sube mientras haya peticiones en
+# cola y buffers libres en el NCP, y baja si escasean los buffers, fallan los
+# envíos o crece la latencia. Entre CONCURRENCY_FLOOR y CONCURRENCY_CEILING.
+ADAPTIVE_CONCURRENCY = True
+CONCURRENCY_FLOOR = 2
+CONCURRENCY_CEILING = 32
+CONCURRENCY_MIN_FREE_BUFFERS = 40
+# Lecturas de atributos simultáneas de un mismo cluster (consultas, sondeos...) que llegan
+# en esta ventana se agrupan en un único Read Attributes (None = desactivado)
+READ_COALESCE_WINDOW_SECONDS = 0.01
+# Instantánea binaria del estado de zigpy (dispositivos, atributos, topología...) para
+# arrancar rápido tras un corte: se escribe al cerrar y cada STATE_SNAPSHOT_PERIOD_MINUTES
+# si hubo cambios, y solo se usa si corresponde a la base de datos actual (si no, se carga
+# zigbee.db como siempre). None = desactivada.
+STATE_SNAPSHOT_PATH = "{database}.snapshot"
+STATE_SNAPSHOT_PERIOD_MINUTES = 10
+# Procesos separados: la radio (zigpy/bellows) corre sola en un proceso hijo y publica
+# las lecturas en un anillo de memoria compartida (ver sensor_ring.py). Las etapas del
+# pipeline (consola, histórico, HTTP, API...) corren en el proceso principal, de modo que
+# un consumidor lento o pesado no retrasa los ACK al NCP.
+RADIO_PROCESS = False
+RING_SLOTS = 65536 # Lecturas que caben en el anillo si el proceso principal se retrasa
+RADIO_METRICS_INTERVAL_SECONDS = 10 # Cada cuánto envía el proceso de radio sus métricas
+RADIO_STOP_TIMEOUT_SECONDS = 30 # Espera máxima al cierre ordenado del proceso de radio
 import zigpy.backups
 import zigpy.config as zigpy_config
 import zigpy.exceptions
@@ -35,67 +120,193 @@ from zigpy.zcl import Cluster
 import zigpy.types as t
 import zigpy.zdo.types as zdo_types
 try:
+    from bellows.config import (
+        CONF_ADAPTIVE_CONCURRENCY, CONF_BELLOWS_CONFIG, CONF_CONCURRENCY_CEILING, CONF_CONCURRENCY_FLOOR,
+        CONF_CONCURRENCY_MIN_FREE_BUFFERS, CONF_FRAME_TRACE_PATH, CONF_FRAME_TRACE_RECORDS,
+        CONF_SERIAL_CAPTURE_PATH, CONF_THREAD_LOOP_FACTORY,
+    )
     from bellows.zigbee.application import ControllerApplication as BellowsApplication
 except ImportError:
     print("Error: La biblioteca 'bellows' no está instalada.")
     BellowsApplication = None
 
-class CustomPowerSensorCluster(Cluster):
-    cluster_id = CUSTOM_CLUSTER_ID
-    attributes = {
-        ATTR_ID_CURRENT_SENSOR_1: ("current_sensor_1", t.Single),
-        ATTR_ID_CURRENT_SENSOR_2: ("current_sensor_2", t.Single),
-        ATTR_ID_CURRENT_SENSOR_3: ("current_sensor_3", t.Single),
-    }
 
-if CUSTOM_CLUSTER_ID not in Cluster._registry:
-     Cluster._registry[CUSTOM_CLUSTER_ID] = CustomPowerSensorCluster
-else:
-    if Cluster._registry[CUSTOM_CLUSTER_ID] is not CustomPowerSensorCluster:
-        logging.warning(
-            f"Cluster ID {CUSTOM_CLUSTER_ID:#06x} ya estaba en Cluster.registry "
-            f"pero con una clase diferente ({Cluster._registry[CUSTOM_CLUSTER_ID].__name__}). "
-            f"Sobrescribiendo con CustomPowerSensorCluster."
-        )
-        Cluster._registry[CUSTOM_CLUSTER_ID] = CustomPowerSensorCluster
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """Crea un bucle de eventos según EVENT_LOOP y EAGER_TASKS."""
+    loop = None
+
+    if EVENT_LOOP in ("auto", "uvloop"):
+        try:
+            import uvloop
+        except ImportError:
+            if EVENT_LOOP == "uvloop":
+                logging.warning("uvloop no está instalado, se usará el bucle estándar de asyncio.")
+        else:
+            loop = uvloop.new_event_loop()
+
+    if loop is None:
+        loop = asyncio.new_event_loop()
+
+    if EAGER_TASKS and hasattr(asyncio, "eager_task_factory"):
+        loop.set_task_factory(asyncio.eager_task_factory)
+
+    return loop
+
+
+def run_with_event_loop(coro) -> None:
+    """Ejecuta `coro` hasta el final en un bucle creado con new_event_loop."""
+    if hasattr(asyncio, "Runner"):
+        with asyncio.Runner(loop_factory=new_event_loop) as runner:
+            runner.run(coro)
     else:
-        logging.info(f"Cluster ID {CUSTOM_CLUSTER_ID:#06x} (CustomPowerSensorCluster) ya estaba en Cluster.registry.")
+        # Python < 3.11: no hay asyncio.Runner, se instala el bucle a mano
+        loop = new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(coro)
+        finally:
+            loop.close()
 
 shutdown_event = asyncio.Event()
 
+
+@dataclasses.dataclass(frozen=True)
+class ShardConfig:
+    """Configuración de una radio (dongle) del gateway."""
+    name: str
+    device_path: str
+    channel: int = DESIRED_CHANNEL
+    database: str = DATABASE_PATH
+    pan_id: Optional[int] = None
+    baudrate: int = BAUDRATE
+    flow_control: Optional[str] = FLOW_CONTROL
+
+
+def load_shard_configs() -> List[ShardConfig]:
+    if not SHARDS:
+        return [ShardConfig(name="radio0", device_path=DEVICE_PATH)]
+
+    shards = [ShardConfig(**shard) for shard in SHARDS]
+    for field in ("name", "device_path", "database"):
+        values = [getattr(shard, field) for shard in shards]
+        if len(set(values)) != len(values):
+            raise ValueError(f"SHARDS: el campo '{field}' debe ser único para cada radio: {values}")
+    return shards
+
+
+class ShardRouter:
+    """Asigna cada dispositivo (por IEEE) a una única radio."""
+
+    def __init__(self):
+        self._owners: Dict[t.EUI64, str] = {}
+
+    def claim(self, ieee: t.EUI64, shard: str) -> bool:
+        """Asigna el dispositivo a la radio si no pertenece ya a otra."""
+        owner = self._owners.setdefault(ieee, shard)
+        return owner == shard
+
+    def release(self, ieee: t.EUI64, shard: str) -> None:
+        if self._owners.get(ieee) == shard:
+            del self._owners[ieee]
+
+    def shard_for(self, ieee: t.EUI64) -> Optional[str]:
+        return self._owners.get(ieee)
+
+
+_root_logger = logging.getLogger()
+# Unidad de cada canal del esquema, para mostrar las lecturas por consola
+CHANNEL_UNITS = {channel.name: channel.unit for channels in SENSOR_REGISTRY.channels.values() for channel in channels.values()}
+
+
+def print_reading(reading: SensorReading) -> None:
+    """Etapa por defecto del pipeline: muestra la lectura por consola."""
+    if reading.valid:
+        value = f"{reading.value:.2f} {CHANNEL_UNITS.get(reading.sensor_name, '')}".rstrip()
+    else:
+        value = f"sin medida (valor crudo {reading.value})"
+    print(f"*** LECTURA DE SENSOR [{reading.ieee}] : {reading.sensor_name} (AttrID: {reading.attribute_id:#06x}) = {value} ***")
+    # isEnabledFor usa la caché de niveles del logger: sin INFO no se formatea nada
+    if _root_logger.isEnabledFor(logging.INFO):
+        _root_logger.info(f"ACTUALIZACIÓN SENSOR [{reading.shard}] ({reading.nwk:#06x}): "
+                          f"Sensor (AttrID: {reading.attribute_id:#06x}) = {reading.value} a las {reading.timestamp}")
+
+
+UNKNOWN_CHANNEL = Channel(index=-1, scale=1.0, name="Desconocido", unit="")
+
+
 class SensorAttributeListener:
-    def __init__(self, device_ieee: t.EUI64, owning_cluster: Cluster): # Renombrar para claridad
+    def __init__(self, device_ieee: t.EUI64, owning_cluster: Cluster, pipeline: ReadingPipeline, shard: str): # Renombrar para claridad
         self.device_ieee = device_ieee
         self._last_values: Dict[int, float] = {}
         self.owning_cluster = owning_cluster # El cluster al que este listener pertenece
+        self._pipeline = pipeline
+        self._shard = shard
+        # Tabla attrid -> canal precalculada desde el esquema: un solo dict.get por muestra
+        self._channels = SENSOR_REGISTRY.channels[owning_cluster.cluster_id]
 
     def attribute_updated(self, attribute_id: int, value: Any, timestamp: Any):
 
         # Comentado para reducir el ruido, pero útil para depuración avanzada si es necesario
         # print(f"DEBUG: Se recibió una actualización para cluster {self.owning_cluster.cluster_id:#06x}, atributo {attribute_id:#06x}, valor {value}")
 
-        if self.owning_cluster.endpoint.device.ieee != self.device_ieee or self.owning_cluster.cluster_id != CUSTOM_CLUSTER_ID:
+        if self.owning_cluster.endpoint.device.ieee != self.device_ieee:
             return
 
         self._last_values[attribute_id] = value
-        sensor_name = "Desconocido"
-        if attribute_id == ATTR_ID_CURRENT_SENSOR_1:
-            sensor_name = "Sensor Corriente 1"
-        elif attribute_id == ATTR_ID_CURRENT_SENSOR_2:
-            sensor_name = "Sensor Corriente 2"
-        elif attribute_id == ATTR_ID_CURRENT_SENSOR_3:
-            sensor_name = "Sensor Corriente 3"
+        channel = self._channels.get(attribute_id, UNKNOWN_CHANNEL)
 
-        device_identifier = str(self.owning_cluster.endpoint.device.ieee) # Usamos el del cluster actual
-        print(f"*** LECTURA DE SENSOR [{device_identifier}] : {sensor_name} (AttrID: {attribute_id:#06x}) = {value:.2f} A ***")
-        logging.info(f"ACTUALIZACIÓN SENSOR ({self.owning_cluster.endpoint.device.nwk:#06x}): "
-                     f"Sensor (AttrID: {attribute_id:#06x}) = {value} a las {timestamp}")
+        device = self.owning_cluster.endpoint.device # Usamos el del cluster actual
+        self._pipeline.submit(SensorReading(
+            shard=self._shard,
+            ieee=str(device.ieee),
+            nwk=device.nwk,
+            attribute_id=attribute_id,
+            sensor_name=channel.name,
+            value=value * channel.scale,
+            timestamp=time.time(),
+            valid=not channel.is_sentinel(value), # Sobre el valor crudo: el escalado no debe ocultarlos
+        ))
 
 
 class MyEventListener:
-    def __init__(self, app_controller):
+    def __init__(self, app_controller, shard: str, pipeline: ReadingPipeline, router: ShardRouter, link: RadioLink,
+                 join: JoinScheduler):
         self._app = app_controller
-        self._sensor_listeners: Dict[t.EUI64, SensorAttributeListener] = {}
+        self._shard = shard
+        self._pipeline = pipeline
+        self._router = router
+        self.link = link
+        self.join = join
+        self._sensor_listeners: Dict[Tuple[t.EUI64, int], SensorAttributeListener] = {}
+
+    def attach_loaded_devices(self):
+        """Añade los listeners de atributos a los sensores cargados de la base de datos.
+
+        Su binding y su configuración de reporte ya están guardados en el propio sensor,
+        así que no se envía nada: basta con volver a escuchar sus reportes.
+        """
+        for device in self._app.devices.values():
+            if device.nwk == 0x0000 or not device.is_initialized:
+                continue
+            if not self._router.claim(device.ieee, self._shard):
+                continue
+            for schema in SENSOR_REGISTRY:
+                endpoint = device.endpoints.get(schema.endpoint_id)
+                if endpoint is None or schema.cluster_id not in endpoint.in_clusters:
+                    continue
+                custom_cluster = endpoint.in_clusters[schema.cluster_id]
+                if isinstance(custom_cluster, SENSOR_REGISTRY.clusters[schema.cluster_id]):
+                    self._add_sensor_listener(device, schema, custom_cluster)
+        logging.info(f"[{self._shard}] {len(self._sensor_listeners)} listeners de atributos restaurados de la base de datos.")
+
+    def _add_sensor_listener(self, device: zigpy_dev.Device, schema: SensorSchema, custom_cluster: Cluster) -> bool:
+        """Devuelve True si el cluster aún no tenía listener y se ha añadido."""
+        if (device.ieee, schema.cluster_id) in self._sensor_listeners:
+            return False
+        sensor_listener = SensorAttributeListener(device.ieee, custom_cluster, self._pipeline, self._shard)
+        custom_cluster.add_listener(sensor_listener)
+        self._sensor_listeners[(device.ieee, schema.cluster_id)] = sensor_listener
+        return True
 
     def device_joined(self, device: zigpy_dev.Device):
         logging.info(f"DISPOSITIVO UNIDO (info básica): {device.nwk:#06x} / {device.ieee}")
@@ -104,23 +315,28 @@ class MyEventListener:
         logging.info(f"DISPOSITIVO RAW INICIALIZADO (endpoints leídos): {device.nwk:#06x} / {device.ieee}")
 
     async def configure_device_reporting(self, device: zigpy_dev.Device):
-        if ESP32_H2_ENDPOINT_ID not in device.endpoints:
-            logging.warning(f"Dispositivo {device.ieee} no tiene el endpoint {ESP32_H2_ENDPOINT_ID}")
-            return
-
-        endpoint = device.endpoints[ESP32_H2_ENDPOINT_ID]
-
-        if CUSTOM_CLUSTER_ID not in endpoint.in_clusters:
+        schemas = [
+            schema for schema in SENSOR_REGISTRY
+            if schema.endpoint_id in device.endpoints
+            and schema.cluster_id in device.endpoints[schema.endpoint_id].in_clusters
+        ]
+        if not schemas:
             logging.error(
-                f"Dispositivo {device.ieee} NO TIENE el cluster custom {CUSTOM_CLUSTER_ID:#06x} "
-                f"en el endpoint {ESP32_H2_ENDPOINT_ID} después de la inicialización. "
-                f"Clusters en input: {list(endpoint.in_clusters.keys())}"
+                f"Dispositivo {device.ieee} NO TIENE ninguno de los clusters de sensor del esquema "
+                f"({', '.join(f'{s.cluster_id:#06x}@{s.endpoint_id}' for s in SENSOR_REGISTRY)}) después de la inicialización. "
+                f"Clusters en input: { {ep_id: list(ep.in_clusters.keys()) for ep_id, ep in device.endpoints.items() if ep_id != 0} }"
             )
             return
 
-        custom_cluster = endpoint.in_clusters[CUSTOM_CLUSTER_ID] # Esta es la instancia del cluster en el dispositivo ESP32
-        if not isinstance(custom_cluster, CustomPowerSensorCluster):
-            logging.error(f"Cluster {CUSTOM_CLUSTER_ID:#06x} en {device.ieee} no es del tipo CustomPowerSensorCluster esperado. "
+        for schema in schemas:
+            await self.configure_sensor_cluster(device, schema)
+
+    async def configure_sensor_cluster(self, device: zigpy_dev.Device, schema: SensorSchema):
+        endpoint = device.endpoints[schema.endpoint_id]
+        custom_cluster = endpoint.in_clusters[schema.cluster_id] # Esta es la instancia del cluster en el dispositivo ESP32
+        expected_cluster = SENSOR_REGISTRY.clusters[schema.cluster_id]
+        if not isinstance(custom_cluster, expected_cluster):
+            logging.error(f"Cluster {schema.cluster_id:#06x} en {device.ieee} no es del tipo {expected_cluster.__name__} esperado. "
                           f"Tipo actual: {type(custom_cluster)}. El registro del cluster puede haber fallado o sido sobrescrito.")
             return
 # --- INICIO DEL BLOQUE DE BINDING EXPLÍCITO (OPCIÓN 2.E - ZDO REQUEST - CORREGIDO) ---
@@ -133,7 +349,7 @@ class MyEventListener:
 
                 src_ieee_bind = device.ieee
                 src_ep_bind = endpoint.endpoint_id
-                cluster_id_bind = CUSTOM_CLUSTER_ID
+                cluster_id_bind = schema.cluster_id
 
                 dst_multi_addr = zdo_types.MultiAddress()
                 dst_multi_addr.addrmode = t.AddrMode.IEEE
@@ -170,9 +386,9 @@ class MyEventListener:
 
 
                 if is_success:
-                    logging.info(f"Binding explícito (ZDO Bind_req) para {CUSTOM_CLUSTER_ID:#06x} en {device.ieee} exitoso. Respuesta: {zdo_resp_payload}")
+                    logging.info(f"Binding explícito (ZDO Bind_req) para {schema.cluster_id:#06x} en {device.ieee} exitoso. Respuesta: {zdo_resp_payload}")
                 else:
-                    logging.warning(f"Binding explícito (ZDO Bind_req) para {CUSTOM_CLUSTER_ID:#06x} en {device.ieee} con respuesta: {zdo_resp_payload} (Status interpretado: {status_val})")
+                    logging.warning(f"Binding explícito (ZDO Bind_req) para {schema.cluster_id:#06x} en {device.ieee} con respuesta: {zdo_resp_payload} (Status interpretado: {status_val})")
             else:
                 logging.warning("No se pudo obtener el objeto del dispositivo coordinador para el binding.")
 
@@ -184,24 +400,19 @@ class MyEventListener:
             logging.error(f"Excepción general durante el binding explícito (ZDO Bind_req): {type(e_bind).__name__} - {e_bind}", exc_info=True)
         # --- FIN DEL BLOQUE DE BINDING EXPLÍCITO ---
 
-        attributes_to_configure = {
-            ATTR_ID_CURRENT_SENSOR_1: "Corriente Sensor 1",
-            ATTR_ID_CURRENT_SENSOR_2: "Corriente Sensor 2",
-            ATTR_ID_CURRENT_SENSOR_3: "Corriente Sensor 3",
-        }
-
         logging.info(f"Configurando reporte de atributos para {device.ieee} en cluster {custom_cluster!r}...")
-        for attr_id, attr_name in attributes_to_configure.items():
+        for attr in schema.attributes:
+            attr_id, attr_name = attr.id, attr.channel
             try:
                 if not custom_cluster.find_attribute(attr_id):
-                    logging.error(f"  Atributo {attr_id:#06x} ({attr_name}) NO ENCONTRADO en la definición de CustomPowerSensorCluster.")
+                    logging.error(f"  Atributo {attr_id:#06x} ({attr_name}) NO ENCONTRADO en la definición de {expected_cluster.__name__}.")
                     continue
 
                 response_from_configure = await custom_cluster.configure_reporting(
                     attr_id,
-                    REPORTING_MIN_INTERVAL,
-                    REPORTING_MAX_INTERVAL,
-                    REPORTABLE_CURRENT_CHANGE,
+                    schema.min_interval,
+                    schema.max_interval,
+                    attr.reportable_change,
                 )
 
                 res_payload_args = None
@@ -246,185 +457,132 @@ class MyEventListener:
             except Exception as e:
                 logging.error(f"  Excepción general al configurar reporte para {attr_name} (AttrID: {attr_id:#06x}): {type(e).__name__} - {e}", exc_info=True)
 
-        if device.ieee not in self._sensor_listeners:
-            sensor_listener = SensorAttributeListener(device.ieee, custom_cluster)
-            custom_cluster.add_listener(sensor_listener)
-            self._sensor_listeners[device.ieee] = sensor_listener
-            logging.info(f"Listener de atributos añadido para el cluster custom de {device.ieee}")
+        if self._add_sensor_listener(device, schema, custom_cluster):
+            logging.info(f"Listener de atributos añadido para el cluster {schema.cluster_id:#06x} de {device.ieee}")
 
     def device_initialized(self, device: zigpy_dev.Device):
-        logging.info(f"DISPOSITIVO COMPLETAMENTE INICIALIZADO: {device}")
-        if device.nwk != 0x0000: # No configurar el propio coordinador
-            asyncio.create_task(self.configure_device_reporting(device))
+        logging.info(f"DISPOSITIVO COMPLETAMENTE INICIALIZADO [{self._shard}]: {device}")
+        if device.nwk == 0x0000: # No configurar el propio coordinador
+            return
+        if not self._router.claim(device.ieee, self._shard):
+            logging.warning(f"Dispositivo {device.ieee} ya pertenece a la radio '{self._router.shard_for(device.ieee)}'. "
+                            f"Se ignora en la radio '{self._shard}'.")
+            return
+        asyncio.create_task(self.configure_device_reporting(device))
 
     def device_left(self, device: zigpy_dev.Device):
-        logging.info(f"DISPOSITIVO ABANDONÓ LA RED: {device}")
-        if device.ieee in self._sensor_listeners and ESP32_H2_ENDPOINT_ID in device.endpoints:
-            endpoint = device.endpoints[ESP32_H2_ENDPOINT_ID]
-            if CUSTOM_CLUSTER_ID in endpoint.in_clusters:
-                custom_cluster = endpoint.in_clusters[CUSTOM_CLUSTER_ID]
-                try:
-                    if hasattr(custom_cluster, '_listeners') and \
-                       self._sensor_listeners[device.ieee] in custom_cluster._listeners.values():
-                        custom_cluster.remove_listener(self._sensor_listeners[device.ieee])
-                except Exception as e:
-                    logging.warning(f"Error al remover listener de {custom_cluster}: {e}")
-            del self._sensor_listeners[device.ieee]
-            logging.info(f"Listener de atributos removido para {device.ieee}")
-
-
-    def connection_lost(self, exc: Exception):
-        logging.error(f"CONEXIÓN PERDIDA con el coordinador: {exc}")
-        logging.info("Intentando detener la aplicación debido a la pérdida de conexión...")
-        if not shutdown_event.is_set():
-            shutdown_event.set()
-
-
-async def periodic_permit_join_task(app_controller, shutdown_evt):
-    """Tarea que periódicamente reabre la red para uniones."""
-    logging.info("Iniciando tarea de permiso de unión periódico.")
-    try:
-        while not shutdown_evt.is_set():
+        logging.info(f"DISPOSITIVO ABANDONÓ LA RED [{self._shard}]: {device}")
+        self._router.release(device.ieee, self._shard)
+        for key in [key for key in self._sensor_listeners if key[0] == device.ieee]:
+            sensor_listener = self._sensor_listeners.pop(key)
+            custom_cluster = sensor_listener.owning_cluster
             try:
-                logging.info(f"Abriendo la red para uniones durante {PERMIT_JOIN_DURATION_ON_STARTUP} segundos...")
-                await app_controller.permit(PERMIT_JOIN_DURATION_ON_STARTUP)
-                logging.info(f"La red está abierta. Se reabrirá en {REOPEN_JOIN_INTERVAL_SECONDS}s (aprox).")
+                if hasattr(custom_cluster, '_listeners') and \
+                   sensor_listener in custom_cluster._listeners.values():
+                    custom_cluster.remove_listener(sensor_listener)
             except Exception as e:
-                logging.error(f"Error en la tarea de permiso de unión periódico al llamar a app.permit: {e}")
+                logging.warning(f"Error al remover listener de {custom_cluster}: {e}")
+            logging.info(f"Listener de atributos removido para {device.ieee} (cluster {key[1]:#06x})")
 
-            try:
-                await asyncio.wait_for(shutdown_evt.wait(), timeout=REOPEN_JOIN_INTERVAL_SECONDS)
-            except asyncio.TimeoutError:
-                pass # Esto es esperado, significa que el timeout se alcanzó y debemos reabrir
-            except Exception as e_wait:
-                logging.error(f"Error esperando en la tarea de permiso de unión: {e_wait}")
-                await asyncio.sleep(5) # Pequeña pausa antes de reintentar en caso de error en wait
-
-    except asyncio.CancelledError:
-        logging.info("Tarea de permiso de unión periódico cancelada.")
-    finally:
-        # Intentar cerrar el permiso de unión si la app sigue conectada
-        if app_controller and hasattr(app_controller, 'permit') and \
-           hasattr(app_controller, '_ezsp') and app_controller._ezsp and app_controller._ezsp.is_connected:
-            try:
-                logging.info("Cerrando permiso de unión desde la tarea periódica al finalizar...")
-                await app_controller.permit(0)
-            except Exception as e_close:
-                logging.warning(f"Error al cerrar permiso de unión en la tarea periódica: {e_close}")
-        logging.info("Tarea de permiso de unión periódico finalizada.")
 
-async def main():
+    def connection_lost(self, exc: Exception):
+        logging.error(f"CONEXIÓN PERDIDA con el coordinador [{self._shard}]: {exc}")
+        # La radio se reconecta sola; los dispositivos y los listeners se conservan
+        self.link.connection_lost(exc)
 
-    if BellowsApplication is None:
-        return
-    log_format = "%(asctime)s %(levelname)s [%(name)s]: %(message)s"
-    logging.basicConfig(level=logging.INFO, format=log_format)
-    logging.getLogger("bellows").setLevel(logging.WARNING)
-    logging.getLogger("zigpy").setLevel(logging.WARNING)
 
-    #logging.getLogger("bellows").setLevel(logging.DEBUG)
-    #logging.getLogger("zigpy").setLevel(logging.DEBUG)
+def build_app_config(shard: ShardConfig) -> Dict[str, Any]:
+    """Configuración de zigpy/bellows para la radio `shard`."""
+    bellows_specific_config = {
+        zigpy_config.CONF_DEVICE_PATH: shard.device_path,
+        zigpy_config.CONF_DEVICE_BAUDRATE: shard.baudrate,
+    }
+    if shard.flow_control is not None:
+        bellows_specific_config[zigpy_config.CONF_DEVICE_FLOW_CONTROL] = shard.flow_control
 
-    app = None # app se inicializará dentro del bucle de reintento
-    listener = None # listener también se inicializará con app
-    permit_join_task_handle = None
-    DESIRED_CHANNEL = 15
+    network_config = {
+        zigpy_config.CONF_NWK_CHANNEL: shard.channel,
+        zigpy_config.CONF_NWK_CHANNELS: [shard.channel],
+    }
+    if shard.pan_id is not None:
+        network_config[zigpy_config.CONF_NWK_PAN_ID] = shard.pan_id
+
+    zigpy_general_config = {
+        zigpy_config.CONF_DATABASE: shard.database,
+        zigpy_config.CONF_STATE_SNAPSHOT: STATE_SNAPSHOT_PATH.format(database=shard.database) if STATE_SNAPSHOT_PATH else None,
+        zigpy_config.CONF_STATE_SNAPSHOT_PERIOD: STATE_SNAPSHOT_PERIOD_MINUTES,
+        zigpy_config.CONF_NWK_BACKUP_ENABLED: True,
+        zigpy_config.CONF_ATTRIBUTE_PERSISTENCE: ATTRIBUTE_PERSISTENCE,
+        zigpy_config.CONF_READ_COALESCE_WINDOW: READ_COALESCE_WINDOW_SECONDS,
+        zigpy_config.CONF_NWK: network_config,
+        zigpy_config.CONF_OTA: {
+            zigpy_config.CONF_OTA_ENABLED: False,
+            zigpy_config.CONF_OTA_PROVIDERS: [],
+        }
+    }
+    config_para_schema = {
+        zigpy_config.CONF_DEVICE: bellows_specific_config,
+        CONF_BELLOWS_CONFIG: {
+            CONF_THREAD_LOOP_FACTORY: new_event_loop,
+            CONF_FRAME_TRACE_RECORDS: FRAME_TRACE_RECORDS,
+            CONF_FRAME_TRACE_PATH: FRAME_TRACE_PATH.format(shard=shard.name),
+            CONF_SERIAL_CAPTURE_PATH: SERIAL_CAPTURE_PATH.format(shard=shard.name) if SERIAL_CAPTURE_PATH else None,
+            CONF_ADAPTIVE_CONCURRENCY: ADAPTIVE_CONCURRENCY,
+            CONF_CONCURRENCY_FLOOR: CONCURRENCY_FLOOR,
+            CONF_CONCURRENCY_CEILING: CONCURRENCY_CEILING,
+            CONF_CONCURRENCY_MIN_FREE_BUFFERS: CONCURRENCY_MIN_FREE_BUFFERS,
+        },
+        **zigpy_general_config,
+    }
+    return BellowsApplication.SCHEMA(config_para_schema)
 
-    print(f"Intentando conectar al coordinador en: {DEVICE_PATH} a {BAUDRATE} baudios con control de flujo: {FLOW_CONTROL}.")
 
-    ### INICIO DEL BLOQUE DE REINTENTO DE CONEXIÓN ###
-    MAX_CONNECT_ATTEMPTS = 3
-    RETRY_DELAY_SECONDS = 5
+async def run_shard(shard: ShardConfig, pipeline: ReadingPipeline, router: ShardRouter, metrics: GatewayMetrics,
+                    radios: Optional[Dict[str, "MyEventListener"]] = None):
+    """Arranca y mantiene una radio (ControllerApplication) hasta el cierre.
 
-    for attempt in range(MAX_CONNECT_ATTEMPTS):
-        try:
-            bellows_specific_config = {
-                zigpy_config.CONF_DEVICE_PATH: DEVICE_PATH,
-                zigpy_config.CONF_DEVICE_BAUDRATE: BAUDRATE,
-            }
-            if FLOW_CONTROL is not None:
-                bellows_specific_config[zigpy_config.CONF_DEVICE_FLOW_CONTROL] = FLOW_CONTROL
-
-            network_config = {
-                zigpy_config.CONF_NWK_CHANNEL: DESIRED_CHANNEL,
-                zigpy_config.CONF_NWK_CHANNELS: [DESIRED_CHANNEL],
-            }
-
-            zigpy_general_config = {
-                zigpy_config.CONF_DATABASE: "zigbee.db",
-                zigpy_config.CONF_NWK_BACKUP_ENABLED: True,
-                zigpy_config.CONF_NWK: network_config,
-                zigpy_config.CONF_OTA: {
-                    zigpy_config.CONF_OTA_ENABLED: False,
-                    zigpy_config.CONF_OTA_PROVIDERS: [],
-                }
-            }
-            config_para_schema = { zigpy_config.CONF_DEVICE: bellows_specific_config, **zigpy_general_config }
-            final_app_config = BellowsApplication.SCHEMA(config_para_schema)
-
-            # Recrear la instancia de la app y el listener si es necesario
-            #print antes de crear la app
-            print(f"Creando instancia de la aplicación del controlador Zigbee...")
-            app = BellowsApplication(config=final_app_config)
-            #print después de crear la app
-            print(f"Instancia de la aplicación creada correctamente.")
-            # Listener se crea aquí para asegurarse de que está vinculado a la nueva instancia de app
-            if listener is None:
-                listener = MyEventListener(app_controller=app)
-            else:
-                # Si el listener ya existe, solo actualizamos su referencia a la nueva instancia de app
-                listener._app = app # Asumiendo que listener tiene un atributo _app
-            app.add_listener(listener)
-
-            print(f"Iniciando aplicación del controlador Zigbee (Intento {attempt + 1}/{MAX_CONNECT_ATTEMPTS})...")
-            await app.startup(auto_form=False)
-            print("Aplicación iniciada correctamente.")
-            break # Si tiene éxito, sal del bucle
-        except TimeoutError as e_timeout:
-            logging.error(f"TimeoutError en el intento {attempt + 1} de conexión: {e_timeout}")
-            if app and hasattr(app, 'shutdown'):
-                try:
-                    logging.info("Intentando cerrar la aplicación después del TimeoutError...")
-                    await app.shutdown()
-                except Exception as e_shutdown_fail:
-                    logging.warning(f"Error al cerrar la app después del TimeoutError: {e_shutdown_fail}")
-            app = None # Asegurar que se recree
-            if attempt < MAX_CONNECT_ATTEMPTS - 1:
-                logging.info(f"Reintentando en {RETRY_DELAY_SECONDS} segundos...")
-                await asyncio.sleep(RETRY_DELAY_SECONDS)
-            else:
-                logging.error("Máximo número de intentos de conexión (TimeoutError) alcanzado.")
-        except Exception as e_connect: # Captura otras excepciones durante la conexión/startup
-            logging.error(f"Error inesperado en el intento {attempt + 1} de conexión/startup: {type(e_connect).__name__} - {e_connect}", exc_info=True)
-            if app and hasattr(app, 'shutdown'):
-                try:
-                    logging.info("Intentando cerrar la aplicación después de un error inesperado...")
-                    await app.shutdown()
-                except Exception as e_shutdown_fail:
-                    logging.warning(f"Error al cerrar la app después de un error inesperado: {e_shutdown_fail}")
-            app = None
-            if attempt < MAX_CONNECT_ATTEMPTS - 1:
-                logging.info(f"Reintentando en {RETRY_DELAY_SECONDS} segundos...")
-                await asyncio.sleep(RETRY_DELAY_SECONDS)
-            else:
-                logging.error("Máximo número de intentos de conexión (Error inesperado) alcanzado.")
+    La app se crea y zigbee.db se carga una sola vez. Si se pierde la conexión con el
+    dongle, `RadioLink` reabre solo el puerto serie y la sesión EZSP, con reintentos
+    indefinidos, conservando los dispositivos, los listeners y las colas (ver sensor_link.py).
+
+    `pipeline` puede ser un ReadingPipeline o un RingWriter (modo RADIO_PROCESS). Si se
+    pasa `radios`, el listener de la radio queda registrado en él hasta el cierre; las
+    órdenes que lleguen durante un corte esperan a la reconexión.
+    """
+    join_task_handle = None
+    DESIRED_CHANNEL = shard.channel
 
-    # Verificar si la aplicación se inició correctamente después de los intentos
-    if not (app and hasattr(app, 'state') and app.state and hasattr(app.state, 'node_info') and app.state.node_info):
-        logging.critical("La aplicación Zigbee no pudo iniciarse después de varios intentos. Saliendo.")
-        # Asegurarse de que si app existe pero está mal, se intente un shutdown final
-        if app and hasattr(app, 'shutdown'):
-            try: await app.shutdown()
-            except: pass
-        return # Salir de main si la conexión falló persistentemente
-    ### FIN DEL BLOQUE DE REINTENTO DE CONEXIÓN ###
+    print(f"[{shard.name}] Intentando conectar al coordinador en: {shard.device_path} a {shard.baudrate} baudios con control de flujo: {shard.flow_control}.")
 
-    # A partir de aquí, 'app' DEBERÍA estar inicializada y conectada si el bucle tuvo éxito.
-    # NO volvemos a llamar a app.startup() ni a crear la instancia de app.
+    try:
+        # Solo crea la app y carga zigbee.db: la radio la arranca RadioLink.connect()
+        app = await BellowsApplication.new(build_app_config(shard), auto_form=False, start_radio=False)
+    except Exception as e_db:
+        logging.critical(f"[{shard.name}] No se pudo cargar la base de datos {shard.database}: {type(e_db).__name__} - {e_db}", exc_info=True)
+        return
+    link = RadioLink(app, shard.name, metrics, shutdown_event)
+    join = JoinScheduler(link, metrics, shutdown_event,
+                         expected=parse_expected(JOIN_EXPECTED_DEVICES, shard.name),
+                         expected_timeout=JOIN_EXPECTED_TIMEOUT_MINUTES * 60,
+                         periods=parse_periods(JOIN_COMMISSIONING_PERIODS, shard.name))
+    listener = MyEventListener(app_controller=app, shard=shard.name, pipeline=pipeline, router=router, link=link, join=join)
+    app.add_listener(listener)
+    app.add_listener(join)
+    listener.attach_loaded_devices()
+    metrics.add_source(shard.name, lambda: zigpy_counters(app))
+    if radios is not None:
+        radios[shard.name] = listener
 
     try:
-        # Esta sección ahora asume que 'app' está lista y conectada desde el bucle anterior.
-        print("¡Controlador Zigbee listo y operando!")
+        # Primera conexión: mismos reintentos indefinidos que tras un corte
+        print(f"[{shard.name}] Iniciando aplicación del controlador Zigbee...")
+        try:
+            if not await link.connect():
+                return
+        except FATAL_ERRORS as e_fatal:
+            logging.critical(f"[{shard.name}] La aplicación Zigbee no puede iniciarse: {type(e_fatal).__name__} - {e_fatal}")
+            return
+        print(f"[{shard.name}] ¡Controlador Zigbee listo y operando!")
         node_info = app.state.node_info
         network_info = app.state.network_info
         if node_info: print(f"  Coordinador IEEE: {node_info.ieee}, NWK: 0x{node_info.nwk:04x}")
@@ -449,7 +607,6 @@ async def main():
              except Exception as e_form:
                  logging.error(f"Error al intentar formar la red: {e_form}", exc_info=True)
                  # Podrías querer salir aquí si la formación de red es crítica y falla
-                 if app and hasattr(app, 'shutdown'): await app.shutdown()
                  return
 
 
@@ -465,10 +622,13 @@ async def main():
                 print(f"Error durante el intento de cambio de canal: {e_chn_chg}")
 
 
-        permit_join_task_handle = asyncio.create_task(periodic_permit_join_task(app, shutdown_event))
+        join.start()
+        if PERMIT_JOIN_DURATION_ON_STARTUP > 0:
+            join.open(PERMIT_JOIN_DURATION_ON_STARTUP)
+        join_task_handle = asyncio.create_task(join.run())
 
         print("\nLa aplicación Zigbee está en funcionamiento. Presiona Ctrl+C para detener.")
-        await shutdown_event.wait()
+        await link.run() # Reconecta tras cada corte hasta que se activa shutdown_event
 
     except KeyboardInterrupt:
         logging.info("\nInterrupción por teclado detectada. Iniciando cierre...")
@@ -477,57 +637,279 @@ async def main():
         logging.error(f"Error general en la aplicación (fuera del bucle de conexión): {type(e).__name__}: {e}", exc_info=True)
         if not shutdown_event.is_set(): shutdown_event.set()
     finally:
-        if permit_join_task_handle and not permit_join_task_handle.done():
-            logging.info("Cancelando la tarea de permiso de unión periódico...")
-            permit_join_task_handle.cancel()
+        if join_task_handle and not join_task_handle.done():
+            logging.info("Cancelando el planificador de uniones...")
+            join_task_handle.cancel()
             try:
-                await permit_join_task_handle
+                await join_task_handle
             except asyncio.CancelledError:
-                logging.info("La tarea de permiso de unión fue cancelada como se esperaba.")
+                logging.info("El planificador de uniones fue cancelado como se esperaba.")
             except Exception as e_task_cancel:
-                logging.error(f"Error esperando la cancelación de la tarea de permiso: {e_task_cancel}")
+                logging.error(f"Error esperando la cancelación del planificador de uniones: {e_task_cancel}")
+
+        metrics.remove_source(shard.name)
+        if radios is not None:
+            radios.pop(shard.name, None)
+        link.close()
+        logging.info("\nIniciando proceso de cierre de la aplicación Zigbee...")
+        connection_ezsp_active = False
+        if hasattr(app, '_ezsp') and app._ezsp is not None:
+            try:
+                if app._ezsp.is_connected: connection_ezsp_active = True
+            except AttributeError: logging.warning("app._ezsp.is_connected no encontrado.")
+            except Exception as e_check_conn: logging.warning(f"Error al verificar app._ezsp.is_connected: {e_check_conn}")
 
-        pending_tasks_in_finally = []
-        if app is not None:
-            logging.info("\nIniciando proceso de cierre de la aplicación Zigbee...")
-            connection_ezsp_active = False
-            if hasattr(app, '_ezsp') and app._ezsp is not None:
-                try:
-                    if app._ezsp.is_connected: connection_ezsp_active = True
-                except AttributeError: logging.warning("app._ezsp.is_connected no encontrado.")
-                except Exception as e_check_conn: logging.warning(f"Error al verificar app._ezsp.is_connected: {e_check_conn}")
-
-            if connection_ezsp_active and hasattr(app, 'permit'):
-                try:
-                    logging.info("Cerrando permiso de unión explícitamente en finally (app.permit(0))...")
-                    await app.permit(0)
-                except Exception as e_permit_final:
-                    logging.warning(f"No se pudo cerrar el permiso de unión en el bloque finally principal: {e_permit_final}")
+        if connection_ezsp_active and join.is_open(): # Con la red ya cerrada no hace falta otro broadcast
+            try:
+                logging.info("Cerrando permiso de unión explícitamente en finally (app.permit(0))...")
+                await app.permit(0)
+            except Exception as e_permit_final:
+                logging.warning(f"No se pudo cerrar el permiso de unión en el bloque finally principal: {e_permit_final}")
+
+        logging.info("Llamando a app.shutdown()...")
+        try:
+            await app.shutdown()
+            logging.info("Proceso de cierre del controlador completado.")
+        except Exception as e_shutdown:
+            logging.error(f"Error durante app.shutdown(): {type(e_shutdown).__name__}: {e_shutdown}", exc_info=True)
+
+
+async def log_metrics_task(metrics: GatewayMetrics, pipeline: ReadingPipeline, detector: AnomalyDetector):
+    """Vuelca periódicamente las métricas comunes de todas las radios al log."""
+    while True:
+        await asyncio.sleep(METRICS_LOG_INTERVAL_SECONDS)
+        pipeline.update_metrics()
+        detector.update_metrics()
+        snapshot = metrics.snapshot()
+        logging.info("MÉTRICAS: " + ", ".join(f"{name}={value}" for name, value in sorted(snapshot.items())))
+
+
+def configure_logging() -> None:
+    log_format = "%(asctime)s %(levelname)s [%(name)s]: %(message)s"
+    logging.basicConfig(level=logging.INFO, format=log_format)
+    logging.getLogger("bellows").setLevel(logging.WARNING)
+    logging.getLogger("zigpy").setLevel(logging.WARNING)
+
+    #logging.getLogger("bellows").setLevel(logging.DEBUG)
+    #logging.getLogger("zigpy").setLevel(logging.DEBUG)
+
+
+# --- Modo RADIO_PROCESS: lado del proceso de radio ---
+
+async def permit_command(radios: Dict[str, MyEventListener], duration: int,
+                         shard: Optional[str] = None, node: Optional[str] = None) -> List[str]:
+    """Orden de control: pide la red (o solo el router `node`) abierta `duration` segundos; 0 la cierra.
+
+    La ventana la abre el planificador de uniones de cada radio (ver sensor_join.py), que
+    aprovecha las que ya estén abiertas y espera a la reconexión si la radio se ha caído.
+    """
+    targets = [shard] if shard is not None else list(radios)
+    for name in targets:
+        if name not in radios:
+            raise ValueError(f"La radio '{name}' no está operativa")
+    node_ieee = t.EUI64.convert(node) if node else None
+    if node_ieee is not None:
+        targets = [name for name in targets if node_ieee in radios[name]._app.devices]
+        if not targets:
+            raise ValueError(f"Dispositivo {node} desconocido")
+    for name in targets:
+        radios[name].join.open(duration, node_ieee)
+    return targets
+
+
+async def configure_reporting_command(radios: Dict[str, MyEventListener], ieee: str) -> str:
+    """Orden de control: repite el binding y la configuración de reporte de un dispositivo."""
+    device_ieee = t.EUI64.convert(ieee)
+    for name, listener in radios.items():
+        device = listener._app.devices.get(device_ieee)
+        if device is not None:
+            await listener.link.call(f"configure_reporting {ieee}", lambda: listener.configure_device_reporting(device))
+            return name
+    raise ValueError(f"Dispositivo {ieee} desconocido")
+
+
+async def send_radio_metrics_task(control: ControlChannel, metrics: GatewayMetrics):
+    while True:
+        await asyncio.sleep(RADIO_METRICS_INTERVAL_SECONDS)
+        control.send("metrics", metrics.snapshot())
+
+
+async def run_radio(ring_name: str, conn):
+    """Ejecuta solo las radios, publicando las lecturas en el anillo `ring_name`."""
+    metrics = GatewayMetrics()
+    ring = ReadingRing.attach(ring_name)
+    writer = RingWriter(ring, metrics)
+    radios: Dict[str, MyEventListener] = {}
+    control = ControlChannel(conn, on_closed=shutdown_event.set)
+    control.on("shutdown", shutdown_event.set)
+    control.on("permit", lambda *args: permit_command(radios, *args))
+    control.on("configure_reporting", lambda ieee: configure_reporting_command(radios, ieee))
+    control.start()
+    metrics_task = asyncio.create_task(send_radio_metrics_task(control, metrics))
+
+    try:
+        router = ShardRouter()
+        await asyncio.gather(*(run_shard(shard, writer, router, metrics, radios) for shard in load_shard_configs()))
+    finally:
+        metrics_task.cancel()
+        control.send("metrics", metrics.snapshot())
+        control.close()
+        ring.close()
 
+
+def radio_process_main(ring_name: str, conn):
+    """Punto de entrada del proceso de radio."""
+    configure_logging()
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    run_with_event_loop(run_radio(ring_name, conn))
+
+
+# --- Modo RADIO_PROCESS: lado del proceso principal ---
+
+class RadioProcess:
+    """Proceso hijo con las radios; sus lecturas llegan al pipeline a través del anillo."""
+
+    def __init__(self, pipeline: ReadingPipeline, metrics: GatewayMetrics):
+        # Los nombres van en campos de tamaño fijo del anillo: si no caben, se falla al arrancar
+        check_record_fields(
+            [shard.name for shard in load_shard_configs()],
+            [channel.name for channels in SENSOR_REGISTRY.channels.values() for channel in channels.values()],
+        )
+        self._pipeline = pipeline
+        self._metrics = metrics
+        self._radio_metrics: Dict[str, float] = {}
+        self._ring = ReadingRing.create(RING_SLOTS)
+        self._reader = RingReader(self._ring, metrics)
+        parent_conn, self._child_conn = multiprocessing.Pipe()
+        self._control = ControlChannel(parent_conn, on_closed=shutdown_event.set)
+        self._control.on("metrics", self._update_radio_metrics)
+        # "spawn": el hijo no hereda el bucle de eventos ni los hilos de este proceso
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=radio_process_main, args=(self._ring.name, self._child_conn), name="radio")
+        self._reader_task = None
+
+    def _update_radio_metrics(self, snapshot: Dict[str, float]) -> None:
+        self._radio_metrics = snapshot
+
+    def start(self) -> None:
+        self._process.start()
+        self._child_conn.close()
+        self._control.start()
+        self._metrics.add_source("radio", lambda: self._radio_metrics)
+        self._reader_task = asyncio.create_task(self._reader.run(self._pipeline.submit))
+        logging.info(f"Proceso de radio iniciado (PID {self._process.pid}), anillo '{self._ring.name}' de {RING_SLOTS} lecturas.")
+
+    async def permit(self, duration: int, shard: Optional[str] = None, node: Optional[str] = None) -> List[str]:
+        """Abre la red en el proceso de radio; devuelve las radios afectadas."""
+        return await self._control.request("permit", duration, shard, node)
+
+    async def configure_reporting(self, ieee: str) -> str:
+        """Reconfigura el reporte de un dispositivo; devuelve la radio a la que pertenece."""
+        return await self._control.request("configure_reporting", ieee)
+
+    async def stop(self) -> None:
+        """Pide el cierre ordenado de las radios y entrega al pipeline lo que quede en el anillo."""
+        self._control.send("shutdown")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._process.join, RADIO_STOP_TIMEOUT_SECONDS)
+        if self._process.is_alive():
+            logging.warning("El proceso de radio no terminó a tiempo, se fuerza su cierre.")
+            self._process.terminate()
+            await loop.run_in_executor(None, self._process.join)
+
+        if self._reader_task is not None:
+            self._reader_task.cancel()
             try:
-                loop = asyncio.get_running_loop()
-                if loop.is_running():
-                    current_main_task = asyncio.current_task(loop=loop)
-                    for task in asyncio.all_tasks(loop=loop):
-                        if task is not current_main_task and task is not permit_join_task_handle and not task.done():
-                            pending_tasks_in_finally.append(task)
-            except RuntimeError: logging.warning("No se pudo obtener el bucle de eventos en finally.")
-
-            if pending_tasks_in_finally:
-                logging.info(f"Cancelando {len(pending_tasks_in_finally)} tareas pendientes adicionales...")
-                for task in pending_tasks_in_finally: task.cancel()
-                try:
-                    await asyncio.gather(*pending_tasks_in_finally, return_exceptions=True)
-                except Exception as e_gather: logging.warning(f"Error durante gather de tareas canceladas adicionales: {e_gather}")
-
-            logging.info("Llamando a app.shutdown()...")
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+        while readings := self._reader.read():
+            for reading in readings:
+                self._pipeline.submit(reading)
+
+        self._control.close()
+        self._metrics.remove_source("radio")
+        self._ring.close()
+
+
+async def main():
+
+    if BellowsApplication is None:
+        return
+    configure_logging()
+
+    shards = load_shard_configs()
+    metrics = GatewayMetrics()
+    pipeline = ReadingPipeline(metrics, wal=WriteAheadQueue(WAL_DIRECTORY, metrics))
+    detector = AnomalyDetector(metrics)
+    detector.add_alert_handler(log_alert)
+    pipeline.add_sink("anomalias", detector.process)
+    pipeline.add_sink("consola", print_reading)
+    latest_values = LatestValues()
+    pipeline.add_sink("ultimos", latest_values)
+    store = None
+    if READINGS_DB_PATH:
+        store = ReadingsStore(READINGS_DB_PATH, metrics, retention_days=READINGS_RETENTION_DAYS)
+        await store.open()
+        pipeline.add_durable_sink("historico", store)
+    uploader = None
+    if UPLOAD_URL:
+        uploader = HttpUploader(UPLOAD_URL, metrics, headers=UPLOAD_HEADERS)
+        pipeline.add_durable_sink("http", uploader, batch_size=UPLOAD_BATCH_SIZE, linger=UPLOAD_LINGER_SECONDS)
+    router = ShardRouter()
+    radios: Dict[str, MyEventListener] = {}
+    radio_process: Optional[RadioProcess] = None
+
+    async def permit(duration: int, shard: Optional[str] = None, node: Optional[str] = None) -> List[str]:
+        if radio_process is not None:
+            return await radio_process.permit(duration, shard, node)
+        return await permit_command(radios, duration, shard, node)
+
+    query_service = None
+    if API_PORT:
+        query_service = QueryService(latest_values, READINGS_DB_PATH, metrics, host=API_HOST, port=API_PORT,
+                                     permit=permit, permit_token=API_PERMIT_TOKEN)
+        await query_service.start()
+
+    background_tasks = [asyncio.create_task(pipeline.run())]
+    if METRICS_LOG_INTERVAL_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(log_metrics_task(metrics, pipeline, detector)))
+
+    try:
+        if RADIO_PROCESS:
+            radio_process = RadioProcess(pipeline, metrics)
+            radio_process.start()
             try:
-                await app.shutdown()
-                logging.info("Proceso de cierre del controlador completado.")
-            except Exception as e_shutdown:
-                logging.error(f"Error durante app.shutdown(): {type(e_shutdown).__name__}: {e_shutdown}", exc_info=True)
+                await shutdown_event.wait()
+            finally:
+                await radio_process.stop()
         else:
-            logging.info("\nLa instancia de la aplicación no fue creada o la conexión inicial falló persistentemente.")
+            await asyncio.gather(*(run_shard(shard, pipeline, router, metrics, radios) for shard in shards))
+    finally:
+        await pipeline.drain()
+
+        pending_tasks_in_finally = []
+        try:
+            current_main_task = asyncio.current_task()
+            for task in asyncio.all_tasks():
+                if task is not current_main_task and not task.done():
+                    pending_tasks_in_finally.append(task)
+        except RuntimeError: logging.warning("No se pudo obtener el bucle de eventos en finally.")
+
+        if pending_tasks_in_finally:
+            logging.info(f"Cancelando {len(pending_tasks_in_finally)} tareas pendientes adicionales...")
+            for task in pending_tasks_in_finally: task.cancel()
+            try:
+                await asyncio.gather(*pending_tasks_in_finally, return_exceptions=True)
+            except Exception as e_gather: logging.warning(f"Error durante gather de tareas canceladas adicionales: {e_gather}")
+        if query_service is not None:
+            await query_service.stop()
+        pipeline.close()
+        if uploader is not None:
+            await uploader.close()
+        if store is not None:
+            await store.close()
         logging.info("Fin del script.")
 
 
@@ -542,4 +924,4 @@ def signal_handler(sig, frame):
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    asyncio.run(main())
\ No newline at end of file
+    run_with_event_loop(main())
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""Permiso de unión a la red bajo demanda.
+
+Antes el gateway reabría toda la red cada 150 s para siempre: cada `app.permit(180)` es un
+Mgmt_Permit_Joining_req a todos los routers, que cada router retransmite y guarda en su
+tabla de broadcasts. Con cientos de routers eso es tiempo de aire y entradas de tabla
+gastados sin que nadie se esté uniendo.
+
+`JoinScheduler` solo abre la red (de una radio) cuando algo lo pide:
+
+* una orden (API `POST /permit`, canal de control del proceso de radio), de toda la red o
+  de un solo router (`permit(node=...)`, un unicast que no se retransmite);
+* la lista de dispositivos esperados: mientras falte alguno por unirse, hasta un plazo;
+* los periodos de puesta en marcha configurados (p. ej. de 08:00 a 09:00 cada día).
+
+Cada destino (toda la red o un router) se abre una sola vez para todo lo que lo pida a la
+vez y se renueva solo cuando está a punto de cerrarse. Los broadcasts están limitados a
+uno cada JOIN_BROADCAST_MIN_INTERVAL. Cuando ya nada lo pide, una ventana aún abierta se
+cierra en lugar de dejarla caducar. Todo pasa por `RadioLink.call`.
+
+Las métricas `join.broadcasts_avoided` y `join.airtime_saved_est_ms` comparan con la tarea
+periódica anterior durante el mismo tiempo. La segunda es una estimación, no una medida:
+broadcasts evitados × (routers conocidos + 1) × JOIN_BROADCAST_AIRTIME_MS, suponiendo que
+cada router retransmite cada broadcast una vez y que todas las tramas tardan lo mismo.
+"""
+import asyncio
+import dataclasses
+import datetime
+import logging
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import zigpy.types as t
+
+from sensor_link import RadioLink
+from sensor_pipeline import GatewayMetrics
+
+JOIN_MAX_WINDOW = 254  # Máximo de Mgmt_Permit_Joining_req; las ventanas más largas se renuevan
+JOIN_RENEW_MARGIN = 20.0  # Segundos antes del cierre en los que se renueva una ventana aún necesaria
+JOIN_BROADCAST_MIN_INTERVAL = 60.0  # Separación mínima entre broadcasts de permiso de unión
+JOIN_CHECK_INTERVAL = 5.0  # Cada cuánto se revisa la demanda si nada despierta antes al planificador
+LEGACY_REOPEN_INTERVAL = 150.0  # Periodo de la antigua tarea periódica (referencia de las métricas)
+JOIN_BROADCAST_AIRTIME_MS = 1.5  # Aire por retransmisión de un broadcast (~40 bytes a 250 kbit/s + CSMA)
+
+
+@dataclasses.dataclass(frozen=True)
+class JoinPeriod:
+    """Franja diaria (hora local) en la que la red, o un router, queda abierta."""
+    start: datetime.time
+    end: datetime.time
+    router: Optional[t.EUI64] = None
+
+    def remaining(self, now: datetime.datetime) -> float:
+        """Segundos que quedan de la franja, o 0 si `now` está fuera de ella."""
+        start = now.replace(hour=self.start.hour, minute=self.start.minute, second=0, microsecond=0)
+        end = now.replace(hour=self.end.hour, minute=self.end.minute, second=0, microsecond=0)
+        if end <= start:  # Cruza la medianoche
+            if now >= start:
+                end += datetime.timedelta(days=1)
+            else:
+                start -= datetime.timedelta(days=1)
+        if start <= now < end:
+            return (end - now).total_seconds()
+        return 0.0
+
+
+def parse_periods(entries: Iterable[Dict[str, Any]], shard: str) -> List[JoinPeriod]:
+    """Franjas de la configuración que se aplican a la radio `shard`."""
+    return [
+        JoinPeriod(
+            start=datetime.time.fromisoformat(entry["start"]),
+            end=datetime.time.fromisoformat(entry["end"]),
+            router=t.EUI64.convert(entry["router"]) if entry.get("router") else None,
+        )
+        for entry in entries
+        if entry.get("radio", shard) == shard
+    ]
+
+
+def parse_expected(entries: Iterable[Dict[str, Any]], shard: str) -> List[Tuple[t.EUI64, Optional[t.EUI64]]]:
+    """Dispositivos esperados (IEEE, router por el que entrarán) para la radio `shard`."""
+    return [
+        (t.EUI64.convert(entry["ieee"]), t.EUI64.convert(entry["router"]) if entry.get("router") else None)
+        for entry in entries
+        if entry.get("radio", shard) == shard
+    ]
+
+
+class JoinScheduler:
+    """Abre y cierra el permiso de unión de una radio según la demanda.
+
+    Se registra como listener de la app para enterarse de las uniones (`device_joined`).
+    Los destinos son `None` (toda la red) o el IEEE de un router o del coordinador.
+    """
+
+    def __init__(self, link: RadioLink, metrics: GatewayMetrics, stopping: asyncio.Event,
+                 expected: Iterable[Tuple[t.EUI64, Optional[t.EUI64]]] = (),
+                 expected_timeout: float = 3600.0, periods: Iterable[JoinPeriod] = ()):
+        self.link = link
+        self.name = link.name
+        self.metrics = metrics
+        self._stopping = stopping
+        self._expected_config = list(expected)
+        self._expected_timeout = expected_timeout
+        self._periods = list(periods)
+        self._manual: Dict[Optional[t.EUI64], float] = {}
+        self._expected: Dict[t.EUI64, Tuple[Optional[t.EUI64], float]] = {}
+        self._open_until: Dict[Optional[t.EUI64], float] = {}
+        self._last_broadcast = -math.inf
+        self._rate_limited = False
+        self._broadcasts = 0
+        self._started = time.monotonic()
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        """Empieza a contar el plazo de los dispositivos esperados que aún no están en la red."""
+        self._started = time.monotonic()
+        devices = self.link.app.devices
+        for ieee, router in self._expected_config:
+            if ieee not in devices:
+                self._expected[ieee] = (router, self._started + self._expected_timeout)
+        if self._expected:
+            logging.info(f"[{self.name}] Esperando la unión de {len(self._expected)} dispositivos "
+                         f"durante {self._expected_timeout / 60:.0f} min.")
+
+    def is_open(self) -> bool:
+        """Si alguna ventana que abrió este planificador sigue abierta."""
+        now = time.monotonic()
+        return any(until > now for until in self._open_until.values())
+
+    def open(self, duration: float, node: Optional[t.EUI64] = None) -> None:
+        """Pide la red (o el router `node`) abierta durante `duration` segundos; 0 la cierra."""
+        if duration <= 0:
+            self.close(node)
+            return
+        now = time.monotonic()
+        until = now + duration
+        if max(self._open_until.get(node, 0.0), self._open_until.get(None, 0.0)) >= until:
+            self.metrics.increment(f"join.coalesced.{self.name}")
+        self._manual[node] = max(self._manual.get(node, 0.0), until)
+        self._wakeup.set()
+
+    def close(self, node: Optional[t.EUI64] = None) -> None:
+        """Retira las peticiones de `node`; sin `node`, las manuales y las de los dispositivos esperados.
+
+        Los periodos de puesta en marcha configurados siguen aplicándose.
+        """
+        if node is None:
+            self._manual.clear()
+            self._expected.clear()
+        else:
+            self._manual.pop(node, None)
+        self._wakeup.set()
+
+    def device_joined(self, device) -> None:
+        if self._expected.pop(device.ieee, None) is not None:
+            logging.info(f"[{self.name}] Se ha unido el dispositivo esperado {device.ieee}; "
+                         f"quedan {len(self._expected)}.")
+            self.metrics.increment(f"join.expected_joined.{self.name}")
+            self._wakeup.set()
+
+    def _demand(self, now: float) -> Dict[Optional[t.EUI64], float]:
+        """Hasta cuándo debe estar abierto cada destino, según todo lo que lo pide ahora."""
+        for node in [node for node, until in self._manual.items() if until <= now]:
+            del self._manual[node]
+        for ieee in [ieee for ieee, (_, until) in self._expected.items() if until <= now]:
+            del self._expected[ieee]
+            logging.warning(f"[{self.name}] El dispositivo esperado {ieee} no se ha unido en el plazo.")
+            self.metrics.increment(f"join.expected_missed.{self.name}")
+
+        demand: Dict[Optional[t.EUI64], float] = dict(self._manual)
+        for router, until in self._expected.values():
+            demand[router] = max(demand.get(router, 0.0), until)
+        if self._periods:
+            wall = datetime.datetime.now()
+            for period in self._periods:
+                remaining = period.remaining(wall)
+                if remaining > 0:
+                    demand[period.router] = max(demand.get(period.router, 0.0), now + remaining)
+
+        devices = self.link.app.devices
+        return {node: until for node, until in demand.items() if node is None or node in devices}
+
+    async def _send(self, node: Optional[t.EUI64], duration: int) -> None:
+        app = self.link.app
+        target = "toda la red" if node is None else str(node)
+        now = time.monotonic()
+        if node is None:
+            self._last_broadcast = now
+            self._broadcasts += 1
+            self.metrics.increment(f"join.broadcasts.{self.name}")
+        else:
+            self.metrics.increment(f"join.targeted.{self.name}")
+        try:
+            await self.link.call(f"permit {duration}s {target}", lambda: app.permit(duration, node=node))
+        except Exception as e:
+            logging.warning(f"[{self.name}] No se pudo cambiar el permiso de unión de {target}: {type(e).__name__} - {e}")
+            self.metrics.increment(f"join.errors.{self.name}")
+            return
+
+        if duration == 0:
+            if node is None:  # El broadcast cierra también los routers abiertos uno a uno
+                self._open_until.clear()
+            else:
+                self._open_until.pop(node, None)
+            logging.info(f"[{self.name}] Permiso de unión cerrado en {target}.")
+        else:
+            self._open_until[node] = now + duration
+            logging.info(f"[{self.name}] Permiso de unión abierto en {target} durante {duration} s.")
+
+    async def _step(self) -> None:
+        now = time.monotonic()
+        if not self.link.connected:
+            # Tras reconectar el NCP ha olvidado las ventanas: se vuelven a abrir si hacen falta
+            self._open_until.clear()
+            return
+
+        demand = self._demand(now)
+        for node in [node for node, until in self._open_until.items() if node not in demand and until - now > 1.0]:
+            if node in self._open_until:  # Puede haberla cerrado ya el broadcast de cierre
+                self.metrics.increment(f"join.closed_early.{self.name}")
+                await self._send(node, 0)
+
+        # Primero toda la red: si se abre, cubre también a los routers pedidos uno a uno
+        for node in sorted(demand, key=lambda node: node is not None):
+            until = demand[node]
+            now = time.monotonic()
+            open_until = self._open_until.get(node, 0.0)
+            if node is not None:
+                open_until = max(open_until, self._open_until.get(None, 0.0))
+            if open_until >= until or open_until - now > JOIN_RENEW_MARGIN:
+                continue
+            if node is None and now < self._last_broadcast + JOIN_BROADCAST_MIN_INTERVAL:
+                if not self._rate_limited:
+                    self._rate_limited = True
+                    self.metrics.increment(f"join.rate_limited.{self.name}")
+                continue
+            if node is None:  # Un permiso a un router no termina la racha de broadcasts limitados
+                self._rate_limited = False
+            await self._send(node, min(math.ceil(until - now), JOIN_MAX_WINDOW))
+
+    def update_metrics(self) -> None:
+        now = time.monotonic()
+        self.metrics.set(f"join.open.{self.name}", int(self._open_until.get(None, 0.0) > now))
+        # La tarea anterior abría la red al arrancar y después cada LEGACY_REOPEN_INTERVAL
+        avoided = max(0, int((now - self._started) // LEGACY_REOPEN_INTERVAL) + 1 - self._broadcasts)
+        routers = sum(1 for device in self.link.app.devices.values()
+                      if device.node_desc is not None and device.node_desc.is_router)
+        self.metrics.set(f"join.broadcasts_avoided.{self.name}", avoided)
+        # Estimación (ver el docstring del módulo): el aire no se mide
+        self.metrics.set(f"join.airtime_saved_est_ms.{self.name}", round(avoided * (routers + 1) * JOIN_BROADCAST_AIRTIME_MS, 1))
+
+    async def run(self) -> None:
+        """Aplica la demanda hasta el cierre del gateway."""
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                await self._step()
+            except Exception as e:
+                logging.error(f"[{self.name}] Error en el planificador de uniones: {type(e).__name__} - {e}", exc_info=True)
+            self.update_metrics()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOIN_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,188 @@
+"""Supervisión de la conexión con cada dongle y reconexión en caliente.
+
+Cuando se pierde el puerto serie (un fallo del USB, un reinicio del NCP, un fallo del
+watchdog de zigpy...), `RadioLink` no cierra el gateway ni vuelve a crear la
+ControllerApplication: cierra solo el transporte y la sesión EZSP
+(`app.shutdown(db=False)`) y vuelve a llamar a `app.startup()`, que reabre el puerto,
+rearranca la red y reanuda las tareas periódicas de zigpy. Los dispositivos cargados de
+zigbee.db, los listeners, el pipeline, el anillo y las colas en disco siguen vivos en
+memoria durante todo el corte.
+
+Los reintentos no acaban nunca (hasta el cierre del gateway): el primero es inmediato
+y los siguientes esperan el doble que el anterior, hasta RECONNECT_MAX_DELAY, menos una
+fracción aleatoria (RECONNECT_JITTER) para que varias radios no reintenten a la vez.
+
+Las órdenes hacia la radio (permit, configurar reporte...) pasan por `RadioLink.call`:
+mientras la radio está desconectada se guardan en orden y se ejecutan al reconectar.
+"""
+import asyncio
+import collections
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+
+import zigpy.exceptions
+
+from sensor_pipeline import GatewayMetrics
+
+RECONNECT_INITIAL_DELAY = 1.0  # Segundos de espera tras el primer intento fallido
+RECONNECT_MAX_DELAY = 60.0  # Espera máxima entre intentos
+RECONNECT_JITTER = 0.5  # Fracción máxima de la espera que se resta al azar
+COMMAND_BUFFER_SIZE = 100  # Órdenes guardadas durante un corte; después se descartan las más antiguas
+
+# Errores de configuración de la red: reintentar no los arregla
+FATAL_ERRORS = (zigpy.exceptions.NetworkNotFormed, zigpy.exceptions.NetworkSettingsInconsistent)
+
+
+def backoff_delay(failures: int) -> float:
+    """Espera antes del siguiente intento tras `failures` intentos fallidos seguidos."""
+    delay = min(RECONNECT_INITIAL_DELAY * 2 ** (failures - 1), RECONNECT_MAX_DELAY)
+    return delay * (1 - RECONNECT_JITTER * random.random())
+
+
+class RadioLink:
+    """Conexión supervisada de una ControllerApplication con su dongle."""
+
+    def __init__(self, app, name: str, metrics: GatewayMetrics, stopping: asyncio.Event):
+        self.app = app
+        self.name = name
+        self.metrics = metrics
+        self._stopping = stopping
+        self._connected = False
+        self._lost = asyncio.Event()
+        self._lost_at: Optional[float] = None
+        self._max_recovery = 0.0
+        self._buffer: Deque[Tuple[str, Callable[[], Awaitable[Any]], asyncio.Future]] = collections.deque()
+        self._replay_task: Optional[asyncio.Task] = None
+        self.metrics.set(f"link.connected.{name}", 0)
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    def connection_lost(self, exc: Exception) -> None:
+        """Llamado por el listener de la app; la reconexión la hace `run`."""
+        if self._connected:
+            self._connected = False
+            self._lost_at = time.monotonic()
+            self.metrics.increment(f"link.disconnects.{self.name}")
+            self.metrics.set(f"link.connected.{self.name}", 0)
+            logging.error(f"[{self.name}] Conexión con el dongle perdida ({exc}). Se reconectará conservando el estado.")
+        # También durante un intento de conexión: ese intento no debe darse por bueno
+        self._lost.set()
+
+    async def connect(self) -> bool:
+        """Conecta con reintentos indefinidos; devuelve False si se pidió el cierre antes.
+
+        Lanza los errores de FATAL_ERRORS, que no se arreglan reintentando.
+        """
+        failures = 0
+        while not self._stopping.is_set():
+            self._lost.clear()
+            try:
+                await self.app.startup(auto_form=False)
+                if self._lost.is_set():
+                    raise ConnectionError("Conexión perdida durante el arranque")
+            except FATAL_ERRORS:
+                raise
+            except Exception as e:
+                # El arranque puede haber fallado a medias (puerto abierto, tareas de zigpy
+                # en marcha...): se cierra siempre antes de reintentar
+                await self._disconnect()
+                failures += 1
+                delay = backoff_delay(failures)
+                self.metrics.increment(f"link.connect_failures.{self.name}")
+                logging.warning(f"[{self.name}] Intento de conexión {failures} fallido ({type(e).__name__}: {e}). "
+                                f"Reintento en {delay:.1f} s.")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._connected = True
+            self.metrics.set(f"link.connected.{self.name}", 1)
+            if self._lost_at is not None:
+                self._record_recovery(time.monotonic() - self._lost_at, failures + 1)
+                self._lost_at = None
+            if self._buffer:
+                self._replay_task = asyncio.create_task(self._replay())
+            return True
+        return False
+
+    def _record_recovery(self, seconds: float, attempts: int) -> None:
+        self.metrics.increment(f"link.reconnects.{self.name}")
+        self.metrics.set(f"link.last_recovery_s.{self.name}", round(seconds, 3))
+        self._max_recovery = max(self._max_recovery, seconds)
+        self.metrics.set(f"link.max_recovery_s.{self.name}", round(self._max_recovery, 3))
+        logging.info(f"[{self.name}] Reconectado con el dongle en {seconds:.2f} s ({attempts} intentos); "
+                     f"{len(self._buffer)} órdenes pendientes.")
+
+    async def run(self) -> None:
+        """Mantiene la conexión hasta que se pide el cierre. Requiere un `connect` previo."""
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while True:
+                lost = asyncio.ensure_future(self._lost.wait())
+                await asyncio.wait([lost, stopping], return_when=asyncio.FIRST_COMPLETED)
+                lost.cancel()
+                if self._stopping.is_set():
+                    return
+                await self._disconnect()
+                if not await self.connect():
+                    return
+        finally:
+            stopping.cancel()
+
+    async def _disconnect(self) -> None:
+        """Cierra el transporte y la sesión EZSP sin tocar la base de datos ni los dispositivos."""
+        try:
+            await self.app.shutdown(db=False)
+        except Exception as e:
+            logging.warning(f"[{self.name}] Error al cerrar la conexión perdida: {type(e).__name__} - {e}")
+
+    async def call(self, description: str, command: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta `command()` hacia la radio; durante un corte espera a que se reconecte."""
+        if self._connected and not self._buffer:
+            return await command()
+
+        if len(self._buffer) >= COMMAND_BUFFER_SIZE:
+            dropped, _, future = self._buffer.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"Orden '{dropped}' descartada: demasiadas órdenes durante el corte"))
+            self.metrics.increment(f"link.commands_dropped.{self.name}")
+
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((description, command, future))
+        self.metrics.increment(f"link.commands_buffered.{self.name}")
+        logging.info(f"[{self.name}] Radio no disponible: orden '{description}' en espera ({len(self._buffer)} pendientes).")
+        if self._connected and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self._replay())
+        return await future
+
+    async def _replay(self) -> None:
+        """Ejecuta en orden las órdenes guardadas mientras siga habiendo conexión."""
+        while self._buffer and self._connected:
+            description, command, future = self._buffer.popleft()
+            if future.done():  # Quien la envió ya no espera (p. ej. timeout del canal de control)
+                continue
+            try:
+                result = await command()
+            except Exception as e:
+                logging.warning(f"[{self.name}] La orden '{description}' falló tras reconectar: {type(e).__name__} - {e}")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+                self.metrics.increment(f"link.commands_replayed.{self.name}")
+
+    def close(self) -> None:
+        """Rechaza las órdenes aún pendientes; se llama al cerrar el gateway."""
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+        while self._buffer:
+            description, _, future = self._buffer.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"Orden '{description}' cancelada: el gateway se está cerrando"))
@@ -0,0 +1,253 @@
+"""Pipeline compartido de ingesta de lecturas de sensores.
+
+Todas las radios del gateway (una ControllerApplication por dongle) publican sus
+lecturas en una única cola. Las etapas registradas con `add_sink` (impresión,
+almacenamiento, envío a la nube...) las consumen en orden desde una sola tarea, de
+modo que una etapa lenta nunca se ejecuta dentro de un callback de zigpy.
+
+Las etapas duraderas (`add_durable_sink`) no leen de la cola en memoria sino de una
+cola en disco (ver sensor_wal.py): reciben lotes de lecturas, y un lote solo se da por
+entregado cuando la etapa termina sin error. Mientras el destino falla, las lecturas
+se acumulan en disco y se reintenta el mismo lote con espera exponencial. Si el mismo
+lote falla DURABLE_POISON_RETRIES veces seguidas se entrega lectura a lectura, y las que
+fallan solas mientras las siguientes se entregan bien se apartan al fichero
+<etapa>.quarantine de la cola (una línea JSON por lectura) para no bloquear la etapa.
+"""
+import asyncio
+import collections
+import dataclasses
+import inspect
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+PIPELINE_MAX_QUEUE = 10000  # Lecturas pendientes antes de empezar a descartar
+DURABLE_BATCH_SIZE = 500  # Lecturas máximas por lote entregado a una etapa duradera
+DURABLE_LINGER = 0.0  # Segundos de espera para completar un lote antes de entregarlo
+DURABLE_RETRY_MIN = 1.0  # Segundos de espera tras el primer fallo de una etapa duradera
+DURABLE_RETRY_MAX = 60.0
+DURABLE_POISON_RETRIES = 5  # Fallos seguidos del mismo lote antes de entregarlo lectura a lectura
+
+
+@dataclasses.dataclass(frozen=True)
+class SensorReading:
+    shard: str  # Nombre de la radio que recibió la lectura
+    ieee: str
+    nwk: int
+    attribute_id: int
+    sensor_name: str
+    value: float
+    timestamp: float  # time.time() en el momento de la recepción
+    valid: bool = True  # False si el valor crudo es un centinela (ver sensor_schema.Channel.is_sentinel)
+
+
+Sink = Callable[[SensorReading], Optional[Awaitable[None]]]
+BatchSink = Callable[[List[SensorReading]], Optional[Awaitable[None]]]
+
+
+class GatewayMetrics:
+    """Contadores comunes a todas las radios y etapas del gateway."""
+
+    def __init__(self):
+        self._counters: Dict[str, float] = collections.Counter()
+        self._sources: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        self._counters[name] += amount
+
+    def set(self, name: str, value: float) -> None:
+        self._counters[name] = value
+
+    def add_source(self, prefix: str, source: Callable[[], Dict[str, float]]) -> None:
+        """Registra una fuente de métricas externa (p. ej. los contadores de una radio)."""
+        self._sources[prefix] = source
+
+    def remove_source(self, prefix: str) -> None:
+        self._sources.pop(prefix, None)
+
+    def snapshot(self) -> Dict[str, float]:
+        values = dict(self._counters)
+        for prefix, source in list(self._sources.items()):
+            try:
+                for name, value in source().items():
+                    values[f"{prefix}.{name}"] = value
+            except Exception as e:
+                logging.debug(f"No se pudieron leer las métricas de {prefix}: {e}")
+        return values
+
+
+def zigpy_counters(app) -> Dict[str, float]:
+    """Aplana los contadores de `app.state.counters` de zigpy/bellows."""
+    values = {}
+    for group in app.state.counters:
+        for counter in group.counters():
+            values[f"{group.name}.{counter.name}"] = int(counter)
+    return values
+
+
+class ReadingPipeline:
+    """Cola única de lecturas con etapas (sinks) ejecutadas en orden."""
+
+    def __init__(self, metrics: GatewayMetrics, max_queue: int = PIPELINE_MAX_QUEUE, wal=None):
+        self.metrics = metrics
+        self.wal = wal  # WriteAheadQueue opcional, necesaria para las etapas duraderas
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._sinks: List[Tuple[str, Sink]] = []
+        self._durable_sinks: List[Tuple[str, BatchSink, int, float]] = []
+
+    def add_sink(self, name: str, sink: Sink) -> None:
+        """Añade una etapa. Puede ser una función normal o una corrutina."""
+        self._sinks.append((name, sink))
+
+    def add_durable_sink(self, name: str, sink: BatchSink, batch_size: int = DURABLE_BATCH_SIZE,
+                         linger: float = DURABLE_LINGER) -> None:
+        """Añade una etapa que recibe lotes desde la cola en disco, con entrega confirmada.
+
+        Si hay menos de `batch_size` lecturas pendientes, se espera hasta `linger`
+        segundos a que lleguen más antes de entregar el lote.
+        """
+        if self.wal is None:
+            raise ValueError("Las etapas duraderas necesitan una WriteAheadQueue")
+        self.wal.consumer(name)
+        self._durable_sinks.append((name, sink, batch_size, linger))
+
+    def submit(self, reading: SensorReading) -> bool:
+        """Encola una lectura sin bloquear. Devuelve False si se descartó."""
+        if self._durable_sinks:
+            try:
+                self.wal.append(reading)
+            except OSError as e:
+                self.metrics.increment("wal.errors")
+                logging.error(f"No se pudo escribir la lectura en la cola en disco: {e}")
+        try:
+            self._queue.put_nowait(reading)
+        except asyncio.QueueFull:
+            self.metrics.increment("pipeline.dropped")
+            return False
+        self.metrics.increment("pipeline.submitted")
+        self.metrics.increment(f"pipeline.submitted.{reading.shard}")
+        return True
+
+    async def run(self) -> None:
+        """Ejecuta todas las etapas indefinidamente; se detiene al cancelar la tarea."""
+        coros = [self._run_memory()]
+        coros += [self._run_durable(*durable_sink) for durable_sink in self._durable_sinks]
+        if self._durable_sinks:
+            coros.append(self.wal.run_syncer())
+        await asyncio.gather(*coros)
+
+    async def _run_memory(self) -> None:
+        while True:
+            reading = await self._queue.get()
+            try:
+                await self._process(reading)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, reading: SensorReading) -> None:
+        for name, sink in self._sinks:
+            try:
+                result = sink(reading)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                self.metrics.increment(f"pipeline.errors.{name}")
+                logging.error(f"Error en la etapa '{name}' del pipeline: {type(e).__name__} - {e}", exc_info=True)
+        self.metrics.increment("pipeline.processed")
+        self.metrics.set("pipeline.last_latency_ms", (time.time() - reading.timestamp) * 1000)
+
+    async def _run_durable(self, name: str, sink: BatchSink, batch_size: int, linger: float) -> None:
+        delay = DURABLE_RETRY_MIN
+        failed_offset, failures = None, 0  # Primer offset del lote que viene fallando y cuántas veces
+        while True:
+            await self.wal.wait(name)
+            if linger and self.wal.lag(name) < batch_size:
+                await asyncio.sleep(linger)
+            batch = self.wal.read(name, batch_size)
+            if not batch:
+                continue
+            if failures >= DURABLE_POISON_RETRIES and batch[0][0] == failed_offset:
+                failure = await self._deliver_isolated(name, sink, batch)
+            else:
+                error = await self._deliver(sink, [reading for _, reading in batch])
+                failure = (batch[0][0], error) if error is not None else None
+                if error is None:
+                    self.wal.ack(name, batch[-1][0])
+                    self.metrics.increment(f"pipeline.delivered.{name}", len(batch))
+            if failure is not None:
+                offset, error = failure
+                self.metrics.increment(f"pipeline.errors.{name}")
+                logging.warning(f"La etapa duradera '{name}' falló ({type(error).__name__} - {error}). "
+                                f"Reintento en {delay:.0f} s; pendientes en disco: {self.wal.lag(name)}")
+                self.wal.rewind(name)
+                failures = failures + 1 if offset == failed_offset else 1
+                failed_offset = offset
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, DURABLE_RETRY_MAX)
+                continue
+            delay = DURABLE_RETRY_MIN
+            failed_offset, failures = None, 0
+
+    @staticmethod
+    async def _deliver(sink: BatchSink, readings: List[SensorReading]) -> Optional[Exception]:
+        """Entrega un lote a una etapa duradera; devuelve el error si falla."""
+        try:
+            result = sink(readings)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            return e
+        return None
+
+    async def _deliver_isolated(self, name: str, sink: BatchSink,
+                                batch: List[Tuple[int, SensorReading]]) -> Optional[Tuple[int, Exception]]:
+        """Entrega un lote que falla una y otra vez lectura a lectura.
+
+        Una lectura que falla sola solo va a cuarentena cuando una posterior se entrega bien:
+        si el destino está caído fallan todas y no se aparta ninguna. Confirma hasta la
+        última lectura entregada o apartada y devuelve (offset, error) de la primera de las
+        que siguen fallando al final del lote.
+        """
+        rejected: List[Tuple[int, SensorReading, Exception]] = []
+        for offset, reading in batch:
+            error = await self._deliver(sink, [reading])
+            if error is not None:
+                rejected.append((offset, reading, error))
+                continue
+            for _, bad_reading, bad_error in rejected:
+                self._quarantine(name, bad_reading, bad_error)
+            rejected = []
+            self.wal.ack(name, offset)
+            self.metrics.increment(f"pipeline.delivered.{name}")
+        return (rejected[0][0], rejected[-1][2]) if rejected else None
+
+    def _quarantine(self, name: str, reading: SensorReading, error: Exception) -> None:
+        path = os.path.join(self.wal.directory, f"{name}.quarantine")
+        record = {**dataclasses.asdict(reading), "error": f"{type(error).__name__} - {error}"}
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.metrics.increment(f"pipeline.quarantined.{name}")
+        logging.error(f"La etapa duradera '{name}' rechaza siempre la lectura {reading}: "
+                      f"{type(error).__name__} - {error}. Apartada en {path}")
+
+    async def drain(self, timeout: float = 5.0) -> None:
+        """Espera a que se procesen las lecturas pendientes (útil al cerrar)."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Quedaron {self._queue.qsize()} lecturas sin procesar al cerrar el pipeline.")
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def update_metrics(self) -> None:
+        self.metrics.set("pipeline.queue_size", self.qsize())
+        if self.wal is not None:
+            self.wal.update_metrics()
+
+    def close(self) -> None:
+        """Cierra la cola en disco; lo no confirmado se entregará en el próximo arranque."""
+        if self.wal is not None:
+            self.wal.close()
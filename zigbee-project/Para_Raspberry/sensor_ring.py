@@ -0,0 +1,355 @@
+"""Anillo de lecturas en memoria compartida entre el proceso de radio y el de procesamiento.
+
+En el modo de procesos separados, el proceso de radio solo ejecuta zigpy/bellows y
+publica cada lectura decodificada en un anillo de `multiprocessing.shared_memory` con
+registros de tamaño fijo. Los consumidores (uno o varios procesos) leen del anillo sin
+serializar nada con pickle: cada registro se desempaqueta con un único `struct`. Así,
+un consumidor lento o que use mucha CPU nunca retrasa los ACK al NCP.
+
+Formato del segmento: una cabecera con el número de registros publicados y `capacity`
+huecos. El registro `n` (desde 0) va en el hueco `n % capacity` con su número de
+secuencia `n + 1` (0 = hueco vacío) y el CRC32 de sus datos. El escritor es único:
+escribe el hueco y después actualiza la cabecera. Cada lector lleva su propio cursor y,
+si el escritor le adelanta una vuelta entera, salta a los registros más antiguos que
+siguen en el anillo y cuenta los perdidos. Un hueco con secuencia o CRC inesperados que
+el escritor no puede estar reescribiendo todavía no es visible para este proceso: se
+vuelve a leer en la siguiente pasada.
+
+Las cadenas (radio, IEEE y nombre del sensor) ocupan campos de tamaño fijo. Una cadena
+que no cabe no se trunca: `check_record_fields` rechaza la configuración al arrancar y,
+si aun así llega una lectura con una cadena demasiado larga, `RingWriter.submit` la
+descarta, lo registra y la cuenta en `ring.rejected`.
+
+Las órdenes (permit, configure_reporting...) no van por el anillo sino por un canal de
+control (`ControlChannel`) sobre un `multiprocessing.Pipe`: son pocas y pequeñas.
+"""
+import asyncio
+import itertools
+import logging
+import struct
+import zlib
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+
+RING_SLOTS = 65536  # Registros que caben en el anillo (~6,9 MB)
+RING_POLL_INTERVAL = 0.01  # Segundos entre lecturas del anillo cuando está vacío
+RING_READ_BATCH = 1000  # Registros máximos leídos por pasada
+CONTROL_TIMEOUT = 30.0  # Segundos máximos de espera de la respuesta a una orden
+MAX_SHARD_BYTES = 16  # Longitud máxima en UTF-8 del nombre de la radio
+MAX_IEEE_BYTES = 24  # "00:11:22:33:44:55:66:77" ocupa 23
+MAX_SENSOR_NAME_BYTES = 32  # Longitud máxima en UTF-8 del nombre del canal
+
+_MAGIC = b"RNG2"
+_HEADER = struct.Struct("<4sIIQ")  # magia, capacidad, tamaño del hueco, registros publicados
+_PUBLISHED = struct.Struct("<Q")
+_PUBLISHED_OFFSET = 12
+_SLOT = struct.Struct("<QI")  # secuencia, CRC32 del registro
+# timestamp, valor, nwk, atributo, válida, radio, IEEE, nombre del sensor (rellenados con ceros)
+_STRINGS = f"{MAX_SHARD_BYTES}s{MAX_IEEE_BYTES}s{MAX_SENSOR_NAME_BYTES}s"
+_RECORD = struct.Struct(f"<ddHHB{_STRINGS}")
+_ENTRY = struct.Struct(f"<QIddHHB{_STRINGS}")  # hueco completo: _SLOT seguido de _RECORD
+_FIELD_LIMITS = {"shard": MAX_SHARD_BYTES, "ieee": MAX_IEEE_BYTES, "sensor_name": MAX_SENSOR_NAME_BYTES}
+SLOT_SIZE = _ENTRY.size
+
+
+def _oversized(field: str, value: str) -> bool:
+    return len(value.encode()) > _FIELD_LIMITS[field]
+
+
+def check_record_fields(shards: Iterable[str], sensor_names: Iterable[str]) -> None:
+    """Lanza ValueError si algún nombre de radio o de sensor no cabe en el registro."""
+    too_long = [
+        f"{field} '{value}' ({len(value.encode())} bytes, máximo {_FIELD_LIMITS[field]})"
+        for field, values in (("shard", shards), ("sensor_name", sensor_names))
+        for value in values
+        if _oversized(field, value)
+    ]
+    if too_long:
+        raise ValueError(f"Nombres demasiado largos para el anillo de lecturas: {', '.join(too_long)}")
+
+
+class ReadingRing:
+    """Segmento de memoria compartida con el anillo; lo crea el proceso que lo libera."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        magic, self.capacity, slot_size, _ = _HEADER.unpack_from(shm.buf)
+        if magic != _MAGIC or slot_size != SLOT_SIZE:
+            shm.close()
+            raise ValueError(f"El segmento '{shm.name}' no es un anillo de lecturas compatible")
+
+    @classmethod
+    def create(cls, capacity: int = RING_SLOTS) -> "ReadingRing":
+        shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity * SLOT_SIZE)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, capacity, SLOT_SIZE, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ReadingRing":
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def published(self) -> int:
+        return _PUBLISHED.unpack_from(self.shm.buf, _PUBLISHED_OFFSET)[0]
+
+    def close(self) -> None:
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingWriter:
+    """Publica lecturas en el anillo. Tiene la misma interfaz `submit` que el pipeline."""
+
+    def __init__(self, ring: ReadingRing, metrics: Optional[GatewayMetrics] = None):
+        self.ring = ring
+        self.metrics = metrics or GatewayMetrics()
+        self._buf = ring.shm.buf
+        self._capacity = ring.capacity
+        self._next = ring.published()
+        # Las cadenas se repiten en casi todas las lecturas: se codifican una vez, y solo
+        # las que caben en su campo (una por campo, porque los tamaños son distintos)
+        self._encoded: Dict[str, Dict[str, bytes]] = {field: {} for field in _FIELD_LIMITS}
+        self._rejected = set()  # (campo, cadena) demasiado largas, ya registradas
+
+    def _encode(self, reading: SensorReading) -> Optional[List[bytes]]:
+        """Codifica las cadenas de una lectura, o devuelve None si alguna no cabe."""
+        encoded = []
+        for field, cache in self._encoded.items():
+            value = getattr(reading, field)
+            if value not in cache:
+                if _oversized(field, value):
+                    if (field, value) not in self._rejected:
+                        self._rejected.add((field, value))
+                        logging.error(f"Lectura descartada: {field} '{value}' no cabe en el anillo "
+                                      f"({len(value.encode())} bytes, máximo {_FIELD_LIMITS[field]})")
+                    self.metrics.increment("ring.rejected")
+                    return None
+                cache[value] = value.encode()
+            encoded.append(cache[value])
+        return encoded
+
+    def submit(self, reading: SensorReading) -> bool:
+        """Publica una lectura sin bloquear; el anillo sobrescribe lo más antiguo.
+
+        Devuelve False si se descartó porque alguna de sus cadenas no cabe en el registro.
+        """
+        encoded = self._encode(reading)
+        if encoded is None:
+            return False
+        record = _RECORD.pack(
+            reading.timestamp, reading.value, reading.nwk, reading.attribute_id, reading.valid, *encoded,
+        )
+        seq = self._next
+        offset = _HEADER.size + (seq % self._capacity) * SLOT_SIZE
+        self._buf[offset:offset + SLOT_SIZE] = _SLOT.pack(seq + 1, zlib.crc32(record)) + record
+        self._next = seq + 1
+        _PUBLISHED.pack_into(self._buf, _PUBLISHED_OFFSET, self._next)
+        self.metrics.increment("ring.published")
+        return True
+
+
+class RingReader:
+    """Cursor de lectura independiente sobre el anillo; puede haber varios por proceso."""
+
+    def __init__(self, ring: ReadingRing, metrics: Optional[GatewayMetrics] = None,
+                 from_oldest: bool = False):
+        self.ring = ring
+        self.metrics = metrics or GatewayMetrics()
+        self._buf = ring.shm.buf
+        self._capacity = ring.capacity
+        published = ring.published()
+        self.next = max(0, published - self._capacity + 1) if from_oldest else published
+        self._decoded: Dict[bytes, str] = {}
+
+    def _decode(self, value: bytes) -> str:
+        try:
+            return self._decoded[value]
+        except KeyError:
+            decoded = self._decoded[value] = value.rstrip(b"\0").decode(errors="replace")
+            return decoded
+
+    def lag(self) -> int:
+        return self.ring.published() - self.next
+
+    def _skip_overwritten(self, published: int) -> None:
+        """Salta los registros que el escritor puede haber sobrescrito ya."""
+        oldest = published - self._capacity + 1
+        if self.next < oldest:
+            self.metrics.increment("ring.lost", oldest - self.next)
+            self.next = oldest
+
+    def _copy(self, first: int, last: int) -> bytes:
+        """Copia los huecos de los registros [first, last), que pueden dar la vuelta al final."""
+        start = _HEADER.size + (first % self._capacity) * SLOT_SIZE
+        size = (last - first) * SLOT_SIZE
+        if start + size <= len(self._buf):
+            return bytes(self._buf[start:start + size])
+        head = bytes(self._buf[start:_HEADER.size + self._capacity * SLOT_SIZE])
+        return head + bytes(self._buf[_HEADER.size:_HEADER.size + size - len(head)])
+
+    def read(self, max_records: int = RING_READ_BATCH) -> List[SensorReading]:
+        """Devuelve las lecturas publicadas desde la última llamada, sin esperar."""
+        published = self.ring.published()
+        self._skip_overwritten(published)
+        first = self.next
+        last = min(published, first + max_records)
+        if first >= last:
+            return []
+
+        data = self._copy(first, last)
+        # Tras copiar: los huecos a los que el escritor ya ha dado la vuelta pueden estar a medias
+        self._skip_overwritten(self.ring.published())
+        if self.next >= last:
+            return self.read(max_records)
+
+        decode = self._decode
+        readings = []
+        for seq in range(self.next, last):
+            offset = (seq - first) * SLOT_SIZE
+            stored_seq, crc, timestamp, value, nwk, attribute_id, valid, shard, ieee, name = _ENTRY.unpack_from(data, offset)
+            if stored_seq != seq + 1 or zlib.crc32(data[offset + _SLOT.size:offset + SLOT_SIZE]) != crc:
+                break  # Aún no visible en este proceso: se vuelve a leer en la siguiente pasada
+            readings.append(SensorReading(
+                shard=decode(shard), ieee=decode(ieee), nwk=nwk, attribute_id=attribute_id,
+                sensor_name=decode(name), value=value, timestamp=timestamp,
+                valid=bool(valid),
+            ))
+
+        self.next += len(readings)
+        if readings:
+            self.metrics.increment("ring.read", len(readings))
+        return readings
+
+    async def run(self, sink: Callable[[SensorReading], Any], poll_interval: float = RING_POLL_INTERVAL) -> None:
+        """Entrega las lecturas a `sink` indefinidamente; se detiene al cancelar la tarea."""
+        while True:
+            readings = self.read()
+            self.update_metrics()
+            for reading in readings:
+                sink(reading)
+            if len(readings) < RING_READ_BATCH:
+                await asyncio.sleep(poll_interval)
+            else:
+                await asyncio.sleep(0)
+
+    def update_metrics(self) -> None:
+        self.metrics.set("ring.lag", self.lag())
+
+
+class ControlChannel:
+    """Extremo de un `multiprocessing.Pipe` integrado en el bucle de eventos.
+
+    Los mensajes son tuplas `(tipo, ...)`. Las órdenes se envían con `request` y se
+    responden con `("reply", id, ok, resultado)`; el resto de mensajes se entregan al
+    manejador registrado para su tipo. Cuando el otro extremo se cierra (p. ej. termina
+    el proceso), se llama a `on_closed`. Las órdenes recibidas se atienden en tareas que el
+    canal conserva hasta que terminan; al cerrarlo se cancelan las que sigan en curso.
+    """
+
+    def __init__(self, conn, on_closed: Optional[Callable[[], None]] = None):
+        self._conn = conn
+        self._on_closed = on_closed
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._serving: Set[asyncio.Task] = set()
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.closed = False
+
+    def on(self, kind: str, handler: Callable[..., Any]) -> None:
+        """Registra el manejador de un tipo de mensaje. Si es una orden puede ser una corrutina."""
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(self._conn.fileno(), self._on_readable)
+
+    def send(self, *message) -> None:
+        """Envía un mensaje sin respuesta; se ignora si el otro extremo ya se cerró."""
+        if self.closed:
+            return
+        try:
+            self._conn.send(message)
+        except OSError:
+            self.close()
+
+    async def request(self, command: str, *args, timeout: float = CONTROL_TIMEOUT) -> Any:
+        """Envía una orden y espera su resultado; lanza RuntimeError si falló en el otro extremo."""
+        if self.closed:
+            raise ConnectionError("El canal de control está cerrado")
+        request_id = next(self._ids)
+        future = self._pending[request_id] = self._loop.create_future()
+        try:
+            self._conn.send(("request", request_id, command, *args))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _on_readable(self) -> None:
+        try:
+            while self._conn.poll():
+                self._dispatch(self._conn.recv())
+        except (EOFError, OSError):
+            self.close()
+            if self._on_closed is not None:
+                self._on_closed()
+
+    def _dispatch(self, message: tuple) -> None:
+        kind, *args = message
+        if kind == "reply":
+            request_id, ok, result = args
+            future = self._pending.get(request_id)
+            if future is not None and not future.done():
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(result))
+        elif kind == "request":
+            # El bucle solo guarda referencias débiles a las tareas: sin esta, podría liberarse a medias
+            task = self._loop.create_task(self._serve(*args))
+            self._serving.add(task)
+            task.add_done_callback(self._served)
+        elif kind in self._handlers:
+            self._handlers[kind](*args)
+        else:
+            logging.warning(f"Mensaje de control desconocido: {kind}")
+
+    async def _serve(self, request_id: int, command: str, *args) -> None:
+        handler = self._handlers.get(command)
+        try:
+            if handler is None:
+                raise ValueError(f"Orden desconocida: {command}")
+            result = handler(*args)
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            logging.warning(f"La orden de control '{command}' falló: {type(e).__name__} - {e}")
+            self.send("reply", request_id, False, f"{type(e).__name__}: {e}")
+        else:
+            self.send("reply", request_id, True, result)
+
+    def _served(self, task: asyncio.Task) -> None:
+        self._serving.discard(task)
+        e = None if task.cancelled() else task.exception()
+        if e is not None:
+            logging.error(f"Error atendiendo una orden de control: {type(e).__name__} - {e}")
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._loop is not None:
+            self._loop.remove_reader(self._conn.fileno())
+        for task in self._serving:
+            task.cancel()  # Su respuesta ya no se podría enviar
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("El canal de control se cerró"))
+        self._conn.close()
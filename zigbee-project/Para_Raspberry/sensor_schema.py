@@ -0,0 +1,171 @@
+"""Registro declarativo de los sensores a partir de sensor_schema.json.
+
+Cada entrada del fichero describe un cluster de fabricante (ID, endpoint, atributos con
+tipo, unidad, escala y nombre de canal, y la configuración de reporte). A partir de él
+se generan:
+
+- la subclase de `zigpy.zcl.Cluster`, que zigpy registra por sí sola al crearse,
+- la lista de atributos y parámetros para `configure_reporting`,
+- una tabla attrid -> (índice de canal, escala, nombre, unidad, centinelas) por cluster,
+  que es lo único que consulta la ruta de ingesta para cada muestra.
+
+Los centinelas son valores crudos (antes de escalar) que no son medidas: el "sin valor"
+del tipo ZCL (0xFFFF en uint16, 0x8000 en int16..., NaN en single y double) y los que declare el sensor en
+"sentinels" (p. ej. -999.9 cuando el firmware no puede leer el ADC).
+
+Una variante nueva de firmware (más canales, tensión...) solo necesita una entrada
+nueva en el JSON.
+"""
+import dataclasses
+import json
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+from zigpy.zcl import Cluster
+import zigpy.types as t
+
+SENSOR_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_schema.json")
+
+ZIGPY_TYPES = {
+    "bool": t.Bool,
+    "uint8": t.uint8_t,
+    "uint16": t.uint16_t,
+    "uint32": t.uint32_t,
+    "int8": t.int8s,
+    "int16": t.int16s,
+    "int32": t.int32s,
+    "single": t.Single,
+    "double": t.Double,
+}
+
+# Valor crudo que indica "sin valor" en cada tipo entero ZCL. En single/double es NaN.
+ZCL_NON_VALUES = {
+    "uint8": 0xFF,
+    "uint16": 0xFFFF,
+    "uint32": 0xFFFFFFFF,
+    "int8": -0x80,
+    "int16": -0x8000,
+    "int32": -0x80000000,
+}
+SENTINEL_REL_TOLERANCE = 1e-6  # Los centinelas en coma flotante llegan redondeados a float32
+
+
+def _parse_int(value) -> int:
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def _parse_sentinels(values) -> Tuple[float, ...]:
+    """Centinelas de la configuración: números o cadenas enteras ("0xFFFF")."""
+    return tuple(float(_parse_int(value) if isinstance(value, str) else value) for value in values)
+
+
+class Channel(NamedTuple):
+    """Entrada de la tabla de decodificación de un atributo."""
+    index: int  # Posición del canal dentro del cluster
+    scale: float  # Factor que convierte el valor crudo a la unidad
+    name: str
+    unit: str
+    sentinels: Tuple[float, ...] = ()  # Valores crudos que no son medidas
+
+    def is_sentinel(self, raw: float) -> bool:
+        if not isinstance(raw, float):  # Los enteros se comparan exactamente
+            return raw in self.sentinels
+        if math.isnan(raw):  # El "sin valor" de single y double
+            return True
+        for sentinel in self.sentinels:
+            if abs(raw - sentinel) <= SENTINEL_REL_TOLERANCE * max(1.0, abs(sentinel)):
+                return True
+        return False
+
+
+@dataclasses.dataclass(frozen=True)
+class AttributeSchema:
+    id: int
+    name: str
+    type: str
+    unit: str = ""
+    scale: float = 1.0
+    channel: str = ""
+    reportable_change: Optional[float] = None
+    manufacturer_specific: bool = False
+    sentinels: Tuple[float, ...] = ()
+
+
+@dataclasses.dataclass(frozen=True)
+class SensorSchema:
+    name: str
+    class_name: str
+    cluster_id: int
+    endpoint_id: int
+    min_interval: int
+    max_interval: int
+    attributes: Tuple[AttributeSchema, ...]
+    description: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SensorSchema":
+        reporting = data.get("reporting", {})
+        sensor_sentinels = _parse_sentinels(data.get("sentinels", []))
+        attributes = []
+        for attr in data["attributes"]:
+            if attr["type"] not in ZIGPY_TYPES:
+                raise ValueError(f"{data['name']}: tipo '{attr['type']}' desconocido en el atributo {attr['name']}")
+            attributes.append(AttributeSchema(
+                id=_parse_int(attr["id"]),
+                name=attr["name"],
+                type=attr["type"],
+                unit=attr.get("unit", ""),
+                scale=float(attr.get("scale", 1.0)),
+                channel=attr.get("channel", attr["name"]),
+                reportable_change=attr.get("reportable_change"),
+                manufacturer_specific=bool(attr.get("manufacturer_specific", False)),
+                sentinels=sensor_sentinels + _parse_sentinels(attr.get("sentinels", []))
+                + ((float(ZCL_NON_VALUES[attr["type"]]),) if attr["type"] in ZCL_NON_VALUES else ()),
+            ))
+        return cls(
+            name=data["name"],
+            class_name=data.get("class_name") or f"{data['name'].title().replace('_', '')}Cluster",
+            cluster_id=_parse_int(data["cluster_id"]),
+            endpoint_id=int(data.get("endpoint_id", 1)),
+            min_interval=int(reporting.get("min_interval", 10)),
+            max_interval=int(reporting.get("max_interval", 60)),
+            attributes=tuple(attributes),
+            description=data.get("description", ""),
+        )
+
+    def build_cluster(self) -> Type[Cluster]:
+        """Genera la clase del cluster. Al heredar de Cluster queda registrada en zigpy."""
+        return type(self.class_name, (Cluster,), {
+            "cluster_id": self.cluster_id,
+            "ep_attribute": self.name,
+            "attributes": {
+                attr.id: (attr.name, ZIGPY_TYPES[attr.type], attr.manufacturer_specific)
+                for attr in self.attributes
+            },
+        })
+
+    def channels(self) -> Dict[int, Channel]:
+        return {
+            attr.id: Channel(index, attr.scale, attr.channel, attr.unit, attr.sentinels)
+            for index, attr in enumerate(self.attributes)
+        }
+
+
+class SensorRegistry:
+    def __init__(self, schemas: List[SensorSchema]):
+        ids = [schema.cluster_id for schema in schemas]
+        if len(set(ids)) != len(ids):
+            raise ValueError(f"Hay clusters repetidos en el esquema de sensores: {[f'{i:#06x}' for i in ids]}")
+        self.schemas = schemas
+        self.clusters: Dict[int, Type[Cluster]] = {schema.cluster_id: schema.build_cluster() for schema in schemas}
+        self.channels: Dict[int, Dict[int, Channel]] = {schema.cluster_id: schema.channels() for schema in schemas}
+
+    @classmethod
+    def load(cls, path: str = SENSOR_SCHEMA_PATH) -> "SensorRegistry":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([SensorSchema.from_dict(sensor) for sensor in data["sensors"]])
+
+    def __iter__(self):
+        return iter(self.schemas)
@@ -0,0 +1,378 @@
+"""Histórico de lecturas en SQLite, independiente de la base de datos de zigpy.
+
+Las lecturas se guardan en un fichero propio (no en zigbee.db, para no competir con
+zigpy por el bloqueo de escritura), en una tabla por día UTC:
+
+    readings_pAAAAMMDD(device_id, attribute_id, ts_ms, value)
+        PRIMARY KEY (device_id, attribute_id, ts_ms) WITHOUT ROWID
+
+`value` es NULL cuando la lectura no es una medida (un centinela o NaN, ver
+`SensorReading.valid`): la fila queda como hueco en los rangos y los agregados la ignoran.
+
+La clave primaria es el propio orden físico de la tabla, así que las consultas por
+dispositivo, canal y rango de tiempo son búsquedas por índice que no necesitan ir a
+ninguna otra estructura. El IEEE se guarda una sola vez en `devices` y cada fila solo
+lleva su número. Borrar el histórico antiguo es un DROP TABLE por día, sin DELETE fila
+a fila. Insertar la misma lectura dos veces (el pipeline entrega "al menos una vez")
+no duplica filas.
+
+Las consultas de rango se leen por páginas (`range_pages`) con el paso de milisegundos a
+segundos hecho en el propio SQL, de modo que tanto la lectura como la conversión ocurren
+en el hilo de la conexión y nunca hay un rango completo en memoria.
+"""
+import datetime
+import logging
+import math
+import pathlib
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiosqlite
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+
+STORE_RETENTION_DAYS = 90  # Días de histórico que se conservan (0 = sin límite)
+STORE_PAGE_ROWS = 2000  # Filas por página en las consultas de rango
+PARTITION_PREFIX = "readings_p"
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def _partition_day(ts_ms: int) -> int:
+    return ts_ms // DAY_MS
+
+
+def _partition_name(day: int) -> str:
+    date = datetime.datetime.fromtimestamp(day * 86400, tz=datetime.timezone.utc)
+    return f"{PARTITION_PREFIX}{date:%Y%m%d}"
+
+
+def _day_from_name(name: str) -> int:
+    date = datetime.datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+    return int(date.replace(tzinfo=datetime.timezone.utc).timestamp()) // 86400
+
+
+class ReadingsStore:
+    """Almacén de lecturas particionado por día, con API asíncrona."""
+
+    def __init__(self, path: str, metrics: Optional[GatewayMetrics] = None,
+                 retention_days: int = STORE_RETENTION_DAYS):
+        self.path = path
+        self.metrics = metrics or GatewayMetrics()
+        self.retention_days = retention_days
+        self._db: Optional[aiosqlite.Connection] = None
+        self._devices: Dict[str, int] = {}
+        self._partitions: List[int] = []  # Días con tabla, ordenados
+        self._not_null_partitions: Set[int] = set()  # Creadas con `value NOT NULL`, se rehacen al escribir
+
+    async def open(self, read_only: bool = False) -> None:
+        """Abre el fichero. Con `read_only` la conexión no puede escribir ni crear nada.
+
+        La de solo lectura (la del servicio de consultas) necesita que el escritor haya
+        creado ya el fichero; las particiones nuevas se ven tras `reload_catalog`.
+        """
+        if read_only:
+            uri = pathlib.Path(self.path).absolute().as_uri() + "?mode=ro"
+            self._db = await aiosqlite.connect(uri, uri=True)
+            await self.reload_catalog()
+            return
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode = WAL")
+        await self._db.execute("PRAGMA synchronous = normal")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS devices (device_id INTEGER PRIMARY KEY, ieee TEXT NOT NULL UNIQUE)"
+        )
+        await self._db.commit()
+        await self.reload_catalog()
+
+    async def reload_catalog(self) -> None:
+        """Relee dispositivos y particiones (p. ej. desde una conexión de solo lectura)."""
+        async with self._db.execute("SELECT device_id, ieee FROM devices") as cursor:
+            self._devices = {ieee: device_id async for device_id, ieee in cursor}
+        async with self._db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (PARTITION_PREFIX + "%",)
+        ) as cursor:
+            self._partitions = sorted([_day_from_name(name) async for (name,) in cursor])
+        self._not_null_partitions = set()
+        for day in self._partitions:
+            async with self._db.execute(f"PRAGMA table_info({_partition_name(day)})") as cursor:
+                if any(name == "value" and notnull for _, name, _, notnull, _, _ in await cursor.fetchall()):
+                    self._not_null_partitions.add(day)
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    @property
+    def partitions(self) -> List[str]:
+        return [_partition_name(day) for day in self._partitions]
+
+    async def _device_id(self, ieee: str, create: bool = False) -> Optional[int]:
+        device_id = self._devices.get(ieee)
+        if device_id is None and create:
+            cursor = await self._db.execute("INSERT INTO devices (ieee) VALUES (?)", (ieee,))
+            device_id = self._devices[ieee] = cursor.lastrowid
+        return device_id
+
+    async def _create_partition_table(self, table: str) -> None:
+        await self._db.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                    device_id INTEGER NOT NULL,
+                    attribute_id INTEGER NOT NULL,
+                    ts_ms INTEGER NOT NULL,
+                    value REAL,
+                    PRIMARY KEY (device_id, attribute_id, ts_ms)
+                ) WITHOUT ROWID"""
+        )
+
+    async def _ensure_partition(self, day: int) -> None:
+        if day in self._not_null_partitions:
+            # Partición de una versión anterior: SQLite no permite quitar el NOT NULL
+            table = _partition_name(day)
+            await self._db.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+            await self._create_partition_table(table)
+            await self._db.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+            await self._db.execute(f"DROP TABLE {table}_old")
+            self._not_null_partitions.discard(day)
+            return
+        if day in self._partitions:
+            return
+        await self._create_partition_table(_partition_name(day))
+        self._partitions.append(day)
+        self._partitions.sort()
+
+    async def insert(self, readings: Iterable[SensorReading]) -> None:
+        """Inserta un lote en una sola transacción, con un executemany por partición."""
+        rows_by_day: Dict[int, List[Tuple[int, int, int, Optional[float]]]] = {}
+        new_partition = False
+        start = time.perf_counter()
+        count = 0
+        try:
+            for reading in readings:
+                ts_ms = int(reading.timestamp * 1000)
+                device_id = await self._device_id(reading.ieee, create=True)
+                value = reading.value if reading.valid and not math.isnan(reading.value) else None
+                rows_by_day.setdefault(_partition_day(ts_ms), []).append(
+                    (device_id, reading.attribute_id, ts_ms, value)
+                )
+
+            for day, rows in rows_by_day.items():
+                if day not in self._partitions or day in self._not_null_partitions:
+                    new_partition |= day not in self._partitions
+                    await self._ensure_partition(day)
+                await self._db.executemany(
+                    f"INSERT OR REPLACE INTO {_partition_name(day)} VALUES (?, ?, ?, ?)", rows
+                )
+                count += len(rows)
+            await self._db.commit()
+        except Exception:
+            # Los dispositivos y particiones creados en la transacción fallida no existen
+            await self._db.rollback()
+            await self.reload_catalog()
+            raise
+        self.metrics.increment("store.inserted", count)
+        invalid = sum(1 for rows in rows_by_day.values() for row in rows if row[3] is None)
+        if invalid:
+            self.metrics.increment("store.inserted_invalid", invalid)
+        self.metrics.set("store.last_insert_ms", round((time.perf_counter() - start) * 1000, 2))
+
+        if new_partition and self.retention_days:
+            await self.prune(self.retention_days)
+
+    async def __call__(self, readings: List[SensorReading]) -> None:
+        """Permite usar el almacén directamente como etapa duradera del pipeline."""
+        await self.insert(readings)
+
+    async def prune(self, retention_days: int) -> List[str]:
+        """Elimina las particiones (días completos) más antiguas que `retention_days`."""
+        cutoff = _partition_day(int(time.time() * 1000)) - retention_days
+        dropped = [day for day in self._partitions if day < cutoff]
+        for day in dropped:
+            await self._db.execute(f"DROP TABLE IF EXISTS {_partition_name(day)}")
+            self._partitions.remove(day)
+            self._not_null_partitions.discard(day)
+        if dropped:
+            await self._db.commit()
+            self.metrics.increment("store.partitions_dropped", len(dropped))
+            logging.info(f"Histórico: eliminadas {len(dropped)} particiones anteriores a {retention_days} días")
+        return [_partition_name(day) for day in dropped]
+
+    def _days_between(self, start_ms: int, end_ms: int) -> List[int]:
+        first, last = _partition_day(start_ms), _partition_day(end_ms)
+        return [day for day in self._partitions if first <= day <= last]
+
+    async def range(self, ieee: str, attribute_id: int, start: float, end: float) -> List[Tuple[float, Optional[float]]]:
+        """Lecturas (timestamp, valor) de un canal entre `start` y `end` (segundos epoch).
+
+        El valor es None en las lecturas no válidas.
+        """
+        result = []
+        async for page in self.range_pages(ieee, attribute_id, start, end):
+            result.extend(page)
+        return result
+
+    async def range_pages(self, ieee: str, attribute_id: int, start: float, end: float,
+                          limit: Optional[int] = None,
+                          page_rows: int = STORE_PAGE_ROWS) -> AsyncIterator[List[Tuple[float, Optional[float]]]]:
+        """Como `range`, pero por páginas de hasta `page_rows` filas y como mucho `limit` en total."""
+        device_id = await self._device_id(ieee)
+        if device_id is None:
+            return
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        remaining = limit if limit is not None else -1  # LIMIT -1: sin límite en SQLite
+        for day in self._days_between(start_ms, end_ms):
+            if remaining == 0:
+                return
+            async with self._db.execute(
+                f"""SELECT ts_ms / 1000.0, value FROM {_partition_name(day)}
+                    WHERE device_id = ? AND attribute_id = ? AND ts_ms BETWEEN ? AND ?
+                    ORDER BY ts_ms LIMIT ?""",
+                (device_id, attribute_id, start_ms, end_ms, remaining),
+            ) as cursor:
+                while True:
+                    page = await cursor.fetchmany(page_rows)
+                    if not page:
+                        break
+                    if remaining > 0:
+                        remaining -= len(page)
+                    yield page
+
+    async def range_summary(self, ieee: str, attribute_id: int, start: float, end: float,
+                            limit: Optional[int] = None) -> Tuple[int, Optional[float], Optional[float]]:
+        """(nº de lecturas, último timestamp, timestamp de la primera lectura tras `limit`) del rango.
+
+        Solo recorre la clave primaria, sin leer los valores: sirve para la ETag y para
+        saber desde dónde continuar un rango recortado antes de enviarlo.
+        """
+        device_id = await self._device_id(ieee)
+        if device_id is None:
+            return 0, None, None
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        params = (device_id, attribute_id, start_ms, end_ms)
+        total, last_ms, next_ms = 0, None, None
+        for day in self._days_between(start_ms, end_ms):
+            table = _partition_name(day)
+            where = "WHERE device_id = ? AND attribute_id = ? AND ts_ms BETWEEN ? AND ?"
+            async with self._db.execute(f"SELECT COUNT(*), MAX(ts_ms) FROM {table} {where}", params) as cursor:
+                count, day_last = await cursor.fetchone()
+            if not count:
+                continue
+            if limit is not None and next_ms is None and total + count > limit:
+                async with self._db.execute(
+                    f"SELECT ts_ms FROM {table} {where} ORDER BY ts_ms LIMIT 1 OFFSET ?", params + (limit - total,)
+                ) as cursor:
+                    (next_ms,) = await cursor.fetchone()
+            total += count
+            last_ms = day_last
+        return (total, last_ms / 1000 if last_ms is not None else None,
+                next_ms / 1000 if next_ms is not None else None)
+
+    async def last(self, ieee: str, attribute_id: int, count: int = 1) -> List[Tuple[float, Optional[float]]]:
+        """Las `count` lecturas más recientes de un canal, de la más nueva a la más antigua."""
+        device_id = await self._device_id(ieee)
+        if device_id is None:
+            return []
+        result = []
+        for day in reversed(self._partitions):
+            async with self._db.execute(
+                f"""SELECT ts_ms, value FROM {_partition_name(day)}
+                    WHERE device_id = ? AND attribute_id = ?
+                    ORDER BY ts_ms DESC LIMIT ?""",
+                (device_id, attribute_id, count - len(result)),
+            ) as cursor:
+                result.extend((ts_ms / 1000, value) for ts_ms, value in await cursor.fetchall())
+            if len(result) >= count:
+                break
+        return result
+
+    async def downsample(self, ieee: str, attribute_id: int, start: float, end: float,
+                         bucket_seconds: float) -> List[Tuple[float, float, float, float, int]]:
+        """Agregados (inicio del intervalo, mín, media, máx, nº de lecturas) por intervalo.
+
+        Solo cuentan las lecturas válidas: los intervalos sin ninguna no aparecen.
+        """
+        device_id = await self._device_id(ieee)
+        if device_id is None:
+            return []
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        bucket_ms = max(int(bucket_seconds * 1000), 1)
+        buckets: Dict[int, List[float]] = {}
+        for day in self._days_between(start_ms, end_ms):
+            async with self._db.execute(
+                f"""SELECT ts_ms / :bucket AS b, MIN(value), SUM(value), MAX(value), COUNT(*)
+                    FROM {_partition_name(day)}
+                    WHERE device_id = :device AND attribute_id = :attr AND ts_ms BETWEEN :start AND :end
+                      AND value IS NOT NULL
+                    GROUP BY b ORDER BY b""",
+                {"bucket": bucket_ms, "device": device_id, "attr": attribute_id, "start": start_ms, "end": end_ms},
+            ) as cursor:
+                for b, vmin, vsum, vmax, n in await cursor.fetchall():
+                    # Un intervalo puede repartirse entre dos particiones: se combinan
+                    current = buckets.get(b)
+                    if current is None:
+                        buckets[b] = [vmin, vsum, vmax, n]
+                    else:
+                        current[0] = min(current[0], vmin)
+                        current[1] += vsum
+                        current[2] = max(current[2], vmax)
+                        current[3] += n
+        return [
+            (b * bucket_ms / 1000, vmin, vsum / n, vmax, n)
+            for b, (vmin, vsum, vmax, n) in sorted(buckets.items())
+        ]
+
+
+if __name__ == "__main__":
+    # Medida de inserción y consultas: python sensor_store.py [filas] [canales] [fichero]
+    import asyncio
+    import os
+    import random
+    import sys
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    path = sys.argv[3] if len(sys.argv) > 3 else "readings_bench.db"
+    batch = 5000
+
+    async def bench():
+        if os.path.exists(path):
+            os.remove(path)
+        store = ReadingsStore(path, retention_days=0)
+        await store.open()
+        # Una lectura por canal cada 10 s, hacia atrás desde ahora
+        per_channel = rows // channels
+        end = time.time()
+        start_ts = end - per_channel * 10
+        t0 = time.perf_counter()
+        pending = []
+        for step in range(per_channel):
+            ts = start_ts + step * 10
+            for c in range(channels):
+                pending.append(SensorReading("radio0", f"{c // 3:016x}", c // 3, 1 + c % 3,
+                                             "Sensor Corriente", random.uniform(0, 20), ts))
+                if len(pending) >= batch:
+                    await store.insert(pending)
+                    pending = []
+        if pending:
+            await store.insert(pending)
+        elapsed = time.perf_counter() - t0
+        total = per_channel * channels
+        print(f"Inserción: {total} filas en {elapsed:.1f} s = {total / elapsed:.0f} filas/s, "
+              f"{len(store.partitions)} particiones, {os.path.getsize(path) / 1024 ** 2:.0f} MiB")
+
+        async def timed(label, coro, repeat=50):
+            t = time.perf_counter()
+            for _ in range(repeat):
+                result = await coro()
+            print(f"{label}: {(time.perf_counter() - t) / repeat * 1000:.2f} ms ({len(result)} filas)")
+
+        ieee = f"{0:016x}"
+        await timed("Última lectura", lambda: store.last(ieee, 1, 1))
+        await timed("Últimas 100", lambda: store.last(ieee, 1, 100))
+        await timed("Rango 1 h", lambda: store.range(ieee, 1, end - 3600, end))
+        await timed("Rango 1 día", lambda: store.range(ieee, 1, end - 86400, end), repeat=10)
+        await timed("Media por hora, 7 días", lambda: store.downsample(ieee, 1, end - 7 * 86400, end, 3600), repeat=10)
+        await store.close()
+
+    asyncio.run(bench())
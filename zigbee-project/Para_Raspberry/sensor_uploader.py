@@ -0,0 +1,189 @@
+"""Envío de lecturas a una API HTTP por lotes comprimidos.
+
+Se registra como etapa duradera del pipeline (ver sensor_pipeline.py), así que recibe
+lotes desde la cola en disco y solo se confirman cuando el servidor los ha aceptado.
+Cada lote se reparte en hasta UPLOAD_MAX_IN_FLIGHT peticiones simultáneas (de entre
+UPLOAD_MIN_REQUEST_READINGS y UPLOAD_MAX_REQUEST_READINGS lecturas), que se comprimen con
+gzip y se envían por una sesión aiohttp con conexiones keep-alive reutilizadas. Los fallos temporales
+(errores de red, 408, 429 y 5xx) se reintentan con espera exponencial aleatorizada.
+
+La entrega es "al menos una vez": si una petición del lote falla definitivamente, el
+pipeline volverá a entregar el lote completo, por lo que el servidor debe tolerar
+lecturas repetidas (p. ej. usando (ieee, atributo, timestamp) como clave). Las lecturas
+no válidas (centinelas del esquema) se envían con `"valid": false` y `"value": null`.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import math
+import random
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+
+UPLOAD_MAX_REQUEST_READINGS = 1000  # Lecturas máximas por petición HTTP
+UPLOAD_MIN_REQUEST_READINGS = 100  # Por debajo no compensa partir el lote en más peticiones
+UPLOAD_MAX_IN_FLIGHT = 4  # Peticiones simultáneas como máximo
+UPLOAD_MAX_RETRIES = 5  # Reintentos por petición antes de devolver el lote a la cola
+UPLOAD_RETRY_BASE = 0.5  # Segundos
+UPLOAD_RETRY_MAX = 30.0
+UPLOAD_TIMEOUT = 30.0  # Segundos por petición
+UPLOAD_COMPRESS_LEVEL = 6
+
+RETRYABLE_STATUS = {408, 429}
+
+
+class UploadError(Exception):
+    """El servidor no aceptó el lote tras agotar los reintentos."""
+
+
+def reading_to_dict(reading: SensorReading) -> Dict:
+    return {
+        "gateway_radio": reading.shard,
+        "ieee": reading.ieee,
+        "nwk": reading.nwk,
+        "attribute_id": reading.attribute_id,
+        "sensor": reading.sensor_name,
+        "value": reading.value if reading.valid else None,  # Un centinela no es una medida
+        "valid": reading.valid,
+        "timestamp": reading.timestamp,
+    }
+
+
+def encode_batch(readings: List[SensorReading], level: int = UPLOAD_COMPRESS_LEVEL) -> bytes:
+    body = json.dumps([reading_to_dict(r) for r in readings], separators=(",", ":")).encode()
+    return gzip.compress(body, compresslevel=level)
+
+
+class HttpUploader:
+    """Etapa duradera que publica lotes de lecturas en `url` como JSON comprimido."""
+
+    def __init__(self, url: str, metrics: Optional[GatewayMetrics] = None, headers: Optional[Dict[str, str]] = None,
+                 max_request_readings: int = UPLOAD_MAX_REQUEST_READINGS, max_in_flight: int = UPLOAD_MAX_IN_FLIGHT,
+                 max_retries: int = UPLOAD_MAX_RETRIES, timeout: float = UPLOAD_TIMEOUT):
+        self.url = url
+        self.metrics = metrics or GatewayMetrics()
+        self.headers = {"Content-Type": "application/json", "Content-Encoding": "gzip", **(headers or {})}
+        self.max_request_readings = max_request_readings
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Una sola sesión: las conexiones (y el handshake TLS) se reutilizan entre lotes
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        return self._session
+
+    async def __call__(self, readings: List[SensorReading]) -> None:
+        session = self._get_session()
+        # Se reparte el lote entre las peticiones simultáneas permitidas
+        size = max(UPLOAD_MIN_REQUEST_READINGS, math.ceil(len(readings) / self.max_in_flight))
+        size = min(size, self.max_request_readings)
+        chunks = [readings[i:i + size] for i in range(0, len(readings), size)]
+        results = await asyncio.gather(*(self._send(session, chunk) for chunk in chunks), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def _send(self, session: aiohttp.ClientSession, readings: List[SensorReading]) -> None:
+        body = encode_batch(readings)
+        attempt = 0
+        while True:
+            async with self._in_flight:
+                start = time.monotonic()
+                try:
+                    async with session.post(self.url, data=body, headers=self.headers) as response:
+                        await response.read()
+                        status = response.status
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status = None
+                    error = f"{type(e).__name__} - {e}"
+                latency = time.monotonic() - start
+
+            if status is not None and status < 300:
+                self.metrics.increment("uploader.requests")
+                self.metrics.increment("uploader.readings", len(readings))
+                self.metrics.increment("uploader.bytes_sent", len(body))
+                self.metrics.set("uploader.last_latency_ms", round(latency * 1000, 1))
+                self.metrics.set("uploader.bytes_per_reading", round(len(body) / len(readings), 1))
+                return
+            if status is not None and status < 500 and status not in RETRYABLE_STATUS:
+                # El servidor rechaza el contenido: reintentar no lo arreglaría y bloquearía la cola
+                self.metrics.increment("uploader.rejected", len(readings))
+                logging.error(f"El servidor rechazó {len(readings)} lecturas con HTTP {status}. Se descartan.")
+                return
+
+            if status is not None:
+                error = f"HTTP {status}"
+            attempt += 1
+            self.metrics.increment("uploader.retries")
+            if attempt > self.max_retries:
+                raise UploadError(f"Envío de {len(readings)} lecturas fallido tras {self.max_retries} reintentos: {error}")
+            delay = min(UPLOAD_RETRY_MAX, UPLOAD_RETRY_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            logging.debug(f"Envío fallido ({error}), reintento {attempt} en {delay:.1f} s")
+            await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+if __name__ == "__main__":
+    # Prueba contra un servidor HTTP local: python sensor_uploader.py [lecturas] [lecturas_por_lote]
+    import sys
+
+    from aiohttp import web
+
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    async def bench():
+        received = {"readings": 0, "requests": 0, "connections": set()}
+
+        async def handle(request: web.Request) -> web.Response:
+            # aiohttp descomprime el cuerpo según Content-Encoding
+            readings = await request.json()
+            received["readings"] += len(readings)
+            received["requests"] += 1
+            received["connections"].add(request.transport)
+            return web.Response(status=204)
+
+        app = web.Application()
+        app.router.add_post("/readings", handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        metrics = GatewayMetrics()
+        uploader = HttpUploader(f"http://127.0.0.1:{port}/readings", metrics)
+        base = time.time()
+        readings = [
+            SensorReading("radio0", f"{n % 1000:016x}", n % 1000, 1 + n % 3, "Sensor Corriente", n * 0.01, base + n)
+            for n in range(total)
+        ]
+        start = time.perf_counter()
+        for i in range(0, total, batch_size):
+            await uploader(readings[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        await uploader.close()
+        await runner.cleanup()
+
+        stats = metrics.snapshot()
+        print(f"{received['readings']} lecturas en {received['requests']} peticiones por "
+              f"{len(received['connections'])} conexiones, {elapsed:.2f} s = {total / elapsed:.0f} lecturas/s, "
+              f"{stats['uploader.bytes_sent'] / total:.1f} bytes/lectura (cuerpo comprimido)")
+
+    asyncio.run(bench())
@@ -0,0 +1,417 @@
+"""Cola persistente en disco (write-ahead log) para las etapas lentas del pipeline.
+
+Las lecturas se añaden a ficheros de segmento de solo escritura al final. Cada
+registro lleva delante su longitud y su CRC32, de modo que un corte de luz deja como
+mucho un registro incompleto al final del último segmento, que se descarta al abrir.
+Los fsync se agrupan (por número de registros o por tiempo) y se hacen en un hilo
+propio: `append` se llama desde el bucle de eventos (`ReadingPipeline.submit`) y un
+fsync en una tarjeta SD puede tardar decenas de milisegundos.
+
+Cada consumidor (p. ej. el envío HTTP o la base de datos local) lee desde su propio
+offset y lo confirma con `ack` cuando la lectura se ha entregado. Si el destino se cae,
+las lecturas siguen acumulándose en disco, no en memoria, y al volver se recuperan a
+la máxima velocidad leyendo los segmentos secuencialmente. El espacio en disco está
+acotado: los segmentos ya confirmados por todos se borran y, si aun así se supera el
+límite, se descarta el segmento más antiguo.
+"""
+import asyncio
+import bisect
+import concurrent.futures
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+
+WAL_SEGMENT_BYTES = 8 * 1024 * 1024  # Tamaño a partir del cual se abre un segmento nuevo
+WAL_MAX_BYTES = 512 * 1024 * 1024  # Espacio máximo en disco de la cola
+WAL_FSYNC_RECORDS = 1000  # Registros sin fsync antes de forzarlo
+WAL_FSYNC_INTERVAL = 1.0  # Segundos máximos sin fsync
+
+SEGMENT_SUFFIX = ".seg"
+ACK_SUFFIX = ".ack"
+
+_HEADER = struct.Struct("<II")  # longitud del registro, CRC32
+_FIXED = struct.Struct("<ddHHBBB")  # timestamp, valor, nwk, atributo, longitudes de las 3 cadenas
+_INVALID = b"\x00"  # Byte final de las lecturas no válidas; los registros sin él son válidos
+
+
+def encode_reading(reading: SensorReading) -> bytes:
+    shard = reading.shard.encode()[:255]
+    ieee = reading.ieee.encode()[:255]
+    name = reading.sensor_name.encode()[:255]
+    payload = _FIXED.pack(
+        reading.timestamp, reading.value, reading.nwk, reading.attribute_id,
+        len(shard), len(ieee), len(name),
+    ) + shard + ieee + name + (b"" if reading.valid else _INVALID)
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_reading(payload: bytes) -> SensorReading:
+    timestamp, value, nwk, attribute_id, len_shard, len_ieee, len_name = _FIXED.unpack_from(payload)
+    pos = _FIXED.size
+    shard = payload[pos:pos + len_shard].decode()
+    pos += len_shard
+    ieee = payload[pos:pos + len_ieee].decode()
+    pos += len_ieee
+    name = payload[pos:pos + len_name].decode()
+    pos += len_name
+    return SensorReading(shard=shard, ieee=ieee, nwk=nwk, attribute_id=attribute_id,
+                         sensor_name=name, value=value, timestamp=timestamp,
+                         valid=payload[pos:pos + 1] != _INVALID)
+
+
+def _read_record(f) -> Optional[bytes]:
+    """Lee un registro completo y válido, o devuelve None (fin de datos o registro dañado)."""
+    header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    length, crc = _HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != crc:
+        return None
+    return payload
+
+
+def _fsync(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logging.error(f"WAL: fsync fallido: {e}")
+
+
+def _fsync_and_close(f) -> None:
+    """Cierre de un segmento lleno, en el hilo del WAL detrás de los fsync pendientes."""
+    try:
+        _fsync(f.fileno())
+    finally:
+        f.close()
+
+
+class _Consumer:
+    def __init__(self, name: str, acked: int):
+        self.name = name
+        self.acked = acked  # Siguiente offset pendiente de confirmar
+        self.next = acked  # Siguiente offset a leer
+        self.file = None
+        self.segment: Optional[int] = None  # Offset inicial del segmento abierto
+        self.event = asyncio.Event()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.segment = None
+
+
+class WriteAheadQueue:
+    """Cola en disco con varios consumidores, cada uno con su offset confirmado."""
+
+    def __init__(self, directory: str, metrics: Optional[GatewayMetrics] = None,
+                 segment_bytes: int = WAL_SEGMENT_BYTES, max_bytes: int = WAL_MAX_BYTES,
+                 fsync_records: int = WAL_FSYNC_RECORDS, fsync_interval: float = WAL_FSYNC_INTERVAL):
+        self.directory = directory
+        self.metrics = metrics or GatewayMetrics()
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_records = fsync_records
+        self.fsync_interval = fsync_interval
+
+        self._segments: List[int] = []  # Offsets iniciales, ordenados
+        self._sizes: Dict[int, int] = {}
+        self._consumers: Dict[str, _Consumer] = {}
+        self._writer = None
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+        # Un solo hilo: los fsync y cierres de segmento se ejecutan en orden
+        self._fsync_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="wal-fsync")
+        self._fsync_pending: Optional[concurrent.futures.Future] = None
+        self.next_offset = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _segment_path(self, start: int) -> str:
+        return os.path.join(self.directory, f"{start:020d}{SEGMENT_SUFFIX}")
+
+    def _recover(self) -> None:
+        for filename in os.listdir(self.directory):
+            if filename.endswith(SEGMENT_SUFFIX):
+                start = int(filename[:-len(SEGMENT_SUFFIX)])
+                self._segments.append(start)
+                self._sizes[start] = os.path.getsize(self._segment_path(start))
+        self._segments.sort()
+
+        if self._segments:
+            # Solo el último segmento puede tener un registro a medio escribir
+            start = self._segments[-1]
+            path = self._segment_path(start)
+            count = 0
+            valid = 0
+            with open(path, "rb") as f:
+                while _read_record(f) is not None:
+                    count += 1
+                    valid = f.tell()
+            if valid != self._sizes[start]:
+                logging.warning(f"WAL: descartados {self._sizes[start] - valid} bytes incompletos al final de {path}")
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+                self._sizes[start] = valid
+            self.next_offset = start + count
+        else:
+            for filename in os.listdir(self.directory):
+                if filename.endswith(ACK_SUFFIX):
+                    self.next_offset = max(self.next_offset, self._load_ack(filename[:-len(ACK_SUFFIX)]))
+
+        if not self._segments or self._sizes[self._segments[-1]] >= self.segment_bytes:
+            self._open_segment(self.next_offset)
+        else:
+            self._writer = open(self._segment_path(self._segments[-1]), "ab")
+
+    def _open_segment(self, start: int) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+            self._fsync_executor.submit(_fsync_and_close, self._writer)
+            self.metrics.increment("wal.fsyncs")
+            self._unsynced = 0
+        self._writer = open(self._segment_path(start), "ab")
+        if start not in self._sizes:
+            self._segments.append(start)
+            self._sizes[start] = 0
+
+    def _load_ack(self, name: str) -> int:
+        try:
+            with open(os.path.join(self.directory, name + ACK_SUFFIX)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _store_ack(self, consumer: _Consumer) -> None:
+        path = os.path.join(self.directory, consumer.name + ACK_SUFFIX)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(consumer.acked))
+        os.replace(path + ".tmp", path)
+
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def append(self, reading: SensorReading) -> int:
+        """Añade una lectura y devuelve su offset. Nunca bloquea esperando a un consumidor."""
+        record = encode_reading(reading)
+        self._writer.write(record)
+        offset = self.next_offset
+        self.next_offset += 1
+        self._sizes[self._segments[-1]] += len(record)
+        self._unsynced += 1
+        self.metrics.increment("wal.appended")
+
+        if self._sizes[self._segments[-1]] >= self.segment_bytes:
+            self._open_segment(self.next_offset)
+            self._enforce_limits()
+        elif self._unsynced >= self.fsync_records:
+            self._sync_in_background()
+
+        for consumer in self._consumers.values():
+            consumer.event.set()
+        return offset
+
+    def flush(self) -> None:
+        """Pasa al sistema operativo lo escrito (sin fsync), para que lo vean los lectores."""
+        self._writer.flush()
+
+    def _sync_in_background(self) -> None:
+        """Pasa lo escrito al sistema operativo y encarga el fsync al hilo del WAL, sin esperarlo."""
+        if self._fsync_pending is not None and not self._fsync_pending.done():
+            return  # Se agrupa con el siguiente: `_unsynced` sigue contando
+        if self._unsynced:
+            self._writer.flush()
+            self._fsync_pending = self._fsync_executor.submit(_fsync, self._writer.fileno())
+            self.metrics.increment("wal.fsyncs")
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def sync(self) -> None:
+        """fsync síncrono de todo lo escrito (al cerrar). Espera también a los fsync en curso."""
+        if self._unsynced:
+            self._writer.flush()
+            self._fsync_pending = self._fsync_executor.submit(_fsync, self._writer.fileno())
+            self.metrics.increment("wal.fsyncs")
+        if self._fsync_pending is not None:
+            self._fsync_pending.result()
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    async def run_syncer(self) -> None:
+        """Garantiza un fsync al menos cada `fsync_interval` segundos aunque haya poco tráfico."""
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._sync_in_background()
+
+    def consumer(self, name: str) -> None:
+        """Registra un consumidor, continuando desde su último offset confirmado."""
+        if name in self._consumers:
+            return
+        acked = self._load_ack(name)
+        if self._segments:
+            acked = min(max(acked, self._segments[0]), self.next_offset)
+        consumer = self._consumers[name] = _Consumer(name, acked)
+        if consumer.acked < self.next_offset:
+            consumer.event.set()
+
+    def lag(self, name: str) -> int:
+        """Lecturas escritas y aún no confirmadas por el consumidor."""
+        return self.next_offset - self._consumers[name].acked
+
+    def read(self, name: str, max_records: int = 500) -> List[Tuple[int, SensorReading]]:
+        """Devuelve hasta `max_records` lecturas a partir de la última leída por el consumidor."""
+        consumer = self._consumers[name]
+        if consumer.next >= self.next_offset:
+            consumer.event.clear()
+            return []
+        self.flush()
+
+        if consumer.next < self._segments[0]:
+            # Lo pendiente se descartó por el límite de disco
+            consumer.close()
+            consumer.next = self._segments[0]
+
+        batch = []
+        while len(batch) < max_records and consumer.next < self.next_offset:
+            if consumer.file is None:
+                self._seek(consumer)
+            payload = _read_record(consumer.file)
+            if payload is None:
+                following = bisect.bisect_right(self._segments, consumer.segment)
+                if following < len(self._segments):
+                    if consumer.next != self._segments[following]:
+                        logging.error(f"WAL: registro dañado en el segmento {consumer.segment}, "
+                                      f"se saltan {self._segments[following] - consumer.next} lecturas")
+                        self.metrics.increment("wal.corrupt_skipped", self._segments[following] - consumer.next)
+                    consumer.close()
+                    consumer.next = self._segments[following]
+                    continue
+                break
+            batch.append((consumer.next, decode_reading(payload)))
+            consumer.next += 1
+
+        if consumer.next >= self.next_offset:
+            consumer.event.clear()
+        return batch
+
+    def _seek(self, consumer: _Consumer) -> None:
+        index = bisect.bisect_right(self._segments, consumer.next) - 1
+        start = self._segments[index]
+        consumer.file = open(self._segment_path(start), "rb")
+        consumer.segment = start
+        # Saltar los registros ya leídos del segmento (solo al arrancar o tras un descarte)
+        for _ in range(consumer.next - start):
+            header = consumer.file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                break
+            consumer.file.seek(_HEADER.unpack(header)[0], os.SEEK_CUR)
+
+    def rewind(self, name: str) -> None:
+        """Vuelve a leer desde el último offset confirmado (p. ej. tras un fallo del destino)."""
+        consumer = self._consumers[name]
+        consumer.close()
+        consumer.next = consumer.acked
+        if consumer.acked < self.next_offset:
+            consumer.event.set()
+
+    def ack(self, name: str, offset: int) -> None:
+        """Confirma que el consumidor ha entregado todas las lecturas hasta `offset` incluido."""
+        consumer = self._consumers[name]
+        if offset + 1 <= consumer.acked:
+            return
+        consumer.acked = offset + 1
+        self._store_ack(consumer)
+        self._delete_acked_segments()
+
+    async def wait(self, name: str) -> None:
+        """Espera a que haya lecturas nuevas para el consumidor."""
+        await self._consumers[name].event.wait()
+
+    def _delete_acked_segments(self) -> None:
+        if not self._consumers:
+            return
+        min_acked = min(consumer.acked for consumer in self._consumers.values())
+        while len(self._segments) > 1 and self._segments[1] <= min_acked:
+            self._delete_oldest()
+
+    def _enforce_limits(self) -> None:
+        self._delete_acked_segments()
+        while len(self._segments) > 1 and self.total_bytes() > self.max_bytes:
+            start = self._segments[0]
+            oldest_acked = min((c.acked for c in self._consumers.values()), default=start)
+            lost = self._segments[1] - max(start, oldest_acked)
+            logging.warning(f"WAL: límite de {self.max_bytes} bytes superado, se descarta el segmento {start}")
+            self.metrics.increment("wal.evicted_segments")
+            self.metrics.increment("wal.evicted_records", max(lost, 0))
+            self._delete_oldest()
+
+    def _delete_oldest(self) -> None:
+        start = self._segments.pop(0)
+        del self._sizes[start]
+        for consumer in self._consumers.values():
+            if consumer.segment == start:
+                consumer.close()
+            if consumer.acked < self._segments[0]:
+                consumer.acked = self._segments[0]
+                self._store_ack(consumer)
+            consumer.next = max(consumer.next, consumer.acked)
+        os.remove(self._segment_path(start))
+
+    def update_metrics(self) -> None:
+        self.metrics.set("wal.bytes", self.total_bytes())
+        self.metrics.set("wal.segments", len(self._segments))
+        for name in self._consumers:
+            self.metrics.set(f"wal.lag.{name}", self.lag(name))
+
+    def close(self) -> None:
+        for consumer in self._consumers.values():
+            consumer.close()
+        if self._writer is not None:
+            self.sync()
+            self._writer.close()
+            self._writer = None
+        self._fsync_executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    # Simula un corte del destino de varias horas y mide la recuperación:
+    # python sensor_wal.py [horas] [lecturas_por_segundo]
+    import sys
+    import tempfile
+
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    total = int(hours * 3600 * rate)
+    base = time.time() - hours * 3600
+
+    with tempfile.TemporaryDirectory() as directory:
+        wal = WriteAheadQueue(directory, max_bytes=4 * 1024 ** 3)
+        wal.consumer("bench")
+        start = time.perf_counter()
+        for n in range(total):
+            wal.append(SensorReading("radio0", f"{n % 1000:016x}", n % 1000, 1 + n % 3,
+                                     "Sensor Corriente", n * 0.001, base + n / rate))
+        wal.sync()
+        write_time = time.perf_counter() - start
+        print(f"Escritura: {total} lecturas ({wal.total_bytes() / 1024 ** 2:.1f} MiB, "
+              f"{len(wal._segments)} segmentos) en {write_time:.2f} s = {total / write_time:.0f} lecturas/s")
+
+        start = time.perf_counter()
+        replayed = 0
+        while True:
+            batch = wal.read("bench", 5000)
+            if not batch:
+                break
+            replayed += len(batch)
+            wal.ack("bench", batch[-1][0])
+        replay_time = time.perf_counter() - start
+        print(f"Recuperación: {replayed} lecturas en {replay_time:.2f} s = {replayed / replay_time:.0f} lecturas/s")
+        wal.close()
@@ -19,6 +19,8 @@ else:
 
 from zigpy.types import BaseDataclassMixin
 
+from bellows.capture import SerialCapture
+from bellows.trace import FrameTracer, TraceStage
 import bellows.types as t
 
 _LOGGER = logging.getLogger(__name__)
@@ -356,8 +358,15 @@ def parse_frame(
 
 
 class AshProtocol(asyncio.Protocol):
-    def __init__(self, ezsp_protocol) -> None:
+    def __init__(
+        self,
+        ezsp_protocol,
+        tracer: FrameTracer | None = None,
+        capture: SerialCapture | None = None,
+    ) -> None:
         self._ezsp_protocol = ezsp_protocol
+        self._tracer = tracer
+        self._capture = capture
         self._transport = None
         self._buffer = bytearray()
         self._discarding_until_next_flag: bool = False
@@ -376,6 +385,12 @@ class AshProtocol(asyncio.Protocol):
 
     def connection_lost(self, exc: Exception | None) -> None:
         self._transport = None
+
+        if self._tracer is not None and exc is not None:
+            self._tracer.dump_on_error(
+                TraceStage.CONNECTION_LOST, repr(exc).encode("utf-8", "replace")
+            )
+
         self._cancel_pending_data_frames()
         self._ezsp_protocol.connection_lost(exc)
 
@@ -431,7 +446,15 @@ class AshProtocol(asyncio.Protocol):
         return out
 
     def data_received(self, data: bytes) -> None:
-        _LOGGER.debug("Received data %s", data.hex())
+        if self._capture is not None:
+            self._capture.write_rx(data)
+
+        if self._tracer is not None:
+            self._tracer.record(TraceStage.ASH_RX_DATA, data)
+
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Received data %s", data.hex())
+
         self._buffer.extend(data)
 
         if len(self._buffer) > MAX_BUFFER_SIZE:
@@ -470,6 +493,10 @@ class AshProtocol(asyncio.Protocol):
 
                 try:
                     data = self._unstuff_bytes(frame_bytes)
+
+                    if self._tracer is not None:
+                        self._tracer.record(TraceStage.ASH_RX_FRAME, data)
+
                     frame = parse_frame(data)
                 except Exception:
                     _LOGGER.debug(
@@ -518,7 +545,8 @@ class AshProtocol(asyncio.Protocol):
             self._pending_data_frames[ack_num].set_result(True)
 
     def frame_received(self, frame: AshFrame) -> None:
-        _LOGGER.debug("Received frame %r", frame)
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Received frame %r", frame)
 
         # If a frame has ACK information (DATA, ACK, or NAK), it should be used even if
         # the frame is out of sequence or invalid
@@ -585,6 +613,10 @@ class AshProtocol(asyncio.Protocol):
 
     def _enter_failed_state(self, reset_code: t.NcpResetCode) -> None:
         self._ncp_state = NcpState.FAILED
+
+        if self._tracer is not None:
+            self._tracer.dump_on_error(TraceStage.NCP_FAILED, bytes([reset_code]))
+
         self._cancel_pending_data_frames(NcpFailure(code=reset_code))
         self._ezsp_protocol.reset_received(reset_code)
 
@@ -598,13 +630,24 @@ class AshProtocol(asyncio.Protocol):
         if self._transport is None or self._transport.is_closing():
             raise NcpFailure("Transport is closed, cannot send frame")
 
-        if _LOGGER.isEnabledFor(logging.DEBUG):
+        debug_enabled = _LOGGER.isEnabledFor(logging.DEBUG)
+
+        if debug_enabled:
             prefix_str = "".join([f"{r.name} + " for r in prefix])
             suffix_str = "".join([f" + {r.name}" for r in suffix])
             _LOGGER.debug("Sending frame %s%r%s", prefix_str, frame, suffix_str)
 
         data = bytes(prefix) + self._stuff_bytes(frame.to_bytes()) + bytes(suffix)
-        _LOGGER.debug("Sending data  %s", data.hex())
+
+        if debug_enabled:
+            _LOGGER.debug("Sending data  %s", data.hex())
+
+        if self._tracer is not None:
+            self._tracer.record(TraceStage.ASH_TX_DATA, data)
+
+        if self._capture is not None:
+            self._capture.write_tx(data)
+
         self._transport.write(data)
 
     def _change_ack_timeout(self, new_value: float) -> None:
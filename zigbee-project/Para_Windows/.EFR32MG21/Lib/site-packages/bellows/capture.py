@@ -0,0 +1,258 @@
+"""Raw serial capture of the bytes exchanged with the NCP.
+
+Everything `AshProtocol` reads from and writes to the serial port is appended to a
+capture file with a timestamp, exactly as it crossed the port: the file can later be
+fed back into a fresh stack with `bellows.replay` to reproduce an incident or to
+benchmark the receive path with real traffic.
+
+File layout (little endian):
+
+    header:  magic "BCAP", version (u8), start time (f64, seconds since the epoch)
+    record:  time since start (u64, microseconds), direction (u8), length (u16), data
+
+A sidecar index file (`<capture>.idx`) holds a `(time, offset)` pair for every
+`CAPTURE_INDEX_INTERVAL` records so a reader can seek to a point in time without
+scanning the whole capture. It is rebuilt by scanning if missing.
+"""
+
+from __future__ import annotations
+
+import bisect
+import dataclasses
+import enum
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from typing import Any, Iterator
+
+_LOGGER = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"BCAP"
+CAPTURE_VERSION = 1
+CAPTURE_INDEX_INTERVAL = 1024  # Records between index entries
+CAPTURE_FLUSH_INTERVAL = 1.0  # Seconds between flushes of the write buffer
+CAPTURE_BUFFER_SIZE = 64 * 1024
+
+_FILE_HEADER = struct.Struct("<4sBd")
+_RECORD_HEADER = struct.Struct("<QBH")
+_INDEX_ENTRY = struct.Struct("<QQ")
+_MAX_RECORD_DATA = 0xFFFF
+
+
+class Direction(enum.IntEnum):
+    RX = 0  # NCP -> host
+    TX = 1  # Host -> NCP
+    META = 2  # JSON metadata written by the host, e.g. the EZSP version
+
+
+@dataclasses.dataclass(frozen=True)
+class CaptureRecord:
+    timestamp: float  # Seconds since the epoch
+    direction: Direction
+    data: bytes
+
+
+class SerialCapture:
+    """Append-only writer of a capture file, safe to use from the serial thread."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.records = 0
+        self._lock = threading.Lock()
+        self._since_index = 0
+        self._last_flush = time.monotonic()
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= _FILE_HEADER.size
+
+        if exists:
+            self._start = self._recover()
+            self._file = open(path, "ab", buffering=CAPTURE_BUFFER_SIZE)
+        else:
+            self._start = time.time()
+            self._file = open(path, "wb", buffering=CAPTURE_BUFFER_SIZE)
+            self._file.write(
+                _FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, self._start)
+            )
+            self._truncate_index(0)
+
+        self._index = open(f"{path}.idx", "ab")
+        self._offset = self._file.tell()
+
+    def _recover(self) -> float:
+        """Validate an existing capture and cut a record torn by a crash."""
+        with open(self.path, "rb") as f:
+            start = _read_header(f)
+            index = _read_index(f"{self.path}.idx")
+            offset = index[-1][1] if index else _FILE_HEADER.size
+            end = _scan_end(f, offset)
+
+        if end != os.path.getsize(self.path):
+            _LOGGER.warning("Truncating torn record at the end of %s", self.path)
+            os.truncate(self.path, end)
+
+        self._truncate_index(end)
+        return start
+
+    def _truncate_index(self, end: int) -> None:
+        entries = [
+            entry for entry in _read_index(f"{self.path}.idx") if entry[1] < end
+        ]
+        with open(f"{self.path}.idx", "wb") as f:
+            for entry in entries:
+                f.write(_INDEX_ENTRY.pack(*entry))
+
+    def write(self, direction: Direction, data: bytes) -> None:
+        now = time.time()
+        time_us = max(0, int((now - self._start) * 1_000_000))
+
+        with self._lock:
+            if self._file is None:
+                return
+
+            for start in range(0, max(len(data), 1), _MAX_RECORD_DATA):
+                chunk = data[start : start + _MAX_RECORD_DATA]
+
+                if self._since_index == 0:
+                    self._index.write(_INDEX_ENTRY.pack(time_us, self._offset))
+
+                self._file.write(_RECORD_HEADER.pack(time_us, direction, len(chunk)))
+                self._file.write(chunk)
+                self._offset += _RECORD_HEADER.size + len(chunk)
+                self._since_index = (self._since_index + 1) % CAPTURE_INDEX_INTERVAL
+                self.records += 1
+
+            if direction == Direction.META or (
+                time.monotonic() - self._last_flush > CAPTURE_FLUSH_INTERVAL
+            ):
+                self._flush()
+
+    def write_rx(self, data: bytes) -> None:
+        self.write(Direction.RX, data)
+
+    def write_tx(self, data: bytes) -> None:
+        self.write(Direction.TX, data)
+
+    def write_meta(self, **meta: Any) -> None:
+        self.write(Direction.META, json.dumps(meta).encode())
+
+    def _flush(self) -> None:
+        self._file.flush()
+        self._index.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is None:
+                return
+
+            self._file.close()
+            self._index.close()
+            self._file = None
+
+
+def _read_header(f) -> float:
+    magic, version, start = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+        raise ValueError(f"Not a serial capture file: {magic!r} v{version}")
+
+    return start
+
+
+def _read_index(path: str) -> list[tuple[int, int]]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+
+    usable = len(data) - len(data) % _INDEX_ENTRY.size
+    return list(_INDEX_ENTRY.iter_unpack(data[:usable]))
+
+
+def _scan_end(f, offset: int) -> int:
+    """Return the offset just after the last complete record, starting at `offset`."""
+    f.seek(offset)
+
+    while True:
+        header = f.read(_RECORD_HEADER.size)
+        if len(header) < _RECORD_HEADER.size:
+            return offset
+
+        _, _, length = _RECORD_HEADER.unpack(header)
+        if len(f.read(length)) < length:
+            return offset
+
+        offset += _RECORD_HEADER.size + length
+
+
+class CaptureReader:
+    """Sequential and time-indexed access to a capture file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        with open(path, "rb") as f:
+            self.start = _read_header(f)
+
+        self.index = _read_index(f"{path}.idx") or self._build_index()
+
+    def _build_index(self) -> list[tuple[int, int]]:
+        index = []
+
+        for count, (offset, time_us, _, _) in enumerate(self._iter_raw()):
+            if count % CAPTURE_INDEX_INTERVAL == 0:
+                index.append((time_us, offset))
+
+        return index
+
+    def _iter_raw(self, offset: int = _FILE_HEADER.size):
+        with open(self.path, "rb", buffering=CAPTURE_BUFFER_SIZE) as f:
+            f.seek(offset)
+
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return
+
+                time_us, direction, length = _RECORD_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length:
+                    return  # Torn record at the end of a capture still being written
+
+                yield offset, time_us, direction, data
+                offset += _RECORD_HEADER.size + length
+
+    def records(self, since: float | None = None) -> Iterator[CaptureRecord]:
+        """Iterate over the records, optionally starting at the epoch time `since`."""
+        offset = _FILE_HEADER.size
+        since_us = None
+
+        if since is not None:
+            since_us = int((since - self.start) * 1_000_000)
+            position = bisect.bisect_right(self.index, (since_us, float("inf"))) - 1
+            if position >= 0:
+                offset = self.index[position][1]
+
+        for _, time_us, direction, data in self._iter_raw(offset):
+            if since_us is not None and time_us < since_us:
+                continue
+
+            yield CaptureRecord(
+                self.start + time_us / 1_000_000, Direction(direction), data
+            )
+
+    def __iter__(self) -> Iterator[CaptureRecord]:
+        return self.records()
+
+    def metadata(self) -> dict[str, Any]:
+        """Merge all of the metadata records of the capture, later ones win."""
+        meta: dict[str, Any] = {}
+
+        for record in self.records():
+            if record.direction == Direction.META:
+                meta.update(json.loads(record.data))
+
+        return meta
@@ -1,2 +1,2 @@
 # flake8: noqa
-from . import application, backup, dump, ncp, network, stream, tone
+from . import application, backup, dump, ncp, network, replay, stream, tone
@@ -0,0 +1,53 @@
+import click
+
+from bellows.replay import STACK_APP, STACKS, ReplayDriver
+
+from . import util
+from .main import main
+
+
+@main.command()
+@click.argument("capture", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-s",
+    "--stack",
+    type=click.Choice(STACKS),
+    default=STACK_APP,
+    show_default=True,
+    help="Highest layer the captured frames are delivered to",
+)
+@click.option(
+    "-r", "--realtime", is_flag=True, default=False, help="Keep the captured timing"
+)
+@click.option("--speed", type=click.FLOAT, default=1.0, show_default=True)
+@click.option(
+    "-D",
+    "--database",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="zigpy database to load the known devices from",
+)
+@click.option("--ezsp-version", type=click.INT, default=None)
+@click.option(
+    "--from-start",
+    is_flag=True,
+    default=False,
+    help="Also replay the startup handshake before the first metadata record",
+)
+@click.pass_context
+@util.background
+async def replay(
+    ctx, capture, stack, realtime, speed, database, ezsp_version, from_start
+):
+    """Replay a serial CAPTURE into a fresh stack, without a radio."""
+    driver = ReplayDriver(
+        capture,
+        stack=stack,
+        realtime=realtime,
+        speed=speed,
+        database=database,
+        ezsp_version=ezsp_version,
+        from_start=from_start,
+    )
+    stats = await driver.run()
+    click.echo(str(stats))
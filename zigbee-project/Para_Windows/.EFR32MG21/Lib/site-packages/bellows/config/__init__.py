@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Any, Callable
+
 import voluptuous as vol
 from zigpy.config import (  # noqa: F401 pylint: disable=unused-import
     CONF_DEVICE,
@@ -20,12 +22,30 @@ from zigpy.config import (  # noqa: F401 pylint: disable=unused-import
 
 CONF_BELLOWS_CONFIG = "bellows_config"
 CONF_MANUAL_SOURCE_ROUTING = "manual_source_routing"
+CONF_THREAD_LOOP_FACTORY = "thread_loop_factory"
+CONF_FRAME_TRACE_RECORDS = "frame_trace_records"
+CONF_FRAME_TRACE_PATH = "frame_trace_path"
+CONF_SERIAL_CAPTURE_PATH = "serial_capture_path"
+CONF_ADAPTIVE_CONCURRENCY = "adaptive_concurrency"
+CONF_CONCURRENCY_FLOOR = "concurrency_floor"
+CONF_CONCURRENCY_CEILING = "concurrency_ceiling"
+CONF_CONCURRENCY_MIN_FREE_BUFFERS = "concurrency_min_free_buffers"
 
 CONF_USE_THREAD = "use_thread"
 CONF_EZSP_CONFIG = "ezsp_config"
 CONF_EZSP_POLICIES = "ezsp_policies"
 CONF_PARAM_MAX_WATCHDOG_FAILURES = "max_watchdog_failures"
 
+
+def cv_optional_callable(value: Any) -> Callable | None:
+    """Voluptuous validator for an optional callable, e.g. a factory function."""
+
+    if value is not None and not callable(value):
+        raise vol.Invalid(f"{value!r} is not callable")
+
+    return value
+
+
 CONFIG_SCHEMA = CONFIG_SCHEMA.extend(
     {
         vol.Optional(CONF_PARAM_MAX_WATCHDOG_FAILURES, default=4): int,
@@ -38,6 +58,30 @@ CONFIG_SCHEMA = CONFIG_SCHEMA.extend(
         vol.Optional(CONF_BELLOWS_CONFIG, default={}): vol.Schema(
             {
                 vol.Optional(CONF_MANUAL_SOURCE_ROUTING, default=False): bool,
+                # Creates the event loop of the serial thread when `use_thread` is set
+                vol.Optional(
+                    CONF_THREAD_LOOP_FACTORY, default=None
+                ): cv_optional_callable,
+                # Keeps the last N serial frames in memory (0 disables the tracer)
+                vol.Optional(CONF_FRAME_TRACE_RECORDS, default=0): vol.All(
+                    int, vol.Range(min=0)
+                ),
+                # Where the trace is dumped when the NCP fails or the port is lost
+                vol.Optional(CONF_FRAME_TRACE_PATH, default=None): vol.Maybe(str),
+                # Appends every byte read from and written to the port to this file
+                vol.Optional(CONF_SERIAL_CAPTURE_PATH, default=None): vol.Maybe(str),
+                # Adjusts `max_concurrent_requests` from the NCP buffers and send results
+                vol.Optional(CONF_ADAPTIVE_CONCURRENCY, default=False): bool,
+                vol.Optional(CONF_CONCURRENCY_FLOOR, default=2): vol.All(
+                    int, vol.Range(min=1)
+                ),
+                vol.Optional(CONF_CONCURRENCY_CEILING, default=32): vol.All(
+                    int, vol.Range(min=1)
+                ),
+                # Concurrency is cut when fewer NCP packet buffers are free
+                vol.Optional(CONF_CONCURRENCY_MIN_FREE_BUFFERS, default=40): vol.All(
+                    int, vol.Range(min=0)
+                ),
             }
         ),
     }
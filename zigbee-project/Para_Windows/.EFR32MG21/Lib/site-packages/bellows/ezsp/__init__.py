@@ -26,6 +26,8 @@ from bellows.exception import EzspError, InvalidCommandError
 from bellows.ezsp import xncp
 from bellows.ezsp.config import DEFAULT_CONFIG, RuntimeConfig, ValueConfig
 from bellows.ezsp.xncp import FirmwareFeatures, FlowControlType
+from bellows.capture import SerialCapture
+from bellows.trace import FrameTracer
 import bellows.types as t
 import bellows.uart
 
@@ -129,9 +131,23 @@ class EZSP:
         await self.version()
         await self.get_xncp_features()
 
-    async def connect(self, *, use_thread: bool = True) -> None:
+    async def connect(
+        self,
+        *,
+        use_thread: bool = True,
+        loop_factory: Callable[[], asyncio.AbstractEventLoop] | None = None,
+        tracer: FrameTracer | None = None,
+        capture: SerialCapture | None = None,
+    ) -> None:
         assert self._gw is None
-        self._gw = await bellows.uart.connect(self._config, self, use_thread=use_thread)
+        self._gw = await bellows.uart.connect(
+            self._config,
+            self,
+            use_thread=use_thread,
+            loop_factory=loop_factory,
+            tracer=tracer,
+            capture=capture,
+        )
 
         try:
             self._protocol = v4.EZSPv4(self.handle_callback, self._gw)
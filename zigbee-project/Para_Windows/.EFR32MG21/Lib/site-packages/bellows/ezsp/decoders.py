@@ -0,0 +1,298 @@
+"""Decoders of received EZSP frames, compiled once per frame schema.
+
+Generic deserialization walks the schema for every frame: every integer, enum and
+struct field is deserialized by its own `deserialize` call, slicing the remaining data
+each time. The layout of a schema is fixed, so the runs of fixed-width fields
+(integers, enums, fixed lists and structs made of them) are instead fused into a single
+`struct.Struct` unpacked in one call, and length-prefixed bytes and lists of integers
+are read in place. Types that can't be compiled fall back to their `deserialize`
+method, so the decoded values are identical to the generic path.
+"""
+
+from __future__ import annotations
+
+import enum
+import functools
+import struct
+from typing import Any, Callable
+
+import zigpy.types as zigpy_t
+
+# `(bits, signed)` of the little endian integers struct can unpack. Layouts never use
+# repeat counts, so there is one format character per unpacked value.
+_STRUCT_CODES = {
+    (8, False): "B",
+    (8, True): "b",
+    (16, False): "H",
+    (16, True): "h",
+    (32, False): "I",
+    (32, True): "i",
+    (64, False): "Q",
+    (64, True): "q",
+}
+
+# Reads a value at an offset into `data`, appending it to the list of values
+_Step = Callable[[bytes, int, list], int]
+
+# Builds a value from the tuple of a fused `struct.Struct` unpacking
+_Builder = Callable[[tuple], Any]
+
+
+def _inherits(type_: type, base: type, method: str) -> bool:
+    """Whether `type_` uses the implementation of `method` of `base`."""
+    return getattr(type_, method).__func__ is getattr(base, method).__func__
+
+
+def _int_code(type_: Any) -> str | None:
+    if not (
+        isinstance(type_, type)
+        and issubclass(type_, zigpy_t.FixedIntType)
+        and _inherits(type_, zigpy_t.FixedIntType, "deserialize")
+        and type_._byteorder == "little"
+    ):
+        return None
+
+    return _STRUCT_CODES.get((type_._bits, type_._signed))
+
+
+def _int_converter(type_: type) -> Callable[[int], Any]:
+    """Converts an unpacked integer exactly like `type_.deserialize` would."""
+    if issubclass(type_, enum.Enum):
+        members = type_._value2member_map_
+
+        def convert(value: int) -> Any:
+            try:
+                return members[value]
+            except KeyError:
+                return type_(value)
+
+        return convert
+
+    if type_.__new__ is zigpy_t.FixedIntType.__new__:
+        # The range check of `FixedIntType.__new__` can't fail for unpacked values
+        return functools.partial(int.__new__, type_)
+
+    return type_
+
+
+def _fixed_layout(type_: Any) -> tuple[str, Callable[[int], _Builder]] | None:
+    """Struct format of a fixed-width type and a factory of its builder.
+
+    The factory takes the index of the first value of the type in the unpacked tuple.
+    """
+    code = _int_code(type_)
+
+    if code is not None:
+        convert = _int_converter(type_)
+        return code, lambda i: lambda raw: convert(raw[i])
+
+    if not isinstance(type_, type):
+        return None
+
+    if (
+        issubclass(type_, zigpy_t.FixedList)
+        and _inherits(type_, zigpy_t.FixedList, "deserialize")
+        and _int_code(type_._item_type) is not None
+    ):
+        length = type_._length
+        convert = _int_converter(type_._item_type)
+
+        return _int_code(type_._item_type) * length, lambda i: lambda raw: type_(
+            [convert(value) for value in raw[i : i + length]]
+        )
+
+    if (
+        issubclass(type_, zigpy_t.Struct)
+        and type_._real_cls() is type_
+        and _inherits(type_, zigpy_t.Struct, "deserialize")
+        and type_.__new__ is zigpy_t.Struct.__new__
+        and not issubclass(type_, zigpy_t.IntStruct)
+    ):
+        layouts = []
+
+        for field in type_.fields:
+            if field.requires is not None or field.optional:
+                return None
+
+            layout = _fixed_layout(field.type)
+            if layout is None:
+                return None
+
+            layouts.append(layout)
+
+        names = [field.name for field in type_.fields]
+        fmt = "".join(code for code, _ in layouts)
+
+        def struct_builder(i: int) -> _Builder:
+            builders = []
+
+            for code, factory in layouts:
+                builders.append(factory(i))
+                i += len(code)
+
+            def build(raw: tuple) -> Any:
+                # Equivalent to `type_(**fields)`: the values already have their types
+                instance = object.__new__(type_)
+                instance.__dict__.update(
+                    zip(names, [builder(raw) for builder in builders])
+                )
+                return instance
+
+            return build
+
+        return fmt, struct_builder
+
+    return None
+
+
+def _fused_step(layouts: list[tuple[str, Callable[[int], _Builder]]]) -> _Step:
+    builders = []
+    index = 0
+
+    for code, factory in layouts:
+        builders.append(factory(index))
+        index += len(code)
+
+    fused = struct.Struct("<" + "".join(code for code, _ in layouts))
+    unpack_from = fused.unpack_from
+    size = fused.size
+
+    def step(data: bytes, offset: int, values: list) -> int:
+        end = offset + size
+
+        if len(data) < end:
+            raise ValueError(f"Data is too short to contain {size} bytes")
+
+        raw = unpack_from(data, offset)
+        values.extend([builder(raw) for builder in builders])
+        return end
+
+    return step
+
+
+def _lvbytes_step(type_: type[zigpy_t.LVBytes]) -> _Step:
+    prefix = type_._prefix_length
+
+    def step(data: bytes, offset: int, values: list) -> int:
+        start = offset + prefix
+        end = start + int.from_bytes(data[offset:start], "little")
+
+        if len(data) < start or len(data) < end:
+            raise ValueError("Data is too short")
+
+        values.append(type_(data[start:end]))
+        return end
+
+    return step
+
+
+def _lvlist_step(type_: type[zigpy_t.LVList]) -> _Step:
+    length_code = _int_code(type_._length_type)
+    length_size = struct.calcsize("<" + length_code)
+    length_struct = struct.Struct("<" + length_code)
+    item_code = _int_code(type_._item_type)
+    item_size = struct.calcsize("<" + item_code)
+    convert = _int_converter(type_._item_type)
+
+    def step(data: bytes, offset: int, values: list) -> int:
+        if len(data) < offset + length_size:
+            raise ValueError(f"Data is too short to contain {length_size} bytes")
+
+        (length,) = length_struct.unpack_from(data, offset)
+        start = offset + length_size
+        end = start + length * item_size
+
+        if len(data) < end:
+            raise ValueError(f"Data is too short to contain {length} items")
+
+        items = struct.unpack_from(f"<{length}{item_code}", data, start)
+        values.append(type_([convert(item) for item in items]))
+        return end
+
+    return step
+
+
+def _generic_step(type_: Any) -> _Step:
+    deserialize = type_.deserialize
+
+    def step(data: bytes, offset: int, values: list) -> int:
+        value, rest = deserialize(data[offset:])
+        values.append(value)
+        return len(data) - len(rest)
+
+    return step
+
+
+def _variable_step(type_: Any) -> _Step:
+    if isinstance(type_, type):
+        if issubclass(type_, zigpy_t.LVBytes) and _inherits(
+            type_, zigpy_t.LVBytes, "deserialize"
+        ):
+            return _lvbytes_step(type_)
+
+        if (
+            issubclass(type_, zigpy_t.LVList)
+            and _inherits(type_, zigpy_t.LVList, "deserialize")
+            and _int_code(type_._length_type) is not None
+            and _int_code(type_._item_type) is not None
+        ):
+            return _lvlist_step(type_)
+
+    return _generic_step(type_)
+
+
+def _compile_steps(types: list[Any]) -> list[_Step]:
+    steps = []
+    run = []
+
+    for type_ in types:
+        layout = _fixed_layout(type_)
+
+        if layout is not None:
+            run.append(layout)
+            continue
+
+        if run:
+            steps.append(_fused_step(run))
+            run = []
+
+        steps.append(_variable_step(type_))
+
+    if run:
+        steps.append(_fused_step(run))
+
+    return steps
+
+
+def compile_decoder(schema: dict[str, Any] | type) -> Callable[[bytes], tuple]:
+    """Compile the decoder of a frame schema.
+
+    The decoder returns the same `(result, remaining_data)` as the generic path: the
+    list of field values for dict schemas, the deserialized object otherwise.
+    """
+    if isinstance(schema, dict):
+        steps = _compile_steps(list(schema.values()))
+
+        def decode(data: bytes) -> tuple[list, bytes]:
+            values = []
+            offset = 0
+
+            for step in steps:
+                offset = step(data, offset, values)
+
+            return values, data[offset:]
+
+        return decode
+
+    if _fixed_layout(schema) is None:
+        # Invalid schemas still only fail when the frame is received
+        return lambda data: schema.deserialize(data)
+
+    (step,) = _compile_steps([schema])
+
+    def decode_single(data: bytes) -> tuple[Any, bytes]:
+        values = []
+        offset = step(data, 0, values)
+        return values[0], data[offset:]
+
+    return decode_single
@@ -1,10 +1,24 @@
 """Implements APS fragmentation reassembly on the EZSP Host side,
 mirroring the logic from fragmentation.c in the EmberZNet stack.
+
+Every fragment but the last one of a message has the same size, so a message is
+reassembled in place into a buffer allocated once `fragment_count` and that size are
+known, with a bitmap of the fragments received. The memory held by partial messages is
+bounded: when a new message would exceed the entry or byte caps, the least recently
+updated partial messages are evicted first, and a single sender can only hold a few
+partial messages at a time so a misbehaving node cannot push out everyone else's.
+
+Only the bytes actually received count towards the byte cap. The size a message claims
+(`fragment_count` times the fragment size) is not trusted for eviction, otherwise a
+single small fragment claiming hundreds of fragments could push out every legitimate
+partial message; it is only used to drop messages that could never fit, which also
+bounds each preallocated buffer by the byte cap.
 """
 
 from __future__ import annotations
 
 import asyncio
+import collections
 import logging
 
 LOGGER = logging.getLogger(__name__)
@@ -13,34 +27,101 @@ LOGGER = logging.getLogger(__name__)
 # If not all fragments arrive within this time, we discard the partial data.
 FRAGMENT_TIMEOUT = 10
 
+# Limits on the partial messages kept in memory at any time
+FRAGMENT_MAX_ENTRIES = 16
+FRAGMENT_MAX_ENTRIES_PER_SENDER = 4
+FRAGMENT_MAX_BYTES = 64 * 1024
+
 # store partial data keyed by (sender, aps_sequence, profile_id, cluster_id)
 FragmentKey = tuple[int, int, int, int]
 
 
 class _FragmentEntry:
-    def __init__(self, fragment_count: int):
+    __slots__ = (
+        "fragment_count",
+        "fragments_received",
+        "received",
+        "received_bytes",
+        "block_size",
+        "buffer",
+        "last_fragment",
+        "deadline",
+        "timer",
+    )
+
+    def __init__(self, fragment_count: int) -> None:
         self.fragment_count = fragment_count
         self.fragments_received = 0
-        self.fragment_data = {}
+        self.received = 0  # Bitmap of the received fragment indices
+        self.received_bytes = 0
+        self.block_size: int | None = None  # Size of every fragment but the last
+        self.buffer = bytearray()
+        self.last_fragment = b""
+        self.deadline = 0.0
+        self.timer: asyncio.TimerHandle | None = None
+
+    @property
+    def size(self) -> int:
+        return self.received_bytes
+
+    @property
+    def claimed_size(self) -> int:
+        """Lower bound of the complete message size, from the fragments seen so far."""
+        return len(self.buffer) + len(self.last_fragment)
 
-    def add_fragment(self, index: int, data: bytes) -> None:
-        if index not in self.fragment_data:
-            self.fragment_data[index] = data
-            self.fragments_received += 1
+    def add_fragment(self, index: int, data: bytes) -> bool:
+        """Store a fragment, returning False if it is inconsistent with the others."""
+        bit = 1 << index
+        if self.received & bit:
+            return True
+
+        if index == self.fragment_count - 1:
+            self.last_fragment = bytes(data)
+        else:
+            if self.block_size is None:
+                self.block_size = len(data)
+                self.buffer = bytearray(self.block_size * (self.fragment_count - 1))
+            elif len(data) != self.block_size:
+                return False
+
+            offset = index * self.block_size
+            self.buffer[offset : offset + self.block_size] = data
+
+        self.received |= bit
+        self.fragments_received += 1
+        self.received_bytes += len(data)
+        return True
 
     def is_complete(self) -> bool:
         return self.fragments_received == self.fragment_count
 
     def assemble(self) -> bytes:
-        return b"".join(
-            self.fragment_data[i] for i in sorted(self.fragment_data.keys())
-        )
+        self.buffer += self.last_fragment
+        return bytes(self.buffer)
 
 
 class FragmentManager:
-    def __init__(self):
-        self._partial: dict[FragmentKey, _FragmentEntry] = {}
-        self._cleanup_timers: dict[FragmentKey, asyncio.TimerHandle] = {}
+    def __init__(
+        self,
+        *,
+        max_entries: int = FRAGMENT_MAX_ENTRIES,
+        max_entries_per_sender: int = FRAGMENT_MAX_ENTRIES_PER_SENDER,
+        max_bytes: int = FRAGMENT_MAX_BYTES,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_entries_per_sender = max_entries_per_sender
+        self.max_bytes = max_bytes
+
+        # Least recently updated first
+        self._partial: collections.OrderedDict[FragmentKey, _FragmentEntry] = (
+            collections.OrderedDict()
+        )
+        self._bytes = 0
+        self.counters: collections.Counter[str] = collections.Counter()
+
+    @property
+    def partial_bytes(self) -> int:
+        return self._bytes
 
     def handle_incoming_fragment(
         self,
@@ -69,42 +150,111 @@ class FragmentManager:
         """
 
         key: FragmentKey = (sender_nwk, aps_sequence, profile_id, cluster_id)
+        incomplete = (False, None, fragment_count, fragment_index)
+
+        if LOGGER.isEnabledFor(logging.DEBUG):
+            LOGGER.debug(
+                "Received fragment %d/%d from %s (APS seq=%d, cluster=0x%04X)",
+                fragment_index + 1,
+                fragment_count,
+                sender_nwk,
+                aps_sequence,
+                cluster_id,
+            )
+
+        if not 0 <= fragment_index < fragment_count:
+            self.counters["invalid"] += 1
+            return incomplete
 
-        # If we have never seen this message, create a reassembly entry.
-        if key not in self._partial:
+        entry = self._partial.get(key)
+
+        if entry is None:
             entry = _FragmentEntry(fragment_count)
+            self._make_room(sender_nwk)
             self._partial[key] = entry
+            self._arm_timer(key, entry)
+        elif entry.fragment_count != fragment_count:
+            self.counters["invalid"] += 1
+            return incomplete
         else:
-            entry = self._partial[key]
+            self._partial.move_to_end(key)
 
-        LOGGER.debug(
-            "Received fragment %d/%d from %s (APS seq=%d, cluster=0x%04X)",
-            fragment_index + 1,
-            fragment_count,
-            sender_nwk,
-            aps_sequence,
-            cluster_id,
-        )
+        size_before = entry.size
+        if not entry.add_fragment(fragment_index, payload):
+            self.counters["invalid"] += 1
+            return incomplete
 
-        entry.add_fragment(fragment_index, payload)
-
-        loop = asyncio.get_running_loop()
-        self._cleanup_timers[key] = loop.call_later(
-            FRAGMENT_TIMEOUT, self.cleanup_partial, key
-        )
+        self._bytes += entry.size - size_before
+        entry.deadline = asyncio.get_running_loop().time() + FRAGMENT_TIMEOUT
 
         if entry.is_complete():
+            self._remove(key)
             reassembled = entry.assemble()
-            del self._partial[key]
-            timer = self._cleanup_timers.pop(key, None)
-            if timer:
-                timer.cancel()
+            self.counters["completed"] += 1
             LOGGER.debug(
                 "Message reassembly complete. Total length=%d", len(reassembled)
             )
             return (True, reassembled, fragment_count, fragment_index)
-        else:
-            return (False, None, fragment_count, fragment_index)
+
+        if entry.claimed_size > self.max_bytes:
+            # A single message can never fit, don't let it push out the others
+            self._remove(key)
+            self.counters["oversized"] += 1
+            LOGGER.debug("Fragmented message from %s is too large, dropping", sender_nwk)
+        elif self._bytes > self.max_bytes:
+            self._evict(lambda k: k != key, self._bytes - self.max_bytes)
+
+        return incomplete
+
+    def _arm_timer(self, key: FragmentKey, entry: _FragmentEntry) -> None:
+        # One timer per entry: new fragments only push `deadline` forward and the timer
+        # re-arms itself if it fires early
+        entry.timer = asyncio.get_running_loop().call_later(
+            FRAGMENT_TIMEOUT, self._check_timeout, key
+        )
+
+    def _check_timeout(self, key: FragmentKey) -> None:
+        entry = self._partial.get(key)
+        if entry is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        if loop.time() < entry.deadline:
+            entry.timer = loop.call_at(entry.deadline, self._check_timeout, key)
+            return
+
+        self.cleanup_partial(key)
+
+    def _make_room(self, sender_nwk: int) -> None:
+        """Evict partial messages so that a new one from `sender_nwk` fits the caps."""
+        sender_entries = sum(1 for k in self._partial if k[0] == sender_nwk)
+        if sender_entries >= self.max_entries_per_sender:
+            self._evict(lambda k: k[0] == sender_nwk, count=1)
+
+        if len(self._partial) >= self.max_entries:
+            self._evict(lambda k: True, count=len(self._partial) - self.max_entries + 1)
+
+    def _evict(self, predicate, nbytes: int = 0, count: int = 0) -> None:
+        """Evict the least recently updated entries matching `predicate`."""
+        for key in [k for k in self._partial if predicate(k)]:
+            if count <= 0 and nbytes <= 0:
+                break
+
+            entry = self._remove(key)
+            nbytes -= entry.size
+            count -= 1
+            self.counters["evicted"] += 1
+            LOGGER.debug("Evicting partial fragmented message, key=%s", key)
+
+    def _remove(self, key: FragmentKey) -> _FragmentEntry:
+        entry = self._partial.pop(key)
+        self._bytes -= entry.size
+
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+
+        return entry
 
     def cleanup_partial(self, key: FragmentKey):
         # Called when FRAGMENT_TIMEOUT passes with no new fragments for that key.
@@ -112,5 +262,6 @@ class FragmentManager:
             "Timeout for partial reassembly of fragmented message, discarding key=%s",
             key,
         )
-        self._partial.pop(key, None)
-        self._cleanup_timers.pop(key, None)
+        if key in self._partial:
+            self._remove(key)
+            self.counters["timed_out"] += 1
@@ -3,6 +3,7 @@ from __future__ import annotations
 import abc
 import asyncio
 import binascii
+import collections
 import functools
 import logging
 import sys
@@ -20,6 +21,7 @@ from zigpy.datastructures import PriorityDynamicBoundedSemaphore
 
 from bellows.config import CONF_EZSP_POLICIES
 from bellows.exception import InvalidCommandError
+from bellows.ezsp.decoders import compile_decoder
 from bellows.ezsp.fragmentation import FragmentManager
 import bellows.types as t
 
@@ -47,6 +49,7 @@ class ProtocolHandler(abc.ABC):
             cmd_id: (name, tx_schema, rx_schema)
             for name, (cmd_id, tx_schema, rx_schema) in self.COMMANDS.items()
         }
+        self._decoders = self._compile_decoders()
         self.tc_policy = 0
         self._send_semaphore = PriorityDynamicBoundedSemaphore(
             value=MAX_COMMAND_CONCURRENCY
@@ -54,9 +57,26 @@ class ProtocolHandler(abc.ABC):
 
         # Cached by `set_extended_timeout` so subsequent calls are a little faster
         self._address_table_size: int | None = None
+
+        # Host-side mirror of the NCP's extended timeout state, valid for the lifetime
+        # of this protocol handler (i.e. until the NCP is reset)
+        self._extended_timeout_cache: dict[t.EUI64, tuple[t.NWK, bool]] = {}
         self._fragment_manager = FragmentManager()
         self._fragment_ack_tasks: set[asyncio.Task] = set()
 
+    @classmethod
+    def _compile_decoders(cls) -> dict[int, Callable[[bytes], tuple[Any, bytes]]]:
+        """Decoders of the received frames, compiled once per protocol version."""
+        decoders = cls.__dict__.get("_DECODERS")
+
+        if decoders is None:
+            decoders = cls._DECODERS = {
+                cmd_id: compile_decoder(rx_schema)
+                for cmd_id, _, rx_schema in cls.COMMANDS.values()
+            }
+
+        return decoders
+
     def _ezsp_frame(self, name: str, *args: Any, **kwargs: Any) -> bytes:
         """Serialize the named frame and data."""
         c, tx_schema, rx_schema = self.COMMANDS[name]
@@ -96,19 +116,22 @@ class ProtocolHandler(abc.ABC):
         delayed = False
         send_time = None
 
+        debug_enabled = LOGGER.isEnabledFor(logging.DEBUG)
+
         if self._send_semaphore.locked():
             delayed = True
             send_time = time.monotonic()
 
-            LOGGER.debug(
-                "Send semaphore is locked, delaying before sending %s(%r, %r)",
-                name,
-                args,
-                kwargs,
-            )
+            if debug_enabled:
+                LOGGER.debug(
+                    "Send semaphore is locked, delaying before sending %s(%r, %r)",
+                    name,
+                    args,
+                    kwargs,
+                )
 
         async with self._send_semaphore(priority=self._get_command_priority(name)):
-            if delayed:
+            if debug_enabled and delayed:
                 LOGGER.debug(
                     "Sending command  %s: %s %s after %0.2fs delay",
                     name,
@@ -116,7 +139,7 @@ class ProtocolHandler(abc.ABC):
                     kwargs,
                     time.monotonic() - send_time,
                 )
-            else:
+            elif debug_enabled:
                 LOGGER.debug("Sending command  %s: %s %s", name, args, kwargs)
 
             data = self._ezsp_frame(name, *args, **kwargs)
@@ -165,13 +188,17 @@ class ProtocolHandler(abc.ABC):
             return
 
         try:
-            if isinstance(rx_schema, dict):
-                result, data = t.deserialize_dict(data, rx_schema)
-                LOGGER.debug("Received command %s: %s", frame_name, result)
-                result = list(result.values())
-            else:
-                result, data = rx_schema.deserialize(data)
-                LOGGER.debug("Received command %s: %s", frame_name, result)
+            result, data = self._decoders[frame_id](data)
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                LOGGER.debug(
+                    "Received command %s: %s",
+                    frame_name,
+                    (
+                        dict(zip(rx_schema, result))
+                        if isinstance(rx_schema, dict)
+                        else result
+                    ),
+                )
         except Exception:
             LOGGER.warning(
                 "Failed to parse frame %s: %s",
@@ -280,6 +307,35 @@ class ProtocolHandler(abc.ABC):
         status = await self.sendReply(sender, ackFrame, b"")
         return status[0]
 
+    def is_extended_timeout_cached(
+        self, nwk: t.NWK, ieee: t.EUI64, extended_timeout: bool
+    ) -> bool:
+        """Check if the NCP is already known to have the given extended timeout."""
+        return self._extended_timeout_cache.get(ieee) == (nwk, extended_timeout)
+
+    def invalidate_extended_timeout(
+        self, *, nwk: t.NWK | None = None, ieee: t.EUI64 | None = None
+    ) -> None:
+        """Drop cached extended timeout state by NWK and/or IEEE, or all of it."""
+        if nwk is None and ieee is None:
+            self._extended_timeout_cache.clear()
+            return
+
+        if ieee is not None:
+            self._extended_timeout_cache.pop(ieee, None)
+
+        if nwk is not None:
+            for cached_ieee, (cached_nwk, _) in list(
+                self._extended_timeout_cache.items()
+            ):
+                if cached_nwk == nwk:
+                    del self._extended_timeout_cache[cached_ieee]
+
+    @property
+    def fragment_counters(self) -> collections.Counter[str]:
+        """Counters of the APS fragment reassembly: completed, evicted, timed out..."""
+        return self._fragment_manager.counters
+
     def __getattr__(self, name: str) -> Callable:
         if name not in self.COMMANDS:
             raise AttributeError(f"{name} not found in COMMANDS")
@@ -201,6 +201,7 @@ class EZSPv4(protocol.ProtocolHandler):
         (curr_extended_timeout,) = await self.getExtendedTimeout(remoteEui64=ieee)
 
         if curr_extended_timeout == extended_timeout:
+            self._extended_timeout_cache[ieee] = (nwk, extended_timeout)
             return
 
         (node_id,) = await self.lookupNodeIdByEui64(eui64=ieee)
@@ -210,6 +211,7 @@ class EZSPv4(protocol.ProtocolHandler):
             await self.setExtendedTimeout(
                 remoteEui64=ieee, extendedTimeout=extended_timeout
             )
+            self._extended_timeout_cache[ieee] = (nwk, extended_timeout)
             return
 
         if self._address_table_size is None:
@@ -218,7 +220,7 @@ class EZSPv4(protocol.ProtocolHandler):
             )
 
             if t.sl_Status.from_ember_status(status) != t.sl_Status.OK:
-                # Last-ditch effort
+                # Last-ditch effort, we can't know if this worked so don't cache it
                 await self.setExtendedTimeout(
                     remoteEui64=ieee, extendedTimeout=extended_timeout
                 )
@@ -229,9 +231,17 @@ class EZSPv4(protocol.ProtocolHandler):
         # Replace a random entry in the address table
         index = random.randint(0, self._address_table_size - 1)
 
-        await self.replaceAddressTableEntry(
-            addressTableIndex=index,
-            newEui64=ieee,
-            newId=nwk,
-            newExtendedTimeout=extended_timeout,
+        (status, old_eui64, _old_nwk, _old_ext_timeout) = (
+            await self.replaceAddressTableEntry(
+                addressTableIndex=index,
+                newEui64=ieee,
+                newId=nwk,
+                newExtendedTimeout=extended_timeout,
+            )
         )
+
+        # The evicted device no longer has an entry, its state is unknown
+        self._extended_timeout_cache.pop(old_eui64, None)
+
+        if t.sl_Status.from_ember_status(status) == t.sl_Status.OK:
+            self._extended_timeout_cache[ieee] = (nwk, extended_timeout)
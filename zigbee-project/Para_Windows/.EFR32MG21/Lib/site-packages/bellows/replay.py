@@ -0,0 +1,292 @@
+"""Replay a serial capture (see `bellows.capture`) into a fresh stack.
+
+The bytes received from the NCP are fed to a new `AshProtocol`, either with the
+original timing or as fast as possible. Depending on `stack`, the frames stop there
+(`ash`), are decoded by the EZSP `ProtocolHandler` (`ezsp`) or are delivered to a
+`ControllerApplication` (`app`), optionally loaded from the production database so the
+devices are known.
+
+Nothing is sent to a real NCP: the replay transport immediately ACKs every DATA frame
+the stack sends and the host side of the capture is only counted. ASH sequence numbers
+are resynchronised to the capture, since the replayed stack did not take part in the
+original session. Responses to commands of the original session have no matching
+request and are handled as unsolicited frames.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import time
+from typing import Any
+
+import zigpy.config
+
+from bellows.ash import (
+    AckFrame,
+    AshProtocol,
+    DataFrame,
+    Reserved,
+    parse_frame,
+)
+from bellows.capture import CaptureReader, Direction
+import bellows.ezsp
+from bellows.ezsp import EZSP_LATEST
+import bellows.types as t
+from bellows.uart import Gateway
+from bellows.zigbee.application import ControllerApplication
+
+_LOGGER = logging.getLogger(__name__)
+
+STACK_ASH = "ash"
+STACK_EZSP = "ezsp"
+STACK_APP = "app"
+STACKS = (STACK_ASH, STACK_EZSP, STACK_APP)
+
+
+@dataclasses.dataclass
+class ReplayStats:
+    records: int = 0
+    rx_bytes: int = 0
+    ezsp_frames: int = 0  # DATA frames delivered above ASH
+    resyncs: int = 0  # Times the ASH sequence had to follow the capture
+    resets: int = 0
+    captured_tx_bytes: int = 0  # Sent by the original host
+    replayed_tx_bytes: int = 0  # Sent by the replayed stack
+    callbacks: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    captured_seconds: float = 0.0
+    elapsed: float = 0.0
+
+    def __str__(self) -> str:
+        rate = self.ezsp_frames / self.elapsed if self.elapsed else 0.0
+        lines = [
+            f"{self.records} records, {self.rx_bytes} bytes received,"
+            f" {self.ezsp_frames} EZSP frames ({self.resyncs} resyncs,"
+            f" {self.resets} resets)",
+            f"{self.captured_seconds:.1f}s of traffic replayed in {self.elapsed:.3f}s:"
+            f" {rate:.0f} frames/s",
+            f"TX bytes: {self.captured_tx_bytes} captured,"
+            f" {self.replayed_tx_bytes} replayed",
+        ]
+        lines.extend(
+            f"  {name}: {count}" for name, count in self.callbacks.most_common()
+        )
+        return "\n".join(lines)
+
+
+class ReplayAshProtocol(AshProtocol):
+    """ASH protocol that follows the sequence numbers of the captured NCP."""
+
+    def __init__(self, ezsp_protocol, stats: ReplayStats) -> None:
+        super().__init__(ezsp_protocol)
+        self._stats = stats
+
+    def data_frame_received(self, frame: DataFrame) -> None:
+        if frame.frm_num != self._rx_seq and not frame.re_tx:
+            # The capture may start mid-session or the original host may have NAKed
+            self._stats.resyncs += 1
+            self._rx_seq = frame.frm_num
+
+        super().data_frame_received(frame)
+
+
+class ReplayGateway(Gateway):
+    def __init__(self, api, stats: ReplayStats) -> None:
+        super().__init__(api)
+        self._stats = stats
+
+    def data_received(self, data: bytes) -> None:
+        self._stats.ezsp_frames += 1
+        super().data_received(data)
+
+    def reset_received(self, code: t.NcpResetCode) -> None:
+        self._stats.resets += 1
+
+
+class ReplayTransport(asyncio.Transport):
+    """Stands in for the serial port: ACKs the DATA frames the stack sends."""
+
+    def __init__(self, protocol: AshProtocol, stats: ReplayStats) -> None:
+        super().__init__()
+        self._protocol = protocol
+        self._stats = stats
+        self._closing = False
+
+    def write(self, data: bytes) -> None:
+        self._stats.replayed_tx_bytes += len(data)
+
+        for stuffed in bytes(data).split(bytes([Reserved.FLAG])):
+            stuffed = stuffed.lstrip(bytes([Reserved.CANCEL]))
+
+            # Only DATA frames (control byte bit 7 clear) need an ACK
+            if not stuffed or stuffed[0] & 0x80:
+                continue
+
+            try:
+                frame = parse_frame(AshProtocol._unstuff_bytes(stuffed))
+            except Exception:  # noqa: BLE001
+                continue
+
+            if isinstance(frame, DataFrame):
+                ack = AckFrame(res=0, ncp_ready=0, ack_num=(frame.frm_num + 1) % 8)
+                asyncio.get_running_loop().call_soon(
+                    self._protocol.data_received,
+                    AshProtocol._stuff_bytes(ack.to_bytes()) + bytes([Reserved.FLAG]),
+                )
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        if not self._closing:
+            self._closing = True
+            asyncio.get_running_loop().call_soon(self._protocol.connection_lost, None)
+
+
+class _NullApi:
+    """Receiver of EZSP frames when only the ASH layer is replayed."""
+
+    def frame_received(self, data: bytes) -> None:
+        pass
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        pass
+
+    def enter_failed_state(self, code: t.NcpResetCode) -> None:
+        pass
+
+
+class ReplayDriver:
+    def __init__(
+        self,
+        path: str,
+        *,
+        stack: str = STACK_APP,
+        realtime: bool = False,
+        speed: float = 1.0,
+        database: str | None = None,
+        ezsp_version: int | None = None,
+        from_start: bool = False,
+    ) -> None:
+        if stack not in STACKS:
+            raise ValueError(f"Unknown stack {stack!r}, expected one of {STACKS}")
+
+        self.reader = CaptureReader(path)
+        self.stack = stack
+        self.realtime = realtime
+        self.speed = speed
+        self.database = database
+        self.from_start = from_start
+        self.stats = ReplayStats()
+
+        self._meta = self.reader.metadata()
+        self.ezsp_version = ezsp_version or self._meta.get("ezsp_version")
+        if self.ezsp_version is None:
+            _LOGGER.warning("Capture has no EZSP version, assuming %d", EZSP_LATEST)
+            self.ezsp_version = EZSP_LATEST
+
+        self.app = None
+        self.ezsp = None
+        self.ash: ReplayAshProtocol | None = None
+
+    async def _build_stack(self) -> None:
+        if self.stack == STACK_ASH:
+            api = _NullApi()
+        else:
+            device_config = {
+                zigpy.config.CONF_DEVICE_PATH: self._meta.get("device", "replay")
+            }
+
+            if self.stack == STACK_APP:
+                self.app = await ControllerApplication.new(
+                    {
+                        zigpy.config.CONF_DEVICE: device_config,
+                        zigpy.config.CONF_DATABASE: self.database,
+                        zigpy.config.CONF_OTA: {zigpy.config.CONF_OTA_ENABLED: False},
+                    },
+                    start_radio=False,
+                )
+
+            self.ezsp = bellows.ezsp.EZSP(device_config, self.app)
+            api = self.ezsp
+
+        gateway = ReplayGateway(api, self.stats)
+        self.ash = ReplayAshProtocol(gateway, self.stats)
+        self.ash.connection_made(ReplayTransport(self.ash, self.stats))
+
+        if self.ezsp is not None:
+            self.ezsp._gw = gateway
+            self.ezsp._switch_protocol_version(self.ezsp_version)
+            self.ezsp.start_ezsp()
+            self.ezsp.add_callback(self._count_callback)
+
+        if self.app is not None:
+            self.app._ezsp = self.ezsp
+            self.ezsp.add_callback(self.app.ezsp_callback_handler)
+            # Requests sent by the application are ACKed but never answered
+            self.app.controller_event.set()
+
+    def _count_callback(self, frame_name: str, args: list[Any]) -> None:
+        self.stats.callbacks[frame_name] += 1
+
+    async def run(self) -> ReplayStats:
+        await self._build_stack()
+
+        started = self.from_start or "ezsp_version" not in self._meta
+        first_timestamp = None
+        wall_start = time.monotonic()
+
+        try:
+            for record in self.reader:
+                if not started:
+                    # Frames before the first metadata record belong to the startup
+                    # handshake and use older EZSP framing
+                    started = record.direction == Direction.META
+                    continue
+
+                if first_timestamp is None:
+                    first_timestamp = record.timestamp
+
+                self.stats.records += 1
+                self.stats.captured_seconds = record.timestamp - first_timestamp
+
+                if record.direction == Direction.TX:
+                    self.stats.captured_tx_bytes += len(record.data)
+                    continue
+                elif record.direction != Direction.RX:
+                    continue
+
+                if self.realtime:
+                    delay = (
+                        wall_start
+                        + self.stats.captured_seconds / self.speed
+                        - time.monotonic()
+                    )
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                self.stats.rx_bytes += len(record.data)
+                self.ash.data_received(record.data)
+
+                # Let the stack run the tasks and ACKs scheduled by this chunk
+                await asyncio.sleep(0)
+        finally:
+            self.stats.elapsed = time.monotonic() - wall_start
+            await self.close()
+
+        return self.stats
+
+    async def close(self) -> None:
+        if self.app is not None:
+            await self.app.shutdown()
+            self.app = None
+        elif self.ezsp is not None:
+            await self.ezsp.disconnect()
+        elif self.ash is not None:
+            self.ash.close()
+
+        self.ezsp = None
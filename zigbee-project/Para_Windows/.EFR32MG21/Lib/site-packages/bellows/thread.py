@@ -1,4 +1,6 @@
 import asyncio
+import collections
+import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 import functools
 import logging
@@ -10,9 +12,10 @@ LOGGER = logging.getLogger(__name__)
 class EventLoopThread:
     """Run a parallel event loop in a separate thread."""
 
-    def __init__(self):
+    def __init__(self, loop_factory=None):
         self.loop = None
         self.thread_complete = None
+        self._loop_factory = loop_factory or asyncio.new_event_loop
 
     def run_coroutine_threadsafe(self, coroutine):
         current_loop = asyncio.get_event_loop()
@@ -20,7 +23,7 @@ class EventLoopThread:
         return asyncio.wrap_future(future, loop=current_loop)
 
     def _thread_main(self, init_task):
-        self.loop = asyncio.new_event_loop()
+        self.loop = self._loop_factory()
         asyncio.set_event_loop(self.loop)
 
         try:
@@ -77,13 +80,26 @@ class ThreadsafeProxy:
     """Proxy class which enforces threadsafe non-blocking calls
     This class can be used to wrap an object to ensure any calls
     using that object's methods are done on a particular event loop
+
+    Calls made from other threads are queued and executed in order by a single
+    scheduled drain, so a burst of calls costs only one wakeup of the target loop.
     """
 
     def __init__(self, obj, obj_loop):
         self._obj = obj
         self._obj_loop = obj_loop
+        self._wrappers = {}
+
+        # `deque.append` and `deque.popleft` are atomic, no lock is required
+        self._pending_calls = collections.deque()
+        self._drain_scheduled = False
 
     def __getattr__(self, name):
+        try:
+            return self._wrappers[name]
+        except KeyError:
+            pass
+
         func = getattr(self._obj, name)
         if not callable(func):
             raise TypeError(
@@ -92,31 +108,87 @@ class ThreadsafeProxy:
                 )
             )
 
+        is_coroutine = asyncio.iscoroutinefunction(func)
+
+        def check_result_wrapper(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if result is not None:
+                raise TypeError(
+                    (
+                        "ThreadsafeProxy can only wrap functions with no return"
+                        "value \nUse an async method to return values: {}.{}"
+                    ).format(self._obj.__class__.__name__, name)
+                )
+
         def func_wrapper(*args, **kwargs):
             loop = self._obj_loop
             curr_loop = asyncio.get_running_loop()
-            call = functools.partial(func, *args, **kwargs)
             if loop == curr_loop:
-                return call()
+                return func(*args, **kwargs)
             if loop.is_closed():
                 # Disconnected
                 LOGGER.warning("Attempted to use a closed event loop")
                 return
-            if asyncio.iscoroutinefunction(func):
-                future = asyncio.run_coroutine_threadsafe(call(), loop)
+            if is_coroutine:
+                future = concurrent.futures.Future()
+                self._schedule(self._run_coroutine, future, func, args, kwargs)
                 return asyncio.wrap_future(future, loop=curr_loop)
             else:
+                self._schedule(check_result_wrapper, *args, **kwargs)
 
-                def check_result_wrapper():
-                    result = call()
-                    if result is not None:
-                        raise TypeError(
-                            (
-                                "ThreadsafeProxy can only wrap functions with no return"
-                                "value \nUse an async method to return values: {}.{}"
-                            ).format(self._obj.__class__.__name__, name)
-                        )
+        self._wrappers[name] = func_wrapper
+        return func_wrapper
 
-                loop.call_soon_threadsafe(check_result_wrapper)
+    def _schedule(self, func, *args, **kwargs):
+        """Queue a call to be run on the object's event loop."""
+        self._pending_calls.append((func, args, kwargs))
+
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+
+            try:
+                self._obj_loop.call_soon_threadsafe(self._drain)
+            except Exception:
+                # No drain is coming (e.g. the loop was closed): let the next call retry
+                self._drain_scheduled = False
+                raise
+
+    def _drain(self):
+        """Run all queued calls, called on the object's event loop."""
+        # Reset the flag first: calls queued while draining either get picked up by
+        # this drain or schedule a new one
+        self._drain_scheduled = False
+
+        while self._pending_calls:
+            func, args, kwargs = self._pending_calls.popleft()
+
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                LOGGER.exception("Exception in proxied call %r", func)
+
+    def _run_coroutine(self, future, func, args, kwargs):
+        """Run a coroutine function and pass its result to a `concurrent` future."""
+        if future.cancelled():
+            return
 
-        return func_wrapper
+        task = self._obj_loop.create_task(func(*args, **kwargs))
+
+        def copy_result(task):
+            if task.cancelled():
+                future.cancel()
+
+            if not future.set_running_or_notify_cancel():
+                return
+
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        def propagate_cancel(future):
+            if future.cancelled() and not self._obj_loop.is_closed():
+                self._obj_loop.call_soon_threadsafe(task.cancel)
+
+        task.add_done_callback(copy_result)
+        future.add_done_callback(propagate_cancel)
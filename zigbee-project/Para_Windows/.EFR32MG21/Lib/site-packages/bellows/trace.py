@@ -0,0 +1,172 @@
+"""Binary ring buffer of the frames exchanged with the NCP.
+
+Debug logging of every serial frame is too expensive to leave enabled on a busy
+network, yet it is exactly what is needed after an NCP failure. `FrameTracer` keeps the
+last N frames as raw bytes in a preallocated buffer: recording one is a `pack_into` and
+a slice assignment, with no formatting and no allocation. The buffer can be dumped on
+demand and is dumped automatically when the NCP fails or the connection is lost.
+
+Frames are recorded from the serial thread while dumps usually run on the main
+thread, so both sides take a lock. Readers only hold it to copy the buffer.
+"""
+
+from __future__ import annotations
+
+import enum
+import logging
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, NamedTuple
+
+_LOGGER = logging.getLogger(__name__)
+
+TRACE_MAGIC = b"BTRC"
+TRACE_VERSION = 1
+
+# timestamp, stage, original length, stored length
+_RECORD_HEADER = struct.Struct("<dBHH")
+_FILE_HEADER = struct.Struct("<4sBII")  # magic, version, record count, max frame size
+
+
+class TraceStage(enum.IntEnum):
+    ASH_RX_DATA = 0  # Raw bytes read from the serial port
+    ASH_RX_FRAME = 1  # Unstuffed ASH frame, before parsing
+    ASH_TX_DATA = 2  # Stuffed bytes written to the serial port
+    NCP_FAILED = 3  # The NCP entered the failed state, data is the reset code
+    CONNECTION_LOST = 4  # Data is the repr of the exception, if any
+
+
+class TraceRecord(NamedTuple):
+    timestamp: float
+    stage: TraceStage
+    length: int  # Length of the original data, `data` may be truncated
+    data: bytes
+
+
+class FrameTracer:
+    """Fixed-size ring buffer of `(timestamp, stage, frame bytes)` records."""
+
+    def __init__(
+        self, records: int = 4096, max_frame: int = 256, dump_path: str | None = None
+    ) -> None:
+        if records <= 0 or not 0 < max_frame <= 0xFFFF:
+            raise ValueError(f"Invalid trace size: {records} x {max_frame} bytes")
+
+        self.records = records
+        self.max_frame = max_frame
+        self.dump_path = dump_path
+        self._slot = _RECORD_HEADER.size + max_frame
+        self._buffer = bytearray(records * self._slot)
+        self._count = 0  # Total number of records ever written
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.records)
+
+    @property
+    def total(self) -> int:
+        """Number of records written since creation, including overwritten ones."""
+        return self._count
+
+    def record(self, stage: TraceStage, data: bytes) -> None:
+        length = len(data)
+        stored = length if length <= self.max_frame else self.max_frame
+        timestamp = time.time()
+
+        with self._lock:
+            offset = (self._count % self.records) * self._slot
+            _RECORD_HEADER.pack_into(
+                self._buffer, offset, timestamp, stage, min(length, 0xFFFF), stored
+            )
+            offset += _RECORD_HEADER.size
+            self._buffer[offset : offset + stored] = (
+                data if stored == length else data[:stored]
+            )
+            self._count += 1
+
+    def __iter__(self) -> Iterator[TraceRecord]:
+        """Iterate over a snapshot of the buffered records, oldest first."""
+        with self._lock:
+            buffer = bytes(self._buffer)
+            count = self._count
+
+        for index in range(max(0, count - self.records), count):
+            offset = (index % self.records) * self._slot
+            timestamp, stage, length, stored = _RECORD_HEADER.unpack_from(
+                buffer, offset
+            )
+            offset += _RECORD_HEADER.size
+            yield TraceRecord(
+                timestamp,
+                TraceStage(stage),
+                length,
+                buffer[offset : offset + stored],
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._count = 0
+
+    def write(self, f: BinaryIO) -> int:
+        """Write the buffered records to a binary file object, oldest first."""
+        records = list(self)
+        f.write(
+            _FILE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, len(records), self.max_frame)
+        )
+
+        for record in records:
+            f.write(
+                _RECORD_HEADER.pack(
+                    record.timestamp, record.stage, record.length, len(record.data)
+                )
+            )
+            f.write(record.data)
+
+        return len(records)
+
+    def dump(self, path: str | None = None) -> str:
+        """Dump the buffer to `path` (or `dump_path`), replacing the file atomically."""
+        path = path or self.dump_path
+        if path is None:
+            raise ValueError("No trace dump path configured")
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            count = self.write(f)
+        os.replace(tmp_path, path)
+
+        _LOGGER.debug("Dumped %d trace records to %s", count, path)
+        return path
+
+    def dump_on_error(self, stage: TraceStage, reason: bytes) -> None:
+        """Record the error and, if a dump path is configured, write the buffer out."""
+        self.record(stage, reason)
+
+        if self.dump_path is None:
+            return
+
+        try:
+            self.dump()
+        except OSError as exc:
+            _LOGGER.warning("Failed to dump frame trace to %s: %r", self.dump_path, exc)
+        else:
+            _LOGGER.warning(
+                "Frame trace of the last %d frames written to %s",
+                len(self),
+                self.dump_path,
+            )
+
+
+def read_trace(f: BinaryIO) -> Iterator[TraceRecord]:
+    """Read the records of a trace file written by `FrameTracer.dump`."""
+    magic, version, count, _ = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+    if magic != TRACE_MAGIC or version != TRACE_VERSION:
+        raise ValueError(f"Not a frame trace file: {magic!r} v{version}")
+
+    for _ in range(count):
+        timestamp, stage, length, stored = _RECORD_HEADER.unpack(
+            f.read(_RECORD_HEADER.size)
+        )
+        yield TraceRecord(timestamp, TraceStage(stage), length, f.read(stored))
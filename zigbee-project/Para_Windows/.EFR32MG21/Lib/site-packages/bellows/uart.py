@@ -109,13 +109,13 @@ class Gateway(zigpy.serial.SerialProtocol):
             return await self._reset_future
 
 
-async def _connect(config, api):
+async def _connect(config, api, tracer=None, capture=None):
     loop = asyncio.get_event_loop()
 
     connection_done_future = loop.create_future()
 
     gateway = Gateway(api, connection_done_future)
-    protocol = AshProtocol(gateway)
+    protocol = AshProtocol(gateway, tracer=tracer, capture=capture)
 
     if config[zigpy.config.CONF_DEVICE_FLOW_CONTROL] is None:
         xon_xoff, rtscts = True, False
@@ -137,19 +137,21 @@ async def _connect(config, api):
     return thread_safe_protocol, connection_done_future
 
 
-async def connect(config, api, use_thread=True):
+async def connect(
+    config, api, use_thread=True, loop_factory=None, tracer=None, capture=None
+):
     if use_thread:
         api = ThreadsafeProxy(api, asyncio.get_event_loop())
-        thread = EventLoopThread()
+        thread = EventLoopThread(loop_factory=loop_factory)
         await thread.start()
         try:
             protocol, connection_done = await thread.run_coroutine_threadsafe(
-                _connect(config, api)
+                _connect(config, api, tracer, capture)
             )
         except Exception:
             thread.force_stop()
             raise
         connection_done.add_done_callback(lambda _: thread.force_stop())
     else:
-        protocol, _ = await _connect(config, api)
+        protocol, _ = await _connect(config, api, tracer, capture)
     return protocol
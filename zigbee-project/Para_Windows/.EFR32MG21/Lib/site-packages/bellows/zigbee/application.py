@@ -6,7 +6,8 @@ import logging
 import os
 import statistics
 import sys
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Callable
 
 if sys.version_info[:2] < (3, 11):
     from async_timeout import timeout as asyncio_timeout  # pragma: no cover
@@ -27,10 +28,18 @@ import zigpy.zdo.types as zdo_t
 
 import bellows
 from bellows.config import (
+    CONF_ADAPTIVE_CONCURRENCY,
     CONF_BELLOWS_CONFIG,
+    CONF_CONCURRENCY_CEILING,
+    CONF_CONCURRENCY_FLOOR,
+    CONF_CONCURRENCY_MIN_FREE_BUFFERS,
     CONF_EZSP_CONFIG,
     CONF_EZSP_POLICIES,
+    CONF_FRAME_TRACE_PATH,
+    CONF_FRAME_TRACE_RECORDS,
     CONF_MANUAL_SOURCE_ROUTING,
+    CONF_SERIAL_CAPTURE_PATH,
+    CONF_THREAD_LOOP_FACTORY,
     CONF_USE_THREAD,
     CONFIG_SCHEMA,
 )
@@ -38,8 +47,11 @@ from bellows.exception import ControllerError, EzspError, StackAlreadyRunning
 import bellows.ezsp
 from bellows.ezsp.xncp import FirmwareFeatures
 import bellows.multicast
+from bellows.capture import SerialCapture
+from bellows.trace import FrameTracer
 import bellows.types as t
 from bellows.zigbee import repairs
+from bellows.zigbee.concurrency import COUNTERS_CONCURRENCY, AdaptiveConcurrency
 from bellows.zigbee.device import EZSPEndpoint, EZSPGroupEndpoint
 import bellows.zigbee.util as util
 
@@ -47,6 +59,8 @@ MESSAGE_SEND_TIMEOUT_MAINS = 3
 MESSAGE_SEND_TIMEOUT_BATTERY = 8
 
 COUNTER_EZSP_BUFFERS = "EZSP_FREE_BUFFERS"
+COUNTER_EXT_TIMEOUT_CACHE_HIT = "extended_timeout_cache_hit"
+COUNTER_EXT_TIMEOUT_CACHE_MISS = "extended_timeout_cache_miss"
 COUNTER_NWK_CONFLICTS = "nwk_conflicts"
 COUNTER_RESET_REQ = "reset_requests"
 COUNTER_RESET_SUCCESS = "reset_success"
@@ -70,6 +84,72 @@ IEEE_PREFIX_MFG_ID = {
     "54:EF:44": 0x115F,  # Lumi
 }
 
+# Counters of the controller group that live in its array, in `_ctrl_counts`.
+# The prefixes keep the historical names, e.g. `unicast_tx_success` and
+# `unknown_msg_type_failure_unexpected`.
+_TX_COUNTER_PREFIXES = {
+    "broadcast": "broadcast_tx_",
+    "multicast": "multicast_tx_",
+    "unicast": "unicast_tx_",
+    "via_binding": "via_binding_tx_",
+    "unknown": "unknown_msg_type_",
+}
+CTRL_ARRAY_COUNTERS = (
+    COUNTER_RX_BCAST,
+    COUNTER_RX_MCAST,
+    COUNTER_RX_UNICAST,
+    COUNTER_EXT_TIMEOUT_CACHE_HIT,
+    COUNTER_EXT_TIMEOUT_CACHE_MISS,
+    *(
+        f"{prefix}{msg}{suffix}"
+        for prefix in _TX_COUNTER_PREFIXES.values()
+        for msg in ("success", "failure")
+        for suffix in ("", "_unexpected", "_duplicate")
+    ),
+)
+_CTRL_INDEX = {name: index for index, name in enumerate(CTRL_ARRAY_COUNTERS)}
+_RX_BCAST = _CTRL_INDEX[COUNTER_RX_BCAST]
+_RX_MCAST = _CTRL_INDEX[COUNTER_RX_MCAST]
+_RX_UNICAST = _CTRL_INDEX[COUNTER_RX_UNICAST]
+_EXT_TIMEOUT_CACHE_HIT = _CTRL_INDEX[COUNTER_EXT_TIMEOUT_CACHE_HIT]
+_EXT_TIMEOUT_CACHE_MISS = _CTRL_INDEX[COUNTER_EXT_TIMEOUT_CACHE_MISS]
+
+# Destination of every received broadcast, shared by all of their packets
+_BROADCAST_DST = zigpy.types.AddrModeAddress.interned(
+    zigpy.types.AddrMode.Broadcast,
+    zigpy.types.BroadcastAddress.ALL_ROUTERS_AND_COORDINATOR,
+)
+
+
+def _tx_counters(kind: str, success: bool) -> tuple[int, int, int]:
+    """Indices of the sent, unexpected and duplicate counters of a message kind."""
+    name = f"{_TX_COUNTER_PREFIXES[kind]}{'success' if success else 'failure'}"
+    return (
+        _CTRL_INDEX[name],
+        _CTRL_INDEX[f"{name}_unexpected"],
+        _CTRL_INDEX[f"{name}_duplicate"],
+    )
+
+
+_TX_MESSAGE_KINDS = {
+    t.EmberOutgoingMessageType.OUTGOING_BROADCAST: "broadcast",
+    t.EmberOutgoingMessageType.OUTGOING_BROADCAST_WITH_ALIAS: "broadcast",
+    t.EmberOutgoingMessageType.OUTGOING_MULTICAST: "multicast",
+    t.EmberOutgoingMessageType.OUTGOING_MULTICAST_WITH_ALIAS: "multicast",
+    t.EmberOutgoingMessageType.OUTGOING_DIRECT: "unicast",
+    t.EmberOutgoingMessageType.OUTGOING_VIA_ADDRESS_TABLE: "unicast",
+    t.EmberOutgoingMessageType.OUTGOING_VIA_BINDING: "via_binding",
+}
+_TX_COUNTERS = {
+    (message_type, success): _tx_counters(kind, success)
+    for message_type, kind in _TX_MESSAGE_KINDS.items()
+    for success in (True, False)
+}
+_TX_UNKNOWN_COUNTERS = {
+    success: _tx_counters("unknown", success) for success in (True, False)
+}
+_TX_RESULT_MESSAGES = {True: "message send success", False: "message send failure"}
+
 LIB_VERSION = importlib.metadata.version("bellows")
 LOGGER = logging.getLogger(__name__)
 
@@ -86,6 +166,12 @@ class ControllerApplication(zigpy.application.ControllerApplication):
     def __init__(self, config: dict) -> None:
         super().__init__(config)
         self._ctrl_event = asyncio.Event()
+
+        # Counters incremented for every frame are kept in an array
+        self.state.counters[COUNTERS_CTRL] = zigpy.state.ArrayCounterGroup(
+            COUNTERS_CTRL, CTRL_ARRAY_COUNTERS
+        )
+        self._ctrl_counts = self.state.counters[COUNTERS_CTRL].array
         self._created_device_endpoints: list[zdo_t.SimpleDescriptor] = []
         self._ezsp = None
         self._multicast = None
@@ -97,6 +183,21 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         self._req_lock = asyncio.Lock()
         self._packet_capture_channel: int | None = None
 
+        trace_records = self.config[CONF_BELLOWS_CONFIG][CONF_FRAME_TRACE_RECORDS]
+        self._frame_tracer: FrameTracer | None = None
+
+        if trace_records:
+            # Shared by all connections so a trace survives reconnects
+            self._frame_tracer = FrameTracer(
+                records=trace_records,
+                dump_path=self.config[CONF_BELLOWS_CONFIG][CONF_FRAME_TRACE_PATH],
+            )
+
+        self._serial_capture: SerialCapture | None = None
+        self._adaptive_concurrency: AdaptiveConcurrency | None = None
+        self._callback_handlers: dict[str, Callable[[list], None]] = {}
+        self._callback_handlers_version: int | None = None
+
     @property
     def controller_event(self):
         """Return asyncio.Event for controller app."""
@@ -107,6 +208,16 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         """Return True if controller was successfully initialized."""
         return self.controller_event.is_set() and self._ezsp.is_ezsp_running
 
+    @property
+    def frame_tracer(self) -> FrameTracer | None:
+        """Return the serial frame tracer, if enabled."""
+        return self._frame_tracer
+
+    @property
+    def adaptive_concurrency(self) -> AdaptiveConcurrency | None:
+        """Return the adaptive request concurrency controller, if enabled."""
+        return self._adaptive_concurrency
+
     @property
     def multicast(self):
         """Return EZSP MulticastController."""
@@ -150,8 +261,29 @@ class ControllerApplication(zigpy.application.ControllerApplication):
     async def connect(self) -> None:
         self._ezsp = bellows.ezsp.EZSP(self.config[zigpy.config.CONF_DEVICE], self)
 
+        capture_path = self.config[CONF_BELLOWS_CONFIG][CONF_SERIAL_CAPTURE_PATH]
+        if capture_path is not None:
+            # Every connection appends to the same capture file
+            self._serial_capture = SerialCapture(capture_path)
+
         try:
-            await self._ezsp.connect(use_thread=self.config[CONF_USE_THREAD])
+            await self._ezsp.connect(
+                use_thread=self.config[CONF_USE_THREAD],
+                loop_factory=self.config[CONF_BELLOWS_CONFIG][
+                    CONF_THREAD_LOOP_FACTORY
+                ],
+                tracer=self._frame_tracer,
+                capture=self._serial_capture,
+            )
+
+            if self._serial_capture is not None:
+                self._serial_capture.write_meta(
+                    ezsp_version=self._ezsp.ezsp_version,
+                    device=self.config[zigpy.config.CONF_DEVICE][
+                        zigpy.config.CONF_DEVICE_PATH
+                    ],
+                    bellows=LIB_VERSION,
+                )
 
             # Writing config is required here because network info can't be loaded
             await self._ezsp.write_config(self.config[CONF_EZSP_CONFIG])
@@ -162,6 +294,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
             if self._ezsp is not None:
                 await self._ezsp.disconnect()
                 self._ezsp = None
+            self._close_serial_capture()
             raise
 
     async def _ensure_network_running(self) -> bool:
@@ -206,6 +339,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
 
         ezsp.add_callback(self.ezsp_callback_handler)
         self.controller_event.set()
+        self._start_adaptive_concurrency()
 
         group_membership = {}
 
@@ -457,10 +591,46 @@ class ControllerApplication(zigpy.application.ControllerApplication):
     async def disconnect(self):
         # TODO: how do you shut down the stack?
         self.controller_event.clear()
+
+        if self._adaptive_concurrency is not None:
+            self._adaptive_concurrency.stop()
+
         if self._ezsp is not None:
             await self._ezsp.disconnect()
             self._ezsp = None
 
+        self._close_serial_capture()
+
+    def _start_adaptive_concurrency(self) -> None:
+        bellows_config = self.config[CONF_BELLOWS_CONFIG]
+        if not bellows_config[CONF_ADAPTIVE_CONCURRENCY]:
+            return
+
+        if self._adaptive_concurrency is None:
+            self._adaptive_concurrency = AdaptiveConcurrency(
+                self._concurrent_requests_semaphore,
+                floor=bellows_config[CONF_CONCURRENCY_FLOOR],
+                ceiling=bellows_config[CONF_CONCURRENCY_CEILING],
+                min_free_buffers=bellows_config[CONF_CONCURRENCY_MIN_FREE_BUFFERS],
+                counters=self.state.counters[COUNTERS_CONCURRENCY],
+                get_free_buffers=self._get_free_buffers,
+            )
+
+        self._adaptive_concurrency.start()
+
+    def _record_send(
+        self, sent_at: float, success: bool, *, extended_timeout: bool
+    ) -> None:
+        if self._adaptive_concurrency is not None:
+            self._adaptive_concurrency.record_send(
+                time.monotonic() - sent_at, success, extended_timeout=extended_timeout
+            )
+
+    def _close_serial_capture(self) -> None:
+        if self._serial_capture is not None:
+            self._serial_capture.close()
+            self._serial_capture = None
+
     async def force_remove(self, dev):
         # This should probably be delivered to the parent device instead
         # of the device itself.
@@ -468,81 +638,110 @@ class ControllerApplication(zigpy.application.ControllerApplication):
 
     def ezsp_callback_handler(self, frame_name, args):
         LOGGER.debug("Received %s frame with %s", frame_name, args)
-        if frame_name == "incomingMessageHandler":
-            if self._ezsp.ezsp_version >= 14:
-                (
-                    message_type,
-                    aps_frame,
-                    nwk,
-                    _eui64,
-                    binding_index,
-                    address_index,
-                    lqi,
-                    rssi,
-                    _timestamp,
-                    message,
-                ) = args
-            else:
-                (
-                    message_type,
-                    aps_frame,
-                    lqi,
-                    rssi,
-                    nwk,
-                    binding_index,
-                    address_index,
-                    message,
-                ) = args
-
-            self._handle_frame(
-                message_type=message_type,
-                aps_frame=aps_frame,
-                lqi=lqi,
-                rssi=rssi,
-                sender=nwk,
-                binding_index=binding_index,
-                address_index=address_index,
-                message=message,
-            )
-        elif frame_name == "messageSentHandler":
-            if self._ezsp.ezsp_version >= 14:
-                (
-                    status,
-                    message_type,
-                    destination,
-                    aps_frame,
-                    message_tag,
-                    message,
-                ) = args
-            else:
-                (
-                    message_type,
-                    destination,
-                    aps_frame,
-                    message_tag,
-                    status,
-                    message,
-                ) = args
-                status = t.sl_Status.from_ember_status(status)
-
-            self._handle_frame_sent(
-                message_type=message_type,
-                destination=destination,
-                aps_frame=aps_frame,
-                message_tag=message_tag,
-                status=status,
-                message=message,
-            )
-        elif frame_name == "trustCenterJoinHandler":
-            self._handle_tc_join_handler(*args)
-        elif frame_name == "incomingRouteRecordHandler":
-            self.handle_route_record(*args)
-        elif frame_name == "incomingRouteErrorHandler":
-            status, nwk = args
-            status = t.sl_Status.from_ember_status(status)
-            self.handle_route_error(status, nwk)
-        elif frame_name == "idConflictHandler":
-            self._handle_id_conflict(*args)
+
+        version = self._ezsp.ezsp_version
+        if version != self._callback_handlers_version:
+            self._callback_handlers = self._build_callback_handlers(version)
+            self._callback_handlers_version = version
+
+        handler = self._callback_handlers.get(frame_name)
+        if handler is not None:
+            handler(args)
+
+    def _build_callback_handlers(
+        self, version: int
+    ) -> dict[str, Callable[[list], None]]:
+        """Callback handlers, with the argument layouts of `version` resolved once."""
+        if version >= 14:
+            incoming_message = self._handle_incoming_message
+            message_sent = self._handle_message_sent
+        else:
+            incoming_message = self._handle_incoming_message_legacy
+            message_sent = self._handle_message_sent_legacy
+
+        return {
+            "incomingMessageHandler": incoming_message,
+            "messageSentHandler": message_sent,
+            "trustCenterJoinHandler": (
+                lambda args: self._handle_tc_join_handler(*args)
+            ),
+            "incomingRouteRecordHandler": (
+                lambda args: self.handle_route_record(*args)
+            ),
+            "incomingRouteErrorHandler": self._handle_incoming_route_error,
+            "idConflictHandler": lambda args: self._handle_id_conflict(*args),
+        }
+
+    def _handle_incoming_message(self, args: list) -> None:
+        (
+            message_type,
+            aps_frame,
+            nwk,
+            _eui64,
+            binding_index,
+            address_index,
+            lqi,
+            rssi,
+            _timestamp,
+            message,
+        ) = args
+
+        self._handle_frame(
+            message_type,
+            aps_frame,
+            lqi,
+            rssi,
+            nwk,
+            binding_index,
+            address_index,
+            message,
+        )
+
+    def _handle_incoming_message_legacy(self, args: list) -> None:
+        (
+            message_type,
+            aps_frame,
+            lqi,
+            rssi,
+            nwk,
+            binding_index,
+            address_index,
+            message,
+        ) = args
+
+        self._handle_frame(
+            message_type,
+            aps_frame,
+            lqi,
+            rssi,
+            nwk,
+            binding_index,
+            address_index,
+            message,
+        )
+
+    def _handle_message_sent(self, args: list) -> None:
+        status, message_type, destination, aps_frame, message_tag, message = args
+
+        self._handle_frame_sent(
+            message_type, destination, aps_frame, message_tag, status, message
+        )
+
+    def _handle_message_sent_legacy(self, args: list) -> None:
+        message_type, destination, aps_frame, message_tag, status, message = args
+
+        self._handle_frame_sent(
+            message_type,
+            destination,
+            aps_frame,
+            message_tag,
+            t.sl_Status.from_ember_status(status),
+            message,
+        )
+
+    def _handle_incoming_route_error(self, args: list) -> None:
+        status, nwk = args
+        self.handle_route_error(t.sl_Status.from_ember_status(status), nwk)
 
     def _handle_frame(
         self,
@@ -556,30 +755,26 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         message: bytes,
     ) -> None:
         if message_type == t.EmberIncomingMessageType.INCOMING_BROADCAST:
-            dst = zigpy.types.AddrModeAddress(
-                addr_mode=zigpy.types.AddrMode.Broadcast,
-                address=zigpy.types.BroadcastAddress.ALL_ROUTERS_AND_COORDINATOR,
-            )
-            self.state.counters[COUNTERS_CTRL][COUNTER_RX_BCAST].increment()
+            dst = _BROADCAST_DST
+            self._ctrl_counts[_RX_BCAST] += 1
         elif message_type == t.EmberIncomingMessageType.INCOMING_MULTICAST:
-            dst = zigpy.types.AddrModeAddress(
-                addr_mode=zigpy.types.AddrMode.Group, address=aps_frame.groupId
+            dst = zigpy.types.AddrModeAddress.interned(
+                zigpy.types.AddrMode.Group, aps_frame.groupId
             )
-            self.state.counters[COUNTERS_CTRL][COUNTER_RX_MCAST].increment()
+            self._ctrl_counts[_RX_MCAST] += 1
         elif message_type == t.EmberIncomingMessageType.INCOMING_UNICAST:
-            dst = zigpy.types.AddrModeAddress(
-                addr_mode=zigpy.types.AddrMode.NWK, address=self.state.node_info.nwk
+            dst = zigpy.types.AddrModeAddress.interned(
+                zigpy.types.AddrMode.NWK, self.state.node_info.nwk
             )
-            self.state.counters[COUNTERS_CTRL][COUNTER_RX_UNICAST].increment()
+            self._ctrl_counts[_RX_UNICAST] += 1
         else:
             LOGGER.debug("Ignoring message type: %r", message_type)
             return
 
         self.packet_received(
             zigpy.types.ZigbeePacket(
-                src=zigpy.types.AddrModeAddress(
-                    addr_mode=zigpy.types.AddrMode.NWK,
-                    address=sender,
+                src=zigpy.types.AddrModeAddress.interned(
+                    zigpy.types.AddrMode.NWK, sender
                 ),
                 src_ep=aps_frame.sourceEndpoint,
                 dst=dst,
@@ -602,41 +797,21 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         status: t.sl_Status,
         message: bytes,
     ):
-        if status == t.sl_Status.OK:
-            msg = "success"
-        else:
-            msg = "failure"
-
-        if message_type in (
-            t.EmberOutgoingMessageType.OUTGOING_BROADCAST,
-            t.EmberOutgoingMessageType.OUTGOING_BROADCAST_WITH_ALIAS,
-        ):
-            cnt_name = f"broadcast_tx_{msg}"
-        elif message_type in (
-            t.EmberOutgoingMessageType.OUTGOING_MULTICAST,
-            t.EmberOutgoingMessageType.OUTGOING_MULTICAST_WITH_ALIAS,
-        ):
-            cnt_name = f"multicast_tx_{msg}"
-        elif message_type in (
-            t.EmberOutgoingMessageType.OUTGOING_DIRECT,
-            t.EmberOutgoingMessageType.OUTGOING_VIA_ADDRESS_TABLE,
-        ):
-            cnt_name = f"unicast_tx_{msg}"
-        elif message_type == t.EmberOutgoingMessageType.OUTGOING_VIA_BINDING:
-            cnt_name = f"via_binding_tx_{msg}"
-        else:
-            cnt_name = f"unknown_msg_type_{msg}"
+        success = status == t.sl_Status.OK
+        sent, unexpected, duplicate = _TX_COUNTERS.get(
+            (message_type, success), _TX_UNKNOWN_COUNTERS[success]
+        )
 
         try:
             pending_tag = (destination, message_tag)
             request = self._pending[pending_tag]
-            request.result.set_result((status, f"message send {msg}"))
-            self.state.counters[COUNTERS_CTRL][cnt_name].increment()
+            request.result.set_result((status, _TX_RESULT_MESSAGES[success]))
+            self._ctrl_counts[sent] += 1
         except KeyError:
-            self.state.counters[COUNTERS_CTRL][f"{cnt_name}_unexpected"].increment()
+            self._ctrl_counts[unexpected] += 1
             LOGGER.debug("Unexpected message send notification tag: %s", pending_tag)
         except asyncio.InvalidStateError as exc:
-            self.state.counters[COUNTERS_CTRL][f"{cnt_name}_duplicate"].increment()
+            self._ctrl_counts[duplicate] += 1
             LOGGER.debug(
                 (
                     "Invalid state on future for message tag %s "
@@ -666,6 +841,9 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         parent_nwk: t.EmberNodeId,
     ) -> None:
         """Trust Center Join handler."""
+        # Joins, rejoins and leaves may all change the NCP's address table entry
+        self._ezsp.invalidate_extended_timeout(ieee=ieee)
+
         if device_update_status == t.EmberDeviceUpdate.DEVICE_LEFT:
             self.handle_leave(nwk, ieee)
             return
@@ -800,6 +978,23 @@ class ControllerApplication(zigpy.application.ControllerApplication):
         self._check_status(status)
         self._packet_capture_channel = channel
 
+    async def _set_extended_timeout(
+        self, device: zigpy.device.Device, extended_timeout: bool
+    ) -> None:
+        """Set the extended timeout for a device, skipping it if the NCP has it."""
+        if self._ezsp.is_extended_timeout_cached(
+            nwk=device.nwk, ieee=device.ieee, extended_timeout=extended_timeout
+        ):
+            self._ctrl_counts[_EXT_TIMEOUT_CACHE_HIT] += 1
+            return
+
+        self._ctrl_counts[_EXT_TIMEOUT_CACHE_MISS] += 1
+        await self._ezsp.set_extended_timeout(
+            nwk=device.nwk,
+            ieee=device.ieee,
+            extended_timeout=extended_timeout,
+        )
+
     async def send_packet(self, packet: zigpy.types.ZigbeePacket) -> None:
         if not self.is_controller_running:
             raise ControllerError("ApplicationController is not running")
@@ -865,11 +1060,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                 async with self._req_lock:
                     if packet.dst.addr_mode == zigpy.types.AddrMode.NWK:
                         if device is not None:
-                            await self._ezsp.set_extended_timeout(
-                                nwk=device.nwk,
-                                ieee=device.ieee,
-                                extended_timeout=extended_timeout,
-                            )
+                            await self._set_extended_timeout(device, extended_timeout)
 
                         if packet.source_route is not None:
                             if (
@@ -889,6 +1080,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                                     relays=packet.source_route,
                                 )
 
+                        sent_at = time.monotonic()
                         status, _ = await self._ezsp.send_unicast(
                             nwk=packet.dst.address,
                             aps_frame=aps_frame,
@@ -914,6 +1106,12 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                         )
 
                 if status != t.sl_Status.OK:
+                    if (
+                        status == t.sl_Status.ALLOCATION_FAILED
+                        and self._adaptive_concurrency is not None
+                    ):
+                        self._adaptive_concurrency.record_no_buffers()
+
                     raise zigpy.exceptions.DeliveryError(
                         f"Failed to enqueue message: {status!r}", status
                     )
@@ -925,14 +1123,25 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                     return
 
                 # Wait for `messageSentHandler` message
-                async with asyncio_timeout(
-                    MESSAGE_SEND_TIMEOUT_MAINS
-                    if not packet.extended_timeout
-                    else MESSAGE_SEND_TIMEOUT_BATTERY
-                ):
-                    send_status, _ = await req.result
-
-                if t.sl_Status.from_ember_status(send_status) != t.sl_Status.OK:
+                try:
+                    async with asyncio_timeout(
+                        MESSAGE_SEND_TIMEOUT_MAINS
+                        if not packet.extended_timeout
+                        else MESSAGE_SEND_TIMEOUT_BATTERY
+                    ):
+                        send_status, _ = await req.result
+                except asyncio.TimeoutError:
+                    self._record_send(
+                        sent_at, success=False, extended_timeout=packet.extended_timeout
+                    )
+                    raise
+
+                delivered = t.sl_Status.from_ember_status(send_status) == t.sl_Status.OK
+                self._record_send(
+                    sent_at, success=delivered, extended_timeout=packet.extended_timeout
+                )
+
+                if not delivered:
                     raise zigpy.exceptions.DeliveryError(
                         f"Failed to deliver message: {send_status!r}", send_status
                     )
@@ -970,6 +1179,7 @@ class ControllerApplication(zigpy.application.ControllerApplication):
     def _handle_id_conflict(self, nwk: t.EmberNodeId) -> None:
         LOGGER.warning("NWK conflict is reported for 0x%04x", nwk)
         self.state.counters[COUNTERS_CTRL][COUNTER_NWK_CONFLICTS].increment()
+        self._ezsp.invalidate_extended_timeout(nwk=nwk)
         for device in self.devices.values():
             if device.nwk != nwk:
                 continue
@@ -1017,6 +1227,13 @@ class ControllerApplication(zigpy.application.ControllerApplication):
                     cnt._raw_value = free_buffers
                     cnt._last_reset_value = 0
 
+                    if self._adaptive_concurrency is not None:
+                        self._adaptive_concurrency.record_free_buffers(free_buffers)
+
+                ctrl_counters = self.state.counters[COUNTERS_CTRL]
+                for name, value in self._ezsp.fragment_counters.items():
+                    ctrl_counters[f"fragment_{name}"].update(value)
+
                 LOGGER.debug("%s", counters)
         except (asyncio.TimeoutError, EzspError) as exc:
             # TODO: converted Silvercrest gateways break without this
@@ -1056,3 +1273,4 @@ class ControllerApplication(zigpy.application.ControllerApplication):
 
     def handle_route_error(self, status: t.sl_Status, nwk: t.EmberNodeId) -> None:
         LOGGER.debug("Processing route error: status=%s, nwk=%s", status, nwk)
+        self.routing.handle_route_error(nwk)
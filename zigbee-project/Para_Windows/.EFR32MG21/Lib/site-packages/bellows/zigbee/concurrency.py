@@ -0,0 +1,214 @@
+"""Adaptive limit of the number of requests sent to the NCP concurrently.
+
+The application's request semaphore bounds how many packets are queued in the NCP at
+once. A fixed limit is either too low to use the radio during a burst or high enough
+to exhaust the NCP's packet buffers. `AdaptiveConcurrency` adjusts the limit with an
+additive-increase/multiplicative-decrease rule, once per interval:
+
+* the limit is cut in half when the free packet buffers fall below a watermark or a
+  message could not be queued for lack of buffers,
+* it is cut by a quarter when too many `messageSentHandler` report a failure or the
+  send latency grows well above its baseline (the NCP queue is filling up),
+* it grows by one when requests had to wait for the semaphore and none of the above
+  happened.
+
+Messages sent with an extended timeout (end devices, which may be asleep until their
+next poll) are slow and fail for reasons unrelated to the NCP queue, so they only count
+as demand and are left out of the failure rate and the latency.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Awaitable, Callable
+
+import zigpy.state
+from zigpy.datastructures import PriorityDynamicBoundedSemaphore
+
+LOGGER = logging.getLogger(__name__)
+
+COUNTERS_CONCURRENCY = "adaptive_concurrency"
+
+ADJUST_INTERVAL = 1.0  # Seconds between decisions
+MIN_SAMPLES = 8  # Sent messages in an interval needed to judge the failure rate
+MAX_FAILURE_RATE = 0.25
+DECREASE_FACTOR = 0.75
+BUFFERS_DECREASE_FACTOR = 0.5
+
+# Latency is smoothed, and compared to the lowest smoothed latency seen so far
+LATENCY_SMOOTHING = 0.2
+LATENCY_FACTOR = 3.0
+LATENCY_MIN_TARGET = 0.25  # Seconds, latencies below this never trigger a decrease
+LATENCY_BASELINE_DECAY = 1.01  # Per interval, lets the baseline follow a slower network
+
+
+class AdaptiveConcurrency:
+    """AIMD controller of the `max_value` of a request semaphore."""
+
+    def __init__(
+        self,
+        semaphore: PriorityDynamicBoundedSemaphore,
+        *,
+        floor: int,
+        ceiling: int,
+        min_free_buffers: int,
+        counters: zigpy.state.CounterGroup,
+        get_free_buffers: Callable[[], Awaitable[int | None]] | None = None,
+        interval: float = ADJUST_INTERVAL,
+    ) -> None:
+        if not 1 <= floor <= ceiling:
+            raise ValueError(f"Invalid concurrency bounds: {floor}..{ceiling}")
+
+        self._semaphore = semaphore
+        self.floor = floor
+        self.ceiling = ceiling
+        self.min_free_buffers = min_free_buffers
+        self._counters = counters
+        self._get_free_buffers = get_free_buffers
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+
+        self.free_buffers: int | None = None
+        self.latency: float | None = None
+        self._latency_baseline = math.inf
+
+        # Per interval
+        self._sent = 0
+        self._failed = 0
+        self._saturated = False
+        self._out_of_buffers = False
+
+        self.limit = min(max(semaphore.max_value, floor), ceiling)
+        self._apply(self.limit)
+
+    def start(self) -> None:
+        self.stop()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record_send(
+        self, latency: float, success: bool, *, extended_timeout: bool = False
+    ) -> None:
+        """A `messageSentHandler` was received `latency` seconds after sending."""
+        if self._semaphore.num_waiting > 0:
+            self._saturated = True
+
+        if extended_timeout:
+            return
+
+        self._sent += 1
+        self._failed += not success
+
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+        self._latency_baseline = min(self._latency_baseline, self.latency)
+
+    def record_free_buffers(self, free_buffers: int) -> None:
+        self.free_buffers = free_buffers
+        self._set_gauge("free_buffers", free_buffers)
+
+    def record_no_buffers(self) -> None:
+        """The NCP could not queue a message: back off without waiting."""
+        self._out_of_buffers = True
+        self._decrease("no_buffers", BUFFERS_DECREASE_FACTOR)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+
+            busy = (
+                self._sent > 0
+                or self._semaphore.num_waiting > 0
+                or self._semaphore.value < self._semaphore.max_value
+            )
+
+            # Buffers are only worth polling while requests are in flight
+            if busy and self._get_free_buffers is not None:
+                try:
+                    free_buffers = await self._get_free_buffers()
+                except Exception as exc:  # noqa: BLE001
+                    LOGGER.debug("Failed to read the free buffers: %r", exc)
+                else:
+                    if free_buffers is not None:
+                        self.record_free_buffers(free_buffers)
+
+            self.adjust()
+
+    def adjust(self) -> str | None:
+        """Take a decision from the feedback of the last interval and reset it."""
+        if self._semaphore.num_waiting > 0:
+            self._saturated = True
+
+        decision = None
+
+        if self._out_of_buffers:
+            pass  # Already handled by `record_no_buffers`
+        elif (
+            self.free_buffers is not None and self.free_buffers < self.min_free_buffers
+        ):
+            decision = self._decrease("buffers", BUFFERS_DECREASE_FACTOR)
+        elif self._sent >= MIN_SAMPLES and self._failed / self._sent > MAX_FAILURE_RATE:
+            decision = self._decrease("failures", DECREASE_FACTOR)
+        elif (
+            self._sent > 0
+            and self.latency is not None
+            and self.latency > LATENCY_MIN_TARGET
+            and self.latency > LATENCY_FACTOR * self._latency_baseline
+        ):
+            decision = self._decrease("latency", DECREASE_FACTOR)
+        elif self._saturated and (
+            self.free_buffers is None or self.free_buffers >= 2 * self.min_free_buffers
+        ):
+            decision = self._increase()
+
+        if self._sent:
+            self._set_gauge("failure_rate_pct", round(100 * self._failed / self._sent))
+        if self.latency is not None:
+            self._set_gauge("latency_ms", round(self.latency * 1000))
+
+        self._sent = 0
+        self._failed = 0
+        self._saturated = False
+        self._out_of_buffers = False
+        self._latency_baseline *= LATENCY_BASELINE_DECAY
+
+        return decision
+
+    def _increase(self) -> str | None:
+        if self.limit >= self.ceiling:
+            return None
+
+        self._apply(self.limit + 1)
+        self._counters["increase"].increment()
+        return "increase"
+
+    def _decrease(self, reason: str, factor: float) -> str | None:
+        new_limit = max(self.floor, int(self.limit * factor))
+        if new_limit >= self.limit:
+            return None
+
+        LOGGER.debug(
+            "Lowering request concurrency %d => %d (%s)", self.limit, new_limit, reason
+        )
+        self._apply(new_limit)
+        self._counters[f"decrease_{reason}"].increment()
+        return f"decrease_{reason}"
+
+    def _apply(self, limit: int) -> None:
+        self.limit = limit
+        self._semaphore.max_value = limit
+        self._set_gauge("limit", limit)
+
+    def _set_gauge(self, name: str, value: int) -> None:
+        cnt = self._counters[name]
+        cnt._raw_value = value
+        cnt._last_reset_value = 0
@@ -5,14 +5,18 @@ import contextlib
 from datetime import datetime, timedelta, timezone
 import json
 import logging
+import os
 import re
+import time
 import types
-from typing import Any
+from typing import Any, Callable, TypeVar
 
 import aiosqlite
 
 import zigpy.appdb_schemas
+import zigpy.appdb_snapshot
 import zigpy.backups
+import zigpy.config as conf
 import zigpy.device
 import zigpy.endpoint
 import zigpy.exceptions
@@ -29,6 +33,8 @@ from zigpy.zdo import types as zdo_t
 
 LOGGER = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
 DB_VERSION = 13
 DB_V = f"_v{DB_VERSION}"
 MIN_SQLITE_VERSION = (3, 24, 0)
@@ -38,6 +44,11 @@ DB_V_REGEX = re.compile(r"(?:_v\d+)?$")
 
 MIN_UPDATE_DELTA = timedelta(seconds=30).total_seconds()
 
+# aiosqlite has no public API to run a function with its `sqlite3.Connection` in the
+# connection thread: `_run_sync` uses the private `Connection._execute` and
+# `Connection._conn`, which are the same in these versions
+AIOSQLITE_TESTED_VERSIONS = ("0.20", "0.21")
+
 
 def _import_compatible_sqlite3(min_version: tuple[int, int, int]) -> types.ModuleType:
     """Loads an SQLite module with a library version matching the provided constraint."""
@@ -82,6 +93,103 @@ def _register_sqlite_adapters():
     sqlite3.register_converter("ieee", convert_ieee)
 
 
+def _execute_commit(
+    conn: sqlite3.Connection, sql: str, parameters: Any = ()
+) -> None:
+    conn.execute(sql, parameters)
+    conn.commit()
+
+
+def _execute_each_commit(conn: sqlite3.Connection, sql: str, rows: list) -> None:
+    """Execute a statement once per row and commit them together.
+
+    A row failing to write is skipped, like a failing event is by `_worker`.
+    """
+    for parameters in rows:
+        try:
+            conn.execute(sql, parameters)
+        except sqlite3.Error as exc:
+            LOGGER.debug("Error executing %r with %s params: %s", sql, parameters, exc)
+
+    conn.commit()
+
+
+def _replace_rows_commit(
+    conn: sqlite3.Connection, delete_sql: str, key: Any, insert_sql: str, rows: list
+) -> None:
+    conn.execute(delete_sql, (key,))
+    conn.executemany(insert_sql, rows)
+    conn.commit()
+
+
+def _executescript(conn: sqlite3.Connection, sql: str) -> None:
+    """Naive replacement for `sqlite3.Cursor.executescript` that does not execute a
+    `COMMIT` before running the script. This extra `COMMIT` breaks transactions that
+    run scripts.
+    """
+
+    # XXX: This will break if you use a semicolon anywhere but at the end of a line
+    for statement in sql.split(";"):
+        conn.execute(statement)
+
+
+def _read_snapshot_tables(conn: sqlite3.Connection) -> dict[str, list[tuple]]:
+    return {
+        name: conn.execute(f"SELECT * FROM {name}{DB_V} {order}").fetchall()
+        for name, order in zigpy.appdb_snapshot.SNAPSHOT_TABLES.items()
+    }
+
+
+def _bump_generation_commit(
+    conn: sqlite3.Connection, func: Callable[..., _T], *args: Any
+) -> _T:
+    """Run `func(conn, *args)` in the transaction that bumps the snapshot generation.
+
+    Both are committed together or not at all, a snapshot can never look current after
+    a write.
+    """
+    try:
+        try:
+            conn.execute(
+                f"UPDATE {zigpy.appdb_snapshot.SNAPSHOT_STATE_TABLE}"
+                " SET generation = generation + 1"
+            )
+        except sqlite3.Error:
+            LOGGER.error(
+                "Failed to bump the database generation, dropping the write",
+                exc_info=True,
+            )
+            raise
+
+        result = func(conn, *args)
+    except BaseException:
+        conn.rollback()
+        raise
+
+    if conn.in_transaction:
+        conn.commit()
+
+    return result
+
+
+def _check_aiosqlite() -> None:
+    """Check that the private aiosqlite API used by `_run_sync` is available."""
+    if not callable(getattr(aiosqlite.Connection, "_execute", None)) or not isinstance(
+        getattr(aiosqlite.Connection, "_conn", None), property
+    ):
+        raise RuntimeError(
+            f"aiosqlite {aiosqlite.__version__} is not supported, it has no"
+            " `Connection._execute` and `Connection._conn`"
+        )
+
+    if aiosqlite.__version__.rsplit(".", 1)[0] not in AIOSQLITE_TESTED_VERSIONS:
+        LOGGER.warning(
+            "aiosqlite %s has not been tested, supported versions are %s",
+            aiosqlite.__version__,
+            ", ".join(AIOSQLITE_TESTED_VERSIONS),
+        )
+
+
 def aiosqlite_connect(
     database: str, iter_chunk_size: int = 64, **kwargs
 ) -> aiosqlite.Connection:
@@ -116,39 +224,95 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         self.running = False
         self._worker_task = asyncio.create_task(self._worker())
 
+        # Attribute persistence policies, keyed by `(cluster_id, attr_id)`. An `attr_id`
+        # of `None` applies to every attribute of the cluster.
+        self._attribute_policies: dict[tuple[int, int | None], dict[str, Any]] = {
+            (
+                policy[conf.CONF_ATTRIBUTE_PERSISTENCE_CLUSTER_ID],
+                policy[conf.CONF_ATTRIBUTE_PERSISTENCE_ATTRIBUTE_ID],
+            ): policy
+            for policy in application.config.get(conf.CONF_ATTRIBUTE_PERSISTENCE, [])
+        }
+        # Last persisted value and time of attributes with a non-default policy
+        self._persisted_attributes: dict[tuple, tuple[Any, float]] = {}
+        # Latest value of attributes whose write was skipped by their policy
+        self._deferred_attributes: dict[tuple, tuple] = {}
+
+        self._snapshot_path: str | None = application.config.get(
+            conf.CONF_STATE_SNAPSHOT
+        )
+        self._snapshot_period: float = 60 * application.config.get(
+            conf.CONF_STATE_SNAPSHOT_PERIOD, conf.CONF_STATE_SNAPSHOT_PERIOD_DEFAULT
+        )
+        self._snapshot_task: asyncio.Task | None = None
+        # Identity and generation of the database, see `zigpy.appdb_snapshot`
+        self._db_id: str | None = None
+        self._generation: int = 0
+        # Generation of the last snapshot written or restored
+        self._snapshot_generation: int | None = None
+        # A snapshot may exist for the current generation, the next write must bump it
+        self._generation_pinned = True
+        # Set by `_worker` while running a write handler that must bump the generation,
+        # the first unit of work of the handler does it
+        self._bump_next_write = False
+        # Signature rows and quirk of the devices matched at load time
+        self._matched_quirks: dict[
+            t.EUI64, tuple[tuple, zigpy.appdb_snapshot.QuirkRef | None]
+        ] = {}
+
     async def initialize_tables(self) -> None:
-        async with self.execute("PRAGMA integrity_check") as cursor:
-            rows = await cursor.fetchall()
-            status = "\n".join(row[0] for row in rows)
+        self._db_id, self._generation = await self._run_sync(self._initialize_database)
 
-            if status != "ok":
-                LOGGER.error(
-                    "Zigbee database is corrupted, integrity check failed!\n%s", status
-                )
+    def _initialize_database(self, conn: sqlite3.Connection) -> tuple[str, int]:
+        """Check, configure and migrate the database, returning its snapshot state."""
+        status = "\n".join(row[0] for row in conn.execute("PRAGMA integrity_check"))
 
-        async with self.execute("PRAGMA foreign_key_check") as cursor:
-            rows = await cursor.fetchall()
+        if status != "ok":
+            LOGGER.error(
+                "Zigbee database is corrupted, integrity check failed!\n%s", status
+            )
 
-            if rows:
-                LOGGER.error(
-                    "Zigbee database is corrupted, foreign key check failed!\n%s", rows
-                )
+        rows = conn.execute("PRAGMA foreign_key_check").fetchall()
+
+        if rows:
+            LOGGER.error(
+                "Zigbee database is corrupted, foreign key check failed!\n%s", rows
+            )
 
         # Truncate the SQLite journal file instead of deleting it after transactions
-        await self._set_isolation_level(None)
-        await self.execute("PRAGMA journal_mode = WAL")
-        await self.execute("PRAGMA synchronous = normal")
-        await self.execute("PRAGMA temp_store = memory")
-        await self._set_isolation_level("DEFERRED")
+        conn.isolation_level = None
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = normal")
+        conn.execute("PRAGMA temp_store = memory")
+        conn.isolation_level = "DEFERRED"
+
+        conn.execute("PRAGMA foreign_keys = ON")
+        self._run_migrations(conn)
+        return self._initialize_snapshot_state(conn)
+
+    def _initialize_snapshot_state(self, conn: sqlite3.Connection) -> tuple[str, int]:
+        table = zigpy.appdb_snapshot.SNAPSHOT_STATE_TABLE
+
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                db_id TEXT NOT NULL,
+                generation INTEGER NOT NULL
+            )"""
+        )
+        conn.execute(
+            f"INSERT OR IGNORE INTO {table} VALUES (0, ?, 0)", (os.urandom(8).hex(),)
+        )
+        conn.commit()
 
-        await self.execute("PRAGMA foreign_keys = ON")
-        await self._run_migrations()
+        return conn.execute(f"SELECT db_id, generation FROM {table}").fetchone()
 
     @classmethod
     async def new(
         cls, database_file: str, app: zigpy.typing.ControllerApplicationType
     ) -> PersistingListener:
         """Create an instance of persisting listener."""
+        _check_aiosqlite()
         sqlite_conn = await aiosqlite_connect(
             database_file,
             detect_types=sqlite3.PARSE_DECLTYPES,
@@ -167,10 +331,39 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
 
     async def _worker(self) -> None:
         """Process request in the received order."""
+        # Event taken from the queue while collecting attribute writes
+        pending = None
+
         while True:
-            cb_name, args = await self._callback_handlers.get()
+            if pending is None:
+                cb_name, args = await self._callback_handlers.get()
+            else:
+                (cb_name, args), pending = pending, None
+
+            count = 1
+
+            if cb_name == "_save_attribute":
+                # Consecutive attribute writes are committed together
+                updates = [args]
+
+                while not self._callback_handlers.empty():
+                    pending = self._callback_handlers.get_nowait()
+
+                    if pending[0] != "_save_attribute":
+                        break
+
+                    updates.append(pending[1])
+                    pending = None
+
+                cb_name, args, count = "_save_attributes", (updates,), len(updates)
+
             handler = getattr(self, cb_name)
             assert handler
+            # Every other handler writes to the database
+            self._bump_next_write = (
+                cb_name != "_save_snapshot" and self._generation_pinned
+            )
+
             try:
                 await handler(*args)
             except sqlite3.Error as exc:
@@ -184,19 +377,29 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 LOGGER.error(
                     "Unexpected error while processing %s(%s): %s", cb_name, args, ex
                 )
-            self._callback_handlers.task_done()
+            finally:
+                self._bump_next_write = False
+
+            for _ in range(count):
+                self._callback_handlers.task_done()
 
     async def shutdown(self) -> None:
         """Shutdown connection."""
+        self.flush_deferred_attributes()
         self.running = False
+        self.stop_periodic_snapshots()
         await self._callback_handlers.join()
         if not self._worker_task.done():
             self._worker_task.cancel()
 
+        if self._snapshot_path is not None and self._db_id is not None:
+            try:
+                await self._save_snapshot()
+            except Exception:  # noqa: BLE001
+                LOGGER.warning("Failed to write the state snapshot", exc_info=True)
+
         # Delete the journal on shutdown
-        await self._set_isolation_level(None)
-        await self.execute("PRAGMA wal_checkpoint;")
-        await self._set_isolation_level("DEFERRED")
+        await self._run_sync(self._checkpoint)
 
         await self._db.close()
 
@@ -210,29 +413,47 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             return
         self._callback_handlers.put_nowait((cb_name, args))
 
-    async def _set_isolation_level(self, level: str | None):
-        """Set the SQLite statement isolation level in a thread-safe way."""
-        await self._db._execute(lambda: setattr(self._db, "isolation_level", level))
+    async def _run_sync(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run `func(connection, *args)` in the database thread as one unit of work.
+
+        `func` gets the `sqlite3.Connection` and can execute any number of statements
+        and commit, for a single round trip to the database thread instead of one per
+        statement, commit and fetched chunk of rows. It runs outside of the event loop,
+        so it must not access the application state.
+
+        The first unit of work of a write handler also bumps the snapshot generation,
+        in the same transaction.
+        """
+        if not self._bump_next_write:
+            return await self._db._execute(func, self._db._conn, *args)
+
+        self._bump_next_write = False
+        result = await self._db._execute(
+            _bump_generation_commit, self._db._conn, func, *args
+        )
+        self._generation += 1
+        self._generation_pinned = False
+        return result
+
+    def _checkpoint(self, conn: sqlite3.Connection) -> None:
+        conn.isolation_level = None
+        conn.execute("PRAGMA wal_checkpoint;")
+        conn.isolation_level = "DEFERRED"
 
     def execute(self, *args, **kwargs):
         return self._db.execute(*args, **kwargs)
 
     async def executescript(self, sql):
-        """Naive replacement for `sqlite3.Cursor.executescript` that does not execute a
-        `COMMIT` before running the script. This extra `COMMIT` breaks transactions that
-        run scripts.
-        """
-
-        # XXX: This will break if you use a semicolon anywhere but at the end of a line
-        for statement in sql.split(";"):
-            await self.execute(statement)
+        """Run a script in a single unit of work, see `_executescript`."""
+        await self._run_sync(_executescript, sql)
 
     def device_joined(self, device: zigpy.typing.DeviceType) -> None:
         self.enqueue("_update_device_nwk", device.ieee, device.nwk)
 
     async def _update_device_nwk(self, ieee: t.EUI64, nwk: t.NWK) -> None:
-        await self.execute(f"UPDATE devices{DB_V} SET nwk=? WHERE ieee=?", (nwk, ieee))
-        await self._db.commit()
+        await self._run_sync(
+            _execute_commit, f"UPDATE devices{DB_V} SET nwk=? WHERE ieee=?", (nwk, ieee)
+        )
 
     def device_initialized(self, device: zigpy.typing.DeviceType) -> None:
         pass
@@ -241,24 +462,24 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         pass
 
     def device_last_seen_updated(
-        self, device: zigpy.typing.DeviceType, last_seen: datetime
+        self, device: zigpy.typing.DeviceType, last_seen: float
     ) -> None:
-        """Device last_seen time is updated."""
+        """Device last_seen time (POSIX timestamp) is updated."""
         self.enqueue("_save_device_last_seen", device.ieee, last_seen)
 
-    async def _save_device_last_seen(self, ieee: t.EUI64, last_seen: datetime) -> None:
+    async def _save_device_last_seen(self, ieee: t.EUI64, last_seen: float) -> None:
         q = f"""UPDATE devices{DB_V}
                     SET last_seen=:ts
                     WHERE ieee=:ieee AND :ts - last_seen > :min_update_delta"""
-        await self.execute(
+        await self._run_sync(
+            _execute_commit,
             q,
             {
-                "ts": last_seen.timestamp(),
+                "ts": last_seen,
                 "ieee": ieee,
                 "min_update_delta": MIN_UPDATE_DELTA,
             },
         )
-        await self._db.commit()
 
     def device_relays_updated(
         self, device: zigpy.typing.DeviceType, relays: t.Relays | None
@@ -268,14 +489,16 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
 
     async def _save_device_relays(self, ieee: t.EUI64, relays: t.Relays | None) -> None:
         if relays is None:
-            await self.execute(f"DELETE FROM relays{DB_V} WHERE ieee = ?", (ieee,))
+            await self._run_sync(
+                _execute_commit, f"DELETE FROM relays{DB_V} WHERE ieee = ?", (ieee,)
+            )
         else:
             q = f"""INSERT INTO relays{DB_V} VALUES (:ieee, :relays)
                         ON CONFLICT (ieee)
                         DO UPDATE SET relays=excluded.relays WHERE relays != :relays"""
-            await self.execute(q, {"ieee": ieee, "relays": relays.serialize()})
-
-        await self._db.commit()
+            await self._run_sync(
+                _execute_commit, q, {"ieee": ieee, "relays": relays.serialize()}
+            )
 
     def attribute_updated(
         self,
@@ -284,8 +507,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         value: Any,
         timestamp: datetime,
     ) -> None:
-        self.enqueue(
-            "_save_attribute",
+        args = (
             cluster.endpoint.device.ieee,
             cluster.endpoint.endpoint_id,
             cluster.cluster_type,
@@ -295,7 +517,87 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             timestamp,
         )
 
+        policy = self._attribute_policies.get(
+            (cluster.cluster_id, attrid)
+        ) or self._attribute_policies.get((cluster.cluster_id, None))
+
+        if policy is None:
+            self.enqueue("_save_attribute", *args)
+            return
+        elif policy[conf.CONF_ATTRIBUTE_PERSISTENCE_POLICY] == (
+            conf.ATTRIBUTE_PERSISTENCE_NEVER
+        ):
+            return
+
+        if not self._should_persist_attribute(policy, args[:5], value):
+            self._deferred_attributes[args[:5]] = args
+            return
+
+        self._deferred_attributes.pop(args[:5], None)
+        self._persisted_attributes[args[:5]] = (value, time.monotonic())
+        self.enqueue("_save_attribute", *args)
+
+    def _should_persist_attribute(
+        self, policy: dict[str, Any], key: tuple, value: Any
+    ) -> bool:
+        """Decide whether an attribute update is written according to its policy."""
+        mode = policy[conf.CONF_ATTRIBUTE_PERSISTENCE_POLICY]
+
+        if mode == conf.ATTRIBUTE_PERSISTENCE_ALWAYS:
+            return True
+
+        last = self._persisted_attributes.get(key)
+
+        if last is None:
+            return True
+
+        last_value, last_persisted = last
+
+        if mode == conf.ATTRIBUTE_PERSISTENCE_SAMPLED:
+            return (
+                time.monotonic() - last_persisted
+                >= policy[conf.CONF_ATTRIBUTE_PERSISTENCE_INTERVAL]
+            )
+
+        try:
+            return (
+                abs(value - last_value)
+                > policy[conf.CONF_ATTRIBUTE_PERSISTENCE_THRESHOLD]
+            )
+        except TypeError:
+            # Non-numeric attributes are written whenever they change
+            return value != last_value
+
+    def flush_deferred_attributes(self) -> None:
+        """Write the latest value of every attribute whose write was deferred."""
+        deferred = self._deferred_attributes
+        self._deferred_attributes = {}
+
+        for key, args in deferred.items():
+            self._persisted_attributes[key] = (args[5], time.monotonic())
+            self.enqueue("_save_attribute", *args)
+
+    def _discard_attribute_state(self, ieee: t.EUI64, key: tuple | None = None) -> None:
+        """Forget the policy state of one attribute or of every attribute of a device."""
+        for attributes in (self._deferred_attributes, self._persisted_attributes):
+            if key is not None:
+                attributes.pop(key, None)
+                continue
+
+            for attr_key in [k for k in attributes if k[0] == ieee]:
+                del attributes[attr_key]
+
     def attribute_cleared(self, cluster: zigpy.typing.ClusterType, attrid: int) -> None:
+        self._discard_attribute_state(
+            cluster.endpoint.device.ieee,
+            (
+                cluster.endpoint.device.ieee,
+                cluster.endpoint.endpoint_id,
+                cluster.cluster_type,
+                cluster.cluster_id,
+                attrid,
+            ),
+        )
         self.enqueue(
             "_clear_attribute",
             cluster.endpoint.device.ieee,
@@ -328,8 +630,9 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         q = f"""INSERT INTO unsupported_attributes{DB_V} VALUES (?, ?, ?, ?, ?)
                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id, attr_id)
                    DO NOTHING"""
-        await self.execute(q, (ieee, endpoint_id, cluster_type, cluster_id, attrid))
-        await self._db.commit()
+        await self._run_sync(
+            _execute_commit, q, (ieee, endpoint_id, cluster_type, cluster_id, attrid)
+        )
 
     def unsupported_attribute_removed(
         self, cluster: zigpy.typing.ClusterType, attrid: int
@@ -356,8 +659,9 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                                                          AND cluster_type = ?
                                                          AND cluster_id = ?
                                                          AND attr_id = ?"""
-        await self.execute(q, (ieee, endpoint_id, cluster_type, cluster_id, attrid))
-        await self._db.commit()
+        await self._run_sync(
+            _execute_commit, q, (ieee, endpoint_id, cluster_type, cluster_id, attrid)
+        )
 
     def neighbors_updated(self, ieee: t.EUI64, neighbors: list[zdo_t.Neighbor]) -> None:
         """Neighbor update from Mgmt_Lqi_req."""
@@ -366,28 +670,30 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
     async def _neighbors_updated(
         self, ieee: t.EUI64, neighbors: list[zdo_t.Neighbor]
     ) -> None:
-        await self.execute(f"DELETE FROM neighbors{DB_V} WHERE device_ieee = ?", [ieee])
-
         rows = [(ieee, *neighbor.as_tuple()) for neighbor in neighbors]
 
-        await self._db.executemany(
-            f"INSERT INTO neighbors{DB_V} VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", rows
+        await self._run_sync(
+            _replace_rows_commit,
+            f"DELETE FROM neighbors{DB_V} WHERE device_ieee = ?",
+            ieee,
+            f"INSERT INTO neighbors{DB_V} VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            rows,
         )
-        await self._db.commit()
 
     def routes_updated(self, ieee: t.EUI64, routes: list[zdo_t.Route]) -> None:
         """Route update from Mgmt_Rtg_req."""
         self.enqueue("_routes_updated", ieee, routes)
 
     async def _routes_updated(self, ieee: t.EUI64, routes: list[zdo_t.Route]) -> None:
-        await self.execute(f"DELETE FROM routes{DB_V} WHERE device_ieee = ?", [ieee])
-
         rows = [(ieee, *route.as_tuple()) for route in routes]
 
-        await self._db.executemany(
-            f"INSERT INTO routes{DB_V} VALUES (?,?,?,?,?,?,?,?)", rows
+        await self._run_sync(
+            _replace_rows_commit,
+            f"DELETE FROM routes{DB_V} WHERE device_ieee = ?",
+            ieee,
+            f"INSERT INTO routes{DB_V} VALUES (?,?,?,?,?,?,?,?)",
+            rows,
         )
-        await self._db.commit()
 
     def group_added(self, group: zigpy.group.Group) -> None:
         """Group is added."""
@@ -397,8 +703,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         q = f"""INSERT INTO groups{DB_V} VALUES (?, ?)
                     ON CONFLICT (group_id)
                     DO UPDATE SET name=excluded.name"""
-        await self.execute(q, (group.group_id, group.name))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (group.group_id, group.name))
 
     def group_member_added(
         self, group: zigpy.group.Group, ep: zigpy.typing.EndpointType
@@ -412,8 +717,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         q = f"""INSERT INTO group_members{DB_V} VALUES (?, ?, ?)
                     ON CONFLICT
                     DO NOTHING"""
-        await self.execute(q, (group.group_id, *ep.unique_id))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (group.group_id, *ep.unique_id))
 
     def group_member_removed(
         self, group: zigpy.group.Group, ep: zigpy.typing.EndpointType
@@ -427,8 +731,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         q = f"""DELETE FROM group_members{DB_V} WHERE group_id=?
                                                 AND ieee=?
                                                 AND endpoint_id=?"""
-        await self.execute(q, (group.group_id, *ep.unique_id))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (group.group_id, *ep.unique_id))
 
     def group_removed(self, group: zigpy.group.Group) -> None:
         """Called when a group is removed."""
@@ -436,73 +739,79 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
 
     async def _group_removed(self, group: zigpy.group.Group) -> None:
         q = f"DELETE FROM groups{DB_V} WHERE group_id=?"
-        await self.execute(q, (group.group_id,))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (group.group_id,))
 
     def device_removed(self, device: zigpy.typing.DeviceType) -> None:
+        self._discard_attribute_state(device.ieee)
         self.enqueue("_remove_device", device)
 
     async def _remove_device(self, device: zigpy.typing.DeviceType) -> None:
-        await self.execute(f"DELETE FROM devices{DB_V} WHERE ieee = ?", (device.ieee,))
-        await self._db.commit()
+        await self._run_sync(
+            _execute_commit, f"DELETE FROM devices{DB_V} WHERE ieee = ?", (device.ieee,)
+        )
 
     def raw_device_initialized(self, device: zigpy.typing.DeviceType) -> None:
         self.enqueue("_save_device", device)
 
     async def _save_device(self, device: zigpy.typing.DeviceType) -> None:
-        q = f"""INSERT INTO devices{DB_V} (ieee, nwk, status, last_seen)
-                    VALUES (?, ?, ?, ?)
-                    ON CONFLICT (ieee)
-                    DO UPDATE SET
-                        nwk=excluded.nwk,
-                        status=excluded.status,
-                        last_seen=excluded.last_seen"""
-        await self.execute(
-            q,
-            (
-                device.ieee,
-                device.nwk,
-                device.status,
-                (device._last_seen or UNIX_EPOCH).timestamp(),
-            ),
+        # The rows are read from the device here, then written in a single unit of work
+        device_row = (
+            device.ieee,
+            device.nwk,
+            device.status,
+            device.last_seen or UNIX_EPOCH.timestamp(),
+        )
+        node_descriptor_row = (
+            (device.ieee, *device.node_desc.as_tuple())
+            if device.node_desc is not None
+            else None
         )
-
-        if device.node_desc is not None:
-            await self._save_node_descriptor(device)
 
         if isinstance(device, zigpy.quirks.BaseCustomDevice):
-            await self._db.commit()
+            await self._run_sync(
+                self._write_device, device_row, node_descriptor_row, [], [], [], []
+            )
             return
 
-        await self._save_endpoints(device)
-        for ep in device.non_zdo_endpoints:
-            await self._save_clusters(ep)
-            await self._save_attribute_cache(ep)
-            await self._save_unsupported_attributes(ep)
-        await self._db.commit()
+        endpoints = self._endpoint_rows(device)
+        clusters = []
+        attributes = []
+        unsupported_attributes = []
 
-    async def _save_endpoints(self, device: zigpy.typing.DeviceType) -> None:
-        rows = [
-            (
-                device.ieee,
-                ep.endpoint_id,
-                ep.profile_id,
-                ep.device_type,
-                ep.status,
-            )
-            for ep in device.non_zdo_endpoints
-        ]
+        for ep in device.non_zdo_endpoints:
+            clusters += self._cluster_rows(ep)
+            attributes += self._attribute_cache_rows(ep)
+            unsupported_attributes += self._unsupported_attribute_rows(ep)
+
+        await self._run_sync(
+            self._write_device,
+            device_row,
+            node_descriptor_row,
+            endpoints,
+            clusters,
+            attributes,
+            unsupported_attributes,
+        )
 
-        q = f"""INSERT INTO endpoints{DB_V} VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT (ieee, endpoint_id)
+    def _write_device(
+        self,
+        conn: sqlite3.Connection,
+        device_row: tuple,
+        node_descriptor_row: tuple | None,
+        endpoints: list[tuple],
+        clusters: list[tuple],
+        attributes: list[tuple],
+        unsupported_attributes: list[tuple],
+    ) -> None:
+        q = f"""INSERT INTO devices{DB_V} (ieee, nwk, status, last_seen)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (ieee)
                     DO UPDATE SET
-                        profile_id=excluded.profile_id,
-                        device_type=excluded.device_type,
-                        status=excluded.status"""
-
-        await self._db.executemany(q, rows)
+                        nwk=excluded.nwk,
+                        status=excluded.status,
+                        last_seen=excluded.last_seen"""
+        conn.execute(q, device_row)
 
-    async def _save_node_descriptor(self, device: zigpy.typing.DeviceType) -> None:
         q = f"""INSERT INTO node_descriptors{DB_V}
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ON CONFLICT (ieee)
@@ -521,10 +830,48 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 maximum_outgoing_transfer_size=excluded.maximum_outgoing_transfer_size,
                 descriptor_capability_field=excluded.descriptor_capability_field"""
 
-        await self.execute(q, (device.ieee, *device.node_desc.as_tuple()))
+        if node_descriptor_row is not None:
+            conn.execute(q, node_descriptor_row)
+
+        q = f"""INSERT INTO endpoints{DB_V} VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (ieee, endpoint_id)
+                    DO UPDATE SET
+                        profile_id=excluded.profile_id,
+                        device_type=excluded.device_type,
+                        status=excluded.status"""
+        conn.executemany(q, endpoints)
+
+        q = f"""INSERT INTO clusters{DB_V} VALUES (?, ?, ?, ?)
+                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id)
+                    DO NOTHING"""
+        conn.executemany(q, clusters)
+
+        q = f"""INSERT INTO attributes_cache{DB_V} VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id, attr_id)
+                    DO UPDATE SET value=excluded.value, last_updated=excluded.last_updated"""
+        conn.executemany(q, attributes)
+
+        q = f"""INSERT INTO unsupported_attributes{DB_V} VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id, attr_id)
+                    DO NOTHING"""
+        conn.executemany(q, unsupported_attributes)
+
+        conn.commit()
 
-    async def _save_clusters(self, endpoint: zigpy.typing.EndpointType) -> None:
-        clusters = [
+    def _endpoint_rows(self, device: zigpy.typing.DeviceType) -> list[tuple]:
+        return [
+            (
+                device.ieee,
+                ep.endpoint_id,
+                ep.profile_id,
+                ep.device_type,
+                ep.status,
+            )
+            for ep in device.non_zdo_endpoints
+        ]
+
+    def _cluster_rows(self, endpoint: zigpy.typing.EndpointType) -> list[tuple]:
+        return [
             (
                 endpoint.device.ieee,
                 endpoint.endpoint_id,
@@ -533,13 +880,9 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             )
             for cluster in endpoint.clusters
         ]
-        q = f"""INSERT INTO clusters{DB_V} VALUES (?, ?, ?, ?)
-                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id)
-                    DO NOTHING"""
-        await self._db.executemany(q, clusters)
 
-    async def _save_attribute_cache(self, ep: zigpy.typing.EndpointType) -> None:
-        clusters = [
+    def _attribute_cache_rows(self, ep: zigpy.typing.EndpointType) -> list[tuple]:
+        return [
             (
                 ep.device.ieee,
                 ep.endpoint_id,
@@ -552,13 +895,9 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             for cluster in ep.clusters
             for attrid, value in cluster._attr_cache.items()
         ]
-        q = f"""INSERT INTO attributes_cache{DB_V} VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id, attr_id)
-                    DO UPDATE SET value=excluded.value, last_updated=excluded.last_updated"""
-        await self._db.executemany(q, clusters)
 
-    async def _save_unsupported_attributes(self, ep: zigpy.typing.EndpointType) -> None:
-        clusters = [
+    def _unsupported_attribute_rows(self, ep: zigpy.typing.EndpointType) -> list[tuple]:
+        return [
             (
                 ep.device.ieee,
                 ep.endpoint_id,
@@ -570,10 +909,6 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             for attr in cluster.unsupported_attributes
             if isinstance(attr, int)
         ]
-        q = f"""INSERT INTO unsupported_attributes{DB_V} VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT (ieee, endpoint_id, cluster_type, cluster_id, attr_id)
-                    DO NOTHING"""
-        await self._db.executemany(q, clusters)
 
     async def _save_attribute(
         self,
@@ -585,6 +920,12 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         value: Any,
         timestamp: datetime,
     ) -> None:
+        await self._save_attributes(
+            [(ieee, endpoint_id, cluster_type, cluster_id, attrid, value, timestamp)]
+        )
+
+    async def _save_attributes(self, updates: list[tuple]) -> None:
+        """Write the arguments of consecutive `_save_attribute` events at once."""
         q = f"""
             INSERT INTO attributes_cache{DB_V}
             VALUES (:ieee, :endpoint_id, :cluster_type, :cluster_id, :attr_id, :value, :timestamp)
@@ -594,8 +935,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                     value != excluded.value
                     OR :timestamp - last_updated > :min_update_delta
             """
-        await self.execute(
-            q,
+        rows = [
             {
                 "ieee": ieee,
                 "endpoint_id": endpoint_id,
@@ -605,9 +945,18 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 "value": value,
                 "timestamp": timestamp.timestamp(),
                 "min_update_delta": MIN_UPDATE_DELTA,
-            },
-        )
-        await self._db.commit()
+            }
+            for (
+                ieee,
+                endpoint_id,
+                cluster_type,
+                cluster_id,
+                attrid,
+                value,
+                timestamp,
+            ) in updates
+        ]
+        await self._run_sync(_execute_each_commit, q, rows)
 
     async def _clear_attribute(
         self,
@@ -627,7 +976,8 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 AND attr_id = :attr_id
             """
 
-        await self.execute(
+        await self._run_sync(
+            _execute_commit,
             q,
             {
                 "ieee": ieee,
@@ -637,7 +987,6 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 "attr_id": attrid,
             },
         )
-        await self._db.commit()
 
     def network_backup_created(self, backup: zigpy.backups.NetworkBackup) -> None:
         self.enqueue("_network_backup_created", json.dumps(backup.as_dict()))
@@ -648,8 +997,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                     DO UPDATE SET
                         backup_json=excluded.backup_json"""
 
-        await self.execute(q, (None, backup_json))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (None, backup_json))
 
     def network_backup_removed(self, backup: zigpy.backups.NetworkBackup) -> None:
         self.enqueue("_network_backup_removed", backup.backup_time)
@@ -658,263 +1006,414 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         q = f"""DELETE FROM network_backups{DB_V}
                     WHERE json_extract(backup_json, '$.backup_time')=?"""
 
-        await self.execute(q, (backup_time.isoformat(),))
-        await self._db.commit()
+        await self._run_sync(_execute_commit, q, (backup_time.isoformat(),))
 
     async def load(self) -> None:
         LOGGER.debug("Loading application state")
-        await self._load_devices()
-        await self._load_node_descriptors()
-        await self._load_endpoints()
-        await self._load_clusters()
+        start = time.monotonic()
 
-        # Quirks require the manufacturer and model name to be populated
-        await self._load_attributes(
-            f"""
-                cluster_type={ClusterType.Server}
-            AND cluster_id={Basic.cluster_id}
-            AND (
-                   attr_id={Basic.AttributeDefs.manufacturer.id}
-                OR attr_id={Basic.AttributeDefs.model.id}
+        if self._snapshot_path is not None and await self._load_snapshot():
+            LOGGER.info(
+                "Restored application state from %s in %0.3fs",
+                self._snapshot_path,
+                time.monotonic() - start,
+            )
+        else:
+            self._load_tables(await self._read_tables())
+            LOGGER.debug(
+                "Loaded application state from the database in %0.3fs",
+                time.monotonic() - start,
             )
-            """
-        )
 
-        for device in self._application.devices.values():
-            device = zigpy.quirks.get_device(device)
-            self._application.devices[device.ieee] = device
-
-        await self._load_attributes()
-        await self._load_unsupported_attributes()
-        await self._load_groups()
-        await self._load_group_members()
-        await self._load_relays()
-        await self._load_neighbors()
-        await self._load_routes()
-        await self._load_network_backups()
         await self._register_device_listeners()
 
-    async def _load_attributes(self, filter: str | None = None) -> None:
-        if filter:
-            query = f"SELECT * FROM attributes_cache{DB_V} WHERE {filter}"
-        else:
-            query = f"SELECT * FROM attributes_cache{DB_V}"
+        if self._snapshot_path is not None:
+            self.start_periodic_snapshots()
 
-        async with self.execute(query) as cursor:
-            async for (
-                ieee,
+    async def _read_tables(self) -> dict[str, list[tuple]]:
+        return await self._run_sync(_read_snapshot_tables)
+
+    def _load_tables(
+        self,
+        tables: dict[str, list[tuple]],
+        quirks: dict[t.EUI64, zigpy.appdb_snapshot.QuirkRef | None] | None = None,
+    ) -> None:
+        """Build the application state from the rows of every table.
+
+        `quirks` are the quirks previously matched to devices with the same rows, they
+        are applied without matching the devices again.
+        """
+        self._load_devices(tables["devices"])
+        self._load_node_descriptors(tables["node_descriptors"])
+        self._load_endpoints(tables["endpoints"])
+        self._load_clusters(tables["clusters"])
+
+        # Quirks require the manufacturer and model name to be populated
+        self._load_attributes(
+            [
+                row
+                for row in tables["attributes_cache"]
+                if row[2] == ClusterType.Server
+                and row[3] == Basic.cluster_id
+                and row[4]
+                in (Basic.AttributeDefs.manufacturer.id, Basic.AttributeDefs.model.id)
+            ]
+        )
+
+        # Quirks matched now can be reused by snapshots while the rows stay the same
+        signatures = (
+            self._quirk_signatures(tables) if self._snapshot_path is not None else None
+        )
+        self._matched_quirks.clear()
+
+        for device in list(self._application.devices.values()):
+            quirked = None
+
+            if quirks is not None and device.ieee in quirks:
+                quirked = zigpy.appdb_snapshot.apply_quirk(device, quirks[device.ieee])
+
+            if quirked is None:
+                quirked = zigpy.quirks.get_device(device)
+
+            self._application.devices[device.ieee] = quirked
+
+            if signatures is not None:
+                self._matched_quirks[device.ieee] = (
+                    signatures[device.ieee],
+                    zigpy.appdb_snapshot.quirk_ref(quirked),
+                )
+
+        self._load_attributes(tables["attributes_cache"])
+        self._load_unsupported_attributes(tables["unsupported_attributes"])
+        self._load_groups(tables["groups"])
+        self._load_group_members(tables["group_members"])
+        self._load_relays(tables["relays"])
+        self._load_neighbors(tables["neighbors"])
+        self._load_routes(tables["routes"])
+        self._load_network_backups(tables["network_backups"])
+
+    def _quirk_signatures(self, tables: dict[str, list[tuple]]) -> dict[t.EUI64, tuple]:
+        """Rows of every device that are loaded when quirks are matched.
+
+        A quirk matched to a device is valid for as long as these rows don't change.
+        """
+        signatures: dict[t.EUI64, list] = {}
+
+        for row in tables["devices"]:
+            # `last_seen` changes all the time and plays no part in matching
+            signatures[row[0]] = [row[:3]]
+
+        for name in ("node_descriptors", "endpoints", "clusters"):
+            for row in tables[name]:
+                signatures[row[0]].append(row)
+
+        for row in tables["attributes_cache"]:
+            if row[2] == ClusterType.Server and row[3] == Basic.cluster_id:
+                # Timestamps play no part in matching
+                signatures[row[0]].append(row[:6])
+
+        return {ieee: tuple(rows) for ieee, rows in signatures.items()}
+
+    def _load_attributes(self, rows: list[tuple]) -> None:
+        for (
+            ieee,
+            endpoint_id,
+            cluster_type,
+            cluster_id,
+            attr_id,
+            value,
+            last_updated,
+        ) in rows:
+            dev = self._application.get_device(ieee)
+
+            # Some quirks create endpoints and clusters that do not exist
+            if endpoint_id not in dev.endpoints:
+                continue
+
+            ep = dev.endpoints[endpoint_id]
+            clusters = (
+                ep.in_clusters
+                if cluster_type == ClusterType.Server
+                else ep.out_clusters
+            )
+
+            if cluster_id not in clusters:
+                continue
+
+            clusters[cluster_id]._attr_cache[attr_id] = value
+            clusters[cluster_id]._attr_last_updated[attr_id] = (
+                datetime.fromtimestamp(last_updated, timezone.utc)
+            )
+
+            LOGGER.debug(
+                "[0x%04x:%s:0x%04x] Attribute id: %s value: %s",
+                dev.nwk,
                 endpoint_id,
-                cluster_type,
                 cluster_id,
                 attr_id,
                 value,
-                last_updated,
-            ) in cursor:
-                dev = self._application.get_device(ieee)
-
-                # Some quirks create endpoints and clusters that do not exist
-                if endpoint_id not in dev.endpoints:
-                    continue
+            )
 
-                ep = dev.endpoints[endpoint_id]
-                clusters = (
-                    ep.in_clusters
-                    if cluster_type == ClusterType.Server
-                    else ep.out_clusters
-                )
+            # Populate the device's manufacturer and model attributes
+            if (
+                cluster_id == Basic.cluster_id
+                and attr_id == Basic.AttributeDefs.manufacturer.id
+            ):
+                dev.manufacturer = decode_str_attribute(value)
+            elif (
+                cluster_id == Basic.cluster_id
+                and attr_id == Basic.AttributeDefs.model.id
+            ):
+                dev.model = decode_str_attribute(value)
+
+    def _load_unsupported_attributes(self, rows: list[tuple]) -> None:
+        """Load unsuppoted attributes."""
 
-                if cluster_id not in clusters:
-                    continue
+        for ieee, endpoint_id, cluster_type, cluster_id, attr_id in rows:
+            dev = self._application.get_device(ieee)
 
-                clusters[cluster_id]._attr_cache[attr_id] = value
-                clusters[cluster_id]._attr_last_updated[attr_id] = (
-                    datetime.fromtimestamp(last_updated, timezone.utc)
-                )
+            try:
+                ep = dev.endpoints[endpoint_id]
+            except KeyError:
+                continue
 
-                LOGGER.debug(
-                    "[0x%04x:%s:0x%04x] Attribute id: %s value: %s",
-                    dev.nwk,
-                    endpoint_id,
-                    cluster_id,
-                    attr_id,
-                    value,
-                )
+            clusters = (
+                ep.in_clusters
+                if cluster_type == ClusterType.Server
+                else ep.out_clusters
+            )
 
-                # Populate the device's manufacturer and model attributes
-                if (
-                    cluster_id == Basic.cluster_id
-                    and attr_id == Basic.AttributeDefs.manufacturer.id
-                ):
-                    dev.manufacturer = decode_str_attribute(value)
-                elif (
-                    cluster_id == Basic.cluster_id
-                    and attr_id == Basic.AttributeDefs.model.id
-                ):
-                    dev.model = decode_str_attribute(value)
-
-    async def _load_unsupported_attributes(self) -> None:
-        """Load unsuppoted attributes."""
+            try:
+                cluster = clusters[cluster_id]
+            except KeyError:
+                continue
 
-        async with self.execute(
-            f"SELECT * FROM unsupported_attributes{DB_V}"
-        ) as cursor:
-            async for ieee, endpoint_id, cluster_type, cluster_id, attr_id in cursor:
-                dev = self._application.get_device(ieee)
+            cluster.add_unsupported_attribute(attr_id, inhibit_events=True)
 
-                try:
-                    ep = dev.endpoints[endpoint_id]
-                except KeyError:
-                    continue
+    def _load_devices(self, rows: list[tuple]) -> None:
+        for ieee, nwk, status, last_seen in rows:
+            dev = self._application.add_device(ieee, nwk)
+            dev.status = zigpy.device.Status(status)
 
-                clusters = (
-                    ep.in_clusters
-                    if cluster_type == ClusterType.Server
-                    else ep.out_clusters
-                )
+            if last_seen > 0:
+                dev.last_seen = last_seen
 
-                try:
-                    cluster = clusters[cluster_id]
-                except KeyError:
-                    continue
+    def _load_node_descriptors(self, rows: list[tuple]) -> None:
+        # Networks have a handful of distinct node descriptors, each device gets a copy
+        descriptors: dict[tuple, zdo_t.NodeDescriptor] = {}
 
-                cluster.add_unsupported_attribute(attr_id, inhibit_events=True)
-
-    async def _load_devices(self) -> None:
-        async with self.execute(f"SELECT * FROM devices{DB_V}") as cursor:
-            async for ieee, nwk, status, last_seen in cursor:
-                dev = self._application.add_device(ieee, nwk)
-                dev.status = zigpy.device.Status(status)
-
-                if last_seen > 0:
-                    dev.last_seen = last_seen
-
-    async def _load_node_descriptors(self) -> None:
-        async with self.execute(f"SELECT * FROM node_descriptors{DB_V}") as cursor:
-            async for ieee, *fields in cursor:
-                dev = self._application.get_device(ieee)
-                dev.node_desc = zdo_t.NodeDescriptor(*fields)
-                assert dev.node_desc.is_valid
-
-    async def _load_endpoints(self) -> None:
-        async with self.execute(f"SELECT * FROM endpoints{DB_V}") as cursor:
-            async for ieee, epid, profile_id, device_type, status in cursor:
-                dev = self._application.get_device(ieee)
-                ep = dev.add_endpoint(epid)
-                ep.profile_id = profile_id
-                ep.status = zigpy.endpoint.Status(status)
-
-                if profile_id == zigpy.profiles.zha.PROFILE_ID:
-                    ep.device_type = zigpy.profiles.zha.DeviceType(device_type)
-                elif profile_id == zigpy.profiles.zll.PROFILE_ID:
-                    ep.device_type = zigpy.profiles.zll.DeviceType(device_type)
-                else:
-                    ep.device_type = device_type
-
-    async def _load_clusters(self) -> None:
-        async with self.execute(f"SELECT * FROM clusters{DB_V}") as cursor:
-            async for ieee, endpoint_id, cluster_type, cluster_id in cursor:
-                dev = self._application.get_device(ieee)
-                ep = dev.endpoints[endpoint_id]
+        for ieee, *fields in rows:
+            dev = self._application.get_device(ieee)
+            key = tuple(fields)
 
-                if ClusterType(cluster_type) == ClusterType.Server:
-                    ep.add_input_cluster(cluster_id)
-                else:
-                    ep.add_output_cluster(cluster_id)
-
-    async def _load_groups(self) -> None:
-        async with self.execute(f"SELECT * FROM groups{DB_V}") as cursor:
-            async for group_id, name in cursor:
-                self._application.groups.add_group(group_id, name, suppress_event=True)
-
-    async def _load_group_members(self) -> None:
-        async with self.execute(f"SELECT * FROM group_members{DB_V}") as cursor:
-            async for group_id, ieee, ep_id in cursor:
-                dev = self._application.get_device(ieee)
-                group = self._application.groups[group_id]
-                group.add_member(dev.endpoints[ep_id], suppress_event=True)
-
-    async def _load_relays(self) -> None:
-        async with self.execute(f"SELECT * FROM relays{DB_V}") as cursor:
-            async for ieee, value in cursor:
-                dev = self._application.get_device(ieee)
-                relays, _ = t.Relays.deserialize(value)
-                dev.relays = zigpy.util.filter_relays(relays)
-
-    async def _load_neighbors(self) -> None:
-        async with self.execute(f"SELECT * FROM neighbors{DB_V}") as cursor:
-            async for ieee, *fields in cursor:
-                neighbor = zdo_t.Neighbor(*fields)
-                self._application.topology.neighbors[ieee].append(neighbor)
-
-    async def _load_routes(self) -> None:
-        async with self.execute(f"SELECT * FROM routes{DB_V}") as cursor:
-            async for ieee, *fields in cursor:
-                route = zdo_t.Route(*fields)
-                self._application.topology.routes[ieee].append(route)
-
-    async def _load_network_backups(self) -> None:
+            try:
+                node_desc = descriptors[key]
+            except KeyError:
+                node_desc = descriptors[key] = zdo_t.NodeDescriptor(*fields)
+                assert node_desc.is_valid
+
+            # Equivalent to `NodeDescriptor(node_desc)`, the fields are immutable
+            dev.node_desc = object.__new__(zdo_t.NodeDescriptor)
+            dev.node_desc.__dict__.update(node_desc.__dict__)
+
+    def _load_endpoints(self, rows: list[tuple]) -> None:
+        for ieee, epid, profile_id, device_type, status in rows:
+            dev = self._application.get_device(ieee)
+            ep = dev.add_endpoint(epid)
+            ep.profile_id = profile_id
+            ep.status = zigpy.endpoint.Status(status)
+
+            if profile_id == zigpy.profiles.zha.PROFILE_ID:
+                ep.device_type = zigpy.profiles.zha.DeviceType(device_type)
+            elif profile_id == zigpy.profiles.zll.PROFILE_ID:
+                ep.device_type = zigpy.profiles.zll.DeviceType(device_type)
+            else:
+                ep.device_type = device_type
+
+    def _load_clusters(self, rows: list[tuple]) -> None:
+        for ieee, endpoint_id, cluster_type, cluster_id in rows:
+            dev = self._application.get_device(ieee)
+            ep = dev.endpoints[endpoint_id]
+
+            if ClusterType(cluster_type) == ClusterType.Server:
+                ep.add_input_cluster(cluster_id)
+            else:
+                ep.add_output_cluster(cluster_id)
+
+    def _load_groups(self, rows: list[tuple]) -> None:
+        for group_id, name in rows:
+            self._application.groups.add_group(group_id, name, suppress_event=True)
+
+    def _load_group_members(self, rows: list[tuple]) -> None:
+        for group_id, ieee, ep_id in rows:
+            dev = self._application.get_device(ieee)
+            group = self._application.groups[group_id]
+            group.add_member(dev.endpoints[ep_id], suppress_event=True)
+
+    def _load_relays(self, rows: list[tuple]) -> None:
+        for ieee, value in rows:
+            dev = self._application.get_device(ieee)
+            relays, _ = t.Relays.deserialize(value)
+            dev.relays = zigpy.util.filter_relays(relays)
+
+    def _load_neighbors(self, rows: list[tuple]) -> None:
+        for ieee, *fields in rows:
+            neighbor = zdo_t.Neighbor(*fields)
+            self._application.topology.neighbors[ieee].append(neighbor)
+
+    def _load_routes(self, rows: list[tuple]) -> None:
+        for ieee, *fields in rows:
+            route = zdo_t.Route(*fields)
+            self._application.topology.routes[ieee].append(route)
+
+    def _load_network_backups(self, rows: list[tuple]) -> None:
         self._application.backups.backups.clear()
+        backups = []
 
-        async with self.execute(
-            f"SELECT * FROM network_backups{DB_V} ORDER BY id"
-        ) as cursor:
-            backups = []
-
-            async for _id, backup_json in cursor:
-                backup = zigpy.backups.NetworkBackup.from_dict(json.loads(backup_json))
-                backups.append(backup)
+        for _id, backup_json in rows:
+            backup = zigpy.backups.NetworkBackup.from_dict(json.loads(backup_json))
+            backups.append(backup)
 
         backups.sort(key=lambda b: b.backup_time)
 
         for backup in backups:
             self._application.backups.add_backup(backup, suppress_event=True)
 
+    async def _load_snapshot(self) -> bool:
+        """Restore the application state from the snapshot, if it is up to date."""
+        try:
+            header, tables, quirks = await asyncio.get_running_loop().run_in_executor(
+                None, zigpy.appdb_snapshot.load, self._snapshot_path
+            )
+        except FileNotFoundError:
+            LOGGER.debug("No state snapshot found at %s", self._snapshot_path)
+            return False
+        except (OSError, ValueError) as exc:
+            LOGGER.warning("Failed to read the state snapshot: %r", exc)
+            return False
+
+        expected = zigpy.appdb_snapshot.SnapshotHeader(
+            db_version=DB_VERSION,
+            db_id=self._db_id,
+            generation=self._generation,
+            quirks=zigpy.appdb_snapshot.quirks_fingerprint(),
+        )
+
+        if header != expected:
+            LOGGER.info(
+                "State snapshot is outdated (%s, expected %s), loading the database",
+                header,
+                expected,
+            )
+            return False
+
+        self._load_tables(tables, quirks)
+        self._snapshot_generation = self._generation
+        return True
+
+    async def _save_snapshot(self) -> None:
+        """Write a snapshot of the database, unless the last one is still current."""
+        if self._snapshot_generation == self._generation:
+            return
+
+        start = time.monotonic()
+        tables = await self._read_tables()
+        signatures = self._quirk_signatures(tables)
+
+        # Quirks are only reused for devices whose rows didn't change since matching
+        quirks = {
+            ieee: ref
+            for ieee, (signature, ref) in self._matched_quirks.items()
+            if signatures.get(ieee) == signature
+        }
+
+        header = zigpy.appdb_snapshot.SnapshotHeader(
+            db_version=DB_VERSION,
+            db_id=self._db_id,
+            generation=self._generation,
+            quirks=zigpy.appdb_snapshot.quirks_fingerprint(),
+        )
+
+        # Before the snapshot exists, any write from now on must invalidate it
+        self._generation_pinned = True
+
+        size = await asyncio.get_running_loop().run_in_executor(
+            None,
+            zigpy.appdb_snapshot.dump,
+            self._snapshot_path,
+            header,
+            tables,
+            quirks,
+        )
+        self._snapshot_generation = header.generation
+
+        LOGGER.debug(
+            "Wrote a state snapshot of %d bytes (generation %d) in %0.3fs",
+            size,
+            header.generation,
+            time.monotonic() - start,
+        )
+
+    def start_periodic_snapshots(self) -> None:
+        self.stop_periodic_snapshots()
+        self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    def stop_periodic_snapshots(self) -> None:
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+
+    async def _snapshot_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._snapshot_period)
+
+            # Serialized with the writes, so the snapshot is taken between two of them
+            self.enqueue("_save_snapshot")
+
     async def _register_device_listeners(self) -> None:
         for dev in self._application.devices.values():
             dev.add_context_listener(self)
 
-    @contextlib.asynccontextmanager
-    async def _transaction(self):
-        await self.execute("BEGIN TRANSACTION")
+    @contextlib.contextmanager
+    def _transaction(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN TRANSACTION")
 
         try:
             yield
         except Exception:  # noqa: BLE001
-            await self.execute("ROLLBACK")
+            conn.execute("ROLLBACK")
             raise
         else:
-            await self.execute("COMMIT")
+            conn.execute("COMMIT")
 
-    async def _get_table_versions(self) -> dict[str, int]:
+    def _get_table_versions(self, conn: sqlite3.Connection) -> dict[str, int]:
         tables = {}
 
-        async with self.execute(
+        for (name,) in conn.execute(
             "SELECT name FROM sqlite_master WHERE type='table'"
-        ) as cursor:
-            async for (name,) in cursor:
-                # Ignore tables internal to SQLite
-                if name.startswith("sqlite_"):
-                    continue
+        ):
+            # Ignore tables internal to SQLite
+            if name.startswith("sqlite_"):
+                continue
 
-                # The regex will always return a match
-                match = DB_V_REGEX.search(name)
-                assert match is not None
+            # The regex will always return a match
+            match = DB_V_REGEX.search(name)
+            assert match is not None
 
-                tables[name] = int(match.group(0)[2:] or "0")
+            tables[name] = int(match.group(0)[2:] or "0")
 
         return tables
 
-    async def _table_exists(self, name: str) -> bool:
-        return name in (await self._get_table_versions())
+    def _table_exists(self, conn: sqlite3.Connection, name: str) -> bool:
+        return name in self._get_table_versions(conn)
 
-    async def _run_migrations(self) -> bool:
+    def _run_migrations(self, conn: sqlite3.Connection) -> bool:
         """Migrates the database to the newest schema, returning True if migrations ran."""
 
-        tables = await self._get_table_versions()
+        tables = self._get_table_versions(conn)
         tables_version = max(tables.values(), default=0)
 
-        async with self.execute("PRAGMA user_version") as cursor:
-            (db_version,) = await cursor.fetchone()
+        (db_version,) = conn.execute("PRAGMA user_version").fetchone()
 
         LOGGER.debug(
             "Current database version is v%s (table version v%s)",
@@ -934,7 +1433,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
 
         if db_version == 0 and not tables:
             # If this is a brand new database, just load the current schema
-            await self.executescript(zigpy.appdb_schemas.SCHEMAS[DB_VERSION])
+            _executescript(conn, zigpy.appdb_schemas.SCHEMAS[DB_VERSION])
             return False
         elif db_version > DB_VERSION:
             LOGGER.error(
@@ -947,7 +1446,7 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             return False
 
         # All migrations must succeed. If any fail, the database is not touched.
-        async with self._transaction():
+        with self._transaction(conn):
             for migration, to_db_version in [
                 (self._migrate_to_v4, 4),
                 (self._migrate_to_v5, 5),
@@ -966,20 +1465,24 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                 LOGGER.info(
                     "Migrating database from v%d to v%d", db_version, to_db_version
                 )
-                await self.executescript(zigpy.appdb_schemas.SCHEMAS[to_db_version])
-                await migration()
+                _executescript(conn, zigpy.appdb_schemas.SCHEMAS[to_db_version])
+                migration(conn)
 
                 db_version = to_db_version
 
         return True
 
-    async def _migrate_tables(
-        self, table_map: dict[str, str], *, errors: str = "raise"
+    def _migrate_tables(
+        self,
+        conn: sqlite3.Connection,
+        table_map: dict[str, str],
+        *,
+        errors: str = "raise",
     ):
         """Copy rows from one set of tables into another."""
 
         # Extract the "old" table version suffix
-        tables = await self._get_table_versions()
+        tables = self._get_table_versions(conn)
         old_table_name = list(table_map.keys())[0]
         old_version = tables[old_table_name]
 
@@ -999,68 +1502,68 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             if new_table is None:
                 continue
 
-            async with self.execute(f"SELECT * FROM {old_table}") as cursor:
-                async for row in cursor:
-                    placeholders = ",".join("?" * len(row))
+            for row in conn.execute(f"SELECT * FROM {old_table}"):
+                placeholders = ",".join("?" * len(row))
 
-                    try:
-                        await self.execute(
-                            f"INSERT INTO {new_table} VALUES ({placeholders})", row
+                try:
+                    conn.execute(
+                        f"INSERT INTO {new_table} VALUES ({placeholders})", row
+                    )
+                except sqlite3.IntegrityError as e:
+                    if errors == "raise":
+                        raise
+                    elif errors == "warn":
+                        LOGGER.warning(
+                            "Failed to migrate row %s%s: %s", old_table, row, e
                         )
-                    except sqlite3.IntegrityError as e:
-                        if errors == "raise":
-                            raise
-                        elif errors == "warn":
-                            LOGGER.warning(
-                                "Failed to migrate row %s%s: %s", old_table, row, e
-                            )
-                        elif errors == "ignore":
-                            pass
-                        else:
-                            raise ValueError(
-                                f"Invalid value for `errors`: {errors!r}"
-                            ) from e
-
-    async def _migrate_to_v4(self):
+                    elif errors == "ignore":
+                        pass
+                    else:
+                        raise ValueError(
+                            f"Invalid value for `errors`: {errors!r}"
+                        ) from e
+
+    def _migrate_to_v4(self, conn: sqlite3.Connection):
         """Schema v4 expanded the node descriptor and neighbor table columns"""
         # The `node_descriptors` table was added in v1
-        if await self._table_exists("node_descriptors"):
-            async with self.execute("SELECT * FROM node_descriptors") as cur:
-                async for dev_ieee, value in cur:
-                    node_desc, rest = zdo_t.NodeDescriptor.deserialize(value)
-                    assert not rest
-
-                    await self.execute(
-                        "INSERT INTO node_descriptors_v4"
-                        " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
-                        (dev_ieee, *node_desc.as_tuple()),
-                    )
+        if self._table_exists(conn, "node_descriptors"):
+            for dev_ieee, value in conn.execute("SELECT * FROM node_descriptors"):
+                node_desc, rest = zdo_t.NodeDescriptor.deserialize(value)
+                assert not rest
+
+                conn.execute(
+                    "INSERT INTO node_descriptors_v4"
+                    " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (dev_ieee, *node_desc.as_tuple()),
+                )
 
         # The `neighbors` table was added in v3 but the version number was not
         # incremented. It may not exist.
-        if await self._table_exists("neighbors"):
-            async with self.execute("SELECT * FROM neighbors") as cur:
-                async for dev_ieee, epid, ieee, nwk, packed, prm, depth, lqi in cur:
-                    neighbor = zdo_t.Neighbor(
-                        extended_pan_id=epid,
-                        ieee=ieee,
-                        nwk=nwk,
-                        permit_joining=prm,
-                        depth=depth,
-                        lqi=lqi,
-                        reserved2=0b000000,
-                        **zdo_t.Neighbor._parse_packed(packed),
-                    )
+        if self._table_exists(conn, "neighbors"):
+            for dev_ieee, epid, ieee, nwk, packed, prm, depth, lqi in conn.execute(
+                "SELECT * FROM neighbors"
+            ):
+                neighbor = zdo_t.Neighbor(
+                    extended_pan_id=epid,
+                    ieee=ieee,
+                    nwk=nwk,
+                    permit_joining=prm,
+                    depth=depth,
+                    lqi=lqi,
+                    reserved2=0b000000,
+                    **zdo_t.Neighbor._parse_packed(packed),
+                )
 
-                    await self.execute(
-                        "INSERT INTO neighbors_v4 VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
-                        (dev_ieee, *neighbor.as_tuple()),
-                    )
+                conn.execute(
+                    "INSERT INTO neighbors_v4 VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (dev_ieee, *neighbor.as_tuple()),
+                )
 
-    async def _migrate_to_v5(self):
+    def _migrate_to_v5(self, conn: sqlite3.Connection):
         """Schema v5 introduced global table version suffixes and removed stale rows"""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices": "devices_v5",
                 "endpoints": "endpoints_v5",
@@ -1080,10 +1583,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             errors="warn",
         )
 
-    async def _migrate_to_v6(self):
+    def _migrate_to_v6(self, conn: sqlite3.Connection):
         """Schema v6 relaxed the `attribute_cache` table schema to ignore endpoints"""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v5": "devices_v6",
                 "endpoints_v5": "endpoints_v6",
@@ -1099,12 +1603,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
         )
 
         # See if we can migrate any `attributes_cache` rows skipped by the v5 migration
-        if await self._table_exists("attributes"):
-            async with self.execute("SELECT count(*) FROM attributes") as cur:
-                (num_attrs_v4,) = await cur.fetchone()
-
-            async with self.execute("SELECT count(*) FROM attributes_cache_v6") as cur:
-                (num_attrs_v6,) = await cur.fetchone()
+        if self._table_exists(conn, "attributes"):
+            (num_attrs_v4,) = conn.execute("SELECT count(*) FROM attributes").fetchone()
+            (num_attrs_v6,) = conn.execute(
+                "SELECT count(*) FROM attributes_cache_v6"
+            ).fetchone()
 
             if num_attrs_v6 < num_attrs_v4:
                 LOGGER.warning(
@@ -1112,7 +1615,8 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                     num_attrs_v4 - num_attrs_v6,
                 )
 
-                await self._migrate_tables(
+                self._migrate_tables(
+                    conn,
                     {
                         "attributes": "attributes_cache_v6",
                         "devices": None,
@@ -1128,10 +1632,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
                     errors="ignore",
                 )
 
-    async def _migrate_to_v7(self):
+    def _migrate_to_v7(self, conn: sqlite3.Connection):
         """Schema v7 added the `unsupported_attributes` table."""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v6": "devices_v7",
                 "endpoints_v6": "endpoints_v7",
@@ -1146,19 +1651,19 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-    async def _migrate_to_v8(self):
+    def _migrate_to_v8(self, conn: sqlite3.Connection):
         """Schema v8 added the `devices_v8.last_seen` column."""
 
-        async with self.execute("SELECT * FROM devices_v7") as cursor:
-            async for ieee, nwk, status in cursor:
-                # Set the default `last_seen` to the unix epoch
-                await self.execute(
-                    "INSERT INTO devices_v8 VALUES (?, ?, ?, ?)",
-                    (ieee, nwk, status, 0),
-                )
+        for ieee, nwk, status in conn.execute("SELECT * FROM devices_v7"):
+            # Set the default `last_seen` to the unix epoch
+            conn.execute(
+                "INSERT INTO devices_v8 VALUES (?, ?, ?, ?)",
+                (ieee, nwk, status, 0),
+            )
 
         # Copy the devices table first, it should have no conflicts
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "endpoints_v7": "endpoints_v8",
                 "in_clusters_v7": "in_clusters_v8",
@@ -1174,15 +1679,16 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-    async def _migrate_to_v9(self):
+    def _migrate_to_v9(self, conn: sqlite3.Connection):
         """Schema v9 changed the data type of the `devices_v8.last_seen` column."""
 
-        await self.execute(
+        conn.execute(
             """INSERT INTO devices_v9 (ieee, nwk, status, last_seen)
             SELECT ieee, nwk, status, last_seen / 1000.0 FROM devices_v8"""
         )
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "endpoints_v8": "endpoints_v9",
                 "in_clusters_v8": "in_clusters_v9",
@@ -1198,10 +1704,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-    async def _migrate_to_v10(self):
+    def _migrate_to_v10(self, conn: sqlite3.Connection):
         """Schema v10 added a new `network_backups_v10` table."""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v9": "devices_v10",
                 "endpoints_v9": "endpoints_v10",
@@ -1217,10 +1724,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-    async def _migrate_to_v11(self):
+    def _migrate_to_v11(self, conn: sqlite3.Connection):
         """Schema v11 added a new `routes_v11` table."""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v10": "devices_v11",
                 "endpoints_v10": "endpoints_v11",
@@ -1237,10 +1745,11 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-    async def _migrate_to_v12(self):
+    def _migrate_to_v12(self, conn: sqlite3.Connection):
         """Schema v12 added a `timestamp` column to attribute updates."""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v11": "devices_v12",
                 "endpoints_v11": "endpoints_v12",
@@ -1258,18 +1767,20 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-        async with self.execute("SELECT * FROM attributes_cache_v11") as cursor:
-            async for ieee, endpoint_id, cluster_id, attrid, value in cursor:
-                # Set the default `last_updated` to the unix epoch
-                await self.execute(
-                    "INSERT INTO attributes_cache_v12 VALUES (?, ?, ?, ?, ?, ?)",
-                    (ieee, endpoint_id, cluster_id, attrid, value, 0),
-                )
+        for ieee, endpoint_id, cluster_id, attrid, value in conn.execute(
+            "SELECT * FROM attributes_cache_v11"
+        ):
+            # Set the default `last_updated` to the unix epoch
+            conn.execute(
+                "INSERT INTO attributes_cache_v12 VALUES (?, ?, ?, ?, ?, ?)",
+                (ieee, endpoint_id, cluster_id, attrid, value, 0),
+            )
 
-    async def _migrate_to_v13(self):
+    def _migrate_to_v13(self, conn: sqlite3.Connection):
         """Schema v13 combines both cluster types and caching for all attributes."""
 
-        await self._migrate_tables(
+        self._migrate_tables(
+            conn,
             {
                 "devices_v12": "devices_v13",
                 "endpoints_v12": "endpoints_v13",
@@ -1287,45 +1798,47 @@ class PersistingListener(zigpy.util.CatchingTaskMixin):
             }
         )
 
-        async with self.execute("SELECT * FROM in_clusters_v12") as cursor:
-            async for ieee, endpoint_id, cluster_id in cursor:
-                await self.execute(
-                    "INSERT INTO clusters_v13 VALUES (?, ?, ?, ?)",
-                    (ieee, endpoint_id, ClusterType.Server, cluster_id),
-                )
+        for ieee, endpoint_id, cluster_id in conn.execute(
+            "SELECT * FROM in_clusters_v12"
+        ):
+            conn.execute(
+                "INSERT INTO clusters_v13 VALUES (?, ?, ?, ?)",
+                (ieee, endpoint_id, ClusterType.Server, cluster_id),
+            )
 
-        async with self.execute("SELECT * FROM out_clusters_v12") as cursor:
-            async for ieee, endpoint_id, cluster_id in cursor:
-                await self.execute(
-                    "INSERT INTO clusters_v13 VALUES (?, ?, ?, ?)",
-                    (ieee, endpoint_id, ClusterType.Client, cluster_id),
-                )
+        for ieee, endpoint_id, cluster_id in conn.execute(
+            "SELECT * FROM out_clusters_v12"
+        ):
+            conn.execute(
+                "INSERT INTO clusters_v13 VALUES (?, ?, ?, ?)",
+                (ieee, endpoint_id, ClusterType.Client, cluster_id),
+            )
 
-        async with self.execute("SELECT * FROM unsupported_attributes_v12") as cursor:
-            async for ieee, endpoint_id, cluster_id, attrid in cursor:
-                await self.execute(
-                    "INSERT INTO unsupported_attributes_v13 VALUES (?, ?, ?, ?, ?)",
-                    (ieee, endpoint_id, ClusterType.Server, cluster_id, attrid),
-                )
+        for ieee, endpoint_id, cluster_id, attrid in conn.execute(
+            "SELECT * FROM unsupported_attributes_v12"
+        ):
+            conn.execute(
+                "INSERT INTO unsupported_attributes_v13 VALUES (?, ?, ?, ?, ?)",
+                (ieee, endpoint_id, ClusterType.Server, cluster_id, attrid),
+            )
 
-        async with self.execute("SELECT * FROM attributes_cache_v12") as cursor:
-            async for (
-                ieee,
-                endpoint_id,
-                cluster_id,
-                attrid,
-                value,
-                last_updated,
-            ) in cursor:
-                await self.execute(
-                    "INSERT INTO attributes_cache_v13 VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (
-                        ieee,
-                        endpoint_id,
-                        ClusterType.Server,
-                        cluster_id,
-                        attrid,
-                        value,
-                        last_updated,
-                    ),
-                )
+        for (
+            ieee,
+            endpoint_id,
+            cluster_id,
+            attrid,
+            value,
+            last_updated,
+        ) in conn.execute("SELECT * FROM attributes_cache_v12"):
+            conn.execute(
+                "INSERT INTO attributes_cache_v13 VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    ieee,
+                    endpoint_id,
+                    ClusterType.Server,
+                    cluster_id,
+                    attrid,
+                    value,
+                    last_updated,
+                ),
+            )
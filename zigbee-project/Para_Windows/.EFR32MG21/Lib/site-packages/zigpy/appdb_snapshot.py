@@ -0,0 +1,244 @@
+"""Binary snapshot of the application database, for fast restarts.
+
+A snapshot holds the rows of every table loaded by `PersistingListener.load`, as read
+from the database, and the quirk each device was matched to. Restoring from it builds
+the same devices as loading the database, without running SQL queries or quirk matching.
+Quirks are only recorded for devices whose rows did not change since they were matched.
+
+The database keeps a generation counter in the `snapshot_state` table, which is
+incremented by the first write following a snapshot. A snapshot is only used when it
+was taken from the same database, schema version and generation, and with the same set
+of quirks, otherwise the database is loaded as usual. Writes made by other programs
+don't increment the generation.
+"""
+
+from __future__ import annotations
+
+import importlib.metadata
+import marshal
+import os
+import typing
+
+import zigpy.quirks
+from zigpy.quirks.v2 import CustomDeviceV2
+import zigpy.types as t
+
+if typing.TYPE_CHECKING:
+    import zigpy.device
+
+SNAPSHOT_MAGIC = b"ZIGPYSNAP"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Unversioned, so that schema migrations ignore it
+SNAPSHOT_STATE_TABLE = "snapshot_state"
+
+# Tables restored from a snapshot, with the ordering used to read them
+SNAPSHOT_TABLES = {
+    "devices": "",
+    "node_descriptors": "",
+    "endpoints": "",
+    "clusters": "",
+    "attributes_cache": "",
+    "unsupported_attributes": "",
+    "groups": "",
+    "group_members": "",
+    "relays": "",
+    "neighbors": "",
+    "routes": "",
+    "network_backups": "ORDER BY id",
+}
+
+# Reference to a quirk: `("v1", module, qualname)` or `("v2", index, file, line)`
+QuirkRef = tuple
+
+
+class SnapshotHeader(typing.NamedTuple):
+    db_version: int
+    db_id: str
+    generation: int
+    quirks: tuple
+
+
+def quirks_fingerprint() -> tuple:
+    """Identifies the quirks that can be matched, a snapshot is tied to them."""
+    registry = zigpy.quirks._DEVICE_REGISTRY
+    versions = []
+
+    for package in ("zigpy", "zha-quirks"):
+        try:
+            versions.append(importlib.metadata.version(package))
+        except importlib.metadata.PackageNotFoundError:
+            versions.append(None)
+
+    return (
+        *versions,
+        sum(
+            len(candidates)
+            for models in registry.registry_v1.values()
+            for candidates in models.values()
+        ),
+        sum(len(entries) for entries in registry.registry_v2.values()),
+    )
+
+
+def quirk_ref(device: zigpy.device.Device) -> QuirkRef | None:
+    """Reference to the quirk applied to a device, `None` if it is not quirked."""
+    if isinstance(device, CustomDeviceV2):
+        entry = device.quirk_metadata
+        entries = zigpy.quirks._DEVICE_REGISTRY.registry_v2.get(
+            (device.manufacturer, device.model), ()
+        )
+
+        for index, candidate in enumerate(entries):
+            if candidate is entry:
+                return ("v2", index, str(entry.quirk_file), entry.quirk_file_line)
+
+        return None
+
+    if isinstance(device, zigpy.quirks.BaseCustomDevice):
+        cls = type(device)
+        return ("v1", cls.__module__, cls.__qualname__)
+
+    return None
+
+
+def apply_quirk(
+    device: zigpy.device.Device, ref: QuirkRef | None
+) -> zigpy.device.Device | None:
+    """Apply a quirk found by a previous match, `None` if it can't be found anymore."""
+    if ref is None:
+        return device
+
+    registry = zigpy.quirks._DEVICE_REGISTRY
+
+    if ref[0] == "v2":
+        _, index, quirk_file, quirk_file_line = ref
+        entries = registry.registry_v2.get((device.manufacturer, device.model), ())
+
+        # The index is only a hint, the entry must still be defined at the same place
+        if index < len(entries) and (
+            str(entries[index].quirk_file),
+            entries[index].quirk_file_line,
+        ) == (quirk_file, quirk_file_line):
+            return entries[index].create_device(device)
+
+        return None
+
+    _, module, qualname = ref
+
+    for candidates in (
+        registry.registry_v1[device.manufacturer][device.model],
+        registry.registry_v1[device.manufacturer][None],
+        registry.registry_v1[None][device.model],
+        registry.registry_v1[None][None],
+    ):
+        for candidate in candidates:
+            if candidate.__module__ == module and candidate.__qualname__ == qualname:
+                return candidate(device._application, device.ieee, device.nwk, device)
+
+    return None
+
+
+def _encode_rows(rows: list[tuple]) -> tuple[tuple[int, ...], list[tuple]]:
+    """Replace the IEEE addresses of rows with strings, `marshal` only has builtins."""
+    if not rows:
+        return (), []
+
+    columns = tuple(i for i, v in enumerate(rows[0]) if isinstance(v, t.EUI64))
+
+    if not columns:
+        return (), rows
+
+    encoded = []
+
+    for row in rows:
+        row = list(row)
+
+        for i in columns:
+            row[i] = str(row[i])
+
+        encoded.append(tuple(row))
+
+    return columns, encoded
+
+
+def _decode_rows(
+    columns: tuple[int, ...], rows: list[tuple], addresses: dict[str, t.EUI64]
+) -> list[tuple]:
+    if not columns:
+        return rows
+
+    decoded = []
+
+    for row in rows:
+        row = list(row)
+
+        for i in columns:
+            address = row[i]
+
+            try:
+                row[i] = addresses[address]
+            except KeyError:
+                row[i] = addresses[address] = t.EUI64.convert(address)
+
+        decoded.append(tuple(row))
+
+    return decoded
+
+
+def dump(
+    path: str,
+    header: SnapshotHeader,
+    tables: dict[str, list[tuple]],
+    quirks: dict[t.EUI64, QuirkRef | None],
+) -> int:
+    """Atomically write a snapshot, returning its size."""
+    data = SNAPSHOT_MAGIC + marshal.dumps(
+        (
+            SNAPSHOT_FORMAT_VERSION,
+            tuple(header),
+            {name: _encode_rows(rows) for name, rows in tables.items()},
+            {str(ieee): ref for ieee, ref in quirks.items()},
+        )
+    )
+
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def load(
+    path: str,
+) -> tuple[SnapshotHeader, dict[str, list[tuple]], dict[t.EUI64, QuirkRef | None]]:
+    """Read a snapshot, raising `ValueError` if it is not a valid snapshot file."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("Not a snapshot file")
+
+    try:
+        version, header, tables, quirks = marshal.loads(data[len(SNAPSHOT_MAGIC) :])
+    except (EOFError, TypeError) as exc:
+        raise ValueError("Corrupted snapshot file") from exc
+
+    if version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {version}")
+
+    # The rows of every table refer to the same few addresses, parsing them dominates
+    addresses: dict[str, t.EUI64] = {}
+
+    return (
+        SnapshotHeader(*header),
+        {
+            name: _decode_rows(columns, rows, addresses)
+            for name, (columns, rows) in tables.items()
+        },
+        {t.EUI64.convert(ieee): ref for ieee, ref in quirks.items()},
+    )
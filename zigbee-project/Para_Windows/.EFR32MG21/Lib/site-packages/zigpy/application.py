@@ -35,6 +35,7 @@ import zigpy.ota
 import zigpy.profiles
 import zigpy.quirks
 import zigpy.state
+import zigpy.routing
 import zigpy.topology
 import zigpy.types as t
 import zigpy.typing
@@ -83,6 +84,8 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
         self.ota = zigpy.ota.OTA(self._config[conf.CONF_OTA], self)
         self.backups: zigpy.backups.BackupManager = zigpy.backups.BackupManager(self)
         self.topology: zigpy.topology.Topology = zigpy.topology.Topology(self)
+        self.routing: zigpy.routing.RoutingGraph = zigpy.routing.RoutingGraph(self)
+        self.topology.add_listener(self.routing)
 
         self._req_listeners: collections.defaultdict[
             zigpy.device.Device,
@@ -110,6 +113,7 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
         self._dblistener = await zigpy.appdb.PersistingListener.new(database_file, self)
         await self._dblistener.load()
         self._add_db_listeners()
+        self.routing.load_topology(self.topology.neighbors, self.topology.routes)
 
     def _add_db_listeners(self):
         if self._dblistener is None:
@@ -555,6 +559,7 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
 
         if dev.nwk != nwk:
             LOGGER.debug("Device %s changed id (0x%04x => 0x%04x)", ieee, dev.nwk, nwk)
+            self.routing.handle_nwk_change(dev.nwk, nwk)
             dev.nwk = nwk
             new_join = True
 
@@ -589,6 +594,7 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
         dev._concurrent_requests_semaphore.cancel_waiting(
             zigpy.exceptions.DeliveryError("Device has left the network")
         )
+        self.routing.remove_node(dev.nwk)
 
         self.listener_event("device_left", dev)
 
@@ -604,6 +610,7 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
             )
         else:
             device.relays = zigpy.util.filter_relays(relays)
+            self.routing.handle_relays(nwk, device.relays)
 
     @classmethod
     async def probe(cls, device_config: dict[str, Any]) -> bool | dict[str, Any]:
@@ -772,10 +779,13 @@ class ControllerApplication(zigpy.util.ListenableMixin, abc.ABC):
     def build_source_route_to(self, dest: zigpy.device.Device) -> list[t.NWK] | None:
         """Compute a source route to the destination device."""
 
+        route = self.routing.source_route_to(dest.nwk)
+        if route is not None:
+            return route
+
         if dest.relays is None:
             return None
 
-        # TODO: utilize topology scanner information
         return dest.relays[::-1]
 
     async def request(
@@ -5,6 +5,7 @@ from __future__ import annotations
 import voluptuous as vol
 
 from zigpy.config.defaults import (
+    CONF_ATTRIBUTE_PERSISTENCE_DEFAULT,
     CONF_DEVICE_BAUDRATE_DEFAULT,
     CONF_DEVICE_FLOW_CONTROL_DEFAULT,
     CONF_MAX_CONCURRENT_REQUESTS_DEFAULT,
@@ -28,7 +29,10 @@ from zigpy.config.defaults import (
     CONF_OTA_ENABLED_DEFAULT,
     CONF_OTA_EXTRA_PROVIDERS_DEFAULT,
     CONF_OTA_PROVIDERS_DEFAULT,
+    CONF_READ_COALESCE_WINDOW_DEFAULT,
     CONF_SOURCE_ROUTING_DEFAULT,
+    CONF_STATE_SNAPSHOT_DEFAULT,
+    CONF_STATE_SNAPSHOT_PERIOD_DEFAULT,
     CONF_TOPO_SCAN_ENABLED_DEFAULT,
     CONF_TOPO_SCAN_PERIOD_DEFAULT,
     CONF_TOPO_SKIP_COORDINATOR_DEFAULT,
@@ -48,6 +52,12 @@ from zigpy.config.validators import (
 import zigpy.types as t
 
 CONF_ADDITIONAL_ENDPOINTS = "additional_endpoints"
+CONF_ATTRIBUTE_PERSISTENCE = "attribute_persistence"
+CONF_ATTRIBUTE_PERSISTENCE_CLUSTER_ID = "cluster_id"
+CONF_ATTRIBUTE_PERSISTENCE_ATTRIBUTE_ID = "attribute_id"
+CONF_ATTRIBUTE_PERSISTENCE_POLICY = "policy"
+CONF_ATTRIBUTE_PERSISTENCE_INTERVAL = "interval"
+CONF_ATTRIBUTE_PERSISTENCE_THRESHOLD = "threshold"
 CONF_DATABASE = "database_path"
 CONF_DEVICE = "device"
 CONF_DEVICE_PATH = "path"
@@ -83,10 +93,13 @@ CONF_OTA_BROADCAST_ENABLED = "broadcast_enabled"
 CONF_OTA_BROADCAST_INITIAL_DELAY = "broadcast_initial_delay"
 CONF_OTA_BROADCAST_INTERVAL = "broadcast_interval"
 CONF_OTA_PROVIDER_MANUF_IDS = "manufacturer_ids"
+CONF_READ_COALESCE_WINDOW = "read_coalesce_window"
 CONF_SOURCE_ROUTING = "source_routing"
 CONF_STARTUP_ENERGY_SCAN = (
     "startup_energy_scan"  # Unused, kept to avoid breaking imports in dependencies
 )
+CONF_STATE_SNAPSHOT = "state_snapshot_path"
+CONF_STATE_SNAPSHOT_PERIOD = "state_snapshot_period"
 CONF_TOPO_SCAN_PERIOD = "topology_scan_period"
 CONF_TOPO_SCAN_ENABLED = "topology_scan_enabled"
 CONF_TOPO_SKIP_COORDINATOR = "topology_scan_skip_coordinator"
@@ -114,6 +127,11 @@ CONF_OTA_REMOTE_PROVIDERS = "remote_providers"
 CONF_OTA_Z2M_LOCAL_INDEX = "z2m_local_index"
 CONF_OTA_Z2M_REMOTE_INDEX = "z2m_remote_index"
 
+ATTRIBUTE_PERSISTENCE_ALWAYS = "always"
+ATTRIBUTE_PERSISTENCE_SAMPLED = "sampled"
+ATTRIBUTE_PERSISTENCE_ON_CHANGE = "on_change"
+ATTRIBUTE_PERSISTENCE_NEVER = "never"
+
 
 SCHEMA_DEVICE = vol.Schema(
     {
@@ -155,6 +173,29 @@ SCHEMA_NETWORK = vol.Schema(
     }
 )
 
+SCHEMA_ATTRIBUTE_PERSISTENCE = vol.Schema(
+    {
+        vol.Required(CONF_ATTRIBUTE_PERSISTENCE_CLUSTER_ID): cv_hex,
+        vol.Optional(CONF_ATTRIBUTE_PERSISTENCE_ATTRIBUTE_ID, default=None): vol.Any(
+            None, cv_hex
+        ),
+        vol.Required(CONF_ATTRIBUTE_PERSISTENCE_POLICY): vol.In(
+            [
+                ATTRIBUTE_PERSISTENCE_ALWAYS,
+                ATTRIBUTE_PERSISTENCE_SAMPLED,
+                ATTRIBUTE_PERSISTENCE_ON_CHANGE,
+                ATTRIBUTE_PERSISTENCE_NEVER,
+            ]
+        ),
+        vol.Optional(CONF_ATTRIBUTE_PERSISTENCE_INTERVAL, default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+        vol.Optional(CONF_ATTRIBUTE_PERSISTENCE_THRESHOLD, default=0): vol.All(
+            vol.Coerce(float), vol.Range(min=0)
+        ),
+    }
+)
+
 SCHEMA_OTA_PROVIDER_BASE = vol.Schema(
     {
         vol.Required(CONF_OTA_PROVIDER_TYPE): cv_ota_provider_name,
@@ -346,6 +387,12 @@ SCHEMA_OTA = vol.Schema(
 ZIGPY_SCHEMA = vol.Schema(
     {
         vol.Optional(CONF_DATABASE, default=None): vol.Any(None, str),
+        vol.Optional(
+            CONF_STATE_SNAPSHOT, default=CONF_STATE_SNAPSHOT_DEFAULT
+        ): vol.Any(None, str),
+        vol.Optional(
+            CONF_STATE_SNAPSHOT_PERIOD, default=CONF_STATE_SNAPSHOT_PERIOD_DEFAULT
+        ): vol.All(int, vol.Range(min=1)),
         vol.Optional(CONF_NWK, default={}): SCHEMA_NETWORK,
         vol.Optional(CONF_OTA, default={}): SCHEMA_OTA,
         vol.Optional(
@@ -370,9 +417,15 @@ ZIGPY_SCHEMA = vol.Schema(
             CONF_NWK_MAX_RETRIES, default=CONF_NWK_MAX_RETRIES_DEFAULT
         ): vol.All(int, vol.Range(min=0)),
         vol.Optional(CONF_ADDITIONAL_ENDPOINTS, default=[]): [cv_simple_descriptor],
+        vol.Optional(
+            CONF_ATTRIBUTE_PERSISTENCE, default=CONF_ATTRIBUTE_PERSISTENCE_DEFAULT
+        ): [SCHEMA_ATTRIBUTE_PERSISTENCE],
         vol.Optional(
             CONF_MAX_CONCURRENT_REQUESTS, default=CONF_MAX_CONCURRENT_REQUESTS_DEFAULT
         ): vol.All(int, vol.Range(min=0)),
+        vol.Optional(
+            CONF_READ_COALESCE_WINDOW, default=CONF_READ_COALESCE_WINDOW_DEFAULT
+        ): vol.Any(None, vol.All(vol.Coerce(float), vol.Range(min=0))),
         vol.Optional(CONF_SOURCE_ROUTING, default=CONF_SOURCE_ROUTING_DEFAULT): (
             cv_boolean
         ),
@@ -9,6 +9,7 @@ if typing.TYPE_CHECKING:
 
 CONF_OTA_PROVIDER_TYPE = "type"
 
+CONF_ATTRIBUTE_PERSISTENCE_DEFAULT = []
 CONF_DEVICE_BAUDRATE_DEFAULT = 115200
 CONF_DEVICE_FLOW_CONTROL_DEFAULT = None
 CONF_MAX_CONCURRENT_REQUESTS_DEFAULT = 8
@@ -45,7 +46,10 @@ CONF_OTA_PROVIDERS_DEFAULT = [
     },
 ]
 CONF_OTA_EXTRA_PROVIDERS_DEFAULT: list[dict[str, typing.Any]] = []
+CONF_READ_COALESCE_WINDOW_DEFAULT = None  # Disabled
 CONF_SOURCE_ROUTING_DEFAULT = False
+CONF_STATE_SNAPSHOT_DEFAULT = None
+CONF_STATE_SNAPSHOT_PERIOD_DEFAULT = 10  # 10 minutes
 CONF_TOPO_SCAN_PERIOD_DEFAULT = 4 * 60  # 4 hours
 CONF_TOPO_SCAN_ENABLED_DEFAULT = True
 CONF_TOPO_SKIP_COORDINATOR_DEFAULT = False
@@ -160,7 +160,11 @@ class PriorityDynamicBoundedSemaphore:
             raise ValueError("Semaphore released too many times")
 
         self._value += 1
-        self._wake_up_next()
+
+        # After `max_value` is lowered, holders above the new limit release without
+        # handing their slot over to a waiter
+        if self._value > 0:
+            self._wake_up_next()
 
     def __call__(self, priority: int = 0) -> WrappedContextManager:
         """Allows specifying the priority by calling the context manager.
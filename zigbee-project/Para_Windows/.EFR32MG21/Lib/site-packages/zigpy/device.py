@@ -83,7 +83,7 @@ class Device(zigpy.util.LocalLogMixin, zigpy.util.ListenableMixin):
         self.lqi: int | None = None
         self.rssi: int | None = None
         self.ota_in_progress: bool = False
-        self._last_seen: datetime | None = None
+        self._last_seen: float | None = None
         self._initialize_task: asyncio.Task | None = None
         self._group_scan_task: asyncio.Task | None = None
         self._listeners = {}
@@ -145,12 +145,14 @@ class Device(zigpy.util.LocalLogMixin, zigpy.util.ListenableMixin):
 
     @property
     def last_seen(self) -> float | None:
-        return self._last_seen.timestamp() if self._last_seen is not None else None
+        return self._last_seen
 
     @last_seen.setter
-    def last_seen(self, value: datetime | float):
-        if isinstance(value, (int, float)):
-            value = datetime.fromtimestamp(value, timezone.utc)
+    def last_seen(self, value: datetime | float | None):
+        # Kept as a POSIX time: every received packet sets it, a `datetime` is only
+        # built by the listeners that need one
+        if isinstance(value, datetime):
+            value = value.timestamp()
 
         self._last_seen = value
         self.listener_event("device_last_seen_updated", self._last_seen)
@@ -426,7 +428,7 @@ class Device(zigpy.util.LocalLogMixin, zigpy.util.ListenableMixin):
 
     def packet_received(self, packet: t.ZigbeePacket) -> None:
         # Set radio details that can be read from any type of packet
-        self.last_seen = packet.timestamp
+        self.last_seen = packet.unix_time
 
         if packet.lqi is not None:
             self.lqi = packet.lqi
@@ -0,0 +1,405 @@
+"""Source route computation from the topology of the network.
+
+The routing graph is built from the neighbor tables (link quality), the routing tables
+collected by the topology scanner and the route records sent by devices. The tree of
+the cheapest paths from the coordinator is kept up to date incrementally as links are
+added, removed or change cost, so a source route is a dictionary lookup once computed.
+
+End devices don't route: they can be the destination of a path but never one of its
+relays. Device types come from the neighbor tables and the node descriptors.
+"""
+
+from __future__ import annotations
+
+import collections
+import heapq
+import logging
+import math
+import typing
+
+import zigpy.types as t
+import zigpy.util
+import zigpy.zdo.types as zdo_t
+
+if typing.TYPE_CHECKING:
+    import zigpy.application
+
+LOGGER = logging.getLogger(__name__)
+
+# Zigbee link costs range from 1 (perfect link) to 7
+LINK_COST_MAX = 7
+
+# Cost of a link known to exist, from a routing table or a route record, without LQI
+DEFAULT_LINK_COST = 3
+
+# Added to the cost of every link of a route when a route error is reported for it
+ROUTE_ERROR_PENALTY = 2
+
+LinkKey = tuple[t.NWK, t.NWK]
+
+
+def link_cost(lqi: int) -> int:
+    """Link cost from an LQI, as in the Zigbee specification: `min(7, round(1 / p^4))`."""
+    if lqi <= 0:
+        return LINK_COST_MAX
+
+    return min(LINK_COST_MAX, round(1 / (lqi / 255) ** 4))
+
+
+def _link_key(a: t.NWK, b: t.NWK) -> LinkKey:
+    return (a, b) if a < b else (b, a)
+
+
+class RoutingGraph:
+    """Cheapest paths from the coordinator to every device of the network."""
+
+    def __init__(
+        self,
+        app: zigpy.application.ControllerApplication | None = None,
+        *,
+        root: t.NWK = t.NWK(0x0000),
+    ) -> None:
+        self._app = app
+        self.root = root
+
+        # Sources of links: LQI reported by a neighbor table, and hops of routing
+        # tables and route records that don't come with a link quality
+        self._neighbor_costs: dict[t.NWK, dict[t.NWK, int]] = {}
+        self._route_hops: dict[t.NWK, set[LinkKey]] = {}
+        self._record_hops: dict[t.NWK, set[LinkKey]] = {}
+        self._hop_refs: collections.Counter[LinkKey] = collections.Counter()
+        self._penalties: dict[LinkKey, int] = {}
+        self._end_devices: set[t.NWK] = set()
+
+        # Effective graph
+        self._adjacency: dict[t.NWK, dict[t.NWK, int]] = collections.defaultdict(dict)
+
+        # Shortest path tree
+        self._dist: dict[t.NWK, int] = {root: 0}
+        self._parent: dict[t.NWK, t.NWK] = {}
+        self._children: dict[t.NWK, set[t.NWK]] = collections.defaultdict(set)
+        self._routes: dict[t.NWK, t.Relays] = {}
+
+    def __contains__(self, nwk: t.NWK) -> bool:
+        return nwk in self._dist
+
+    def cost_to(self, nwk: t.NWK) -> int | None:
+        """Total cost of the cheapest path to `nwk`, if it is reachable."""
+        return self._dist.get(nwk)
+
+    def source_route_to(self, nwk: t.NWK) -> t.Relays | None:
+        """Relays of the cheapest path to `nwk`, closest to the coordinator first."""
+        try:
+            return self._routes[nwk]
+        except KeyError:
+            pass
+
+        if nwk not in self._dist:
+            return None
+
+        path = []
+        node = self._parent.get(nwk)
+
+        while node is not None and node != self.root:
+            path.append(node)
+            node = self._parent.get(node)
+
+        route = self._routes[nwk] = t.Relays(path[::-1])
+        return route
+
+    def load_topology(
+        self,
+        neighbors: dict[t.EUI64, list[zdo_t.Neighbor]],
+        routes: dict[t.EUI64, list[zdo_t.Route]],
+    ) -> None:
+        """Build the graph from all of the tables known to the topology scanner."""
+        if self._app is not None:
+            for device in self._app.devices.values():
+                if device.node_desc is not None and device.node_desc.is_end_device:
+                    self.set_end_device(device.nwk, True)
+
+        for ieee, table in neighbors.items():
+            self.neighbors_updated(ieee, table)
+
+        for ieee, table in routes.items():
+            self.routes_updated(ieee, table)
+
+    def _nwk_of(self, ieee: t.EUI64) -> t.NWK | None:
+        if self._app is None:
+            return None
+
+        try:
+            return self._app.get_device(ieee=ieee).nwk
+        except KeyError:
+            return None
+
+    def neighbors_updated(
+        self, ieee: t.EUI64, neighbors: list[zdo_t.Neighbor]
+    ) -> None:
+        """Topology listener: a neighbor table was scanned."""
+        nwk = self._nwk_of(ieee)
+        if nwk is None:
+            return
+
+        for neighbor in neighbors:
+            if neighbor.device_type != zdo_t.Neighbor.DeviceType.Unknown:
+                self.set_end_device(
+                    neighbor.nwk,
+                    neighbor.device_type == zdo_t.Neighbor.DeviceType.EndDevice,
+                )
+
+        self.set_neighbors(nwk, {n.nwk: link_cost(n.lqi) for n in neighbors})
+
+    def routes_updated(self, ieee: t.EUI64, routes: list[zdo_t.Route]) -> None:
+        """Topology listener: a routing table was scanned."""
+        nwk = self._nwk_of(ieee)
+        if nwk is None:
+            return
+
+        self.set_route_hops(
+            nwk,
+            {
+                route.NextHop
+                for route in routes
+                if route.RouteStatus == zdo_t.RouteStatus.Active
+            },
+        )
+
+    def set_end_device(self, nwk: t.NWK, end_device: bool) -> None:
+        """Mark `nwk` as an end device, which is never used as a relay, or not."""
+        if nwk == self.root or end_device == (nwk in self._end_devices):
+            return
+
+        if end_device:
+            self._end_devices.add(nwk)
+            # Everything that was reached through it needs another path
+            for child in list(self._children.get(nwk, ())):
+                self._recompute_subtree(child)
+        else:
+            self._end_devices.discard(nwk)
+            if nwk in self._dist:
+                self._relax(
+                    [
+                        (self._dist[nwk] + link, neighbor, nwk)
+                        for neighbor, link in self._adjacency.get(nwk, {}).items()
+                    ]
+                )
+
+    def set_neighbors(self, nwk: t.NWK, costs: dict[t.NWK, int]) -> None:
+        """Replace the links reported by the neighbor table of `nwk`."""
+        old = self._neighbor_costs.get(nwk, {})
+        self._neighbor_costs[nwk] = {n: c for n, c in costs.items() if n != nwk}
+
+        for neighbor in old.keys() | costs.keys():
+            key = _link_key(nwk, neighbor)
+            # A fresh scan supersedes the penalties of earlier route errors
+            if neighbor in costs:
+                self._penalties.pop(key, None)
+
+            self._update_link(key)
+
+    def set_route_hops(self, nwk: t.NWK, next_hops: set[t.NWK]) -> None:
+        """Replace the links to the next hops of the routing table of `nwk`."""
+        self._replace_hops(
+            self._route_hops, nwk, {_link_key(nwk, h) for h in next_hops if h != nwk}
+        )
+
+    def handle_relays(self, nwk: t.NWK, relays: list[t.NWK]) -> None:
+        """Replace the links of the last route record sent by `nwk`."""
+        path = [nwk, *zigpy.util.filter_relays(relays), self.root]
+        hops = {_link_key(a, b) for a, b in zip(path, path[1:]) if a != b}
+
+        for key in hops:
+            self._penalties.pop(key, None)
+
+        self._replace_hops(self._record_hops, nwk, hops)
+
+    def _replace_hops(
+        self, sources: dict[t.NWK, set[LinkKey]], nwk: t.NWK, hops: set[LinkKey]
+    ) -> None:
+        old = sources.get(nwk, set())
+        sources[nwk] = hops
+
+        self._hop_refs.update(hops)
+        self._hop_refs.subtract(old)
+
+        for key in old ^ hops:
+            if self._hop_refs[key] <= 0:
+                del self._hop_refs[key]
+
+            self._update_link(key)
+
+    def handle_route_error(self, nwk: t.NWK) -> None:
+        """A route to `nwk` failed: make its links more expensive and forget it."""
+        route = self.source_route_to(nwk)
+        self._record_hops_discard(nwk)
+
+        if route is None:
+            return
+
+        path = [self.root, *route, nwk]
+        for key in {_link_key(a, b) for a, b in zip(path, path[1:])}:
+            if key in self._penalties or self._has_link(key):
+                self._penalties[key] = min(
+                    self._penalties.get(key, 0) + ROUTE_ERROR_PENALTY, LINK_COST_MAX
+                )
+                self._update_link(key)
+
+    def _record_hops_discard(self, nwk: t.NWK) -> None:
+        if nwk in self._record_hops:
+            self._replace_hops(self._record_hops, nwk, set())
+            del self._record_hops[nwk]
+
+    def handle_nwk_change(self, old_nwk: t.NWK, new_nwk: t.NWK) -> None:
+        """A device changed its NWK address, links to the old address are stale."""
+        self.remove_node(old_nwk)
+
+    def remove_node(self, nwk: t.NWK) -> None:
+        """Forget every link of `nwk`."""
+        if nwk == self.root:
+            return
+
+        self._record_hops_discard(nwk)
+        self._neighbor_costs.pop(nwk, None)
+        self._route_hops.pop(nwk, None)
+
+        for key in [k for k in self._hop_refs if nwk in k]:
+            del self._hop_refs[key]
+
+        for neighbor in list(self._adjacency.get(nwk, {})):
+            self._neighbor_costs.get(neighbor, {}).pop(nwk, None)
+            self._penalties.pop(_link_key(nwk, neighbor), None)
+            self._update_link(_link_key(nwk, neighbor))
+
+        self._adjacency.pop(nwk, None)
+        self._end_devices.discard(nwk)
+
+    def _has_link(self, key: LinkKey) -> bool:
+        a, b = key
+        return (
+            b in self._neighbor_costs.get(a, {})
+            or a in self._neighbor_costs.get(b, {})
+            or key in self._hop_refs
+        )
+
+    def _effective_cost(self, key: LinkKey) -> int | None:
+        a, b = key
+        costs = [
+            cost
+            for cost in (
+                self._neighbor_costs.get(a, {}).get(b),
+                self._neighbor_costs.get(b, {}).get(a),
+            )
+            if cost is not None
+        ]
+
+        if costs:
+            # Both ends measure the link, the worse direction limits it
+            cost = max(costs)
+        elif key in self._hop_refs:
+            cost = DEFAULT_LINK_COST
+        else:
+            return None
+
+        return cost + self._penalties.get(key, 0)
+
+    def _update_link(self, key: LinkKey) -> None:
+        a, b = key
+        old = self._adjacency.get(a, {}).get(b)
+        new = self._effective_cost(key)
+
+        if old == new:
+            return
+
+        if new is None:
+            del self._adjacency[a][b]
+            del self._adjacency[b][a]
+        else:
+            self._adjacency[a][b] = new
+            self._adjacency[b][a] = new
+
+        if old is None or (new is not None and new < old):
+            self._link_decreased(a, b, new)
+        else:
+            self._link_increased(a, b)
+
+    def _set_parent(self, node: t.NWK, parent: t.NWK | None) -> None:
+        old = self._parent.pop(node, None)
+        if old is not None:
+            self._children[old].discard(node)
+
+        if parent is not None:
+            self._parent[node] = parent
+            self._children[parent].add(node)
+
+    def _subtree(self, node: t.NWK) -> list[t.NWK]:
+        nodes = [node]
+        for current in nodes:
+            nodes.extend(self._children.get(current, ()))
+
+        return nodes
+
+    def _forget_routes(self, node: t.NWK) -> None:
+        for descendant in self._subtree(node):
+            self._routes.pop(descendant, None)
+
+    def _relax(self, heap: list[tuple[int, t.NWK, t.NWK]]) -> None:
+        """Dijkstra from the seeded `(cost, node, parent)` entries, only improving."""
+        heapq.heapify(heap)
+
+        while heap:
+            cost, node, parent = heapq.heappop(heap)
+            if cost >= self._dist.get(node, math.inf):
+                continue
+
+            self._forget_routes(node)
+            self._dist[node] = cost
+            self._set_parent(node, parent)
+
+            if node in self._end_devices:
+                continue
+
+            for neighbor, link in self._adjacency[node].items():
+                if cost + link < self._dist.get(neighbor, math.inf):
+                    heapq.heappush(heap, (cost + link, neighbor, node))
+
+    def _link_decreased(self, a: t.NWK, b: t.NWK, cost: int) -> None:
+        heap = [
+            (self._dist[u] + cost, v, u)
+            for u, v in ((a, b), (b, a))
+            if u in self._dist
+            and u not in self._end_devices
+            and self._dist[u] + cost < self._dist.get(v, math.inf)
+        ]
+
+        if heap:
+            self._relax(heap)
+
+    def _link_increased(self, a: t.NWK, b: t.NWK) -> None:
+        if self._parent.get(b) == a:
+            child = b
+        elif self._parent.get(a) == b:
+            child = a
+        else:
+            return  # Not part of any cheapest path
+
+        self._recompute_subtree(child)
+
+    def _recompute_subtree(self, child: t.NWK) -> None:
+        """Find new paths for `child` and every node reached through it."""
+        # Every path through it has to be recomputed from the rest of the tree
+        affected = self._subtree(child)
+        for node in affected:
+            self._routes.pop(node, None)
+            self._dist.pop(node, None)
+
+        for node in affected:
+            self._set_parent(node, None)
+
+        heap = []
+        for node in affected:
+            for neighbor, link in self._adjacency.get(node, {}).items():
+                if neighbor in self._dist and neighbor not in self._end_devices:
+                    heap.append((self._dist[neighbor] + link, node, neighbor))
+
+        self._relax(heap)
@@ -307,6 +307,103 @@ class CounterGroup(dict):
             counter.reset()
 
 
+class _ArrayCounter(Counter):
+    """Counter whose raw value is a slot of the array of an `ArrayCounterGroup`."""
+
+    def __init__(self, name: str, values: list[int], index: int) -> None:
+        self._values = values
+        self._index = index
+        super().__init__(name)
+
+    @property
+    def _raw_value(self) -> int:
+        return self._values[self._index]
+
+    @_raw_value.setter
+    def _raw_value(self, value: int) -> None:
+        self._values[self._index] = value
+
+
+class ArrayCounterGroup(CounterGroup):
+    """Counter group whose fixed set of counters is stored in a flat array.
+
+    `array[index]` is the raw value of the counter `names[index]`, so a hot path can
+    resolve the index of its counters once and increment them with a single index
+    operation, `group.array[index] += 1`. The group is otherwise a regular
+    `CounterGroup`: like any other counter, an array counter only becomes an entry of
+    the group once it is used, either by incrementing its slot or by looking it up.
+    Every view of the group (iteration, `len`, `in`, `keys`, `values`, `items`,
+    `get`) first adds the counters whose slot has been incremented since.
+    """
+
+    def __init__(self, collection_name: str | None, names: Iterable[str]) -> None:
+        super().__init__(collection_name)
+        self.names: tuple[str, ...] = tuple(names)
+        self.array: list[int] = [0] * len(self.names)
+        self._indices = {name: index for index, name in enumerate(self.names)}
+
+    def index(self, name: str) -> int:
+        """Return the index of a counter of the fixed set in `array`."""
+        return self._indices[name]
+
+    def _add_used(self) -> None:
+        for index, value in enumerate(self.array):
+            if value and not super().__contains__(self.names[index]):
+                self._add(index)
+
+    def _add(self, index: int) -> Counter:
+        name = self.names[index]
+        # Creating the counter zeroes the slot, keep what was counted before
+        raw_value = self.array[index]
+        counter = _ArrayCounter(name, self.array, index)
+        counter._raw_value = raw_value
+        super().__setitem__(name, counter)
+        return counter
+
+    def __missing__(self, counter_id: Any) -> Counter:
+        index = self._indices.get(counter_id)
+        if index is None:
+            return super().__missing__(counter_id)
+
+        return self._add(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        self._add_used()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self._add_used()
+        return super().__len__()
+
+    def __contains__(self, key: object) -> bool:
+        self._add_used()
+        return super().__contains__(key)
+
+    def keys(self):
+        self._add_used()
+        return super().keys()
+
+    def values(self):
+        self._add_used()
+        return super().values()
+
+    def items(self):
+        self._add_used()
+        return super().items()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        self._add_used()
+        return super().get(key, default)
+
+    def __repr__(self) -> str:
+        """Same representation as a regular group, the array is a storage detail."""
+        counters = ", ".join(
+            f"{Counter.__name__}('{counter.name}', {int(counter)})"
+            for counter in self.counters()
+        )
+        return f"{CounterGroup.__name__}('{self.name}', {{{counters}}})"
+
+
 class CounterGroups(dict):
     """A collection of unrelated counter groups in a dict."""
 
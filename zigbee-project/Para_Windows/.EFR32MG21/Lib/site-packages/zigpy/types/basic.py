@@ -53,6 +53,8 @@ class Bits(list):
 class SerializableBytes:
     """A container object for raw bytes that enforces `serialize()` will be called."""
 
+    __slots__ = ("value",)
+
     def __init__(self, value: bytes = b"") -> None:
         if isinstance(value, SerializableBytes):
             value = value.value
@@ -3,6 +3,8 @@ from __future__ import annotations
 import dataclasses
 from datetime import datetime, timezone
 import enum
+import operator
+import time
 import typing
 
 import attrs
@@ -15,6 +17,8 @@ if typing.TYPE_CHECKING:
 
 
 class BaseDataclassMixin:
+    __slots__ = ()
+
     def replace(self, **kwargs: typing.Any) -> Self:
         if dataclasses.is_dataclass(self):
             assert not isinstance(self, type)  # `is_dataclass` works on types as well
@@ -48,7 +52,12 @@ class EUI64(basic.FixedList, item_type=basic.uint8_t, length=8):
         return ":".join(f"{i:02x}" for i in self[::-1])
 
     def __hash__(self) -> int:  # type: ignore[override]
-        return hash(repr(self))
+        # Devices are looked up by IEEE address all the time, hashing the bytes is an
+        # order of magnitude faster than hashing the formatted address. This used to be
+        # `hash(repr(self))`: equal addresses still hash equally and lookups still
+        # need an equal EUI64 (a string never compared equal), so dicts and sets keep
+        # their behavior. Hash values are never persisted.
+        return hash(tuple(self))
 
     @classmethod
     def convert(cls, ieee: str) -> EUI64:
@@ -541,7 +550,18 @@ class Addressing:
     Broadcast = AddrMode
 
 
-@dataclasses.dataclass
+_ADDR_MODE_TYPES: dict[AddrMode, type] = {
+    AddrMode.Group: Group,
+    AddrMode.NWK: NWK,
+    AddrMode.IEEE: EUI64,
+    AddrMode.Broadcast: BroadcastAddress,
+}
+
+# Bound on the number of interned addresses, roughly the size of a large network
+ADDRESS_INTERN_LIMIT = 4096
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class AddrModeAddress(BaseDataclassMixin):
     """Address mode and address."""
 
@@ -550,16 +570,39 @@ class AddrModeAddress(BaseDataclassMixin):
 
     def __post_init__(self) -> None:
         if self.addr_mode is not None and self.address is not None:
-            self.address = {
-                AddrMode.Group: Group,
-                AddrMode.NWK: NWK,
-                AddrMode.IEEE: EUI64,
-                AddrMode.Broadcast: BroadcastAddress,
-            }[self.addr_mode](self.address)
+            address_type = _ADDR_MODE_TYPES[self.addr_mode]
+
+            if type(self.address) is not address_type:
+                object.__setattr__(self, "address", address_type(self.address))
 
     def __hash__(self) -> int:
         return hash((self.addr_mode, self.address))
 
+    @classmethod
+    def interned(
+        cls, addr_mode: AddrMode, address: NWK | Group | EUI64 | BroadcastAddress
+    ) -> AddrModeAddress:
+        """Return a shared instance for the address, addresses are immutable.
+
+        Used on the receive path, where the same few sources and destinations are
+        created for every packet.
+        """
+        key = (addr_mode, address)
+
+        try:
+            return _INTERNED_ADDRESSES[key]
+        except KeyError:
+            pass
+
+        if len(_INTERNED_ADDRESSES) >= ADDRESS_INTERN_LIMIT:
+            _INTERNED_ADDRESSES.clear()
+
+        obj = _INTERNED_ADDRESSES[key] = cls(addr_mode=addr_mode, address=address)
+        return obj
+
+
+_INTERNED_ADDRESSES: dict[tuple[AddrMode, typing.Any], AddrModeAddress] = {}
+
 
 class TransmitOptions(enum.Flag):
     NONE = 0
@@ -578,73 +621,154 @@ class PacketPriority(enum.IntEnum):
     LOW = -1
 
 
-@dataclasses.dataclass
+# Fields of a packet that are compared and hashed, in constructor order
+_PACKET_FIELDS = (
+    "priority",
+    "src",
+    "src_ep",
+    "dst",
+    "dst_ep",
+    "source_route",
+    "extended_timeout",
+    "tsn",
+    "profile_id",
+    "cluster_id",
+    "data",
+    "tx_options",
+    "radius",
+    "non_member_radius",
+    "lqi",
+    "rssi",
+)
+_packet_values = operator.attrgetter(*_PACKET_FIELDS)
+
+# Placeholder for a timestamp that has not been converted to a `datetime` yet
+_LAZY_TIMESTAMP: typing.Any = object()
+
+
 class ZigbeePacket(BaseDataclassMixin):
     """Container for the information in an incoming or outgoing ZDO or ZCL packet.
 
     The radio library is expected to fill this object in with all received data and pass
     it to zigpy for every type of packet.
-    """
-
-    timestamp: datetime = dataclasses.field(
-        compare=False, default_factory=lambda: datetime.now(timezone.utc)
-    )
 
-    # Higher priority will try to be sent before lower
-    priority: int = dataclasses.field(default=0)
+    A packet is created for every frame received, so it is slotted and only records the
+    monotonic time it was created at: `timestamp` is converted to a `datetime` the first
+    time it is read. The timestamp is not compared, like any other time of reception.
+    """
 
-    # Set to `None` when the packet is outgoing
-    src: AddrModeAddress | None = dataclasses.field(default=None)
-    src_ep: basic.uint8_t | None = dataclasses.field(default=None)
+    __slots__ = ("_timestamp", "monotonic", *_PACKET_FIELDS)
+
+    def __init__(
+        self,
+        timestamp: datetime | None = _LAZY_TIMESTAMP,
+        # Higher priority will try to be sent before lower
+        priority: int = 0,
+        # Set to `None` when the packet is outgoing
+        src: AddrModeAddress | None = None,
+        src_ep: basic.uint8_t | None = None,
+        # Set to `None` when the packet is incoming
+        dst: AddrModeAddress | None = None,
+        dst_ep: basic.uint8_t | None = None,
+        # If the radio supports it, a source route for the packet
+        source_route: list[NWK] | None = None,
+        extended_timeout: bool = False,
+        tsn: basic.uint8_t = 0x00,
+        profile_id: basic.uint16_t = 0x0000,
+        cluster_id: basic.uint16_t = 0x0000,
+        # Any serializable object
+        data: basic.SerializableBytes | None = None,
+        # Options for outgoing packets
+        tx_options: TransmitOptions = TransmitOptions.NONE,
+        radius: basic.uint8_t = 0,
+        non_member_radius: basic.uint8_t = 0,
+        # Options for incoming packets
+        lqi: basic.uint8_t | None = None,
+        rssi: basic.int8s | None = None,
+        *,
+        monotonic: float | None = None,
+    ) -> None:
+        self._timestamp = timestamp
+        self.monotonic = time.monotonic() if monotonic is None else monotonic
+        self.priority = priority
+        self.src = src
+        self.src_ep = src_ep
+        self.dst = dst
+        self.dst_ep = dst_ep
+        self.source_route = source_route
+        self.extended_timeout = extended_timeout
+        self.tsn = tsn
+        self.profile_id = profile_id
+        self.cluster_id = cluster_id
+        self.data = basic.SerializableBytes() if data is None else data
+        self.tx_options = tx_options
+        self.radius = radius
+        self.non_member_radius = non_member_radius
+        self.lqi = lqi
+        self.rssi = rssi
 
-    # Set to `None` when the packet is incoming
-    dst: AddrModeAddress | None = dataclasses.field(default=None)
-    dst_ep: basic.uint8_t | None = dataclasses.field(default=None)
+    @property
+    def timestamp(self) -> datetime | None:
+        if self._timestamp is _LAZY_TIMESTAMP:
+            self._timestamp = datetime.fromtimestamp(self.unix_time, timezone.utc)
 
-    # If the radio supports it, a source route for the packet
-    source_route: list[NWK] | None = dataclasses.field(default=None)
-    extended_timeout: bool = dataclasses.field(default=False)
+        return self._timestamp
 
-    tsn: basic.uint8_t = dataclasses.field(default=0x00)
-    profile_id: basic.uint16_t = dataclasses.field(default=0x0000)
-    cluster_id: basic.uint16_t = dataclasses.field(default=0x0000)
+    @property
+    def unix_time(self) -> float | None:
+        """POSIX time of reception, without converting `timestamp` to a `datetime`."""
+        if self._timestamp is _LAZY_TIMESTAMP:
+            return time.time() - (time.monotonic() - self.monotonic)
 
-    # Any serializable object
-    data: basic.SerializableBytes = dataclasses.field(
-        default_factory=basic.SerializableBytes
-    )
+        return self._timestamp.timestamp() if self._timestamp is not None else None
 
-    # Options for outgoing packets
-    tx_options: TransmitOptions = dataclasses.field(default=TransmitOptions.NONE)
-    radius: basic.uint8_t = dataclasses.field(default=0)
-    non_member_radius: basic.uint8_t = dataclasses.field(default=0)
+    @timestamp.setter
+    def timestamp(self, value: datetime | None) -> None:
+        self._timestamp = value
 
-    # Options for incoming packets
-    lqi: basic.uint8_t | None = dataclasses.field(default=None)
-    rssi: basic.int8s | None = dataclasses.field(default=None)
+    def replace(self, **kwargs: typing.Any) -> Self:
+        packet = object.__new__(type(self))
+        packet._timestamp = self._timestamp
+        packet.monotonic = self.monotonic
+        packet.priority = self.priority
+        packet.src = self.src
+        packet.src_ep = self.src_ep
+        packet.dst = self.dst
+        packet.dst_ep = self.dst_ep
+        packet.source_route = self.source_route
+        packet.extended_timeout = self.extended_timeout
+        packet.tsn = self.tsn
+        packet.profile_id = self.profile_id
+        packet.cluster_id = self.cluster_id
+        packet.data = self.data
+        packet.tx_options = self.tx_options
+        packet.radius = self.radius
+        packet.non_member_radius = self.non_member_radius
+        packet.lqi = self.lqi
+        packet.rssi = self.rssi
+
+        for name, value in kwargs.items():
+            if name != "timestamp" and name not in _PACKET_FIELDS:
+                raise TypeError(f"{type(self).__name__} has no field {name!r}")
+
+            setattr(packet, name, value)
+
+        return packet
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+
+        return _packet_values(self) == _packet_values(other)
 
     def __hash__(self) -> int:
-        return hash(
-            (
-                self.timestamp,
-                self.src,
-                self.src_ep,
-                self.dst,
-                self.dst_ep,
-                self.source_route,
-                self.extended_timeout,
-                self.tsn,
-                self.profile_id,
-                self.cluster_id,
-                self.data,
-                self.tx_options,
-                self.radius,
-                self.non_member_radius,
-                self.lqi,
-                self.rssi,
-                self.priority,
-            )
+        return hash(_packet_values(self))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in ("timestamp", *_PACKET_FIELDS)
         )
+        return f"{type(self).__qualname__}({fields})"
 
 
 @dataclasses.dataclass(frozen=True)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import collections
 from collections.abc import Iterable, Sequence
 from datetime import datetime, timezone
@@ -12,6 +13,7 @@ from typing import TYPE_CHECKING, Any
 import warnings
 
 from zigpy import util
+from zigpy.config import CONF_READ_COALESCE_WINDOW
 from zigpy.const import APS_REPLY_TIMEOUT
 import zigpy.types as t
 from zigpy.typing import AddressingMode, EndpointType
@@ -25,6 +27,22 @@ if TYPE_CHECKING:
 
 LOGGER = logging.getLogger(__name__)
 
+# NSDU size assumed for devices whose node descriptor has not been read yet
+READ_ATTRIBUTES_DEFAULT_MAX_NSDU = 82
+
+# APS header of a unicast data frame: frame control, endpoints, cluster, profile, counter
+APS_UNICAST_HEADER_SIZE = 8
+
+# ZCL header: frame control, TSN and command ID, plus the manufacturer code if present
+ZCL_HEADER_SIZE = 3
+ZCL_MANUFACTURER_CODE_SIZE = 2
+
+# Per-record overhead in a Read Attributes response: attrid, status and data type
+READ_ATTRIBUTES_RSP_RECORD_OVERHEAD = 4
+
+# Assumed size of attribute values with a variable or unknown length
+READ_ATTRIBUTES_RSP_UNKNOWN_VALUE_SIZE = 16
+
 
 def convert_list_schema(
     schema: Sequence[type], command_id: int, direction: foundation.Direction
@@ -50,6 +68,149 @@ def convert_list_schema(
     return temp.with_compiled_schema().schema
 
 
+class ReadAttributesCoalescer:
+    """Merges concurrent attribute reads on a cluster into shared requests.
+
+    Reads arriving within the coalescing window are combined into as few Read
+    Attributes requests as fit within a single response frame and an attribute that is
+    already being read is not requested again. Every caller receives the result of the
+    request that covered its attributes.
+    """
+
+    def __init__(self, cluster: Cluster) -> None:
+        self._cluster = cluster
+        self._pending: dict[int | None, dict[int, asyncio.Future]] = {}
+        self._in_flight: dict[tuple[int | None, int], asyncio.Future] = {}
+        self._flush_handles: dict[int | None, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def read(
+        self,
+        attribute_ids: list[int],
+        manufacturer: int | None = None,
+        window: float = 0.01,
+    ) -> dict[int, foundation.ReadAttributeRecord | foundation.Status | None]:
+        """Read attributes, returning either a record or a default response status.
+
+        Attributes the device omitted from its response are mapped to `None`.
+        """
+        loop = asyncio.get_running_loop()
+        pending = self._pending.setdefault(manufacturer, {})
+        futures = {}
+
+        for attrid in attribute_ids:
+            future = self._in_flight.get((manufacturer, attrid)) or pending.get(attrid)
+
+            if future is None:
+                future = loop.create_future()
+                future.add_done_callback(_consume_future_exception)
+                pending[attrid] = future
+
+            futures[attrid] = future
+
+        if pending and manufacturer not in self._flush_handles:
+            self._flush_handles[manufacturer] = loop.call_later(
+                window, self._flush, manufacturer
+            )
+
+        # A cancelled caller must not cancel a request shared with other callers
+        return {
+            attrid: await asyncio.shield(future) for attrid, future in futures.items()
+        }
+
+    def _flush(self, manufacturer: int | None) -> None:
+        del self._flush_handles[manufacturer]
+        pending = self._pending.pop(manufacturer, {})
+
+        for chunk in self._split_reads(list(pending), manufacturer):
+            futures = {attrid: pending[attrid] for attrid in chunk}
+
+            for attrid, future in futures.items():
+                self._in_flight[manufacturer, attrid] = future
+
+            task = asyncio.get_running_loop().create_task(
+                self._read_chunk(futures, manufacturer)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _response_payload_size(self, manufacturer: int | None) -> int:
+        """Room for attribute records in an unfragmented response from the device."""
+        node_desc = self._cluster.endpoint.device.node_desc
+        max_nsdu = (
+            node_desc is not None and node_desc.maximum_buffer_size
+        ) or READ_ATTRIBUTES_DEFAULT_MAX_NSDU
+        zcl_header = ZCL_HEADER_SIZE + (
+            ZCL_MANUFACTURER_CODE_SIZE if manufacturer is not None else 0
+        )
+        return max_nsdu - APS_UNICAST_HEADER_SIZE - zcl_header
+
+    def _split_reads(
+        self, attribute_ids: list[int], manufacturer: int | None = None
+    ) -> list[list[int]]:
+        """Split attributes into chunks whose responses fit into a single frame."""
+        payload_size = self._response_payload_size(manufacturer)
+        chunks: list[list[int]] = [[]]
+        chunk_size = 0
+
+        for attrid in attribute_ids:
+            try:
+                attr_type = self._cluster.attributes[attrid].type
+            except KeyError:
+                attr_type = None
+
+            size = READ_ATTRIBUTES_RSP_RECORD_OVERHEAD + (
+                getattr(attr_type, "_size", None)
+                or READ_ATTRIBUTES_RSP_UNKNOWN_VALUE_SIZE
+            )
+
+            if chunks[-1] and chunk_size + size > payload_size:
+                chunks.append([])
+                chunk_size = 0
+
+            chunks[-1].append(attrid)
+            chunk_size += size
+
+        return [chunk for chunk in chunks if chunk]
+
+    async def _read_chunk(
+        self, futures: dict[int, asyncio.Future], manufacturer: int | None
+    ) -> None:
+        try:
+            result = await self._cluster.read_attributes_raw(
+                list(futures), manufacturer=manufacturer
+            )
+        except asyncio.CancelledError:
+            # Callers waiting on this chunk are cancelled with it, and so is the task
+            for future in futures.values():
+                future.cancel()
+
+            raise
+        except Exception as exc:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            if not isinstance(result[0], list):
+                # Assume default response
+                responses = dict.fromkeys(futures, result[0])
+            else:
+                responses = {record.attrid: record for record in result[0]}
+
+            for attrid, future in futures.items():
+                if not future.done():
+                    future.set_result(responses.get(attrid))
+        finally:
+            for attrid in futures:
+                self._in_flight.pop((manufacturer, attrid), None)
+
+
+def _consume_future_exception(future: asyncio.Future) -> None:
+    """Mark a shared future's exception as retrieved if all its callers are gone."""
+    if not future.cancelled():
+        future.exception()
+
+
 class ClusterType(enum.IntEnum):
     Server = 0
     Client = 1
@@ -92,6 +253,10 @@ class Cluster(util.ListenableMixin, util.CatchingTaskMixin):
     _registry: dict = {}
     _registry_range: dict = {}
 
+    # Overrides the application's `read_coalesce_window` for this cluster class, set
+    # to `0` to always send reads directly
+    read_coalesce_window: float | None = None
+
     def __init_subclass__(cls) -> None:
         if cls.cluster_id is not None:
             cls.cluster_id = t.ClusterId(cls.cluster_id)
@@ -219,6 +384,7 @@ class Cluster(util.ListenableMixin, util.CatchingTaskMixin):
         self._attr_last_updated: dict[int, datetime] = {}
         self.unsupported_attributes: set[int | str] = set()
         self._listeners = {}
+        self._read_coalescer = ReadAttributesCoalescer(self)
         self._type: ClusterType = (
             ClusterType.Server if is_server else ClusterType.Client
         )
@@ -472,15 +638,18 @@ class Cluster(util.ListenableMixin, util.CatchingTaskMixin):
         dst_addressing: AddressingMode | None = None,
     ) -> None:
         if hdr.command_id == foundation.GeneralCommand.Report_Attributes:
-            values = []
+            if LOGGER.isEnabledFor(logging.DEBUG):
+                values = []
 
-            for a in args.attribute_reports:
-                if a.attrid in self.attributes:
-                    values.append(f"{self.attributes[a.attrid].name}={a.value.value!r}")
-                else:
-                    values.append(f"0x{a.attrid:04X}={a.value.value!r}")
+                for a in args.attribute_reports:
+                    if a.attrid in self.attributes:
+                        values.append(
+                            f"{self.attributes[a.attrid].name}={a.value.value!r}"
+                        )
+                    else:
+                        values.append(f"0x{a.attrid:04X}={a.value.value!r}")
 
-            self.debug("Attribute report received: %s", ", ".join(values))
+                self.debug("Attribute report received: %s", ", ".join(values))
 
             for attr in args.attribute_reports:
                 try:
@@ -573,36 +742,53 @@ class Cluster(util.ListenableMixin, util.CatchingTaskMixin):
         if not to_read or only_cache:
             return success, failure
 
-        result = await self.read_attributes_raw(
-            to_read, manufacturer=manufacturer, **kwargs
-        )
-        if not isinstance(result[0], list):
-            for attrid in to_read:
-                orig_attribute = orig_attributes[attrid]
-                failure[orig_attribute] = result[0]  # Assume default response
+        window = self.read_coalesce_window
+        if window is None:
+            window = self._endpoint.device.application.config.get(
+                CONF_READ_COALESCE_WINDOW
+            )
+
+        if window and not kwargs:
+            responses = await self._read_coalescer.read(to_read, manufacturer, window)
         else:
-            for record in result[0]:
-                orig_attribute = orig_attributes[record.attrid]
-                if record.status == foundation.Status.SUCCESS:
-                    try:
-                        value = self.attributes[record.attrid].type(record.value.value)
-                    except KeyError:
-                        value = record.value.value
-                    except ValueError:
-                        value = record.value.value
-                        self.debug(
-                            "Couldn't normalize %a attribute with %s value",
-                            record.attrid,
-                            value,
-                            exc_info=True,
-                        )
-                    self._update_attribute(record.attrid, value)
-                    success[orig_attribute] = value
-                    self.remove_unsupported_attribute(record.attrid)
-                else:
-                    if record.status == foundation.Status.UNSUPPORTED_ATTRIBUTE:
-                        self.add_unsupported_attribute(record.attrid)
-                    failure[orig_attribute] = record.status
+            result = await self.read_attributes_raw(
+                to_read, manufacturer=manufacturer, **kwargs
+            )
+
+            if not isinstance(result[0], list):
+                # Assume default response
+                responses = dict.fromkeys(to_read, result[0])
+            else:
+                responses = {record.attrid: record for record in result[0]}
+
+        for attrid, record in responses.items():
+            if record is None:
+                continue
+
+            orig_attribute = orig_attributes[attrid]
+
+            if not isinstance(record, foundation.ReadAttributeRecord):
+                failure[orig_attribute] = record
+            elif record.status == foundation.Status.SUCCESS:
+                try:
+                    value = self.attributes[record.attrid].type(record.value.value)
+                except KeyError:
+                    value = record.value.value
+                except ValueError:
+                    value = record.value.value
+                    self.debug(
+                        "Couldn't normalize %a attribute with %s value",
+                        record.attrid,
+                        value,
+                        exc_info=True,
+                    )
+                self._update_attribute(record.attrid, value)
+                success[orig_attribute] = value
+                self.remove_unsupported_attribute(record.attrid)
+            else:
+                if record.status == foundation.Status.UNSUPPORTED_ATTRIBUTE:
+                    self.add_unsupported_attribute(record.attrid)
+                failure[orig_attribute] = record.status
 
         return success, failure
 
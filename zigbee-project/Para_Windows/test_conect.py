@@ -1,7 +1,9 @@
 # --- START OF FILE ---
 import asyncio
+import importlib.util
 import logging
 import random
+import os
 import signal
 from typing import Dict, Any
 
@@ -16,15 +18,24 @@ PERMIT_JOIN_DURATION_ON_STARTUP = 180 # Duración de cada ventana de unión (ej.
 REOPEN_JOIN_INTERVAL_SECONDS = 150    # Reabrir cada 150 segundos (2.5 minutos)
                                       # Asegúrate REOPEN_JOIN_INTERVAL_SECONDS < PERMIT_JOIN_DURATION_ON_STARTUP
 
-ESP32_H2_ENDPOINT_ID = 1
-CUSTOM_CLUSTER_ID = 0xFC01
-ATTR_ID_CURRENT_SENSOR_1 = 0x0001
-ATTR_ID_CURRENT_SENSOR_2 = 0x0002
-ATTR_ID_CURRENT_SENSOR_3 = 0x0003
-
-REPORTING_MIN_INTERVAL = 10
-REPORTING_MAX_INTERVAL = 60
-REPORTABLE_CURRENT_CHANGE = 0.05
+# El cluster, sus atributos y el reporte salen del mismo esquema que usa el gateway de la
+# Raspberry, leído con su propio sensor_schema.py (tipos, unidades, valores por defecto y
+# centinelas): así no hay un segundo parser que pueda divergir. Se carga desde su ruta
+# para no tocar sys.path ni importar nada más de Para_Raspberry.
+SENSOR_SCHEMA_MODULE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Para_Raspberry", "sensor_schema.py")
+_schema_spec = importlib.util.spec_from_file_location("sensor_schema", SENSOR_SCHEMA_MODULE)
+sensor_schema = importlib.util.module_from_spec(_schema_spec)
+_schema_spec.loader.exec_module(sensor_schema)
+
+SENSOR_REGISTRY = sensor_schema.SensorRegistry.load()
+SENSOR_SCHEMA = SENSOR_REGISTRY.schemas[0] # El ESP32-H2 con los sensores de corriente
+
+ESP32_H2_ENDPOINT_ID = SENSOR_SCHEMA.endpoint_id
+CUSTOM_CLUSTER_ID = SENSOR_SCHEMA.cluster_id
+REPORTING_MIN_INTERVAL = SENSOR_SCHEMA.min_interval
+REPORTING_MAX_INTERVAL = SENSOR_SCHEMA.max_interval
+SENSOR_ATTRIBUTES = {attr.id: attr for attr in SENSOR_SCHEMA.attributes}
+SENSOR_CHANNELS = SENSOR_REGISTRY.channels[CUSTOM_CLUSTER_ID]
 import zigpy.backups
 import zigpy.config as zigpy_config
 import zigpy.exceptions
@@ -40,26 +51,10 @@ except ImportError:
     print("Error: La biblioteca 'bellows' no está instalada.")
     BellowsApplication = None
 
-class CustomPowerSensorCluster(Cluster):
-    cluster_id = CUSTOM_CLUSTER_ID
-    attributes = {
-        ATTR_ID_CURRENT_SENSOR_1: ("current_sensor_1", t.Single),
-        ATTR_ID_CURRENT_SENSOR_2: ("current_sensor_2", t.Single),
-        ATTR_ID_CURRENT_SENSOR_3: ("current_sensor_3", t.Single),
-    }
-
-if CUSTOM_CLUSTER_ID not in Cluster._registry:
-     Cluster._registry[CUSTOM_CLUSTER_ID] = CustomPowerSensorCluster
-else:
-    if Cluster._registry[CUSTOM_CLUSTER_ID] is not CustomPowerSensorCluster:
-        logging.warning(
-            f"Cluster ID {CUSTOM_CLUSTER_ID:#06x} ya estaba en Cluster.registry "
-            f"pero con una clase diferente ({Cluster._registry[CUSTOM_CLUSTER_ID].__name__}). "
-            f"Sobrescribiendo con CustomPowerSensorCluster."
-        )
-        Cluster._registry[CUSTOM_CLUSTER_ID] = CustomPowerSensorCluster
-    else:
-        logging.info(f"Cluster ID {CUSTOM_CLUSTER_ID:#06x} (CustomPowerSensorCluster) ya estaba en Cluster.registry.")
+UNKNOWN_CHANNEL = sensor_schema.Channel(index=-1, scale=1.0, name="Desconocido", unit="")
+
+# Generado por el esquema: al heredar de Cluster queda registrado en zigpy
+CustomPowerSensorCluster = SENSOR_REGISTRY.clusters[CUSTOM_CLUSTER_ID]
 
 shutdown_event = asyncio.Event()
 
@@ -78,16 +73,15 @@ class SensorAttributeListener:
             return
 
         self._last_values[attribute_id] = value
-        sensor_name = "Desconocido"
-        if attribute_id == ATTR_ID_CURRENT_SENSOR_1:
-            sensor_name = "Sensor Corriente 1"
-        elif attribute_id == ATTR_ID_CURRENT_SENSOR_2:
-            sensor_name = "Sensor Corriente 2"
-        elif attribute_id == ATTR_ID_CURRENT_SENSOR_3:
-            sensor_name = "Sensor Corriente 3"
+        channel = SENSOR_CHANNELS.get(attribute_id, UNKNOWN_CHANNEL)
+        if channel.is_sentinel(value): # Sobre el valor crudo, antes de escalar
+            shown = f"sin medida (valor crudo {value})"
+        else:
+            value = value * channel.scale
+            shown = f"{value:.2f} {channel.unit}".rstrip()
 
         device_identifier = str(self.owning_cluster.endpoint.device.ieee) # Usamos el del cluster actual
-        print(f"*** LECTURA DE SENSOR [{device_identifier}] : {sensor_name} (AttrID: {attribute_id:#06x}) = {value:.2f} A ***")
+        print(f"*** LECTURA DE SENSOR [{device_identifier}] : {channel.name} (AttrID: {attribute_id:#06x}) = {shown} ***")
         logging.info(f"ACTUALIZACIÓN SENSOR ({self.owning_cluster.endpoint.device.nwk:#06x}): "
                      f"Sensor (AttrID: {attribute_id:#06x}) = {value} a las {timestamp}")
 
@@ -184,14 +178,9 @@ class MyEventListener:
             logging.error(f"Excepción general durante el binding explícito (ZDO Bind_req): {type(e_bind).__name__} - {e_bind}", exc_info=True)
         # --- FIN DEL BLOQUE DE BINDING EXPLÍCITO ---
 
-        attributes_to_configure = {
-            ATTR_ID_CURRENT_SENSOR_1: "Corriente Sensor 1",
-            ATTR_ID_CURRENT_SENSOR_2: "Corriente Sensor 2",
-            ATTR_ID_CURRENT_SENSOR_3: "Corriente Sensor 3",
-        }
-
         logging.info(f"Configurando reporte de atributos para {device.ieee} en cluster {custom_cluster!r}...")
-        for attr_id, attr_name in attributes_to_configure.items():
+        for attr_id, attr in SENSOR_ATTRIBUTES.items():
+            attr_name = attr.channel
             try:
                 if not custom_cluster.find_attribute(attr_id):
                     logging.error(f"  Atributo {attr_id:#06x} ({attr_name}) NO ENCONTRADO en la definición de CustomPowerSensorCluster.")
@@ -201,7 +190,7 @@ class MyEventListener:
                     attr_id,
                     REPORTING_MIN_INTERVAL,
                     REPORTING_MAX_INTERVAL,
-                    REPORTABLE_CURRENT_CHANGE,
+                    attr.reportable_change,
                 )
 
                 res_payload_args = None
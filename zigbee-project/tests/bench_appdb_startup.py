@@ -0,0 +1,241 @@
+"""Tiempo de arranque de zigpy cargando zigbee.db frente a restaurar la instantánea.
+
+Es el banco de pruebas de las cifras de `appdb_snapshot`: crea una base de datos con
+DEVICES dispositivos (una tercera parte sin quirk, otra con un quirk v1 y otra con un
+quirk v2, cada uno con 17 atributos y un vecino, además de un grupo y relays), escribe
+la instantánea y mide `_load_db` RUNS veces de cada forma, mostrando la mediana.
+
+Con --cold vacía la caché de páginas antes de cada arranque (necesita root), que es
+como se midieron las cifras de la instantánea:
+
+    python tests/bench_appdb_startup.py 1000 --runs 7 --cold
+
+test_appdb_snapshot.py usa las mismas funciones con pocos dispositivos.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import zigpy.application
+import zigpy.config as conf
+import zigpy.device
+import zigpy.endpoint
+import zigpy.profiles.zha as zha
+from zigpy.quirks import CustomCluster, CustomDevice
+from zigpy.quirks.v2 import QuirkBuilder
+from zigpy.zcl.clusters.general import OnOff
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+
+MANUFACTURER = "Acme"
+MODELS = ("plain", "v1model", "v2model")  # Sin quirk, quirk v1, quirk v2
+ATTRIBUTES = 15  # Más fabricante y modelo: 17 atributos por dispositivo
+GROUP_MEMBERS = 20
+
+
+class App(zigpy.application.ControllerApplication):
+    """Aplicación sin radio, solo para cargar y guardar la base de datos."""
+
+    async def send_packet(self, packet):
+        pass
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def start_network(self):
+        pass
+
+    async def force_remove(self, dev):
+        pass
+
+    async def add_endpoint(self, descriptor):
+        pass
+
+    async def permit_ncp(self, time_s=60):
+        pass
+
+    async def permit_with_link_key(self, node, link_key, time_s=60):
+        pass
+
+    async def reset_network_info(self):
+        pass
+
+    async def write_network_info(self, *, network_info, node_info):
+        pass
+
+    async def load_network_info(self, *, load_devices=False):
+        pass
+
+
+class V1Quirk(CustomDevice):
+    signature = {
+        "models_info": [(MANUFACTURER, "v1model")],
+        "endpoints": {1: {
+            "profile_id": zha.PROFILE_ID, "device_type": zha.DeviceType.ON_OFF_SWITCH,
+            "input_clusters": [0x0000, 0x0006], "output_clusters": [0x0019],
+        }},
+    }
+    replacement = {
+        "endpoints": {1: {
+            "profile_id": zha.PROFILE_ID, "device_type": zha.DeviceType.ON_OFF_SWITCH,
+            "input_clusters": [0x0000, 0x0006, 0x0001], "output_clusters": [0x0019],
+        }},
+    }
+
+
+class V2OnOff(CustomCluster, OnOff):
+    pass
+
+
+QuirkBuilder(MANUFACTURER, "v2model").replaces(V2OnOff).add_to_registry()
+
+
+def make_app(database, snapshot):
+    return App({
+        conf.CONF_DEVICE: {conf.CONF_DEVICE_PATH: "/dev/null"},
+        conf.CONF_DATABASE: database,
+        conf.CONF_STATE_SNAPSHOT: snapshot,
+        conf.CONF_OTA: {conf.CONF_OTA_ENABLED: False},
+    })
+
+
+async def populate(database, devices):
+    """Crea la base de datos con `devices` dispositivos."""
+    for path in (database, database + "-wal", database + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    app = make_app(database, None)
+    await app._load_db()
+    rng = random.Random(1)
+
+    for n in range(devices):
+        kind = n % len(MODELS)
+        ieee = t.EUI64(n.to_bytes(8, "little"))
+        dev = app.add_device(ieee, 0x1000 + n)
+        dev.node_desc = zdo_t.NodeDescriptor(2, 64, 128, 4174, 82, 255, 0, 255, 0)
+
+        ep = dev.add_endpoint(1)
+        ep.profile_id = zha.PROFILE_ID
+        ep.status = zigpy.endpoint.Status.ZDO_INIT
+        ep.device_type = zha.DeviceType.ON_OFF_SWITCH if kind else zha.DeviceType.TEMPERATURE_SENSOR
+        measured = ep.add_input_cluster(0x0006 if kind else 0x0402)
+        basic = ep.add_input_cluster(0x0000)
+        if kind == 0:
+            ep.add_input_cluster(0x0001)
+        ep.add_output_cluster(0x0019)
+
+        basic._update_attribute(0x0004, MANUFACTURER)
+        basic._update_attribute(0x0005, MODELS[kind])
+        basic.add_unsupported_attribute(0x4000)
+        for attr_id in range(ATTRIBUTES):
+            measured._update_attribute(attr_id, rng.randint(0, 1000))
+
+        dev.status = zigpy.device.Status.ENDPOINTS_INIT
+        app._dblistener.enqueue("_save_device", dev)
+        app.topology.neighbors[ieee] = [zdo_t.Neighbor(
+            extended_pan_id=t.ExtendedPanId.convert("aa:bb:cc:dd:ee:ff:00:11"),
+            ieee=t.EUI64((n + 1).to_bytes(8, "little")), nwk=0x1001 + n, device_type=1,
+            rx_on_when_idle=1, relationship=2, reserved1=0, permit_joining=0, reserved2=0,
+            depth=1, lqi=200,
+        )]
+        app._dblistener.enqueue("_neighbors_updated", ieee, app.topology.neighbors[ieee])
+        dev.relays = t.Relays([0x1234]) if n % 5 == 0 else None
+
+    group = app.groups.add_group(0x0010, "group")
+    for dev in list(app.devices.values())[1:GROUP_MEMBERS]:
+        group.add_member(dev.endpoints[1])
+
+    await app._dblistener._callback_handlers.join()
+    await app.shutdown()
+
+
+async def load(database, snapshot):
+    """Arranca una aplicación y devuelve `(app, segundos de _load_db)`."""
+    app = make_app(database, snapshot)
+    start = time.perf_counter()
+    await app._load_db()
+    return app, time.perf_counter() - start
+
+
+def state(app):
+    """Estado cargado, comparable entre la base de datos y la instantánea."""
+    devices = {}
+    for ieee, dev in sorted(app.devices.items()):
+        endpoints = {
+            ep_id: (
+                ep.profile_id, ep.device_type, ep.status,
+                {
+                    cluster_id: (
+                        type(cluster).__name__, dict(cluster._attr_cache),
+                        dict(cluster._attr_last_updated), set(cluster.unsupported_attributes),
+                    )
+                    for cluster_id, cluster in ep.in_clusters.items()
+                },
+                {cluster_id: type(cluster).__name__ for cluster_id, cluster in ep.out_clusters.items()},
+            )
+            for ep_id, ep in dev.endpoints.items()
+            if ep_id != 0
+        }
+        devices[ieee] = (
+            type(dev).__name__, dev.nwk, dev.status, dev.last_seen, dev.manufacturer,
+            dev.model, dev.node_desc, dev.relays, endpoints,
+        )
+
+    groups = {group_id: (group.name, sorted(group.members)) for group_id, group in app.groups.items()}
+    neighbors = {ieee: list(n) for ieee, n in app.topology.neighbors.items() if n}
+    return devices, groups, neighbors
+
+
+def drop_page_cache():
+    os.sync()
+    with open("/proc/sys/vm/drop_caches", "w") as f:
+        f.write("3")
+
+
+async def bench(devices, runs, cold):
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "zigbee.db")
+        snapshot = database + ".snapshot"
+        await populate(database, devices)
+        # El primer arranque con instantánea carga la base de datos y la escribe al cerrar
+        app, _ = await load(database, snapshot)
+        await app.shutdown()
+
+        timings = {None: [], snapshot: []}
+        for _ in range(runs):
+            for path in timings:
+                if cold:
+                    drop_page_cache()
+                app, seconds = await load(database, path)
+                timings[path].append(seconds)
+                await app.shutdown()  # Sin escrituras la instantánea sigue vigente
+
+        print(
+            f"{devices} dispositivos: base de datos {statistics.median(timings[None]) * 1000:.0f} ms, "
+            f"instantánea {statistics.median(timings[snapshot]) * 1000:.0f} ms, "
+            f"{os.path.getsize(snapshot) / 1024:.0f} KiB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("devices", type=int, nargs="?", default=1000)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--cold", action="store_true", help="vaciar la caché de páginas antes de cada arranque")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(bench(args.devices, args.runs, args.cold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Ingestión del gateway con distintos bucles de eventos sobre la misma captura.
+
+Es el banco de pruebas de EVENT_LOOP y EAGER_TASKS de sensor_gateway.py: reproduce una
+captura del puerto serie (ver bellows.capture) con `ReplayDriver` hasta la aplicación
+completa (ASH, EZSP y ControllerApplication) tan rápido como se pueda, una vez con cada
+bucle disponible, y mide:
+
+- tramas EZSP por segundo,
+- la latencia de cada paquete: desde que su último trozo entra en ASH hasta que llega a
+  `packet_received`, con sus percentiles 50 y 99 y el máximo.
+
+Sin captura usa una sintética de REPORTS informes de atributos, construida igual que
+tests/data/make_ncp_capture.py. Con la de un gateway real (SERIAL_CAPTURE_PATH):
+
+    python tests/bench_event_loops.py --capture serial.bcap --runs 5
+
+Los bucles que no se pueden crear aquí (uvloop sin instalar, tareas eager antes de
+Python 3.12) se indican y se saltan.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import statistics
+import tempfile
+import time
+
+from bellows.capture import SerialCapture
+from bellows.replay import STACK_APP, ReplayDriver
+from bellows.zigbee.application import ControllerApplication
+
+MAKE_CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "make_ncp_capture.py")
+
+
+def load_make_capture():
+    spec = importlib.util.spec_from_file_location("make_ncp_capture", MAKE_CAPTURE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_synthetic_capture(path, reports):
+    """Captura con `reports` informes, uno por lectura del puerto y con su ACK."""
+    make = load_make_capture()
+    capture = SerialCapture(path)
+    capture.write_meta(ezsp_version=make.EZSPv14.VERSION, device="/dev/ttyACM0")
+    frames = [make.ezsp_callback(0, "stackStatusHandler", status=make.t.sl_Status.NETWORK_UP)]
+    frames += [make.incoming_report((1 + n) % 256, n % 256) for n in range(reports)]
+    for n, frame in enumerate(frames):
+        capture.write_rx(make.ash_data(n, frame))
+        capture.write_tx(make.ash_ack(n + 1))
+    capture.close()
+
+
+def loop_factories():
+    """`{nombre: fábrica}` de los bucles disponibles y `{nombre: motivo}` de los que no."""
+    available, missing = {"asyncio": asyncio.new_event_loop}, {}
+
+    try:
+        import uvloop
+    except ImportError:
+        missing["uvloop"] = "uvloop no está instalado"
+    else:
+        available["uvloop"] = uvloop.new_event_loop
+
+    for name, factory in list(available.items()):
+        if not hasattr(asyncio, "eager_task_factory"):
+            missing[f"{name}+eager"] = "las tareas eager necesitan Python 3.12"
+            continue
+
+        def eager(factory=factory):
+            loop = factory()
+            loop.set_task_factory(asyncio.eager_task_factory)
+            return loop
+
+        available[f"{name}+eager"] = eager
+
+    return available, missing
+
+
+class TimedReplayDriver(ReplayDriver):
+    """ReplayDriver que anota cuándo entra en ASH cada trozo de la captura."""
+
+    async def _build_stack(self):
+        await super()._build_stack()
+        data_received = self.ash.data_received
+
+        def timed_data_received(data):
+            self.fed_at = time.perf_counter()
+            data_received(data)
+
+        self.ash.data_received = timed_data_received
+
+
+async def replay(capture):
+    """Devuelve `(tramas por segundo, latencias en segundos)` de una reproducción."""
+    driver = TimedReplayDriver(capture, stack=STACK_APP)
+    latencies = []
+    original = ControllerApplication.packet_received
+    ControllerApplication.packet_received = lambda app, packet: latencies.append(time.perf_counter() - driver.fed_at)
+    try:
+        stats = await driver.run()
+    finally:
+        ControllerApplication.packet_received = original
+    return stats.ezsp_frames / stats.elapsed, latencies
+
+
+def run_with(factory, capture):
+    with asyncio.Runner(loop_factory=factory) as runner:
+        return runner.run(replay(capture))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def bench(capture, runs):
+    available, missing = loop_factories()
+    for name, reason in missing.items():
+        print(f"{name:14} saltado: {reason}")
+
+    for name, factory in available.items():
+        rates, latencies = [], []
+        for _ in range(runs):
+            rate, run_latencies = run_with(factory, capture)
+            rates.append(rate)
+            latencies.extend(run_latencies)
+
+        print(
+            f"{name:14} {statistics.median(rates):8.0f} tramas/s, latencia"
+            f" p50 {percentile(latencies, 0.5) * 1e6:5.0f} us,"
+            f" p99 {percentile(latencies, 0.99) * 1e6:5.0f} us,"
+            f" máx {max(latencies) * 1e6:6.0f} us ({len(latencies)} paquetes)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--capture", help="captura del puerto serie (por defecto, una sintética)")
+    parser.add_argument("--reports", type=int, default=5000, help="informes de la captura sintética")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.capture:
+        bench(args.capture, args.runs)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        capture = os.path.join(directory, "synthetic.bcap")
+        write_synthetic_capture(capture, args.reports)
+        bench(capture, args.runs)
+
+
+if __name__ == "__main__":
+    main()
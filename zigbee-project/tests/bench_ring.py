@@ -0,0 +1,228 @@
+"""Retraso del bucle de la radio y rendimiento del anillo de lecturas (sensor_ring.py).
+
+Es el banco de pruebas de RADIO_PROCESS en sensor_gateway.py. Tiene dos partes:
+
+    jitter       Un bucle de "radio" despierta cada TICK y publica una lectura por tick
+                 durante DURATION segundos. Un consumidor lento (SINK_COST por lectura y
+                 una pausa de STALL cada STALL_EVERY lecturas, como una escritura a disco)
+                 las lee del anillo. Se mide cuánto llega tarde cada tick con el consumidor
+                 en el mismo bucle (un solo proceso) y en otro proceso (modo separado).
+    throughput   Coste por registro de `RingWriter.submit` y `RingReader.read` en un
+                 proceso, y RECORDS registros entre dos procesos a RATE por segundo,
+                 comprobando que llegan todos y en orden.
+
+Se ejecuta desde zigbee-project con los módulos del gateway en el path:
+
+    PYTHONPATH=Para_Raspberry python tests/bench_ring.py jitter --runs 2
+    PYTHONPATH=Para_Raspberry python tests/bench_ring.py throughput --records 1000000
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from sensor_pipeline import SensorReading
+from sensor_ring import RING_SLOTS, ReadingRing, RingReader, RingWriter
+
+SPAWN = multiprocessing.get_context("spawn")
+
+
+def reading(n):
+    return SensorReading("radio0", "00:11:22:33:44:55:66:77", 0x1234, 1, "corriente", float(n), time.time())
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class SlowSink:
+    """Consumidor que gasta CPU por lectura y se bloquea de vez en cuando."""
+
+    def __init__(self, cost, stall, stall_every):
+        self.cost, self.stall, self.stall_every = cost, stall, stall_every
+        self.received = 0
+        self.last = -1.0
+        self.in_order = True
+
+    def __call__(self, r):
+        self.in_order &= r.value > self.last  # Puede faltar alguna, pero nunca desordenadas
+        self.last = r.value
+        self.received += 1
+        busy_wait(self.cost)
+        if self.received % self.stall_every == 0:
+            busy_wait(self.stall)
+
+
+async def consume(ring, sink, stop):
+    reader = RingReader(ring, from_oldest=True)
+    task = asyncio.create_task(reader.run(sink))
+    await stop()
+    task.cancel()
+    while readings := reader.read():
+        for r in readings:
+            sink(r)
+    return reader.metrics.snapshot().get("ring.lost", 0)
+
+
+def consumer_process(ring_name, conn, cost, stall, stall_every):
+    """Consumidor del modo separado: lee hasta que el padre avisa y devuelve lo recibido."""
+    ring = ReadingRing.attach(ring_name)
+    sink = SlowSink(cost, stall, stall_every)
+    loop = asyncio.new_event_loop()
+
+    async def stop():
+        done = loop.create_future()
+        loop.add_reader(conn.fileno(), lambda: done.done() or done.set_result(conn.recv()))
+        await done
+
+    conn.send("listo")
+    lost = loop.run_until_complete(consume(ring, sink, stop))
+    conn.send((sink.received, sink.in_order, lost))
+    ring.close()
+
+
+async def radio_loop(writer, tick, duration):
+    """Publica una lectura por tick; devuelve cuánto llegó tarde cada tick, en segundos."""
+    lateness = []
+    loop = asyncio.get_running_loop()
+    start = deadline = loop.time()
+    n = 0
+    while deadline - start < duration:
+        deadline += tick
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+        lateness.append(max(0.0, loop.time() - deadline))
+        writer.submit(reading(n))
+        n += 1
+    return lateness, n
+
+
+def jitter_single(args):
+    ring = ReadingRing.create(RING_SLOTS)
+    sink = SlowSink(args.sink_cost, args.stall, args.stall_every)
+
+    async def main():
+        radio = asyncio.create_task(radio_loop(RingWriter(ring), args.tick, args.duration))
+        lost = await consume(ring, sink, lambda: asyncio.wait({radio}))
+        return *radio.result(), lost
+
+    try:
+        lateness, published, lost = asyncio.run(main())
+    finally:
+        ring.close()
+    return lateness, published, sink.received, sink.in_order, lost
+
+
+def jitter_split(args):
+    ring = ReadingRing.create(RING_SLOTS)
+    conn, child_conn = SPAWN.Pipe()
+    process = SPAWN.Process(target=consumer_process, args=(
+        ring.name, child_conn, args.sink_cost, args.stall, args.stall_every))
+    try:
+        process.start()
+        conn.recv()  # Espera a que el hijo esté leyendo
+        lateness, published = asyncio.run(radio_loop(RingWriter(ring), args.tick, args.duration))
+        conn.send("fin")
+        received, in_order, lost = conn.recv()
+        process.join()
+    finally:
+        ring.close()
+    return lateness, published, received, in_order, lost
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def jitter(args):
+    for name, run in (("un proceso", jitter_single), ("separado", jitter_split)):
+        for _ in range(args.runs):
+            lateness, published, received, in_order, lost = run(args)
+            late = sum(1 for value in lateness if value > 0.010)
+            print(
+                f"{name:10} retraso p99 {percentile(lateness, 0.99) * 1e3:5.1f} ms,"
+                f" máx {max(lateness) * 1e3:5.1f} ms, {late} ticks >10 ms de {len(lateness)};"
+                f" {received}/{published} lecturas{'' if in_order else ' DESORDENADAS'}, {lost} perdidas"
+            )
+
+
+def time_per_record(function, count):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) / count
+
+
+def reader_process(ring_name, conn, records):
+    ring = ReadingRing.attach(ring_name)
+    reader = RingReader(ring, from_oldest=True)
+    conn.send("listo")
+    received, last, in_order = 0, -1.0, True
+    while received < records and not conn.poll():
+        for r in reader.read():
+            in_order &= r.value > last
+            last = r.value
+            received += 1
+    conn.send((received, in_order, reader.metrics.snapshot().get("ring.lost", 0)))
+    ring.close()
+
+
+def throughput(args):
+    ring = ReadingRing.create(args.records + 1)
+    try:
+        writer, reader = RingWriter(ring), RingReader(ring)
+        readings = [reading(n) for n in range(args.records)]
+        write = time_per_record(lambda: [writer.submit(r) for r in readings], args.records)
+        read = time_per_record(lambda: reader.read(args.records), args.records)
+        print(f"un proceso: {write * 1e6:.2f} us por escritura, {read * 1e6:.2f} us por lectura")
+    finally:
+        ring.close()
+
+    ring = ReadingRing.create(RING_SLOTS)
+    conn, child_conn = SPAWN.Pipe()
+    process = SPAWN.Process(target=reader_process, args=(ring.name, child_conn, args.records))
+    try:
+        process.start()
+        conn.recv()
+        writer = RingWriter(ring)
+        start = time.perf_counter()
+        for n, r in enumerate(readings):
+            writer.submit(r)
+            if n % 1000 == 999:  # Ritmo RATE: sin él, el escritor daría la vuelta al lector
+                time.sleep(max(0.0, start + (n + 1) / args.rate - time.perf_counter()))
+        if not conn.poll(args.records / args.rate + 10):
+            conn.send("fin")
+        received, in_order, lost = conn.recv()
+        process.join()
+    finally:
+        ring.close()
+    print(
+        f"dos procesos: {received}/{args.records} registros a {args.rate:.0f}/s,"
+        f" {'en orden' if in_order else 'DESORDENADOS'}, {lost} perdidos"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    parser_jitter = commands.add_parser("jitter")
+    parser_jitter.add_argument("--duration", type=float, default=5.0)
+    parser_jitter.add_argument("--tick", type=float, default=0.001)
+    parser_jitter.add_argument("--sink-cost", type=float, default=0.0005)
+    parser_jitter.add_argument("--stall", type=float, default=0.050)
+    parser_jitter.add_argument("--stall-every", type=int, default=200)
+    parser_jitter.add_argument("--runs", type=int, default=2)
+    parser_throughput = commands.add_parser("throughput")
+    parser_throughput.add_argument("--records", type=int, default=1_000_000)
+    parser_throughput.add_argument("--rate", type=float, default=50_000)
+    args = parser.parse_args()
+
+    if args.command == "jitter":
+        jitter(args)
+    else:
+        throughput(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Coste de pasar tramas del hilo serie al bucle principal, con y sin lotes.
+
+Es el banco de pruebas de `bellows.thread.ThreadsafeProxy`: un productor entrega
+FRAMES tramas en ráfagas de BURST (como varias tramas EZSP en un mismo `data_received`)
+y se mide cuánto tardan en llegar todas al consumidor y el tiempo de CPU de los dos
+hilos, en tres modos:
+
+    sin hilo    productor y consumidor en el mismo bucle (use_thread=False)
+    por trama   un call_soon_threadsafe por trama, como hacía antes el proxy
+    por lotes   ThreadsafeProxy: una cola y un único despertar por ráfaga
+
+    python tests/bench_threadsafe_proxy.py 200000 --burst 8 --runs 5
+
+Muestra la mediana de RUNS ejecuciones de cada modo.
+"""
+import argparse
+import asyncio
+import functools
+import statistics
+import time
+
+from bellows.thread import EventLoopThread, ThreadsafeProxy
+
+FRAME = bytes(range(40))  # Tamaño típico de un informe de atributos con su cabecera EZSP
+
+
+class Consumer:
+    def __init__(self, frames, loop):
+        self.frames = frames
+        self.received = 0
+        self.done = loop.create_future()
+
+    def frame_received(self, data):
+        self.received += 1
+        if self.received == self.frames:
+            self.done.set_result(None)
+
+
+class PerFrameProxy:
+    """El proxy anterior: un envoltorio nuevo y un despertar del bucle por llamada."""
+
+    def __init__(self, obj, obj_loop):
+        self._obj = obj
+        self._obj_loop = obj_loop
+
+    def __getattr__(self, name):
+        func = getattr(self._obj, name)
+
+        def func_wrapper(*args, **kwargs):
+            loop = self._obj_loop
+            call = functools.partial(func, *args, **kwargs)
+            if loop == asyncio.get_running_loop():
+                return call()
+            if loop.is_closed():
+                return
+
+            def check_result_wrapper():
+                if call() is not None:
+                    raise TypeError(name)
+
+            loop.call_soon_threadsafe(check_result_wrapper)
+
+        return func_wrapper
+
+
+async def produce(target, frames, burst):
+    for start in range(0, frames, burst):
+        for _ in range(min(burst, frames - start)):
+            target.frame_received(FRAME)
+        await asyncio.sleep(0)  # El transporte vuelve al bucle entre lecturas del puerto
+
+
+async def run_mode(mode, frames, burst):
+    """Devuelve `(segundos, segundos de CPU)` hasta que el consumidor recibe todo."""
+    loop = asyncio.get_running_loop()
+    consumer = Consumer(frames, loop)
+
+    if mode == "sin hilo":
+        start, cpu = time.perf_counter(), time.process_time()
+        await produce(ThreadsafeProxy(consumer, loop), frames, burst)
+        await consumer.done
+        return time.perf_counter() - start, time.process_time() - cpu
+
+    proxy = (PerFrameProxy if mode == "por trama" else ThreadsafeProxy)(consumer, loop)
+    thread = EventLoopThread()
+    await thread.start()
+    try:
+        start, cpu = time.perf_counter(), time.process_time()
+        await thread.run_coroutine_threadsafe(produce(proxy, frames, burst))
+        await consumer.done
+        return time.perf_counter() - start, time.process_time() - cpu
+    finally:
+        thread.force_stop()
+        await thread.thread_complete
+
+
+async def bench(frames, burst, runs):
+    modes = ("sin hilo", "por trama", "por lotes")
+    timings = {mode: [] for mode in modes}
+    for _ in range(runs):
+        for mode in modes:
+            timings[mode].append(await run_mode(mode, frames, burst))
+
+    for mode in modes:
+        wall = statistics.median(t[0] for t in timings[mode])
+        cpu = statistics.median(t[1] for t in timings[mode])
+        print(f"{mode:10} {wall / frames * 1e6:6.2f} us/trama, CPU {cpu / frames * 1e6:6.2f} us/trama")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("frames", type=int, nargs="?", default=200000)
+    parser.add_argument("--burst", type=int, default=8, help="tramas por lectura del puerto")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(bench(args.frames, args.burst, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import pytest
+import zigpy.application
+import zigpy.state as app_state
+import zigpy.types as t
+
+
+class FakeApp(zigpy.application.ControllerApplication):
+    """ControllerApplication sin radio: guarda los paquetes enviados en `sent`."""
+
+    def __init__(self, config=None):
+        super().__init__({"device": {"path": "/dev/null"}, **(config or {})})
+        self.sent = []
+        self.state.node_info = app_state.NodeInfo(nwk=0x0000, ieee=t.EUI64(b"\xAA" * 8))
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    async def start_network(self):
+        pass
+
+    async def force_remove(self, dev):
+        pass
+
+    async def add_endpoint(self, descriptor):
+        pass
+
+    async def send_packet(self, packet):
+        self.sent.append(packet)
+
+    async def permit_ncp(self, time_s=60):
+        pass
+
+    async def permit_with_link_key(self, node, link_key, time_s=60):
+        pass
+
+    async def write_network_info(self, *, network_info, node_info):
+        pass
+
+    async def load_network_info(self, *, load_devices=False):
+        pass
+
+    async def reset_network_info(self):
+        pass
+
+
+@pytest.fixture
+def make_app():
+    return FakeApp
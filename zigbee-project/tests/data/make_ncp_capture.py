@@ -0,0 +1,95 @@
+"""Genera ncp_v14_reports.bcap, la captura de puerto serie que usa test_replay.py.
+
+No hay un NCP conectado en la integración continua, así que la captura se construye con
+los mismos codificadores de bellows (tramas EZSP v14 dentro de tramas DATA de ASH) y se
+escribe con `SerialCapture`, igual que la escribiría el gateway. Contiene:
+
+- el registro META con la versión EZSP,
+- un stackStatusHandler(NETWORK_UP),
+- REPORTS informes de atributos del cluster 0xFC01 (3 corrientes en coma flotante) de un
+  ESP32-H2, con una trama partida entre dos lecturas del puerto y dos tramas en una,
+- los ACK que el host envió en la sesión original (registros TX).
+
+    python tests/data/make_ncp_capture.py
+"""
+import os
+import struct
+
+from bellows.ash import AckFrame, AshProtocol, DataFrame, Reserved
+from bellows.capture import SerialCapture
+from bellows.ezsp.v14 import EZSPv14
+import bellows.types as t
+
+CAPTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ncp_v14_reports.bcap")
+REPORTS = 12
+SENSOR_NWK = 0x1234
+SENSOR_IEEE = "00:11:22:33:44:55:66:77"
+SENSOR_CLUSTER = 0xFC01
+
+
+def ezsp_callback(seq: int, name: str, **values) -> bytes:
+    cmd_id, _, rx_schema = EZSPv14.COMMANDS[name]
+    return bytes([seq, 0x90, 0x01]) + t.uint16_t(cmd_id).serialize() + t.serialize_dict([], values, rx_schema)
+
+
+def ash_data(frm_num: int, ezsp_frame: bytes) -> bytes:
+    frame = DataFrame(frm_num=frm_num % 8, re_tx=False, ack_num=0, ezsp_frame=ezsp_frame)
+    return AshProtocol._stuff_bytes(frame.to_bytes()) + bytes([Reserved.FLAG])
+
+
+def ash_ack(ack_num: int) -> bytes:
+    frame = AckFrame(res=0, ncp_ready=0, ack_num=ack_num % 8)
+    return AshProtocol._stuff_bytes(frame.to_bytes()) + bytes([Reserved.FLAG])
+
+
+def attribute_report(tsn: int) -> bytes:
+    """Report Attributes (0x0A) con los 3 canales de corriente como float32."""
+    records = b"".join(
+        struct.pack("<HB", attr_id, 0x39) + struct.pack("<f", 1.5 * attr_id + tsn / 10)
+        for attr_id in (1, 2, 3)
+    )
+    return bytes([0x18, tsn, 0x0A]) + records
+
+
+def incoming_report(seq: int, tsn: int) -> bytes:
+    aps_frame = t.EmberApsFrame(
+        profileId=0x0104, clusterId=SENSOR_CLUSTER, sourceEndpoint=1, destinationEndpoint=1,
+        options=t.EmberApsOption.APS_OPTION_NONE, groupId=0, sequence=tsn,
+    )
+    return ezsp_callback(
+        seq, "incomingMessageHandler",
+        message_type=t.EmberIncomingMessageType.INCOMING_UNICAST, aps_frame=aps_frame,
+        nwk=SENSOR_NWK, eui64=t.EUI64.convert(SENSOR_IEEE), binding_index=0xFF,
+        address_index=0xFF, lqi=200, rssi=-60, timestamp=0, message=attribute_report(tsn),
+    )
+
+
+def main() -> None:
+    for path in (CAPTURE_PATH, CAPTURE_PATH + ".idx"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    capture = SerialCapture(CAPTURE_PATH)
+    capture.write_meta(ezsp_version=EZSPv14.VERSION, device="/dev/ttyACM0")
+
+    frames = [ezsp_callback(0, "stackStatusHandler", status=t.sl_Status.NETWORK_UP)]
+    frames += [incoming_report(1 + n, n) for n in range(REPORTS)]
+    chunks = [ash_data(n, frame) for n, frame in enumerate(frames)]
+
+    capture.write_rx(chunks[0])
+    capture.write_tx(ash_ack(1))
+    split = len(chunks[1]) // 2
+    capture.write_rx(chunks[1][:split])  # Una trama repartida entre dos lecturas
+    capture.write_rx(chunks[1][split:])
+    capture.write_tx(ash_ack(2))
+    capture.write_rx(chunks[2] + chunks[3])  # Dos tramas en la misma lectura
+    capture.write_tx(ash_ack(4))
+    for n, chunk in enumerate(chunks[4:], start=4):
+        capture.write_rx(chunk)
+        capture.write_tx(ash_ack(n + 1))
+    capture.close()
+    os.remove(CAPTURE_PATH + ".idx")  # El lector lo reconstruye; no hace falta versionarlo
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import struct
+
+import pytest
+
+from sensor_anomaly import FLATLINE_SAMPLES, AnomalyDetector
+from sensor_pipeline import SensorReading
+from sensor_schema import SensorSchema
+from sensor_wal import decode_reading, encode_reading
+
+IEEE = "00:11:22:33:44:55:66:77"
+
+
+def reading(attribute_id, value, ts, valid=True, ieee=IEEE):
+    return SensorReading("radio0", ieee, 0x1234, attribute_id, "test", value, ts, valid)
+
+
+def run(detector, samples):
+    events = []
+    detector.add_alert_handler(events.append)
+    for ts, values in enumerate(samples):
+        for attribute_id, value in values.items():
+            detector.process(reading(attribute_id, value, float(ts)))
+    return [(e.kind, e.active, e.reading.attribute_id) for e in events]
+
+
+def test_flat_zero_at_night_is_not_disconnected():
+    events = run(AnomalyDetector(), [{1: 0.0, 2: 0.0, 3: 0.0}] * (FLATLINE_SAMPLES * 3))
+    assert events == []
+
+
+def test_flat_zero_while_sibling_produces_is_disconnected():
+    samples = [{1: 0.0, 2: 5.0 + (ts % 2) * 0.1} for ts in range(FLATLINE_SAMPLES * 2)]
+    events = run(AnomalyDetector(), samples)
+    assert events == [("disconnected", True, 1)]
+
+
+def test_disconnected_clears_when_siblings_stop_producing():
+    samples = [{1: 0.0, 2: 5.0 + (ts % 2) * 0.1} for ts in range(FLATLINE_SAMPLES + 1)]
+    samples += [{1: 0.0, 2: 0.0}] * 2
+    events = run(AnomalyDetector(), samples)
+    assert events == [("disconnected", True, 1), ("disconnected", False, 1)]
+
+
+def test_flat_nonzero_is_stuck():
+    events = run(AnomalyDetector(), [{1: 3.0}] * (FLATLINE_SAMPLES + 1))
+    assert events == [("stuck", True, 1)]
+
+
+def test_invalid_reading_raises_sentinel_whatever_the_value():
+    detector = AnomalyDetector()
+    events = []
+    detector.add_alert_handler(events.append)
+    detector.process(reading(1, 0xFFFF * 0.001, 0.0, valid=False))
+    detector.process(reading(1, 2.0, 1.0))
+    assert [(e.kind, e.active) for e in events] == [("sentinel", True), ("sentinel", False)]
+
+
+def make_schema(attr_type, **extra):
+    return SensorSchema.from_dict({
+        "name": "test", "cluster_id": "0xFC7F", "sentinels": [-999.9],
+        "attributes": [{"id": "0x0001", "name": "a", "type": attr_type, "scale": 0.001, **extra}],
+    })
+
+
+@pytest.mark.parametrize("attr_type, raw", [
+    ("uint16", 0xFFFF), ("int16", -0x8000), ("uint8", 0xFF), ("int32", -0x80000000),
+])
+def test_zcl_non_value_is_sentinel_before_scaling(attr_type, raw):
+    schema = make_schema(attr_type)
+    channel = schema.channels()[1]
+    assert channel.is_sentinel(raw)
+    assert not channel.is_sentinel(raw - 1 if raw > 0 else raw + 1)
+
+
+def test_configured_sentinel_matches_float32_value():
+    channel = make_schema("single", sentinels=["0x7FFF"]).channels()[1]
+    float32 = struct.unpack("<f", struct.pack("<f", -999.9))[0]
+    assert channel.is_sentinel(float32)
+    assert channel.is_sentinel(0x7FFF)
+    assert not channel.is_sentinel(-999.0)
+    assert not channel.is_sentinel(0.0)
+
+
+@pytest.mark.parametrize("valid", [True, False])
+def test_wal_keeps_valid_flag(valid):
+    original = reading(1, -999.9, 1.5, valid=valid)
+    assert decode_reading(encode_reading(original)[8:]) == original
+
+
+def test_ring_keeps_valid_flag():
+    from sensor_ring import ReadingRing, RingReader, RingWriter
+
+    ring = ReadingRing.create(capacity=8)
+    try:
+        writer = RingWriter(ring)
+        reader = RingReader(ring)
+        writer.submit(reading(1, 1.0, 1.0))
+        writer.submit(reading(2, -999.9, 2.0, valid=False))
+        assert [r.valid for r in reader.read()] == [True, False]
+    finally:
+        ring.close()
@@ -0,0 +1,188 @@
+import asyncio
+import sqlite3
+import time
+import types
+
+import aiohttp
+import pytest
+
+import sensor_api
+from sensor_api import API_DEFAULT_END_STEP, LatestValues, QueryService
+from sensor_pipeline import SensorReading
+from sensor_store import ReadingsStore
+
+IEEE = "00:11:22:33:44:55:66:77"
+DAY = 86400.0
+BASE = 1_700_000_000.0  # Las lecturas cruzan la medianoche UTC: dos particiones
+
+
+def readings(count, step=60.0):
+    start = (BASE // DAY + 1) * DAY - count * step / 2
+    return [SensorReading("radio0", IEEE, 1, 1, "test", n * 0.5, start + n * step) for n in range(count)]
+
+
+async def make_store(path, count):
+    store = ReadingsStore(str(path), retention_days=0)
+    await store.open()
+    await store.insert(readings(count))
+    return store
+
+
+def test_coalesce_followers_survive_leader_cancellation():
+    async def main():
+        service = QueryService(LatestValues())
+        calls = []
+
+        async def producer():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return "ok"
+
+        leader = asyncio.create_task(service._coalesce("k", producer))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(service._coalesce("k", producer))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await asyncio.wait_for(follower, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return result, len(calls), service._in_flight
+
+    assert asyncio.run(main()) == ("ok", 2, {})
+
+
+def test_read_only_store_cannot_write(tmp_path):
+    async def main():
+        writer = await make_store(tmp_path / "readings.db", 10)
+        reader = ReadingsStore(str(tmp_path / "readings.db"))
+        await reader.open(read_only=True)
+        try:
+            assert len(await reader.range(IEEE, 1, 0, BASE + 2 * DAY)) == 10
+            with pytest.raises(sqlite3.OperationalError, match="readonly"):
+                await reader._db.execute("CREATE TABLE x (y)")
+        finally:
+            await reader.close()
+            await writer.close()
+
+    asyncio.run(main())
+
+
+def test_range_pages_convert_in_sql_and_respect_limit(tmp_path):
+    async def main():
+        store = await make_store(tmp_path / "readings.db", 50)
+        try:
+            pages = [page async for page in store.range_pages(IEEE, 1, 0, BASE + 2 * DAY, limit=30, page_rows=8)]
+            summary = await store.range_summary(IEEE, 1, 0, BASE + 2 * DAY, limit=30)
+        finally:
+            await store.close()
+        return pages, summary
+
+    pages, (total, last, next_start) = asyncio.run(main())
+    expected = [(r.timestamp, r.value) for r in readings(50)]
+    assert max(len(page) for page in pages) == 8
+    assert [row for page in pages for row in page] == expected[:30]
+    assert (total, last, next_start) == (50, expected[-1][0], expected[30][0])
+
+
+def test_range_endpoint_pages_with_next_start(tmp_path):
+    async def main():
+        store = await make_store(tmp_path / "readings.db", 50)
+        service = QueryService(LatestValues(), str(tmp_path / "readings.db"), port=0)
+        await service.start()
+        url = f"http://127.0.0.1:{service._runner.addresses[0][1]}/range"
+        params = {"ieee": IEEE, "attribute": "1", "start": "0", "end": str(BASE + 2 * DAY), "limit": "20"}
+        received = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                while True:
+                    async with session.get(url, params=params) as response:
+                        assert response.status == 200
+                        lines = (await response.text()).splitlines()
+                        assert response.headers["X-Range-Rows"] == str(len(lines))
+                        received.extend(lines)
+                        etag = response.headers["ETag"]
+                        next_start = response.headers.get("X-Range-Next-Start")
+                    async with session.get(url, params=params, headers={"If-None-Match": etag}) as response:
+                        assert response.status == 304
+                    if next_start is None:
+                        break
+                    params["start"] = next_start
+                async with session.get(url, params={**params, "limit": "0"}) as response:
+                    assert response.status == 400
+        finally:
+            await service.stop()
+            await store.close()
+        return received
+
+    assert len(asyncio.run(main())) == 50
+
+
+def test_permit_requires_a_token():
+    calls = []
+
+    async def permit(duration, shard, node):
+        calls.append((duration, shard, node))
+        return ["radio0"]
+
+    async def status(service, headers=None):
+        url = f"http://127.0.0.1:{service._runner.addresses[0][1]}/permit"
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, params={"duration": "60"}, headers=headers) as response:
+                return response.status, await response.text()
+
+    async def main():
+        # Sin token la ruta no existe aunque haya `permit`
+        service = QueryService(LatestValues(), port=0, permit=permit)
+        await service.start()
+        try:
+            assert (await status(service))[0] in (404, 405)
+        finally:
+            await service.stop()
+
+        service = QueryService(LatestValues(), port=0, permit=permit, permit_token="secreto")
+        await service.start()
+        try:
+            assert (await status(service))[0] == 401
+            assert (await status(service, {"Authorization": "Bearer otro"}))[0] == 401
+            assert (await status(service, {"Authorization": "Basic secreto"}))[0] == 401
+            assert calls == []
+
+            code, body = await status(service, {"Authorization": "Bearer secreto"})
+            assert code == 200
+            assert calls == [(60, None, None)]
+            assert '"radios": ["radio0"]' in body
+        finally:
+            await service.stop()
+
+    asyncio.run(main())
+
+
+def test_queries_without_end_share_the_cache_within_a_step(tmp_path, monkeypatch):
+    now = types.SimpleNamespace(value=API_DEFAULT_END_STEP * 56666667 + 1)
+    monkeypatch.setattr(sensor_api, "time", types.SimpleNamespace(time=lambda: now.value, monotonic=time.monotonic))
+
+    async def main():
+        store = await make_store(tmp_path / "readings.db", 10)
+        service = QueryService(LatestValues(), str(tmp_path / "readings.db"), port=0)
+        await service.start()
+        base = f"http://127.0.0.1:{service._runner.addresses[0][1]}"
+        params = {"ieee": IEEE, "attribute": "1"}
+        misses, etags = [], []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for advance in (0, 15, 25):  # Los dos primeros dentro del mismo paso
+                    now.value += advance
+                    async with session.get(f"{base}/rollup", params=params) as response:
+                        assert response.status == 200
+                    async with session.get(f"{base}/range", params=params) as response:
+                        etags.append(response.headers["ETag"])
+                    misses.append(service.metrics.snapshot()["api.cache_misses"])
+        finally:
+            await service.stop()
+            await store.close()
+        return misses, etags
+
+    misses, etags = asyncio.run(main())
+    assert misses == [1, 1, 2]
+    assert etags[0] == etags[1] != etags[2]
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import sqlite3
+
+import aiosqlite
+import pytest
+import zigpy.appdb
+from zigpy.appdb_snapshot import SNAPSHOT_STATE_TABLE
+import zigpy.group
+
+
+def groups_and_generation(path):
+    conn = sqlite3.connect(path)
+    try:
+        groups = conn.execute(f"SELECT group_id, name FROM groups{zigpy.appdb.DB_V}").fetchall()
+        (generation,) = conn.execute(f"SELECT generation FROM {SNAPSHOT_STATE_TABLE}").fetchone()
+        return groups, generation
+    finally:
+        conn.close()
+
+
+async def add_group(listener, app, group_id):
+    listener.enqueue("_group_added", zigpy.group.Group(group_id, f"group{group_id}", app.groups))
+    await listener._callback_handlers.join()
+
+
+def fail_on(path, table, operation):
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TRIGGER fail AFTER {operation} ON {table} BEGIN SELECT RAISE(ABORT, 'fallo'); END")
+    conn.commit()
+    conn.close()
+
+
+def stop_failing(path):
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TRIGGER fail")
+    conn.commit()
+    conn.close()
+
+
+def test_generation_bump_and_write_are_one_unit(tmp_path, make_app, caplog):
+    path = str(tmp_path / "zigbee.db")
+
+    async def run():
+        app = make_app()
+        listener = await zigpy.appdb.PersistingListener.new(path, app)
+        listener.running = True
+        generation = listener._generation
+        steps = []
+        try:
+            # No se puede subir la generación: la escritura no se hace y se registra
+            fail_on(path, SNAPSHOT_STATE_TABLE, "UPDATE")
+            with caplog.at_level(logging.ERROR, logger="zigpy.appdb"):
+                await add_group(listener, app, 1)
+            steps.append((groups_and_generation(path), listener._generation, listener._generation_pinned))
+            stop_failing(path)
+
+            # Falla la escritura: tampoco queda la subida de generación
+            fail_on(path, f"groups{zigpy.appdb.DB_V}", "INSERT")
+            await add_group(listener, app, 2)
+            steps.append((groups_and_generation(path), listener._generation, listener._generation_pinned))
+            stop_failing(path)
+
+            # Las dos se hacen juntas, y solo la primera escritura sube la generación
+            await add_group(listener, app, 3)
+            await add_group(listener, app, 4)
+            steps.append((groups_and_generation(path), listener._generation, listener._generation_pinned))
+        finally:
+            await listener.shutdown()
+        return generation, steps
+
+    generation, steps = asyncio.run(run())
+    assert steps == [
+        (([], generation), generation, True),
+        (([], generation), generation, True),
+        (([(3, "group3"), (4, "group4")], generation + 1), generation + 1, False),
+    ]
+    assert any("Failed to bump the database generation" in r.getMessage() for r in caplog.records)
+
+
+def test_aiosqlite_private_api_is_checked(tmp_path, make_app, monkeypatch, caplog):
+    async def connect():
+        listener = await zigpy.appdb.PersistingListener.new(str(tmp_path / "zigbee.db"), make_app())
+        await listener.shutdown()
+
+    monkeypatch.setattr(aiosqlite, "__version__", "0.99.0")
+    with caplog.at_level(logging.WARNING, logger="zigpy.appdb"):
+        asyncio.run(connect())
+    assert "aiosqlite 0.99.0 has not been tested" in caplog.text
+
+    monkeypatch.delattr(aiosqlite.Connection, "_execute")
+    with pytest.raises(RuntimeError, match="aiosqlite 0.99.0 is not supported"):
+        asyncio.run(connect())
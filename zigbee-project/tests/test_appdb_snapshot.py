@@ -0,0 +1,49 @@
+import asyncio
+
+import zigpy.quirks
+import zigpy.types as t
+
+import bench_appdb_startup as bench
+
+DEVICES = 30
+
+
+def test_snapshot_restores_the_database_state(tmp_path, monkeypatch):
+    database = str(tmp_path / "zigbee.db")
+    snapshot = database + ".snapshot"
+
+    async def run():
+        await bench.populate(database, DEVICES)
+        # Sin instantánea todavía: carga la base de datos y la escribe al cerrar
+        app, _ = await bench.load(database, snapshot)
+        from_database = bench.state(app)
+        await app.shutdown()
+
+        matched = []
+        get_device = zigpy.quirks.get_device
+        monkeypatch.setattr(zigpy.quirks, "get_device", lambda dev, *args: matched.append(dev) or get_device(dev, *args))
+        app, _ = await bench.load(database, snapshot)
+        from_snapshot = bench.state(app)
+        restored_matches = len(matched)
+
+        # Una escritura posterior invalida la instantánea que hay en disco. Al cerrar se
+        # escribiría otra, así que se vuelve a poner la anterior
+        dev = app.get_device(t.EUI64((1).to_bytes(8, "little")))
+        app._dblistener.enqueue("_update_device_nwk", dev.ieee, t.NWK(0x4444))
+        await app._dblistener._callback_handlers.join()
+        stale = (tmp_path / "zigbee.db.snapshot").read_bytes()
+        await app.shutdown()
+        (tmp_path / "zigbee.db.snapshot").write_bytes(stale)
+
+        app, _ = await bench.load(database, snapshot)
+        nwk = app.get_device(dev.ieee).nwk
+        await app.shutdown()
+        return from_database, from_snapshot, restored_matches, len(matched), nwk
+
+    from_database, from_snapshot, restored_matches, matches, nwk = asyncio.run(run())
+    assert from_snapshot == from_database
+    assert len(from_database[0]) == DEVICES
+    assert {kind for kind, *_ in from_database[0].values()} == {"Device", "V1Quirk", "CustomDeviceV2"}
+    assert restored_matches == 0  # Los quirks se aplican sin volver a buscarlos
+    # La instantánea desfasada se descarta: se carga la base de datos y se buscan los quirks
+    assert (matches, nwk) == (DEVICES, 0x4444)
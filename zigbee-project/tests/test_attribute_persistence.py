@@ -0,0 +1,137 @@
+import asyncio
+import types
+from datetime import datetime, timezone
+
+import pytest
+import voluptuous as vol
+import zigpy.appdb
+import zigpy.config as conf
+import zigpy.types as t
+
+from sensor_gateway import ATTRIBUTE_PERSISTENCE
+
+IEEE = t.EUI64.convert("00:11:22:33:44:55:66:77")
+OTHER_IEEE = t.EUI64.convert("00:11:22:33:44:55:66:88")
+NOW = datetime(2024, 3, 1, tzinfo=timezone.utc)
+SENSOR_CLUSTER = ATTRIBUTE_PERSISTENCE[0]["cluster_id"]  # Muestreado cada 300 s en el gateway
+
+
+def cluster(cluster_id, ieee=IEEE):
+    device = types.SimpleNamespace(ieee=ieee)
+    return types.SimpleNamespace(
+        cluster_id=cluster_id, cluster_type=0, endpoint=types.SimpleNamespace(device=device, endpoint_id=1))
+
+
+def run_listener(tmp_path, make_app, monkeypatch, policies, updates):
+    """Aplica `updates(listener, clock)` y devuelve los valores que se habrían escrito, en orden.
+
+    `clock` es el `time.monotonic` que ve la política `sampled`; las escrituras se anotan
+    en lugar de ejecutarse.
+    """
+    clock = types.SimpleNamespace(now=0.0)
+    monkeypatch.setattr(zigpy.appdb, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+
+    async def run():
+        app = make_app({conf.CONF_ATTRIBUTE_PERSISTENCE: policies})
+        listener = await zigpy.appdb.PersistingListener.new(str(tmp_path / "zigbee.db"), app)
+        written = []
+        listener.enqueue = lambda name, *args: written.append((args[3], args[4], args[5])) if name == "_save_attribute" else None
+        try:
+            updates(listener, clock)
+            flushed_from = len(written)
+            listener.flush_deferred_attributes()  # Lo que hace `shutdown`
+        finally:
+            await listener.shutdown()
+        return written[:flushed_from], written[flushed_from:]
+
+    return asyncio.run(run())
+
+
+def report(listener, cluster_id, attrid, *values, ieee=IEEE):
+    for value in values:
+        listener.attribute_updated(cluster(cluster_id, ieee), attrid, value, NOW)
+
+
+def test_attributes_without_a_policy_and_always_are_written_every_time(tmp_path, make_app, monkeypatch):
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, [
+        {"cluster_id": 0x0006, "policy": "always"},
+    ], lambda listener, clock: (report(listener, 0x0006, 0, True, True), report(listener, 0x0402, 0, 2100, 2100)))
+
+    assert written == [(0x0006, 0, True), (0x0006, 0, True), (0x0402, 0, 2100), (0x0402, 0, 2100)]
+    assert flushed == []
+
+
+def test_never_skips_the_write_and_keeps_nothing_to_flush(tmp_path, make_app, monkeypatch):
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, [
+        {"cluster_id": 0x0402, "policy": "never"},
+    ], lambda listener, clock: report(listener, 0x0402, 0, 2100, 2200))
+
+    assert written == [] and flushed == []
+
+
+def test_sampled_writes_at_most_once_per_interval_and_flushes_the_latest(tmp_path, make_app, monkeypatch):
+    def updates(listener, clock):
+        report(listener, SENSOR_CLUSTER, 1, 1.0)  # El primero se escribe siempre
+        clock.now = 100
+        report(listener, SENSOR_CLUSTER, 1, 2.0, 3.0)  # Dentro del intervalo: se aplazan
+        clock.now = 300
+        report(listener, SENSOR_CLUSTER, 1, 4.0)  # Cumplido el intervalo desde la última escritura
+        clock.now = 400
+        report(listener, SENSOR_CLUSTER, 1, 5.0)
+
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, ATTRIBUTE_PERSISTENCE, updates)
+    assert written == [(SENSOR_CLUSTER, 1, 1.0), (SENSOR_CLUSTER, 1, 4.0)]
+    assert flushed == [(SENSOR_CLUSTER, 1, 5.0)]  # Al cerrar, el último valor aplazado
+
+
+def test_on_change_compares_with_the_last_written_value(tmp_path, make_app, monkeypatch):
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, [
+        {"cluster_id": 0x0402, "policy": "on_change", "threshold": 50},
+    ], lambda listener, clock: report(listener, 0x0402, 0, 2000, 2030, 2050, 2060, 2120, 2100))
+
+    # 2030 y 2050 no superan el umbral; 2060 sí, aunque cada paso sea pequeño
+    assert written == [(0x0402, 0, 2000), (0x0402, 0, 2060), (0x0402, 0, 2120)]
+    assert flushed == [(0x0402, 0, 2100)]
+
+
+def test_on_change_writes_non_numeric_values_when_they_change(tmp_path, make_app, monkeypatch):
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, [
+        {"cluster_id": 0x0000, "policy": "on_change"},
+    ], lambda listener, clock: report(listener, 0x0000, 5, "sensor", "sensor", "sensor-2"))
+
+    assert written == [(0x0000, 5, "sensor"), (0x0000, 5, "sensor-2")]
+    assert flushed == []  # El repetido se aplaza, pero el cambio posterior ya lo sustituye
+
+
+def test_an_attribute_policy_overrides_the_cluster_policy(tmp_path, make_app, monkeypatch):
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, [
+        {"cluster_id": SENSOR_CLUSTER, "policy": "never"},
+        {"cluster_id": SENSOR_CLUSTER, "attribute_id": 2, "policy": "always"},
+    ], lambda listener, clock: (report(listener, SENSOR_CLUSTER, 1, 1.0), report(listener, SENSOR_CLUSTER, 2, 7)))
+
+    assert written == [(SENSOR_CLUSTER, 2, 7)]
+
+
+def test_cleared_attributes_and_removed_devices_drop_their_state(tmp_path, make_app, monkeypatch):
+    def updates(listener, clock):
+        for ieee in (IEEE, OTHER_IEEE):
+            report(listener, SENSOR_CLUSTER, 1, 1.0, 2.0, ieee=ieee)
+            report(listener, SENSOR_CLUSTER, 2, 1.0, 2.0, ieee=ieee)
+        listener.attribute_cleared(cluster(SENSOR_CLUSTER), 1)
+        listener.device_removed(types.SimpleNamespace(ieee=OTHER_IEEE))
+        # Sin estado, el siguiente valor del atributo borrado se escribe como el primero
+        report(listener, SENSOR_CLUSTER, 1, 3.0)
+
+    written, flushed = run_listener(tmp_path, make_app, monkeypatch, ATTRIBUTE_PERSISTENCE, updates)
+    assert written[-1] == (SENSOR_CLUSTER, 1, 3.0)
+    assert flushed == [(SENSOR_CLUSTER, 2, 2.0)]  # Nada del dispositivo eliminado
+
+
+def test_policy_config_defaults_and_validation():
+    (policy,) = conf.ZIGPY_SCHEMA({conf.CONF_ATTRIBUTE_PERSISTENCE: [{"cluster_id": "0xFC01", "policy": "sampled"}]})[
+        conf.CONF_ATTRIBUTE_PERSISTENCE]
+    assert policy == {"cluster_id": 0xFC01, "attribute_id": None, "policy": "sampled", "interval": 60, "threshold": 0}
+
+    for invalid in ({"cluster_id": 1, "policy": "sometimes"}, {"cluster_id": 1, "policy": "sampled", "interval": -1}):
+        with pytest.raises(vol.Invalid):
+            conf.ZIGPY_SCHEMA({conf.CONF_ATTRIBUTE_PERSISTENCE: [invalid]})
@@ -0,0 +1,206 @@
+import asyncio
+import random
+import types
+
+import pytest
+import zigpy.state
+from zigpy.datastructures import PriorityDynamicBoundedSemaphore
+
+import bellows.zigbee.concurrency as concurrency
+from bellows.zigbee.concurrency import AdaptiveConcurrency
+
+
+class SimulatedNCP:
+    """Modelo de la cola del NCP: envía RATE mensajes por segundo de uno en uno.
+
+    Cada mensaje en cola ocupa BUFFERS_PER_MESSAGE búferes hasta que llega su
+    `messageSentHandler`; sin búferes libres el envío falla como ALLOCATION_FAILED.
+    """
+
+    BUFFERS = 255
+    BUFFERS_PER_MESSAGE = 10
+
+    def __init__(self, rate=2000, confirm_delay=(0.005, 0.02), failure_rate=0.02, seed=0):
+        self.free = self.BUFFERS
+        self.min_free = self.BUFFERS
+        self.allocation_failures = 0
+        self.rate = rate
+        self.confirm_delay = confirm_delay
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._queue = asyncio.Queue()
+        self._tasks = set()
+
+    def start(self):
+        self._spawn(self._radio())
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _radio(self):
+        while True:
+            confirmation = await self._queue.get()
+            await asyncio.sleep(1 / self.rate)
+            self._spawn(self._confirm(confirmation))
+
+    async def _confirm(self, confirmation):
+        await asyncio.sleep(self._random.uniform(*self.confirm_delay))
+        self.free += self.BUFFERS_PER_MESSAGE
+        confirmation.set_result(self._random.random() > self.failure_rate)
+
+    def send(self):
+        """Encola un mensaje; devuelve el futuro de su confirmación o None sin búferes."""
+        if self.free < self.BUFFERS_PER_MESSAGE:
+            self.allocation_failures += 1
+            return None
+        self.free -= self.BUFFERS_PER_MESSAGE
+        self.min_free = min(self.min_free, self.free)
+        confirmation = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(confirmation)
+        return confirmation
+
+    async def free_buffers(self):
+        return self.free
+
+
+@pytest.fixture
+def simulated_ncp():
+    return SimulatedNCP()
+
+
+def controller(limit=8, floor=2, ceiling=16, min_free_buffers=40, waiting=0):
+    """Controlador sobre un semáforo falso: solo se leen `max_value`, `value` y `num_waiting`."""
+    semaphore = types.SimpleNamespace(max_value=limit, value=limit, num_waiting=waiting)
+    counters = zigpy.state.CounterGroups()["adaptive_concurrency"]
+    return AdaptiveConcurrency(semaphore, floor=floor, ceiling=ceiling,
+                               min_free_buffers=min_free_buffers, counters=counters), semaphore
+
+
+def test_grows_by_one_while_requests_wait_up_to_the_ceiling():
+    ctl, semaphore = controller(limit=14, waiting=3)
+    assert [ctl.adjust() for _ in range(4)] == ["increase", "increase", None, None]
+    assert ctl.limit == semaphore.max_value == 16
+
+    semaphore.num_waiting = 0
+    ctl.limit = semaphore.max_value = 8
+    assert ctl.adjust() is None  # Sin peticiones esperando no hace falta más
+
+
+def test_low_free_buffers_halve_the_limit_down_to_the_floor():
+    ctl, semaphore = controller(limit=16, floor=3, waiting=5)
+    ctl.record_free_buffers(10)
+    assert [ctl.adjust() for _ in range(4)] == ["decrease_buffers", "decrease_buffers", "decrease_buffers", None]
+    assert ctl.limit == semaphore.max_value == 3
+
+    # Con búferes de sobra vuelve a crecer
+    ctl.record_free_buffers(200)
+    assert ctl.adjust() == "increase"
+
+
+def test_no_buffers_backs_off_immediately():
+    ctl, semaphore = controller(limit=16)
+    ctl.record_no_buffers()
+    assert semaphore.max_value == 8
+    assert ctl.adjust() is None  # Ya se redujo en el momento: no se reduce dos veces
+
+
+def test_failure_rate_decreases_the_limit():
+    ctl, semaphore = controller(limit=16)
+    for n in range(concurrency.MIN_SAMPLES):
+        ctl.record_send(0.05, success=n % 2 == 0)
+    assert ctl.adjust() == "decrease_failures"
+    assert ctl.limit == 12
+
+    # Con pocas muestras no se juzga la tasa de fallos
+    ctl.record_send(0.05, success=False)
+    assert ctl.adjust() is None
+
+
+def test_latency_growth_decreases_the_limit():
+    ctl, semaphore = controller(limit=16)
+    for _ in range(20):
+        ctl.record_send(0.05, success=True)
+    assert ctl.adjust() is None
+
+    for _ in range(20):
+        ctl.record_send(1.0, success=True)
+    assert ctl.adjust() == "decrease_latency"
+
+
+def test_extended_timeout_sends_only_count_as_demand():
+    ctl, semaphore = controller(limit=8, waiting=2)
+    for _ in range(20):
+        ctl.record_send(0.05, success=True)
+    ctl.adjust()
+
+    # Un dispositivo final dormido: respuestas lentas y fallos que no dicen nada del NCP
+    for _ in range(20):
+        ctl.record_send(5.0, success=False, extended_timeout=True)
+    assert ctl.adjust() == "increase"
+    assert ctl.latency == pytest.approx(0.05)
+
+
+def test_simulated_ncp_keeps_buffers_and_converges(simulated_ncp):
+    async def main():
+        semaphore = PriorityDynamicBoundedSemaphore(64)  # Empieza demasiado alto
+        counters = zigpy.state.CounterGroups()["adaptive_concurrency"]
+        ctl = AdaptiveConcurrency(semaphore, floor=2, ceiling=64, min_free_buffers=40, counters=counters,
+                                  get_free_buffers=simulated_ncp.free_buffers, interval=0.02)
+        simulated_ncp.start()
+        ctl.start()
+
+        async def request():
+            async with semaphore:
+                sent_at = asyncio.get_running_loop().time()
+                confirmation = simulated_ncp.send()
+                if confirmation is None:
+                    ctl.record_no_buffers()
+                    return
+                success = await confirmation
+                ctl.record_send(asyncio.get_running_loop().time() - sent_at, success)
+
+        try:
+            await asyncio.gather(*(request() for _ in range(1500)))
+        finally:
+            ctl.stop()
+            simulated_ncp.stop()
+        return ctl, counters
+
+    ctl, counters = asyncio.run(main())
+    # Baja en cuanto se agotan los búferes en la primera ráfaga y no vuelve a agotarlos
+    assert counters["decrease_no_buffers"].value >= 1
+    assert simulated_ncp.allocation_failures <= 5
+    # Y se queda cerca de lo que caben en los búferes dejando `min_free_buffers` libres (21)
+    assert 8 <= ctl.limit <= 30
+
+
+def test_lowered_limit_applies_to_requests_already_waiting():
+    async def main():
+        semaphore = PriorityDynamicBoundedSemaphore(8)
+        in_flight, peak = 0, []
+        release = asyncio.Event()
+
+        async def request():
+            nonlocal in_flight
+            async with semaphore:
+                in_flight += 1
+                peak.append(in_flight)
+                await release.wait()
+                await asyncio.sleep(0)
+                in_flight -= 1
+
+        tasks = [asyncio.create_task(request()) for _ in range(40)]
+        await asyncio.sleep(0)
+        semaphore.max_value = 2  # Los 8 que ya tienen permiso salen sin ceder su hueco
+        peak.clear()
+        release.set()
+        await asyncio.gather(*tasks)
+        return max(peak)
+
+    assert asyncio.run(main()) <= 2
@@ -0,0 +1,63 @@
+import pytest
+from zigpy.state import ArrayCounterGroup, CounterGroup
+
+from bellows.zigbee.application import _TX_COUNTERS, _TX_UNKNOWN_COUNTERS, CTRL_ARRAY_COUNTERS
+import bellows.types as t
+
+
+def test_tx_counter_names_are_unchanged():
+    names = lambda indices: [CTRL_ARRAY_COUNTERS[i] for i in indices]  # noqa: E731
+    assert names(_TX_UNKNOWN_COUNTERS[True]) == [
+        "unknown_msg_type_success", "unknown_msg_type_success_unexpected", "unknown_msg_type_success_duplicate",
+    ]
+    assert names(_TX_UNKNOWN_COUNTERS[False])[0] == "unknown_msg_type_failure"
+    assert names(_TX_COUNTERS[(t.EmberOutgoingMessageType.OUTGOING_DIRECT, False)])[0] == "unicast_tx_failure"
+    assert names(_TX_COUNTERS[(t.EmberOutgoingMessageType.OUTGOING_VIA_BINDING, True)])[1] == (
+        "via_binding_tx_success_unexpected"
+    )
+
+
+def views(group):
+    return {
+        "keys": list(group), "len": len(group), "items": {k: int(v) for k, v in group.items()},
+        "in_a": "a" in group, "in_b": "b" in group, "get_b": group.get("b") and int(group["b"]),
+        "str": str(group), "repr": repr(group), "dict": {k: int(v) for k, v in dict(group).items()},
+    }
+
+
+def apply(array_group, regular, name, index):
+    array_group.array[index] += 1
+    regular[name].increment()
+
+
+@pytest.mark.parametrize("steps", [
+    [],
+    [("a", 0)],
+    [("a", 0), ("b", 1), ("b", 1)],  # En el orden del array, que es el de las claves
+])
+def test_array_group_views_match_a_regular_group(steps):
+    array_group = ArrayCounterGroup("ctrl", ["a", "b", "c"])
+    regular = CounterGroup("ctrl")
+    for name, index in steps:
+        apply(array_group, regular, name, index)
+    assert views(array_group) == views(regular)
+
+    # Una consulta crea el contador en los dos casos, y "other" no es del array
+    array_group["c"], regular["c"]
+    array_group["other"].increment()
+    regular["other"].increment()
+    assert views(array_group) == views(regular)
+
+    array_group.reset()
+    regular.reset()
+    apply(array_group, regular, "a", 0)
+    assert views(array_group) == views(regular)
+    assert [c.reset_count for c in array_group.values()] == [c.reset_count for c in regular.values()]
+
+
+def test_counter_created_after_increments_keeps_value():
+    group = ArrayCounterGroup("ctrl", ["a"])
+    group.array[0] += 3
+    assert group["a"].value == 3
+    group["a"].increment()
+    assert group.array[0] == 4
@@ -0,0 +1,70 @@
+import importlib
+import random
+
+import pytest
+
+from bellows.ezsp.decoders import compile_decoder
+import bellows.types as t
+
+VERSIONS = range(4, 15)
+PROTOCOLS = {
+    version: getattr(importlib.import_module(f"bellows.ezsp.v{version}"), f"EZSPv{version}")
+    for version in VERSIONS
+}
+COMMANDS = [(version, name) for version, protocol in PROTOCOLS.items() for name in protocol.COMMANDS]
+PAYLOADS = 4
+PAYLOAD_SIZE = 256
+
+
+def generic_decode(rx_schema, data):
+    """Camino genérico, el que usaba ProtocolHandler.__call__ antes de compilar."""
+    if isinstance(rx_schema, dict):
+        result, data = t.deserialize_dict(data, rx_schema)
+        return list(result.values()), data
+
+    return rx_schema.deserialize(data)
+
+
+def outcome(decode, data):
+    try:
+        result, rest = decode(data)
+    except Exception:  # noqa: BLE001
+        return None
+
+    # El tipo y el repr detectan enteros donde debía haber enums o structs mal construidos
+    values = result if isinstance(result, list) else [result]
+    return [(type(value), value, repr(value)) for value in values], rest
+
+
+def payloads(version, name):
+    rng = random.Random(f"{version}-{name}")
+    # Con ceros todas las longitudes son 0; con bytes pequeños los prefijos de longitud
+    # caben en la trama; con bytes aleatorios la mayoría de las tramas no son válidas
+    yield bytes(PAYLOAD_SIZE)
+    for n in range(1, PAYLOADS):
+        high = 4 if n < PAYLOADS - 1 else 256
+        yield bytes(rng.randrange(high) for _ in range(PAYLOAD_SIZE))
+
+
+@pytest.mark.parametrize(("version", "name"), COMMANDS, ids=[f"v{v}-{name}" for v, name in COMMANDS])
+def test_compiled_decoder_matches_generic_path(version, name):
+    protocol = PROTOCOLS[version]
+    cmd_id, _, rx_schema = protocol.COMMANDS[name]
+    decode = protocol._compile_decoders()[cmd_id]
+    assert outcome(decode, b"") == outcome(compile_decoder(rx_schema), b"")
+
+    decoded = 0
+    for payload in payloads(version, name):
+        expected = outcome(lambda data: generic_decode(rx_schema, data), payload)
+        assert outcome(decode, payload) == expected
+        if expected is None:
+            continue
+
+        decoded += 1
+        used = len(payload) - len(expected[1])
+        # Tramas truncadas en cada byte y con bytes de más al final
+        for data in [payload[:end] for end in range(used)] + [payload[:used], payload[:used] + b"\xAA\x55"]:
+            assert outcome(decode, data) == outcome(lambda d: generic_decode(rx_schema, d), data)
+
+    # Algunos comandos sin respuesta tienen `()` como esquema: fallan en los dos caminos
+    assert decoded or not isinstance(rx_schema, (dict, type))
@@ -0,0 +1,46 @@
+import pytest
+import zigpy.types as t
+
+ADDRESSES = ["00:11:22:33:44:55:66:77", "ff:ff:ff:ff:ff:ff:ff:fe", "00:00:00:00:00:00:00:00"]
+
+
+class ReprHashedEUI64(t.EUI64):
+    """EUI64 con el hash de antes, el de la dirección formateada."""
+
+    def __hash__(self):
+        return hash(repr(self))
+
+
+def equal_addresses(cls, address):
+    # La misma dirección construida por los caminos que usan zigpy y bellows
+    converted = cls.convert(address)
+    deserialized, _ = cls.deserialize(converted.serialize())
+    return [converted, deserialized, cls(list(converted)), cls(converted)]
+
+
+def lookups(cls):
+    table = {cls.convert(address): n for n, address in enumerate(ADDRESSES)}
+    keys = [key for address in ADDRESSES for key in equal_addresses(cls, address)]
+    return (
+        [table.get(key) for key in keys],
+        [table.get(address) for address in ADDRESSES],  # Una cadena nunca es una clave
+        len(set(keys)),
+        sorted(repr(key) for key in {*keys, *table}),
+    )
+
+
+def test_hash_is_consistent_with_equality():
+    for address in ADDRESSES:
+        hashes = {hash(key) for key in equal_addresses(t.EUI64, address)}
+        assert len(hashes) == 1
+    assert len({hash(t.EUI64.convert(address)) for address in ADDRESSES}) == len(ADDRESSES)
+
+
+def test_dicts_and_sets_behave_as_with_the_repr_hash():
+    assert lookups(t.EUI64) == lookups(ReprHashedEUI64)
+    assert lookups(t.EUI64)[0] == [0] * 4 + [1] * 4 + [2] * 4
+
+
+def test_unhashable_lookups_still_fail():
+    with pytest.raises(TypeError):
+        {t.EUI64.convert(ADDRESSES[0]): 0}[list(t.EUI64.convert(ADDRESSES[0]))]
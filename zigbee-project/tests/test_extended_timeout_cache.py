@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from bellows.ezsp.v14 import EZSPv14
+from bellows.zigbee.application import (
+    COUNTER_EXT_TIMEOUT_CACHE_HIT,
+    COUNTER_EXT_TIMEOUT_CACHE_MISS,
+    COUNTERS_CTRL,
+    ControllerApplication,
+)
+import bellows.types as t
+
+IEEE = t.EUI64(b"\x01" * 8)
+OTHER = t.EUI64(b"\x02" * 8)
+
+
+def make_protocol(current=False, node_id=0x1234, replace_status=t.EmberStatus.SUCCESS, evicted=OTHER):
+    """Protocolo con los comandos del NCP simulados."""
+    protocol = EZSPv14(MagicMock(), MagicMock())
+    protocol.getExtendedTimeout = AsyncMock(return_value=[current])
+    protocol.lookupNodeIdByEui64 = AsyncMock(return_value=[node_id])
+    protocol.setExtendedTimeout = AsyncMock(return_value=[t.EmberStatus.SUCCESS])
+    protocol.getConfigurationValue = AsyncMock(return_value=[t.EzspStatus.SUCCESS, 8])
+    protocol.replaceAddressTableEntry = AsyncMock(return_value=[replace_status, evicted, 0x5678, False])
+    return protocol
+
+
+def test_cache_hits_only_for_the_same_nwk_and_timeout():
+    protocol = make_protocol()
+    assert not protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    protocol.setExtendedTimeout.assert_awaited_once()
+    assert protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+    assert not protocol.is_extended_timeout_cached(0x1234, IEEE, False)
+    assert not protocol.is_extended_timeout_cached(0x4321, IEEE, True)  # Cambió la NWK
+
+
+def test_state_already_in_the_ncp_is_cached():
+    protocol = make_protocol(current=True)
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    protocol.lookupNodeIdByEui64.assert_not_awaited()
+    assert protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+
+
+def test_invalidation_by_nwk_ieee_and_all():
+    protocol = make_protocol()
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    asyncio.run(protocol.set_extended_timeout(0x4321, OTHER, True))
+
+    protocol.invalidate_extended_timeout(nwk=0x1234)
+    assert not protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+    assert protocol.is_extended_timeout_cached(0x4321, OTHER, True)
+
+    protocol.invalidate_extended_timeout(ieee=OTHER)
+    assert not protocol.is_extended_timeout_cached(0x4321, OTHER, True)
+
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    protocol.invalidate_extended_timeout()
+    assert protocol._extended_timeout_cache == {}
+
+
+def test_replacing_an_address_table_entry_evicts_the_old_device():
+    protocol = make_protocol(current=True)
+    asyncio.run(protocol.set_extended_timeout(0x4321, OTHER, True))
+
+    # IEEE no está en la tabla de direcciones: se reemplaza la entrada de OTHER
+    protocol.getExtendedTimeout.return_value = [False]
+    protocol.lookupNodeIdByEui64.return_value = [0xFFFF]
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    protocol.replaceAddressTableEntry.assert_awaited_once()
+    assert protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+    assert not protocol.is_extended_timeout_cached(0x4321, OTHER, True)
+
+
+def test_failed_replacement_is_not_cached():
+    protocol = make_protocol(node_id=0xFFFF, replace_status=t.EmberStatus.TABLE_FULL)
+    asyncio.run(protocol.set_extended_timeout(0x1234, IEEE, True))
+    assert not protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+
+
+def test_application_counts_hits_and_misses_and_invalidates_on_events():
+    async def run():
+        app = ControllerApplication({"device": {"path": "/dev/null"}})
+        app._ezsp = protocol = make_protocol()
+        device = app.add_device(IEEE, 0x1234)
+
+        for _ in range(3):
+            await app._set_extended_timeout(device, True)
+        assert protocol.getExtendedTimeout.await_count == 1
+
+        # Un rejoin por el centro de confianza invalida la entrada
+        app._handle_tc_join_handler(0x1234, IEEE, t.EmberDeviceUpdate.STANDARD_SECURITY_UNSECURED_REJOIN,
+                                    t.EmberJoinDecision.USE_PRECONFIGURED_KEY, 0x0000)
+        await app._set_extended_timeout(device, True)
+        assert protocol.getExtendedTimeout.await_count == 2
+
+        # Igual que un conflicto de NWK
+        app._handle_id_conflict(0x1234)
+        assert not protocol.is_extended_timeout_cached(0x1234, IEEE, True)
+
+        counters = app.state.counters[COUNTERS_CTRL]
+        return counters[COUNTER_EXT_TIMEOUT_CACHE_HIT].value, counters[COUNTER_EXT_TIMEOUT_CACHE_MISS].value
+
+    assert asyncio.run(run()) == (2, 2)
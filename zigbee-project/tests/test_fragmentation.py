@@ -0,0 +1,137 @@
+import asyncio
+
+import bellows.ezsp.fragmentation as fragmentation
+from bellows.ezsp.fragmentation import FragmentManager
+
+PROFILE, CLUSTER = 0x0104, 0x0006
+
+
+def send(manager, sender, seq, count, index, payload):
+    return manager.handle_incoming_fragment(sender, seq, PROFILE, CLUSTER, count, index, payload)
+
+
+def parts(count, size=40, last=7):
+    return [bytes([n]) * size for n in range(count - 1)] + [b"\xff" * last]
+
+
+def run(coro_fn):
+    """Ejecuta la prueba dentro de un bucle: los temporizadores de cada mensaje lo necesitan."""
+    return asyncio.run(coro_fn())
+
+
+def test_in_order_reassembly():
+    async def main():
+        manager = FragmentManager()
+        message = parts(4)
+        results = [send(manager, 0x1234, 7, 4, n, data) for n, data in enumerate(message)]
+        return manager, results
+
+    manager, results = run(main)
+    assert [complete for complete, *_ in results] == [False, False, False, True]
+    assert results[-1][1] == b"".join(parts(4))
+    assert manager.partial_bytes == 0 and manager.counters["completed"] == 1
+
+
+def test_out_of_order_with_duplicates():
+    async def main():
+        manager = FragmentManager()
+        message = parts(5)
+        for index in (4, 2, 2, 0, 4, 3):  # El último llega primero y hay repetidos
+            assert not send(manager, 0x1234, 7, 5, index, message[index])[0]
+        # Los repetidos no cuentan dos veces
+        assert manager.partial_bytes == sum(len(message[i]) for i in (0, 2, 3, 4))
+        return send(manager, 0x1234, 7, 5, 1, message[1]), manager
+
+    (complete, data, _, _), manager = run(main)
+    assert complete and data == b"".join(parts(5))
+    assert manager.partial_bytes == 0
+
+
+def test_inconsistent_fragments_are_rejected():
+    async def main():
+        manager = FragmentManager()
+        send(manager, 0x1234, 7, 3, 0, b"a" * 40)
+        send(manager, 0x1234, 7, 3, 1, b"b" * 39)  # Distinto tamaño que el resto
+        send(manager, 0x1234, 7, 4, 2, b"c")  # Otro número de fragmentos
+        send(manager, 0x1234, 7, 3, 3, b"d")  # Índice fuera de rango
+        return manager
+
+    manager = run(main)
+    assert manager.counters["invalid"] == 3
+    assert manager.partial_bytes == 40
+
+
+def test_partial_message_times_out(monkeypatch):
+    monkeypatch.setattr(fragmentation, "FRAGMENT_TIMEOUT", 0.05)
+
+    async def main():
+        manager = FragmentManager()
+        message = parts(4)
+        # Un mensaje lento que sigue recibiendo fragmentos no caduca
+        for index in range(3):
+            send(manager, 0x1234, 7, 4, index, message[index])
+            await asyncio.sleep(0.03)
+        assert manager.partial_bytes > 0
+        await asyncio.sleep(0.1)
+        return manager
+
+    manager = run(main)
+    assert manager.partial_bytes == 0 and manager.counters["timed_out"] == 1
+
+
+def test_byte_cap_evicts_least_recently_updated():
+    async def main():
+        manager = FragmentManager(max_bytes=200)
+        for sender in range(4):
+            send(manager, sender, 1, 3, 0, b"x" * 60)
+        return manager
+
+    manager = run(main)
+    # 4 x 60 bytes no caben en 200: sale el primero
+    assert manager.counters["evicted"] == 1
+    assert manager.partial_bytes == 180
+    assert [key[0] for key in manager._partial] == [1, 2, 3]
+
+
+def test_claimed_size_does_not_push_out_other_messages():
+    async def main():
+        manager = FragmentManager()
+        legit = parts(3)
+        for sender in range(8):
+            send(manager, sender, 1, 3, 0, legit[0])
+
+        # Nodos que anuncian 200 fragmentos pero solo envían uno: antes cada uno
+        # reservaba ~16 KB y cuatro bastaban para llenar el límite de 64 KB
+        for sender in range(100, 108):
+            send(manager, sender, 1, 200, 0, b"z" * 80)
+
+        completed = [send(manager, sender, 1, 3, n, legit[n])[0] for sender in range(8) for n in (1, 2)]
+        return manager, completed
+
+    manager, completed = run(main)
+    assert manager.counters["evicted"] == 0
+    assert completed.count(True) == 8
+
+
+def test_message_that_can_never_fit_is_dropped():
+    async def main():
+        manager = FragmentManager(max_bytes=1000)
+        send(manager, 0x1111, 1, 3, 0, b"a" * 40)
+        send(manager, 0x2222, 1, 100, 0, b"z" * 80)  # Al menos 99 x 80 bytes
+        return manager
+
+    manager = run(main)
+    assert manager.counters["oversized"] == 1 and manager.counters["evicted"] == 0
+    assert [key[0] for key in manager._partial] == [0x1111]
+
+
+def test_one_sender_cannot_hold_more_than_its_share():
+    async def main():
+        manager = FragmentManager(max_entries=8, max_entries_per_sender=2)
+        send(manager, 0x1111, 1, 3, 0, b"a" * 40)
+        for seq in range(20):
+            send(manager, 0x2222, seq, 3, 0, b"b" * 40)
+        return manager
+
+    manager = run(main)
+    assert [key[:2] for key in manager._partial] == [(0x1111, 1), (0x2222, 18), (0x2222, 19)]
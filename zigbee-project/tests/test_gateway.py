@@ -0,0 +1,297 @@
+import asyncio
+import json
+import struct
+import types
+
+import aiohttp
+import pytest
+import zigpy.device
+import zigpy.endpoint
+import zigpy.exceptions
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+
+import sensor_gateway
+from aiohttp import web
+from sensor_api import LatestValues, QueryService
+from sensor_gateway import SENSOR_REGISTRY, MyEventListener, SensorAttributeListener, ShardConfig, ShardRouter
+from sensor_pipeline import GatewayMetrics, ReadingPipeline
+from sensor_store import ReadingsStore
+from sensor_uploader import HttpUploader
+from sensor_wal import WriteAheadQueue
+
+IEEE_A = t.EUI64.convert("00:11:22:33:44:55:66:01")
+IEEE_B = t.EUI64.convert("00:11:22:33:44:55:66:02")
+
+
+def gateway_app(make_app, startup_error=zigpy.exceptions.NetworkNotFormed("sin red")):
+    """Clase de aplicación para run_shard: registra cómo se crea y falla al arrancar."""
+
+    class GatewayApp(make_app):
+        created = []
+        startups = 0
+
+        @classmethod
+        async def new(cls, config, auto_form=False, start_radio=True):
+            cls.created.append({"auto_form": auto_form, "start_radio": start_radio})
+            return await super().new(config, auto_form=auto_form, start_radio=start_radio)
+
+        async def startup(self, auto_form=False):
+            type(self).startups += 1
+            raise startup_error
+
+    return GatewayApp
+
+
+def run_shards(monkeypatch, app_class, shards, radios=None):
+    monkeypatch.setattr(sensor_gateway, "BellowsApplication", app_class)
+    monkeypatch.setattr(sensor_gateway, "build_app_config", lambda shard: {"device": {"path": shard.device_path}})
+    radios = {} if radios is None else radios
+    router = ShardRouter()
+
+    async def run():
+        await asyncio.gather(*(sensor_gateway.run_shard(shard, lambda reading: None, router, GatewayMetrics(), radios)
+                               for shard in shards))
+
+    asyncio.run(run())
+    return radios
+
+
+def run_shard(monkeypatch, app_class, shard=ShardConfig(name="radio0", device_path="/dev/null")):
+    return run_shards(monkeypatch, app_class, [shard])
+
+
+def test_run_shard_creates_the_app_without_starting_the_radio(make_app, monkeypatch):
+    app_class = gateway_app(make_app)
+    run_shard(monkeypatch, app_class)
+    # La base de datos se carga con la API pública; la radio la arranca RadioLink.connect()
+    assert app_class.created == [{"auto_form": False, "start_radio": False}]
+    assert app_class.startups == 1
+
+
+def sensor_device(app, ieee, nwk):
+    """Sensor inicializado con el cluster del esquema."""
+    schema = next(iter(SENSOR_REGISTRY))
+    device = app.add_device(ieee, nwk)
+    device.node_desc = zdo_t.NodeDescriptor(2, 64, 128, 4174, 82, 255, 0, 255, 0)
+    endpoint = device.add_endpoint(schema.endpoint_id)
+    endpoint.status = zigpy.endpoint.Status.ZDO_INIT
+    endpoint.add_input_cluster(schema.cluster_id)
+    device.status = zigpy.device.Status.ENDPOINTS_INIT
+    return device
+
+
+def listener(app, shard, router):
+    return MyEventListener(app, shard, pipeline=lambda reading: None, router=router, link=None, join=None)
+
+
+def test_router_gives_each_ieee_to_a_single_shard():
+    router = ShardRouter()
+    assert router.claim(IEEE_A, "radio0")
+    assert router.claim(IEEE_A, "radio0")  # Volver a reclamarlo no cambia nada
+    assert not router.claim(IEEE_A, "radio1")
+    assert router.claim(IEEE_B, "radio1")
+    assert (router.shard_for(IEEE_A), router.shard_for(IEEE_B)) == ("radio0", "radio1")
+
+    router.release(IEEE_A, "radio1")  # Solo lo libera su radio
+    assert router.shard_for(IEEE_A) == "radio0"
+    router.release(IEEE_A, "radio0")
+    assert router.shard_for(IEEE_A) is None
+    assert router.claim(IEEE_A, "radio1")
+
+
+def test_shard_configs_default_and_must_be_unique(monkeypatch):
+    monkeypatch.setattr(sensor_gateway, "SHARDS", [])
+    assert [shard.name for shard in sensor_gateway.load_shard_configs()] == ["radio0"]
+
+    monkeypatch.setattr(sensor_gateway, "SHARDS", [
+        {"name": "radio0", "device_path": "/dev/ttyUSB0", "database": "a.db"},
+        {"name": "radio1", "device_path": "/dev/ttyUSB0", "database": "b.db"},
+    ])
+    with pytest.raises(ValueError, match="device_path"):
+        sensor_gateway.load_shard_configs()
+
+
+def test_device_seen_by_two_radios_is_handled_by_the_first(make_app):
+    async def run():
+        router = ShardRouter()
+        radios = [listener(make_app(), name, router) for name in ("radio0", "radio1")]
+        configured = []
+        for radio in radios:
+            radio.configure_device_reporting = lambda device, radio=radio: asyncio.sleep(0, configured.append(radio._shard))
+
+        device = sensor_device(radios[0]._app, IEEE_A, 0x1234)
+        for radio in radios:
+            radio.device_initialized(device)
+        await asyncio.sleep(0.01)
+        assert configured == ["radio0"]
+
+        # Cuando abandona la primera red, la otra radio puede quedárselo
+        radios[0].device_left(device)
+        radios[1].device_initialized(device)
+        await asyncio.sleep(0.01)
+        assert configured == ["radio0", "radio1"]
+        assert router.shard_for(IEEE_A) == "radio1"
+
+    asyncio.run(run())
+
+
+def test_loaded_devices_get_listeners_only_on_their_shard(make_app):
+    router = ShardRouter()
+    radio0, radio1 = listener(make_app(), "radio0", router), listener(make_app(), "radio1", router)
+    sensor_device(radio0._app, IEEE_A, 0x1234)
+    sensor_device(radio1._app, IEEE_A, 0x1234)  # También en la base de datos de la otra radio
+    sensor_device(radio1._app, IEEE_B, 0x5678)
+
+    radio0.attach_loaded_devices()
+    radio1.attach_loaded_devices()
+    assert set(radio0._sensor_listeners) == {(IEEE_A, schema.cluster_id) for schema in SENSOR_REGISTRY}
+    assert set(radio1._sensor_listeners) == {(IEEE_B, schema.cluster_id) for schema in SENSOR_REGISTRY}
+
+
+def test_commands_are_routed_to_the_shard_that_knows_the_device(make_app):
+    opened = []
+
+    def radio(name, *ieees):
+        app = make_app()
+        for nwk, ieee in enumerate(ieees, start=1):
+            app.add_device(ieee, nwk)
+        join = types.SimpleNamespace(open=lambda duration, node=None: opened.append((name, duration, node)))
+        return types.SimpleNamespace(_app=app, join=join)
+
+    radios = {"radio0": radio("radio0", IEEE_A), "radio1": radio("radio1", IEEE_B)}
+
+    async def run():
+        assert await sensor_gateway.permit_command(radios, 60) == ["radio0", "radio1"]
+        assert await sensor_gateway.permit_command(radios, 60, node=str(IEEE_B)) == ["radio1"]
+        assert await sensor_gateway.permit_command(radios, 0, shard="radio0") == ["radio0"]
+        with pytest.raises(ValueError, match="no está operativa"):
+            await sensor_gateway.permit_command(radios, 60, shard="radio2")
+        with pytest.raises(ValueError, match="desconocido"):
+            await sensor_gateway.permit_command(radios, 60, node="00:00:00:00:00:00:00:99")
+
+    asyncio.run(run())
+    assert opened == [("radio0", 60, None), ("radio1", 60, None), ("radio1", 60, IEEE_B), ("radio0", 0, None)]
+
+
+def test_configure_reporting_goes_to_the_owning_shard(make_app):
+    calls = []
+
+    def radio(name, ieee):
+        app = make_app()
+        app.add_device(ieee, 0x1000)
+
+        async def call(description, command):
+            calls.append((name, description))
+            return await command()
+
+        radio = listener(app, name, ShardRouter())
+        radio.link = types.SimpleNamespace(call=call)
+        radio.configure_device_reporting = lambda device: asyncio.sleep(0)
+        return radio
+
+    radios = {"radio0": radio("radio0", IEEE_A), "radio1": radio("radio1", IEEE_B)}
+    assert asyncio.run(sensor_gateway.configure_reporting_command(radios, str(IEEE_B))) == "radio1"
+    assert calls == [("radio1", f"configure_reporting {IEEE_B}")]
+    with pytest.raises(ValueError, match="desconocido"):
+        asyncio.run(sensor_gateway.configure_reporting_command(radios, "00:00:00:00:00:00:00:99"))
+
+
+def test_a_failed_shard_does_not_stop_the_others(make_app, monkeypatch):
+    radios = {}
+    registered = []
+
+    class App(gateway_app(make_app)):
+        @classmethod
+        async def new(cls, config, auto_form=False, start_radio=True):
+            if config["device"]["path"] == "/dev/roto":
+                raise OSError("zigbee.db ilegible")
+            return await super().new(config, auto_form=auto_form, start_radio=start_radio)
+
+        async def startup(self, auto_form=False):
+            registered.append(sorted(radios))  # Radios operativas mientras arranca esta
+            await super().startup(auto_form)
+
+    shards = [ShardConfig(name="radio0", device_path="/dev/roto"), ShardConfig(name="radio1", device_path="/dev/null")]
+    run_shards(monkeypatch, App, shards, radios)
+
+    # radio0 no llega a registrarse; radio1 arranca igualmente y se retira al terminar
+    assert App.startups == 1
+    assert registered == [["radio1"]]
+    assert radios == {}
+
+
+def test_sentinel_reading_is_flagged_end_to_end(make_app, tmp_path):
+    schema = next(iter(SENSOR_REGISTRY))
+    attribute = schema.attributes[0]
+    (sentinel,) = attribute.sentinels
+    sentinel = struct.unpack("<f", struct.pack("<f", sentinel))[0]  # Llega redondeado a single
+    uploaded = []
+
+    async def upload(request):
+        uploaded.extend(await request.json())
+        return web.Response(status=204)
+
+    async def run():
+        server = web.Application()
+        server.router.add_post("/readings", upload)
+        runner = web.AppRunner(server)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        upload_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/readings"
+
+        # El pipeline del gateway: últimos valores en memoria, histórico y envío a la nube
+        wal = WriteAheadQueue(str(tmp_path / "wal"))
+        pipeline = ReadingPipeline(GatewayMetrics(), wal=wal)
+        latest = LatestValues()
+        store = ReadingsStore(str(tmp_path / "readings.db"), retention_days=0)
+        await store.open()
+        uploader = HttpUploader(upload_url)
+        pipeline.add_sink("ultimos", latest)
+        pipeline.add_durable_sink("historico", store)
+        pipeline.add_durable_sink("http", uploader)
+        task = asyncio.create_task(pipeline.run())
+
+        app = make_app()
+        device = sensor_device(app, IEEE_A, 0x1234)
+        cluster = device.endpoints[schema.endpoint_id].in_clusters[schema.cluster_id]
+        sensor = SensorAttributeListener(IEEE_A, cluster, pipeline, "radio0")
+        for value in (2.5, 3.5, sentinel):  # La última lectura es el centinela
+            sensor.attribute_updated(attribute.id, value, None)
+            await asyncio.sleep(0.01)  # El histórico distingue las lecturas por milisegundo
+        for _ in range(500):
+            if not (wal.lag("historico") or wal.lag("http") or pipeline.qsize()):
+                break
+            await asyncio.sleep(0.01)
+
+        service = QueryService(latest, str(tmp_path / "readings.db"), port=0)
+        await service.start()
+        base = f"http://127.0.0.1:{service._runner.addresses[0][1]}"
+        params = {"ieee": str(IEEE_A), "attribute": str(attribute.id), "start": "0", "end": "9999999999",
+                  "bucket": "9999999999"}
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{base}/latest") as response:
+                    latest_body = await response.json()
+                async with session.get(f"{base}/rollup", params=params) as response:
+                    rollup = await response.json()
+                async with session.get(f"{base}/range", params=params) as response:
+                    points = [json.loads(line) for line in (await response.text()).splitlines()]
+        finally:
+            await service.stop()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await uploader.close()
+            await store.close()
+            await runner.cleanup()
+            wal.close()
+        return latest_body, rollup, points
+
+    latest_body, rollup, points = asyncio.run(run())
+
+    assert [(r["value"], r["valid"]) for r in latest_body] == [(None, False)]
+    assert [(r["value"], r["valid"]) for r in uploaded] == [(2.5, True), (3.5, True), (None, False)]
+    assert [p["v"] for p in points] == [2.5, 3.5, None]
+    # El centinela no entra en la media ni en el mínimo
+    assert [(r["min"], r["avg"], r["max"], r["n"]) for r in rollup] == [(2.5, 3.0, 3.5, 2)]
@@ -0,0 +1,224 @@
+import asyncio
+import datetime
+import types
+
+import pytest
+import zigpy.types as t
+
+import sensor_join
+from sensor_join import JOIN_BROADCAST_MIN_INTERVAL, JOIN_MAX_WINDOW, JoinPeriod, JoinScheduler
+from sensor_pipeline import GatewayMetrics
+
+ROUTER = t.EUI64.convert("00:11:22:33:44:55:66:01")
+SENSOR_A = t.EUI64.convert("00:11:22:33:44:55:66:0a")
+SENSOR_B = t.EUI64.convert("00:11:22:33:44:55:66:0b")
+STRANGER = t.EUI64.convert("00:11:22:33:44:55:66:ff")
+MIDNIGHT = datetime.datetime(2024, 3, 1)
+
+
+class VirtualClock:
+    """Reloj monótono y de pared del planificador, que solo avanza con `advance`."""
+
+    def __init__(self, wall=MIDNIGHT):
+        self.now = 1000.0
+        self.wall = wall
+
+    def advance(self, seconds):
+        self.now += seconds
+        self.wall += datetime.timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = VirtualClock()
+
+    class FakeDatetime(datetime.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock.wall
+
+    monkeypatch.setattr(sensor_join, "time", types.SimpleNamespace(monotonic=lambda: clock.now))
+    monkeypatch.setattr(sensor_join, "datetime", types.SimpleNamespace(
+        datetime=FakeDatetime, time=datetime.time, timedelta=datetime.timedelta))
+    return clock
+
+
+class FakeApp:
+    """App que anota cada `permit` con el instante del reloj virtual."""
+
+    def __init__(self, clock, devices=()):
+        self.clock = clock
+        self.devices = {ieee: types.SimpleNamespace(ieee=ieee, node_desc=None) for ieee in devices}
+        self.permits = []
+
+    async def permit(self, duration, node=None):
+        self.permits.append((self.clock.now - 1000.0, node, duration))
+
+
+class FakeLink:
+    def __init__(self, app):
+        self.name = "radio0"
+        self.app = app
+        self.connected = True
+
+    async def call(self, description, fn):
+        return await fn()
+
+
+def scheduler(clock, devices=(ROUTER,), **options):
+    metrics = GatewayMetrics()
+    join = JoinScheduler(FakeLink(FakeApp(clock, devices)), metrics, asyncio.Event(), **options)
+    return join, join.link.app, metrics
+
+
+def simulate(join, clock, seconds, events=None, step=sensor_join.JOIN_CHECK_INTERVAL):
+    """Ejecuta `_step` cada `step` segundos virtuales; `events` son `{segundo: función}`."""
+    events = dict(events or {})
+
+    async def run():
+        elapsed = 0.0
+        while elapsed <= seconds:
+            for at in [at for at in events if at <= elapsed]:
+                events.pop(at)()
+            await join._step()
+            clock.advance(step)
+            elapsed += step
+
+    asyncio.run(run())
+
+
+def join_device(join, ieee):
+    join.link.app.devices[ieee] = types.SimpleNamespace(ieee=ieee, node_desc=None)
+    join.device_joined(join.link.app.devices[ieee])
+
+
+def broadcasts(app):
+    return [(at, duration) for at, node, duration in app.permits if node is None]
+
+
+@pytest.mark.parametrize("now, remaining", [
+    ("21:59:59", 0.0),
+    ("22:00:00", 4 * 3600.0),
+    ("23:59:30", 2 * 3600.0 + 30),
+    ("00:00:00", 2 * 3600.0),
+    ("01:30:00", 1800.0),
+    ("02:00:00", 0.0),
+    ("12:00:00", 0.0),
+])
+def test_period_remaining_across_midnight(now, remaining):
+    period = JoinPeriod(datetime.time(22, 0), datetime.time(2, 0))
+    wall = datetime.datetime.combine(MIDNIGHT.date(), datetime.time.fromisoformat(now))
+    assert period.remaining(wall) == remaining
+
+
+def test_period_remaining_within_a_day():
+    period = JoinPeriod(datetime.time(8, 0), datetime.time(9, 0))
+    at = lambda hour, minute: MIDNIGHT.replace(hour=hour, minute=minute)
+    assert [period.remaining(at(*when)) for when in ((7, 59), (8, 0), (8, 30), (9, 0))] == [0.0, 3600.0, 1800.0, 0.0]
+
+
+def test_broadcasts_are_rate_limited_but_targeted_permits_are_not(clock):
+    join, app, metrics = scheduler(clock)
+    # Un cliente que pide 10 s cada 10 s: la ventana caduca antes del siguiente broadcast permitido
+    requests = {at: (lambda: join.open(10)) for at in range(0, 120, 10)}
+    requests.update({at: (lambda: join.open(10, node=ROUTER)) for at in range(25, 55, 10)})
+    simulate(join, clock, 120, requests)
+
+    assert broadcasts(app) == [(0.0, 10), (JOIN_BROADCAST_MIN_INTERVAL, 10)]
+    assert [at for at, node, _ in app.permits if node == ROUTER] == [25.0, 35.0, 45.0]
+    # Se cuenta una vez por racha de peticiones limitadas, no una por paso
+    assert metrics.snapshot()["join.rate_limited.radio0"] == 2
+
+
+def test_only_expected_devices_count_and_the_window_closes_once_all_joined(clock):
+    join, app, metrics = scheduler(clock, expected=[(SENSOR_A, None), (SENSOR_B, ROUTER)])
+    join.start()
+    simulate(join, clock, 600, {
+        100: lambda: join_device(join, STRANGER),  # No está en la lista: no cambia nada
+        300: lambda: join_device(join, SENSOR_A),
+        450: lambda: join_device(join, SENSOR_B),
+    })
+
+    assert app.permits == [
+        (0.0, None, JOIN_MAX_WINDOW),
+        # Renovada en el primer paso a menos de JOIN_RENEW_MARGIN del cierre (234 s), aunque
+        # se uniera un dispositivo que no se esperaba
+        (235.0, None, JOIN_MAX_WINDOW),
+        # Ya solo falta SENSOR_B, que entra por ROUTER: se cierra la red y se abre solo el router
+        (300.0, None, 0),
+        (300.0, ROUTER, JOIN_MAX_WINDOW),
+        (450.0, ROUTER, 0),
+    ]
+    assert not join.is_open()
+    snapshot = metrics.snapshot()
+    assert snapshot["join.expected_joined.radio0"] == 2
+    assert snapshot["join.closed_early.radio0"] == 2
+
+
+def test_expected_devices_already_in_the_network_or_late_are_not_waited_for(clock):
+    join, app, metrics = scheduler(clock, devices=(ROUTER, SENSOR_A), expected=[(SENSOR_A, None), (SENSOR_B, None)],
+                                   expected_timeout=120)
+    join.start()
+    simulate(join, clock, 600)
+
+    assert app.permits == [(0.0, None, 120)]  # Solo SENSOR_B, y solo hasta el plazo
+    assert not join.is_open()
+    assert metrics.snapshot()["join.expected_missed.radio0"] == 1
+
+
+def test_commissioning_period_across_midnight(clock):
+    clock.wall = MIDNIGHT - datetime.timedelta(hours=1)  # 23:00
+    join, app, _ = scheduler(clock, periods=[JoinPeriod(datetime.time(23, 30), datetime.time(0, 30))])
+    opened = []
+
+    async def sample():
+        opened.append((clock.wall, join.is_open()))
+
+    original_step = join._step
+
+    async def step():
+        await original_step()
+        await sample()
+
+    join._step = step
+    simulate(join, clock, 2 * 3600)
+
+    open_times = [when for when, is_open in opened if is_open]
+    assert min(open_times) == MIDNIGHT - datetime.timedelta(minutes=30)
+    # Abierta sin cortes hasta el final de la franja, también al pasar la medianoche
+    assert max(open_times) == MIDNIGHT + datetime.timedelta(minutes=29, seconds=55)
+    assert len(open_times) == 3600 // 5
+    assert broadcasts(app)[0] == (1800.0, JOIN_MAX_WINDOW)
+    # La última renovación no pasa del final de la franja
+    last_at, last_duration = broadcasts(app)[-1]
+    assert last_at + last_duration == 5400.0
+
+
+def test_a_day_of_demand_against_the_old_periodic_task(clock):
+    """24 h virtuales: cada ventana pedida está abierta y hay muchos menos broadcasts que antes."""
+    join, app, metrics = scheduler(clock, expected=[(SENSOR_A, None)],
+                                   periods=[JoinPeriod(datetime.time(8, 0), datetime.time(9, 0))])
+    join.start()
+    join.open(180)  # PERMIT_JOIN_DURATION_ON_STARTUP
+    events = {1200: lambda: join_device(join, SENSOR_A)}
+    # Un cliente de la API que pide 60 s cada 30 s entre las 12:00 y las 12:30
+    events.update({at: (lambda: join.open(60)) for at in range(12 * 3600, 12 * 3600 + 1800, 30)})
+    required = [(0, 1200), (8 * 3600, 9 * 3600), (12 * 3600, 12 * 3600 + 1800)]
+    closed_when_required = []
+
+    original_step = join._step
+
+    async def step():
+        await original_step()
+        elapsed = clock.now - 1000.0
+        if any(start <= elapsed < end for start, end in required) and not join.is_open():
+            closed_when_required.append(elapsed)
+
+    join._step = step
+    simulate(join, clock, 24 * 3600 - 5, events)
+    join.update_metrics()
+
+    assert closed_when_required == []
+    legacy = 24 * 3600 // sensor_join.LEGACY_REOPEN_INTERVAL + 1
+    assert len(broadcasts(app)) < legacy / 10
+    assert metrics.snapshot()["join.broadcasts_avoided.radio0"] == legacy - metrics.snapshot()["join.broadcasts.radio0"]
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timezone
+import time
+
+import zigpy.types as t
+from zigpy.types.named import _LAZY_TIMESTAMP
+from zigpy.zcl import foundation
+
+
+class SeenListener:
+    def __init__(self):
+        self.seen = []
+
+    def device_last_seen_updated(self, last_seen):
+        self.seen.append(last_seen)
+
+
+def report_packet(device, tsn=1):
+    return t.ZigbeePacket(
+        src=t.AddrModeAddress(addr_mode=t.AddrMode.NWK, address=device.nwk), src_ep=1,
+        dst=t.AddrModeAddress(addr_mode=t.AddrMode.NWK, address=0x0000), dst_ep=1,
+        tsn=tsn, profile_id=0x0104, cluster_id=0x0000, lqi=200, rssi=-60,
+        data=t.SerializableBytes(bytes([0x18, tsn, foundation.GeneralCommand.Default_Response, 0x0A, 0x00])),
+    )
+
+
+def test_packet_received_keeps_the_timestamp_lazy(make_app):
+    async def run():
+        device = make_app().add_device(t.EUI64(b"\x01" * 8), 0x1234)
+        device.add_endpoint(1).add_input_cluster(0x0000)
+        listener = SeenListener()
+        device.add_listener(listener)
+
+        before = time.time()
+        packet = report_packet(device)
+        device.packet_received(packet)
+        after = time.time()
+
+        # El datetime del paquete no se construye solo para actualizar last_seen
+        assert packet._timestamp is _LAZY_TIMESTAMP
+        assert before <= device.last_seen <= after
+        assert listener.seen == [device.last_seen]
+        assert abs(packet.timestamp.timestamp() - device.last_seen) < 1e-3
+
+    asyncio.run(run())
+
+
+def test_last_seen_accepts_datetimes_and_explicit_timestamps(make_app):
+    device = make_app().add_device(t.EUI64(b"\x02" * 8), 0x4321)
+    device.last_seen = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    assert device.last_seen == 1704067200.0
+
+    packet = report_packet(device).replace(timestamp=datetime(2024, 1, 2, tzinfo=timezone.utc))
+    assert packet.unix_time == 1704153600.0
+    assert report_packet(device).replace(timestamp=None).unix_time is None
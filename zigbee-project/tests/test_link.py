@@ -0,0 +1,54 @@
+import asyncio
+
+import sensor_link
+from sensor_link import RadioLink
+from sensor_pipeline import GatewayMetrics
+
+
+class FlakyApp:
+    """App que falla el arranque `failures` veces dejando el puerto abierto."""
+
+    def __init__(self, failures, shutdown_error=None):
+        self.failures = failures
+        self.shutdown_error = shutdown_error
+        self.port_open = False
+        self.overlapping_startups = 0
+        self.calls = []
+
+    async def startup(self, auto_form=False):
+        self.calls.append("startup")
+        if self.port_open:  # Arranque con la instancia anterior aún abierta
+            self.overlapping_startups += 1
+        self.port_open = True
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("el NCP no responde")
+
+    async def shutdown(self, db=True):
+        self.calls.append(f"shutdown(db={db})")
+        self.port_open = False
+        if self.shutdown_error is not None:
+            raise self.shutdown_error
+
+
+def connect(app, monkeypatch):
+    monkeypatch.setattr(sensor_link, "backoff_delay", lambda failures: 0)
+
+    async def run():
+        link = RadioLink(app, "radio0", GatewayMetrics(), asyncio.Event())
+        return await link.connect(), link.connected
+
+    return asyncio.run(run())
+
+
+def test_failed_startup_is_shut_down_before_every_retry(monkeypatch):
+    app = FlakyApp(failures=2)
+    assert connect(app, monkeypatch) == (True, True)
+    assert app.calls == ["startup", "shutdown(db=False)"] * 2 + ["startup"]
+    assert app.overlapping_startups == 0
+
+
+def test_shutdown_errors_do_not_stop_the_retries(monkeypatch):
+    app = FlakyApp(failures=1, shutdown_error=OSError("puerto ya cerrado"))
+    assert connect(app, monkeypatch) == (True, True)
+    assert app.calls == ["startup", "shutdown(db=False)", "startup"]
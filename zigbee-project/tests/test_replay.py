@@ -0,0 +1,47 @@
+import asyncio
+import os
+
+import pytest
+
+from bellows.capture import CaptureReader, Direction
+from bellows.replay import STACK_APP, STACK_ASH, STACK_EZSP, ReplayDriver
+from bellows.zigbee.application import ControllerApplication
+
+CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ncp_v14_reports.bcap")
+REPORTS = 12
+FRAMES = REPORTS + 1  # stackStatusHandler + informes
+
+
+def replay(stack):
+    return asyncio.run(ReplayDriver(CAPTURE, stack=stack).run())
+
+
+def test_capture_is_readable():
+    reader = CaptureReader(CAPTURE)
+    assert reader.metadata()["ezsp_version"] == 14
+    directions = [record.direction for record in reader]
+    assert directions.count(Direction.META) == 1
+    assert directions.count(Direction.TX) == FRAMES - 1  # Un solo ACK para las dos tramas de una lectura
+
+
+@pytest.mark.parametrize("stack", [STACK_ASH, STACK_EZSP, STACK_APP])
+def test_replay_delivers_every_frame(stack):
+    stats = replay(stack)
+    assert stats.ezsp_frames == FRAMES
+    assert stats.resets == 0
+    assert stats.captured_tx_bytes > 0
+    if stack != STACK_ASH:
+        assert stats.callbacks == {"stackStatusHandler": 1, "incomingMessageHandler": REPORTS}
+
+
+def test_replay_reaches_the_application(monkeypatch):
+    packets = []
+    monkeypatch.setattr(ControllerApplication, "packet_received", lambda self, packet: packets.append(packet))
+    replay(STACK_APP)
+
+    assert len(packets) == REPORTS
+    assert {(p.src.address, p.cluster_id, p.src_ep, p.dst_ep) for p in packets} == {(0x1234, 0xFC01, 1, 1)}
+    # Report Attributes con los 3 canales: cabecera ZCL de 3 bytes + 3 x (2 + 1 + 4)
+    assert [p.data.serialize()[2] for p in packets] == [0x0A] * REPORTS
+    assert [len(p.data.serialize()) for p in packets] == [3 + 3 * 7] * REPORTS
+    assert [p.data.serialize()[1] for p in packets] == list(range(REPORTS))
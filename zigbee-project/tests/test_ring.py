@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import multiprocessing
+
+import pytest
+
+import sensor_ring
+from sensor_pipeline import GatewayMetrics, SensorReading
+from sensor_ring import (
+    MAX_IEEE_BYTES, MAX_SENSOR_NAME_BYTES, MAX_SHARD_BYTES, SLOT_SIZE, ControlChannel, ReadingRing,
+    RingReader, RingWriter, check_record_fields,
+)
+
+IEEE = "00:11:22:33:44:55:66:77"
+
+
+def reading(shard="radio0", ieee=IEEE, name="corriente", value=1.0):
+    return SensorReading(shard, ieee, 0x1234, 1, name, value, 1_700_000_000.0)
+
+
+@pytest.fixture
+def ring():
+    ring = ReadingRing.create(capacity=8)
+    yield ring
+    ring.close()
+
+
+@pytest.mark.parametrize("field, limit", [
+    ("shard", MAX_SHARD_BYTES), ("ieee", MAX_IEEE_BYTES), ("name", MAX_SENSOR_NAME_BYTES),
+])
+def test_strings_at_the_limit_round_trip_and_longer_ones_are_rejected(ring, caplog, field, limit):
+    metrics = GatewayMetrics()
+    writer = RingWriter(ring, metrics)
+    reader = RingReader(ring)
+    # "ñ" ocupa 2 bytes en UTF-8: el límite es de bytes, no de caracteres
+    fits = "ñ" * (limit // 2) + "a" * (limit % 2)
+    too_long = fits + "a"
+
+    assert writer.submit(reading(**{field: fits}))
+    with caplog.at_level(logging.ERROR):
+        assert not writer.submit(reading(**{field: too_long}))
+        assert not writer.submit(reading(**{field: too_long}, value=2.0))
+    assert writer.submit(reading(value=3.0))
+
+    received = reader.read()
+    assert [getattr(r, "sensor_name" if field == "name" else field) for r in received[:1]] == [fits]
+    assert [r.value for r in received] == [1.0, 3.0]  # Nada truncado llega al lector
+    assert metrics.snapshot()["ring.rejected"] == 2
+    assert len([r for r in caplog.records if too_long in r.getMessage()]) == 1  # Se registra una vez
+
+
+def test_a_string_accepted_in_one_field_is_checked_in_another(ring):
+    writer = RingWriter(ring)
+    name = "n" * MAX_SENSOR_NAME_BYTES
+    assert writer.submit(reading(name=name))
+    assert not writer.submit(reading(shard=name))
+
+
+def test_check_record_fields():
+    check_record_fields(["r" * MAX_SHARD_BYTES], ["n" * MAX_SENSOR_NAME_BYTES])
+    with pytest.raises(ValueError, match="shard 'radio_demasiado_larga'"):
+        check_record_fields(["radio0", "radio_demasiado_larga"], ["corriente"])
+    with pytest.raises(ValueError, match="sensor_name"):
+        check_record_fields(["radio0"], ["n" * (MAX_SENSOR_NAME_BYTES + 1)])
+
+
+def values(readings):
+    return [r.value for r in readings]
+
+
+def test_records_round_trip_across_the_end_of_the_ring(ring):
+    writer = RingWriter(ring)
+    reader = RingReader(ring)
+    for n in range(5):
+        writer.submit(reading(value=float(n)))
+    assert values(reader.read()) == [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    for n in range(5, 12):  # Los huecos 5..7 y después 0..3 otra vez
+        writer.submit(reading(value=float(n)))
+    assert values(reader.read(max_records=4)) == [5.0, 6.0, 7.0, 8.0]
+    assert values(reader.read()) == [9.0, 10.0, 11.0]
+    assert reader.read() == [] and reader.lag() == 0
+
+
+def test_lapped_reader_skips_to_the_oldest_record_and_counts_the_lost(ring):
+    metrics = GatewayMetrics()
+    writer = RingWriter(ring)
+    reader = RingReader(ring, metrics)
+    for n in range(20):
+        writer.submit(reading(value=float(n)))
+
+    # El hueco del registro 12 es el siguiente que se reescribe: solo quedan fiables 13..19
+    assert values(reader.read()) == [float(n) for n in range(13, 20)]
+    assert metrics.snapshot()["ring.lost"] == 13
+
+    writer.submit(reading(value=20.0))
+    assert values(reader.read()) == [20.0]
+    assert metrics.snapshot()["ring.lost"] == 13
+
+
+def test_reader_from_oldest_starts_at_what_is_left_in_the_ring(ring):
+    writer = RingWriter(ring)
+    for n in range(3):
+        writer.submit(reading(value=float(n)))
+    assert values(RingReader(ring, from_oldest=True).read()) == [0.0, 1.0, 2.0]
+    assert RingReader(ring).read() == []  # Sin from_oldest solo ve lo que se publique después
+
+    for n in range(3, 20):
+        writer.submit(reading(value=float(n)))
+    assert values(RingReader(ring, from_oldest=True).read()) == [float(n) for n in range(13, 20)]
+
+
+def slot_offset(ring, seq):
+    return sensor_ring._HEADER.size + (seq % ring.capacity) * SLOT_SIZE
+
+
+@pytest.mark.parametrize("corrupt_at", [0, sensor_ring._SLOT.size + 8])  # Secuencia o valor
+def test_slot_with_unexpected_sequence_or_crc_is_read_again_later(ring, corrupt_at):
+    metrics = GatewayMetrics()
+    writer = RingWriter(ring)
+    reader = RingReader(ring, metrics)
+    for n in range(4):
+        writer.submit(reading(value=float(n)))
+
+    # Como si la escritura del hueco 1 aún no fuera visible en este proceso
+    offset = slot_offset(ring, 1) + corrupt_at
+    original = ring.shm.buf[offset]
+    ring.shm.buf[offset] = original ^ 0xFF
+    assert values(reader.read()) == [0.0]  # Se para antes del hueco, sin saltarlo
+    assert reader.read() == []
+    assert reader.lag() == 3
+
+    ring.shm.buf[offset] = original
+    assert values(reader.read()) == [1.0, 2.0, 3.0]
+    assert "ring.lost" not in metrics.snapshot()
+
+
+def test_incompatible_segment_is_rejected(ring):
+    ring.shm.buf[0:4] = b"XXXX"
+    with pytest.raises(ValueError, match="no es un anillo"):
+        ReadingRing.attach(ring.name)
+    ring.shm.buf[0:4] = sensor_ring._MAGIC
+
+
+def channels(**options):
+    """Dos ControlChannel unidos por un Pipe, como los de los dos procesos."""
+    left, right = multiprocessing.Pipe()
+    return ControlChannel(left, **options), ControlChannel(right)
+
+
+def test_control_requests_replies_and_messages():
+    async def main():
+        client, server = channels()
+        client.start()
+        server.start()
+        received = []
+
+        async def slow_double(value):
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        def fail():
+            raise KeyError("sin radio")
+
+        server.on("double", slow_double)
+        server.on("echo", lambda *args: list(args))
+        server.on("fail", fail)
+        client.on("metrics", received.append)
+
+        results = await asyncio.gather(client.request("double", 21), client.request("echo", 1, "a"))
+        with pytest.raises(RuntimeError, match="KeyError: 'sin radio'"):
+            await client.request("fail")
+        with pytest.raises(RuntimeError, match="Orden desconocida: missing"):
+            await client.request("missing")
+
+        server.send("metrics", {"ring.lag": 0})
+        server.send("unknown")  # Se registra y se ignora
+        await asyncio.sleep(0.01)
+
+        client.close()
+        server.close()
+        return results, received
+
+    results, received = asyncio.run(main())
+    assert results == [42, [1, "a"]]
+    assert received == [{"ring.lag": 0}]
+
+
+def test_control_keeps_the_tasks_serving_requests():
+    async def main():
+        client, server = channels()
+        client.start()
+        server.start()
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def wait():
+            started.set()
+            await finish.wait()
+            return "hecho"
+
+        server.on("wait", wait)
+        request = asyncio.create_task(client.request("wait"))
+        await started.wait()
+        serving = set(server._serving)  # La referencia que evita que la tarea se libere a medias
+        finish.set()
+        result = await request
+        await asyncio.sleep(0)
+        left = set(server._serving)
+
+        # Al cerrar, las órdenes en curso se cancelan
+        finish.clear()
+        started.clear()
+        pending = asyncio.create_task(client.request("wait", timeout=1))
+        await started.wait()
+        (task,) = server._serving
+        server.close()
+        await asyncio.sleep(0)
+        with pytest.raises(ConnectionError):
+            await pending
+        client.close()
+        return serving, result, left, task
+
+    serving, result, left, task = asyncio.run(main())
+    assert len(serving) == 1 and result == "hecho" and left == set()
+    assert task.cancelled()
+
+
+def test_closing_the_other_end_fails_pending_requests():
+    async def main():
+        closed = asyncio.Event()
+        client, server = channels(on_closed=closed.set)
+        client.start()
+        server.start()
+        server.on("never", lambda: asyncio.sleep(3600))
+
+        request = asyncio.create_task(client.request("never"))
+        await asyncio.sleep(0.01)
+        server.close()  # P. ej. termina el proceso de radio
+        await asyncio.wait_for(closed.wait(), 1)
+        with pytest.raises(ConnectionError):
+            await request
+        with pytest.raises(ConnectionError):
+            await client.request("never")
+        client.send("ignored")  # Sin error una vez cerrado
+        return client.closed
+
+    assert asyncio.run(main())
@@ -0,0 +1,133 @@
+import heapq
+import math
+import random
+
+import pytest
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+
+from zigpy.routing import RoutingGraph, link_cost
+
+ROOT = t.NWK(0x0000)
+
+
+def full_dijkstra(graph):
+    """Costes mínimos recalculados desde cero, sin pasar nunca por dispositivos finales."""
+    dist = {graph.root: 0}
+    heap = [(0, graph.root)]
+    while heap:
+        cost, node = heapq.heappop(heap)
+        if cost > dist[node] or (node != graph.root and node in graph._end_devices):
+            continue
+        for neighbor, link in graph._adjacency[node].items():
+            if cost + link < dist.get(neighbor, math.inf):
+                dist[neighbor] = cost + link
+                heapq.heappush(heap, (cost + link, neighbor))
+    return dist
+
+
+def check_against_full_dijkstra(graph):
+    expected = full_dijkstra(graph)
+    assert graph._dist == expected
+    for node, cost in expected.items():
+        if node == graph.root:
+            continue
+        route = graph.source_route_to(node)
+        assert not set(route) & graph._end_devices  # Ningún dispositivo final hace de relay
+        path = [graph.root, *route, node]
+        assert sum(graph._adjacency[a][b] for a, b in zip(path, path[1:])) == cost
+
+
+def random_mesh(rng, count, radius=0.3):
+    """Nodos en el plano unidad con enlaces entre los cercanos; coste según la distancia."""
+    nodes = [ROOT] + [t.NWK(nwk) for nwk in rng.sample(range(1, 0xFFF7), count - 1)]
+    position = {node: (rng.random(), rng.random()) for node in nodes}
+    tables = {}
+    for a in nodes:
+        tables[a] = {}
+        for b in nodes:
+            distance = math.dist(position[a], position[b])
+            if a != b and distance < radius:
+                tables[a][b] = link_cost(max(1, int(255 * (1 - distance / radius))))
+    return nodes, tables
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_incremental_updates_match_full_dijkstra(seed):
+    rng = random.Random(seed)
+    nodes, tables = random_mesh(rng, 40)
+    graph = RoutingGraph()
+    for node in rng.sample(nodes[1:], 8):
+        graph.set_end_device(node, True)
+    for node, costs in tables.items():
+        graph.set_neighbors(node, costs)
+    check_against_full_dijkstra(graph)
+
+    for _ in range(60):
+        node = rng.choice(nodes)
+        op = rng.random()
+        if op < 0.2:
+            graph.handle_route_error(node)
+        elif op < 0.4:
+            graph.set_neighbors(node, {n: rng.randint(1, 7) for n in tables[node] if rng.random() < 0.8})
+        elif op < 0.5:
+            graph.remove_node(node)
+        elif op < 0.6:
+            graph.set_route_hops(node, set(rng.sample(nodes, 3)))
+        elif op < 0.75:
+            graph.handle_relays(node, rng.sample(nodes[1:], rng.randint(0, 3)))
+        else:
+            graph.set_end_device(node, rng.random() < 0.5)
+        check_against_full_dijkstra(graph)
+
+
+def test_end_devices_are_destinations_but_never_relays():
+    end_device, router, far = t.NWK(0x1111), t.NWK(0x2222), t.NWK(0x3333)
+    graph = RoutingGraph()
+    graph.set_neighbors(ROOT, {end_device: 1, router: 5})
+    graph.set_neighbors(far, {end_device: 1, router: 1})
+
+    # Por el dispositivo final el camino sería más barato (1 + 1)
+    assert graph.source_route_to(far) == [end_device]
+    graph.set_end_device(end_device, True)
+    assert graph.source_route_to(far) == [router]
+    assert graph.cost_to(far) == 6
+    assert graph.source_route_to(end_device) == []
+
+    graph.set_end_device(end_device, False)  # P. ej. era un router con la misma NWK
+    assert graph.source_route_to(far) == [end_device]
+
+
+def test_neighbor_tables_tell_the_device_types():
+    router_ieee = t.EUI64.convert("00:11:22:33:44:55:66:01")
+    end_device, router = t.NWK(0x1111), t.NWK(0x2222)
+
+    class App:
+        devices = {}
+
+        def get_device(self, ieee):
+            return type("Device", (), {"nwk": router})()
+
+    def neighbor(nwk, device_type):
+        return zdo_t.Neighbor(
+            extended_pan_id=t.ExtendedPanId.convert("00:00:00:00:00:00:00:01"),
+            ieee=t.EUI64.convert(f"00:00:00:00:00:00:{nwk >> 8:02x}:{nwk & 0xFF:02x}"),
+            nwk=nwk,
+            device_type=device_type,
+            rx_on_when_idle=zdo_t.Neighbor.RxOnWhenIdle.Off,
+            relationship=zdo_t.Neighbor.Relationship.Child,
+            reserved1=0,
+            permit_joining=zdo_t.Neighbor.PermitJoins.Unknown,
+            reserved2=0,
+            depth=2,
+            lqi=255,
+        )
+
+    graph = RoutingGraph(App())
+    graph.set_neighbors(ROOT, {router: 1})
+    graph.neighbors_updated(router_ieee, [
+        neighbor(ROOT, zdo_t.Neighbor.DeviceType.Coordinator),
+        neighbor(end_device, zdo_t.Neighbor.DeviceType.EndDevice),
+    ])
+    assert graph._end_devices == {end_device}
+    assert graph.source_route_to(end_device) == [router]
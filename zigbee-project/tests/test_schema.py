@@ -0,0 +1,98 @@
+import json
+import math
+import struct
+
+import pytest
+import zigpy.types as t
+
+from sensor_schema import SENSOR_SCHEMA_PATH, SensorRegistry, SensorSchema
+
+
+def sensor(cluster_id="0xFC10", **overrides):
+    data = {
+        "name": "sensor_prueba",
+        "cluster_id": cluster_id,
+        "attributes": [{"id": "0x0001", "name": "corriente", "type": "single"}],
+    }
+    data.update(overrides)
+    return data
+
+
+def float32(value):
+    return struct.unpack("<f", struct.pack("<f", value))[0]
+
+
+def test_defaults_for_optional_fields():
+    schema = SensorSchema.from_dict(sensor())
+    assert (schema.endpoint_id, schema.min_interval, schema.max_interval) == (1, 10, 60)
+    assert schema.class_name == "SensorPruebaCluster"
+    assert schema.description == ""
+
+    (attr,) = schema.attributes
+    assert (attr.unit, attr.scale, attr.channel) == ("", 1.0, "corriente")  # El canal toma el nombre
+    assert attr.reportable_change is None
+    assert not attr.manufacturer_specific
+
+
+def test_ids_may_be_ints_or_hex_strings():
+    attributes = [
+        {"id": "0x0010", "name": "hex", "type": "uint16"},
+        {"id": 17, "name": "entero", "type": "uint16"},
+        {"id": "18", "name": "decimal", "type": "uint16"},
+    ]
+    for cluster_id in ("0xFC10", 0xFC10, "64528"):
+        schema = SensorSchema.from_dict(sensor(cluster_id, attributes=attributes))
+        assert schema.cluster_id == 0xFC10
+        assert [attr.id for attr in schema.attributes] == [0x10, 17, 18]
+
+
+def test_unknown_type_is_rejected():
+    with pytest.raises(ValueError, match="tipo 'float'"):
+        SensorSchema.from_dict(sensor(attributes=[{"id": 1, "name": "x", "type": "float"}]))
+
+
+def test_generated_cluster_uses_the_schema_types():
+    schema = SensorSchema.from_dict(sensor("0xFC11", attributes=[
+        {"id": 1, "name": "corriente", "type": "single"},
+        {"id": 2, "name": "estado", "type": "uint8", "manufacturer_specific": True},
+    ]))
+    cluster = schema.build_cluster()
+    assert cluster.cluster_id == 0xFC11 and cluster.ep_attribute == "sensor_prueba"
+    assert cluster.attributes[1].type is t.Single
+    assert cluster.attributes[2].type is t.uint8_t and cluster.attributes[2].is_manufacturer_specific
+
+
+def test_sentinels_from_the_type_the_sensor_and_the_attribute():
+    schema = SensorSchema.from_dict(sensor(sentinels=[-999.9], attributes=[
+        {"id": 1, "name": "corriente", "type": "single", "sentinels": [1e6]},
+        {"id": 2, "name": "tension", "type": "int16", "sentinels": ["0x7FFF"]},
+    ]))
+    current, voltage = schema.channels()[1], schema.channels()[2]
+
+    # Centinelas en coma flotante: llegan redondeados a float32
+    assert current.is_sentinel(float32(-999.9)) and current.is_sentinel(float32(1e6))
+    assert not current.is_sentinel(-999.0) and not current.is_sentinel(0.0)
+    # NaN es el "sin valor" de single y double
+    assert current.is_sentinel(math.nan)
+    assert current.is_sentinel(float32(math.nan))
+
+    # Enteros: el "sin valor" del tipo y los configurados, comparados exactamente
+    assert voltage.is_sentinel(-0x8000) and voltage.is_sentinel(0x7FFF)
+    assert not voltage.is_sentinel(0x7FFE) and not voltage.is_sentinel(0)
+
+
+def test_registry_rejects_repeated_clusters():
+    with pytest.raises(ValueError, match="repetidos"):
+        SensorRegistry([SensorSchema.from_dict(sensor("0xFC12")), SensorSchema.from_dict(sensor(0xFC12))])
+
+
+def test_registry_loads_the_shipped_schema_and_custom_files(tmp_path):
+    registry = SensorRegistry.load(SENSOR_SCHEMA_PATH)
+    schema = next(iter(registry))
+    assert registry.clusters[schema.cluster_id].cluster_id == schema.cluster_id
+    assert set(registry.channels[schema.cluster_id]) == {attr.id for attr in schema.attributes}
+
+    path = tmp_path / "sensores.json"
+    path.write_text(json.dumps({"sensors": [sensor("0xFC13", name="otro")]}), encoding="utf-8")
+    (custom,) = SensorRegistry.load(str(path))
+    assert custom.cluster_id == 0xFC13 and custom.class_name == "OtroCluster"
@@ -0,0 +1,135 @@
+import asyncio
+import math
+import sqlite3
+import time
+
+from sensor_pipeline import GatewayMetrics, SensorReading
+from sensor_store import ReadingsStore
+
+IEEE = "0011223344556601"
+DAY = 86400
+MIDNIGHT = (int(time.time()) // DAY) * DAY  # Hoy a las 00:00 UTC, dentro de la retención
+
+
+def reading(ts, value, attribute_id=1, valid=True, ieee=IEEE):
+    return SensorReading("radio0", ieee, 0x1234, attribute_id, "Sensor Corriente", value, ts, valid)
+
+
+def with_store(path, coro_fn, retention_days=0, metrics=None):
+    async def run():
+        store = ReadingsStore(str(path), metrics=metrics, retention_days=retention_days)
+        await store.open()
+        try:
+            return await coro_fn(store)
+        finally:
+            await store.close()
+
+    return asyncio.run(run())
+
+
+def test_readings_go_to_one_partition_per_utc_day(tmp_path):
+    async def run(store):
+        await store.insert([reading(MIDNIGHT - 1, 1.0), reading(MIDNIGHT, 2.0), reading(MIDNIGHT + DAY - 1, 3.0)])
+        assert len(store.partitions) == 2
+        # Un rango que cruza la medianoche lee las dos particiones en orden
+        assert await store.range(IEEE, 1, MIDNIGHT - 10, MIDNIGHT + DAY) == [
+            (MIDNIGHT - 1, 1.0), (MIDNIGHT, 2.0), (MIDNIGHT + DAY - 1, 3.0)]
+        await store.insert([reading(MIDNIGHT + DAY, 4.0)])
+        return store.partitions
+
+    partitions = with_store(tmp_path / "readings.db", run)
+    assert len(partitions) == 3 and partitions == sorted(partitions)
+
+    # El catálogo se reconstruye al reabrir el fichero
+    assert with_store(tmp_path / "readings.db", lambda store: asyncio.sleep(0, store.partitions)) == partitions
+
+
+def test_new_partition_prunes_days_past_retention(tmp_path):
+    async def run(store):
+        await store.insert([reading(MIDNIGHT - 5 * DAY, 1.0), reading(MIDNIGHT - DAY, 2.0)])
+        await store.insert([reading(MIDNIGHT, 3.0)])  # Partición nueva: se aplica la retención
+        return await store.range(IEEE, 1, MIDNIGHT - 10 * DAY, MIDNIGHT + DAY), len(store.partitions)
+
+    rows, partitions = with_store(tmp_path / "readings.db", run, retention_days=2)
+    assert rows == [(MIDNIGHT - DAY, 2.0), (MIDNIGHT, 3.0)]
+    assert partitions == 2
+
+
+def test_insert_range_last_and_summary(tmp_path):
+    async def run(store):
+        await store.insert([reading(MIDNIGHT + n, float(n)) for n in range(10)])
+        await store.insert([reading(MIDNIGHT + 3, 30.0)])  # Misma clave: la sustituye
+        await store.insert([reading(MIDNIGHT + 5, 99.0, attribute_id=2)])
+        return (
+            await store.range(IEEE, 1, MIDNIGHT + 2, MIDNIGHT + 4),
+            await store.last(IEEE, 1, 2),
+            await store.range_summary(IEEE, 1, MIDNIGHT, MIDNIGHT + DAY, limit=4),
+            await store.range(IEEE, 2, MIDNIGHT, MIDNIGHT + DAY),
+            await store.range("00000000000000ff", 1, MIDNIGHT, MIDNIGHT + DAY),
+        )
+
+    rows, last, summary, other_channel, unknown = with_store(tmp_path / "readings.db", run)
+    assert rows == [(MIDNIGHT + 2, 2.0), (MIDNIGHT + 3, 30.0), (MIDNIGHT + 4, 4.0)]
+    assert last == [(MIDNIGHT + 9, 9.0), (MIDNIGHT + 8, 8.0)]
+    assert summary == (10, MIDNIGHT + 9, MIDNIGHT + 4)
+    assert other_channel == [(MIDNIGHT + 5, 99.0)]
+    assert unknown == []
+
+
+def test_downsample_buckets_across_partitions(tmp_path):
+    async def run(store):
+        await store.insert([reading(MIDNIGHT - 60 + 20 * n, float(n)) for n in range(6)])
+        return await store.downsample(IEEE, 1, MIDNIGHT - 3600, MIDNIGHT + 3600, 3600)
+
+    # Un intervalo de una hora que empieza a medianoche solo contiene las lecturas de hoy
+    assert with_store(tmp_path / "readings.db", run) == [
+        (MIDNIGHT - 3600, 0.0, 1.0, 2.0, 3),
+        (MIDNIGHT, 3.0, 4.0, 5.0, 3),
+    ]
+
+
+def test_invalid_and_nan_readings_are_stored_as_gaps(tmp_path):
+    metrics = GatewayMetrics()
+
+    async def run(store):
+        await store.insert([
+            reading(MIDNIGHT, 10.0),
+            reading(MIDNIGHT + 1, -999.9, valid=False),  # Centinela del esquema
+            reading(MIDNIGHT + 2, math.nan),
+            reading(MIDNIGHT + 3, 20.0),
+        ])
+        return (
+            await store.range(IEEE, 1, MIDNIGHT, MIDNIGHT + DAY),
+            await store.last(IEEE, 1),
+            await store.downsample(IEEE, 1, MIDNIGHT, MIDNIGHT + DAY, 60),
+            await store.downsample(IEEE, 1, MIDNIGHT + 1, MIDNIGHT + 2, 60),
+        )
+
+    rows, last, buckets, only_invalid = with_store(tmp_path / "readings.db", run, metrics=metrics)
+    assert rows == [(MIDNIGHT, 10.0), (MIDNIGHT + 1, None), (MIDNIGHT + 2, None), (MIDNIGHT + 3, 20.0)]
+    assert last == [(MIDNIGHT + 3, 20.0)]
+    assert buckets == [(MIDNIGHT, 10.0, 15.0, 20.0, 2)]  # Los huecos no cuentan en el agregado
+    assert only_invalid == []
+    assert metrics.snapshot()["store.inserted_invalid"] == 2
+
+
+def test_partitions_from_older_versions_accept_invalid_readings(tmp_path):
+    path = tmp_path / "readings.db"
+    with_store(path, lambda store: store.insert([reading(MIDNIGHT, 1.0)]))
+    table = with_store(path, lambda store: asyncio.sleep(0, store.partitions[0]))
+
+    # Recrea la partición con el esquema anterior, con `value REAL NOT NULL`
+    with sqlite3.connect(path) as db:
+        db.execute(f"DROP TABLE {table}")
+        db.execute(f"""CREATE TABLE {table} (device_id INTEGER NOT NULL, attribute_id INTEGER NOT NULL,
+                       ts_ms INTEGER NOT NULL, value REAL NOT NULL,
+                       PRIMARY KEY (device_id, attribute_id, ts_ms)) WITHOUT ROWID""")
+        db.execute(f"INSERT INTO {table} VALUES (1, 1, ?, 1.0)", (MIDNIGHT * 1000,))
+
+    async def run(store):
+        await store.insert([reading(MIDNIGHT + 1, math.nan)])
+        return await store.range(IEEE, 1, MIDNIGHT, MIDNIGHT + DAY)
+
+    assert with_store(path, run) == [(MIDNIGHT, 1.0), (MIDNIGHT + 1, None)]
+    with sqlite3.connect(path) as db:
+        assert [row[3] for row in db.execute(f"PRAGMA table_info({table})") if row[1] == "value"] == [0]
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+
+import pytest
+
+from bellows.thread import EventLoopThread, ThreadsafeProxy
+
+
+class Sink:
+    def __init__(self):
+        self.calls = []
+
+    def record(self, n):
+        self.calls.append(n)
+
+    async def double(self, n):
+        await asyncio.sleep(0)
+        return 2 * n
+
+    async def fail(self):
+        raise ValueError("fallo en el otro bucle")
+
+
+async def start_thread():
+    thread = EventLoopThread()
+    await thread.start()
+    return thread
+
+
+async def stop_thread(thread):
+    thread.force_stop()
+    await thread.thread_complete
+
+
+def test_burst_from_another_thread_runs_in_order_with_one_drain():
+    async def run():
+        sink = Sink()
+        proxy = ThreadsafeProxy(sink, asyncio.get_running_loop())
+        drains = []
+        drain = proxy._drain
+        proxy._drain = lambda: (drains.append(len(proxy._pending_calls)), drain())
+
+        async def produce():
+            for n in range(1000):
+                proxy.record(n)
+
+        thread = await start_thread()
+        try:
+            # El bucle principal queda bloqueado mientras el otro hilo encola la ráfaga
+            asyncio.run_coroutine_threadsafe(produce(), thread.loop).result()
+            await asyncio.sleep(0)
+        finally:
+            await stop_thread(thread)
+        return sink.calls, drains
+
+    calls, drains = asyncio.run(run())
+    assert calls == list(range(1000))
+    assert drains == [1000]  # Un único despertar para toda la ráfaga
+
+
+def test_calls_on_the_same_loop_run_directly():
+    async def run():
+        sink = Sink()
+        proxy = ThreadsafeProxy(sink, asyncio.get_running_loop())
+        proxy.record(1)
+        assert sink.calls == [1]
+        assert await proxy.double(3) == 6
+        assert proxy.record is proxy.record  # El envoltorio se crea una sola vez
+
+    asyncio.run(run())
+
+
+def test_coroutine_results_and_exceptions_cross_threads():
+    async def run():
+        thread = await start_thread()
+        sink = Sink()
+        proxy = ThreadsafeProxy(sink, thread.loop)
+        try:
+            results = await asyncio.gather(*(proxy.double(n) for n in range(20)))
+            with pytest.raises(ValueError, match="fallo en el otro bucle"):
+                await proxy.fail()
+        finally:
+            await stop_thread(thread)
+        return results
+
+    assert asyncio.run(run()) == [2 * n for n in range(20)]
+
+
+def test_calls_after_shutdown_are_dropped(caplog):
+    async def run():
+        thread = await start_thread()
+        sink = Sink()
+        proxy = ThreadsafeProxy(sink, thread.loop)
+        proxy.record(1)
+        await asyncio.sleep(0.05)
+        await stop_thread(thread)
+
+        with caplog.at_level(logging.WARNING):
+            assert proxy.record(2) is None
+        return sink.calls
+
+    assert asyncio.run(run()) == [1]
+    assert "closed event loop" in caplog.text
+
+
+def test_failed_wakeup_does_not_leave_later_calls_queued_forever():
+    loop = asyncio.new_event_loop()
+    loop.close()
+    proxy = ThreadsafeProxy(Sink(), loop)
+
+    # El bucle se cierra entre la comprobación y el despertar: el error llega al llamante
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            proxy._schedule(print, "nunca")
+        assert not proxy._drain_scheduled
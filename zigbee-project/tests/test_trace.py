@@ -0,0 +1,47 @@
+import io
+import threading
+
+from bellows.trace import FrameTracer, TraceStage, read_trace
+
+
+def frame(n):
+    return bytes([n % 256]) * (1 + n % 40)
+
+
+def test_dump_while_recording_from_another_thread():
+    tracer = FrameTracer(records=64, max_frame=32)
+    stop = threading.Event()
+
+    def serial_thread():
+        n = 0
+        while not stop.is_set():
+            tracer.record(TraceStage.ASH_RX_FRAME, frame(n))
+            n += 1
+
+    thread = threading.Thread(target=serial_thread)
+    thread.start()
+    try:
+        for _ in range(200):
+            f = io.BytesIO()
+            tracer.write(f)
+            f.seek(0)
+            records = list(read_trace(f))
+            for record in records:
+                # Un registro a medio escribir tendría la longitud de uno y los bytes de otro
+                expected = min(record.length, 32)
+                assert len(record.data) == expected
+                assert record.data == record.data[:1] * expected
+            timestamps = [record.timestamp for record in records]
+            assert timestamps == sorted(timestamps)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_truncated_frames_keep_original_length():
+    tracer = FrameTracer(records=2, max_frame=4)
+    tracer.record(TraceStage.ASH_TX_DATA, b"\x01\x02\x03\x04\x05\x06")
+    tracer.record(TraceStage.ASH_RX_DATA, b"\x07")
+    tracer.record(TraceStage.ASH_RX_DATA, b"\x08")
+    assert [(r.length, r.data) for r in tracer] == [(1, b"\x07"), (1, b"\x08")]
+    assert tracer.total == 3
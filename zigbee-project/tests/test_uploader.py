@@ -0,0 +1,63 @@
+import asyncio
+
+from aiohttp import web
+
+from sensor_pipeline import SensorReading
+from sensor_uploader import HttpUploader
+
+
+def readings(count):
+    return [SensorReading("radio0", f"{n:016x}", n, 1, "test", n * 0.5, 1000.0 + n) for n in range(count)]
+
+
+async def serve(delay):
+    stats = {"current": 0, "max": 0, "sizes": []}
+
+    async def handle(request):
+        stats["current"] += 1
+        stats["max"] = max(stats["max"], stats["current"])
+        try:
+            stats["sizes"].append(len(await request.json()))
+            await asyncio.sleep(delay)
+        finally:
+            stats["current"] -= 1
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post("/readings", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/readings", stats
+
+
+def test_batch_is_sent_as_concurrent_requests():
+    async def main():
+        runner, url, stats = await serve(0.2)
+        uploader = HttpUploader(url, max_in_flight=4)
+        try:
+            await uploader(readings(2000))
+        finally:
+            await uploader.close()
+            await runner.cleanup()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["max"] == 4
+    assert sorted(stats["sizes"]) == [500] * 4
+
+
+def test_small_batch_is_not_split_below_minimum():
+    async def main():
+        runner, url, stats = await serve(0)
+        uploader = HttpUploader(url, max_in_flight=4)
+        try:
+            await uploader(readings(150))
+        finally:
+            await uploader.close()
+            await runner.cleanup()
+        return stats
+
+    assert sorted(asyncio.run(main())["sizes"]) == [50, 100]
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import sensor_pipeline
+from sensor_pipeline import GatewayMetrics, ReadingPipeline, SensorReading
+from sensor_wal import WriteAheadQueue
+
+
+def reading(n):
+    return SensorReading("radio0", f"{n:016x}", n, 1, "test", n * 0.5, 1000.0 + n)
+
+
+def test_append_does_not_wait_for_fsync(tmp_path, monkeypatch):
+    release = threading.Event()
+    fsync_threads = []
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        fsync_threads.append(threading.current_thread().name)
+        release.wait(5)
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", slow_fsync)
+    wal = WriteAheadQueue(str(tmp_path), fsync_records=10)
+    wal.consumer("test")
+
+    start = time.monotonic()
+    for n in range(100):
+        wal.append(reading(n))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0  # El fsync bloqueado no ha frenado la ingesta
+    assert fsync_threads and all(name.startswith("wal-fsync") for name in fsync_threads)
+    release.set()
+    wal.close()
+
+    reopened = WriteAheadQueue(str(tmp_path))
+    reopened.consumer("test")
+    assert [r for _, r in reopened.read("test", 200)] == [reading(n) for n in range(100)]
+    reopened.close()
+
+
+def test_segment_rotation_closes_old_segment_off_loop(tmp_path):
+    wal = WriteAheadQueue(str(tmp_path), segment_bytes=1024)
+    wal.consumer("test")
+    for n in range(200):
+        wal.append(reading(n))
+    assert len(wal._segments) > 1
+    batch = wal.read("test", 500)
+    assert [r for _, r in batch] == [reading(n) for n in range(200)]
+    wal.close()
+
+
+def run_durable(tmp_path, monkeypatch, sink, readings, until):
+    """Entrega `readings` a una etapa duradera hasta que se cumple `until(pipeline)`."""
+    monkeypatch.setattr(sensor_pipeline, "DURABLE_RETRY_MIN", 0)
+    monkeypatch.setattr(sensor_pipeline, "DURABLE_RETRY_MAX", 0)
+    wal = WriteAheadQueue(str(tmp_path))
+    pipeline = ReadingPipeline(GatewayMetrics(), wal=wal)
+    pipeline.add_durable_sink("historico", sink, batch_size=10)
+
+    async def run():
+        for r in readings:
+            pipeline.submit(r)
+        task = asyncio.create_task(pipeline.run())
+        for _ in range(1000):
+            if until(pipeline):
+                break
+            await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    wal.close()
+    return pipeline
+
+
+def test_poison_reading_is_quarantined_after_repeated_failures(tmp_path, monkeypatch):
+    delivered, attempts = [], []
+
+    def sink(batch):
+        attempts.append(len(batch))
+        if reading(3) in batch:
+            raise ValueError("lectura que el destino nunca acepta")
+        delivered.extend(batch)
+
+    pipeline = run_durable(tmp_path, monkeypatch, sink, [reading(n) for n in range(6)],
+                           until=lambda pipeline: pipeline.wal.lag("historico") == 0)
+
+    assert delivered == [reading(n) for n in range(6) if n != 3]
+    # El lote entero falla DURABLE_POISON_RETRIES veces antes de entregarse lectura a lectura
+    assert attempts[:sensor_pipeline.DURABLE_POISON_RETRIES] == [6] * sensor_pipeline.DURABLE_POISON_RETRIES
+    metrics = pipeline.metrics.snapshot()
+    assert metrics["pipeline.quarantined.historico"] == 1
+    assert metrics["pipeline.delivered.historico"] == 5
+    with open(tmp_path / "historico.quarantine") as f:
+        (record,) = [json.loads(line) for line in f]
+    assert record["value"] == reading(3).value and record["error"].startswith("ValueError")
+
+
+def test_outage_never_quarantines(tmp_path, monkeypatch):
+    attempts = []
+
+    def sink(batch):
+        attempts.append(len(batch))
+        raise ConnectionError("destino caído")
+
+    pipeline = run_durable(tmp_path, monkeypatch, sink, [reading(n) for n in range(3)],
+                           until=lambda pipeline: len(attempts) > 30)
+
+    # Lectura a lectura también fallan todas: nada se aparta ni se confirma
+    assert 1 in attempts
+    assert "pipeline.quarantined.historico" not in pipeline.metrics.snapshot()
+    assert not os.path.exists(tmp_path / "historico.quarantine")
+
+    reopened = WriteAheadQueue(str(tmp_path))
+    reopened.consumer("historico")
+    assert [r for _, r in reopened.read("historico")] == [reading(n) for n in range(3)]
+    reopened.close()
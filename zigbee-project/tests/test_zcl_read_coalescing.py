@@ -0,0 +1,119 @@
+import asyncio
+
+import zigpy.config as zigpy_config
+from zigpy.zcl import foundation
+import zigpy.types as t
+import zigpy.zdo.types as zdo_t
+
+
+def _cluster(app, max_nsdu=None):
+    device = app.add_device(t.EUI64(b"\x01" * 8), 0x1234)
+    if max_nsdu is not None:
+        device.node_desc = zdo_t.NodeDescriptor(1, 64, 142, 4476, max_nsdu, 255, 0, 255, 0)
+    cluster = device.add_endpoint(1).add_input_cluster(0x0000)  # Basic
+    requests = []
+
+    async def read_attributes_raw(attributes, manufacturer=None, **kwargs):
+        requests.append(list(attributes))
+        await asyncio.sleep(0)
+        return [[
+            foundation.ReadAttributeRecord(
+                attrid=a, status=foundation.Status.SUCCESS,
+                value=foundation.TypeValue(type=0x20, value=t.uint8_t(1)),
+            )
+            for a in attributes
+        ]]
+
+    cluster.read_attributes_raw = read_attributes_raw
+    return cluster, requests
+
+
+async def _concurrent_reads(cluster):
+    return await asyncio.gather(
+        cluster.read_attributes([0x0000], allow_cache=False),
+        cluster.read_attributes([0x0001], allow_cache=False),
+        cluster.read_attributes([0x0000, 0x0002], allow_cache=False),
+    )
+
+
+def test_reads_are_sent_directly_by_default(make_app):
+    async def run():
+        cluster, requests = _cluster(make_app())
+        results = await _concurrent_reads(cluster)
+        assert requests == [[0x0000], [0x0001], [0x0000, 0x0002]]
+        assert results[2][0] == {0x0000: 1, 0x0002: 1}
+
+    asyncio.run(run())
+
+
+def test_application_setting_enables_coalescing(make_app):
+    async def run():
+        app = make_app({zigpy_config.CONF_READ_COALESCE_WINDOW: 0.01})
+        cluster, requests = _cluster(app)
+        results = await _concurrent_reads(cluster)
+        assert requests == [[0x0000, 0x0001, 0x0002]]
+        assert results[0][0] == {0x0000: 1}
+        assert results[2][0] == {0x0000: 1, 0x0002: 1}
+
+    asyncio.run(run())
+
+
+def test_cluster_class_can_opt_out(make_app):
+    async def run():
+        app = make_app({zigpy_config.CONF_READ_COALESCE_WINDOW: 0.01})
+        cluster, requests = _cluster(app)
+        cluster.read_coalesce_window = 0
+        await _concurrent_reads(cluster)
+        assert len(requests) == 3
+
+    asyncio.run(run())
+
+
+def test_split_follows_device_max_payload(make_app):
+    app = make_app({zigpy_config.CONF_READ_COALESCE_WINDOW: 0.01})
+    cluster, _ = _cluster(app, max_nsdu=82)
+    attrs = list(range(0x4000, 0x4000 + 20))  # 16-byte placeholder for unknown types
+    coalescer = cluster._read_coalescer
+    # 82 - 8 (APS) - 3 (ZCL) = 71 bytes: 3 records of 20 bytes per response
+    assert [len(c) for c in coalescer._split_reads(attrs)] == [3] * 6 + [2]
+    # With a manufacturer code there are 2 bytes less, still 3 records
+    assert len(coalescer._split_reads(attrs, manufacturer=0x1234)[0]) == 3
+
+    cluster.endpoint.device.node_desc.maximum_buffer_size = 127
+    # 127 - 11 = 116 bytes: 5 records
+    assert [len(c) for c in coalescer._split_reads(attrs)] == [5] * 4
+
+    cluster.endpoint.device.node_desc = None  # Not read yet: assumes 82
+    assert len(coalescer._split_reads(attrs)[0]) == 3
+
+
+def test_cancelled_chunk_read_stops(make_app):
+    async def run():
+        app = make_app({zigpy_config.CONF_READ_COALESCE_WINDOW: 0.01})
+        cluster, _ = _cluster(app)
+        sent = asyncio.Event()
+
+        async def read_attributes_raw(attributes, manufacturer=None, **kwargs):
+            sent.set()
+            await asyncio.sleep(10)
+
+        cluster.read_attributes_raw = read_attributes_raw
+        read = asyncio.ensure_future(cluster.read_attributes([0x0000], allow_cache=False))
+        await sent.wait()
+
+        coalescer = cluster._read_coalescer
+        (task,) = coalescer._tasks
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        # The chunk task ends cancelled instead of completing, and so does its caller
+        assert task.cancelled()
+        assert coalescer._in_flight == {}
+        try:
+            await read
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("the read was not cancelled")
+
+    asyncio.run(run())